@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Поиск по журналу входящих updates (logs/updates.jsonl) по чату, пользователю, типу и времени
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from services.journal_index import build_index, index_path, journal_files, query_journal
+
+
+def parse_time(value):
+    """Unix-время или дата/время в ISO формате (локальное время)"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def day_range(value):
+    """Границы суток: today, yesterday или YYYY-MM-DD"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if value == "today":
+        start = today
+    elif value == "yesterday":
+        start = today - timedelta(days=1)
+    else:
+        start = datetime.fromisoformat(value)
+    return start.timestamp(), (start + timedelta(days=1)).timestamp() - 0.001
+
+
+def reindex(journal_file):
+    """Строит индексы для запечатанных сегментов без .idx"""
+    for path in journal_files(journal_file):
+        if path == journal_file or os.path.exists(index_path(path)):
+            continue
+        index = build_index(path)
+        print(f"📇 {path}: {index.lines} updates", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск по журналу входящих updates")
+    parser.add_argument("--file", default=os.getenv("UPDATE_JOURNAL_FILE", "/app/logs/updates.jsonl"),
+                        help="Файл журнала (сегменты <файл>.N ищутся рядом)")
+    parser.add_argument("--chat", type=int, help="chat_id")
+    parser.add_argument("--user", type=int, help="user_id отправителя")
+    parser.add_argument("--type", dest="update_type",
+                        help="Вид update (message, business_message, callback_query...) или содержимого (text, voice, photo...)")
+    parser.add_argument("--since", type=parse_time, help="Начало интервала (unix-время или ISO)")
+    parser.add_argument("--until", type=parse_time, help="Конец интервала (unix-время или ISO)")
+    parser.add_argument("--day", help="Сутки: today, yesterday или YYYY-MM-DD")
+    parser.add_argument("--limit", type=int, default=0, help="Не больше N результатов")
+    parser.add_argument("--count", action="store_true", help="Вывести только количество")
+    parser.add_argument("--reindex", action="store_true", help="Построить недостающие индексы сегментов")
+    args = parser.parse_args()
+
+    if args.reindex:
+        reindex(args.file)
+        return
+
+    since, until = args.since, args.until
+    if args.day:
+        since, until = day_range(args.day)
+
+    found = 0
+    results = query_journal(args.file, chat=args.chat, user=args.user, update_type=args.update_type,
+                            since=since, until=until)
+    for line, _ in results:
+        found += 1
+        if not args.count:
+            sys.stdout.buffer.write(line if line.endswith(b"\n") else line + b"\n")
+        if args.limit and found >= args.limit:
+            break
+    if args.count:
+        print(found)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон: повтор записанных updates в webhook бота.
+
+Updates читаются из журнала (logs/updates.jsonl и его сегменты) или из старого
+logs/updates.json (блоки log_update_json между строками "====") и отправляются
+POST-запросами в webhook с исходными интервалами, ускоренными в --speed раз
+(--speed 0 - без пауз), не больше --concurrency одновременно.
+
+NeuroAPI, YandexGPT, SpeechKit и Telegram Bot API заменяются локальными
+заглушками на aiohttp с заданным распределением задержки. С --spawn-bot бот
+запускается сам, с адресами API на заглушках и временными файлами состояния;
+без него печатаются переменные окружения для запуска бота вручную.
+
+В конце выводится пропускная способность и перцентили задержек по этапам:
+ack - ответ webhook; first_action - первый вызов Telegram API по чату update
+(typing); first_message - первое отправленное сообщение; reply - последнее
+отправленное или исправленное сообщение. Вызовы Telegram API относятся к
+последнему отправленному update того же чата.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import bisect
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from aiohttp import web
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from services.journal_index import journal_files, update_keys
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'bot.py')
+REPLAY_TOKEN = "123456:replay"
+
+# Методы Telegram API, которые отправляют или меняют сообщение
+SEND_METHODS = ("sendMessage", "sendVoice", "sendAudio", "sendPhoto", "sendDocument", "sendSticker")
+EDIT_METHODS = ("editMessageText", "editMessageCaption")
+
+
+class Latency:
+    """Распределение задержки заглушки (мс): fixed:MS, uniform:LO:HI, normal:MEAN:STD, lognormal:MEDIAN:SIGMA"""
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        try:
+            self.params = [float(value) for value in params.split(":")] if params else []
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Неверная задержка: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise argparse.ArgumentTypeError(f"Неверная задержка: {spec}")
+        self.kind = kind
+        self.spec = spec
+
+    def sample(self) -> float:
+        """Задержка в секундах"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = random.gauss(*self.params)
+        else:
+            ms = self.params[0] * math.exp(random.gauss(0, self.params[1]))
+        return max(ms, 0.0) / 1000
+
+
+def percentiles(values):
+    """Количество и перцентили p50/p90/p99/max (мс)"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)], 1)
+
+    return {"count": len(ordered), "p50": rank(50), "p90": rank(90), "p99": rank(99), "max": round(ordered[-1], 1)}
+
+
+def _parse_record(text):
+    """(время получения или None, update) из записи журнала или log_update_json"""
+    try:
+        record = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    if isinstance(record.get("update"), dict):
+        ts = record.get("ts")
+        if ts is None and record.get("timestamp"):
+            try:
+                ts = datetime.strptime(record["timestamp"], "%Y-%m-%d %H:%M:%S").timestamp()
+            except ValueError:
+                ts = None
+        return ts, record["update"]
+    if "update_id" in record:
+        return None, record
+    return None
+
+
+def _read_file(path):
+    block = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped and set(stripped) == {"="}:
+                # Разделитель блоков log_update_json
+                if block:
+                    record = _parse_record("".join(block))
+                    block = []
+                    if record is not None:
+                        yield record
+                continue
+            if block:
+                block.append(line)
+            elif stripped == "{":
+                # Начало многострочного JSON (indent=2)
+                block.append(line)
+            elif "{" in line:
+                # JSONL журнала или одна строка лога с JSON после префикса
+                record = _parse_record(line[line.index("{"):])
+                if record is not None:
+                    yield record
+    if block:
+        record = _parse_record("".join(block))
+        if record is not None:
+            yield record
+
+
+def read_updates(path):
+    """(время получения или None, update) из журнала с сегментами или из старого updates.json"""
+    for file_path in journal_files(path) or [path]:
+        yield from _read_file(file_path)
+
+
+class BackendStubs:
+    """Локальные заглушки внешних API с заданными задержками"""
+
+    def __init__(self, llm_latency, speech_latency, telegram_latency, reply_chars=400, stt_text="Привет, это тест",
+                 voice_file=None):
+        self.llm_latency = llm_latency
+        self.speech_latency = speech_latency
+        self.telegram_latency = telegram_latency
+        self.reply_text = ("Ответ заглушки для нагрузочного прогона. " * (reply_chars // 40 + 1))[:reply_chars]
+        self.stt_text = stt_text
+        self.voice_bytes = open(voice_file, 'rb').read() if voice_file else b"OggS" + b"\0" * 4096
+        # Время обработки запроса заглушкой по API (мс)
+        self.upstream = {}
+        # (время получения, chat_id, метод) для вызовов Telegram API
+        self.telegram_calls = []
+        self.message_id = 0
+        self.runner = None
+
+    def env(self, base_url):
+        """Адреса API бота на заглушках"""
+        return {
+            "NEUROAPI_ENDPOINT": f"{base_url}/neuroapi/v1/chat/completions",
+            "YC_FOUNDATION_MODELS_ENDPOINT": f"{base_url}/yandexgpt/completion",
+            "YC_STT_ENDPOINT": f"{base_url}/speechkit/stt",
+            "YC_TTS_ENDPOINT": f"{base_url}/speechkit/tts",
+            "TELEGRAM_API_BASE_URL": f"{base_url}/telegram/bot",
+            "TELEGRAM_API_FILE_URL": f"{base_url}/telegram/file/bot",
+        }
+
+    def _record(self, name, started):
+        self.upstream.setdefault(name, []).append((time.monotonic() - started) * 1000)
+
+    async def neuroapi(self, request):
+        started = time.monotonic()
+        payload = await request.json()
+        delay = self.llm_latency.sample()
+        if not payload.get("stream"):
+            await asyncio.sleep(delay)
+            self._record("neuroapi", started)
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": self.reply_text}}]})
+
+        # Потоковый ответ: части текста равномерно за время задержки
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunks = 10
+        size = math.ceil(len(self.reply_text) / chunks)
+        for i in range(chunks):
+            await asyncio.sleep(delay / chunks)
+            delta = self.reply_text[i * size:(i + 1) * size]
+            chunk = {"choices": [{"delta": {"content": delta}}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        self._record("neuroapi", started)
+        return response
+
+    async def yandexgpt(self, request):
+        started = time.monotonic()
+        await request.read()
+        await asyncio.sleep(self.llm_latency.sample())
+        self._record("yandexgpt", started)
+        return web.json_response({"result": {"alternatives": [
+            {"message": {"role": "assistant", "text": self.reply_text}, "status": "ALTERNATIVE_STATUS_FINAL"}
+        ]}})
+
+    async def stt(self, request):
+        started = time.monotonic()
+        await request.read()
+        await asyncio.sleep(self.speech_latency.sample())
+        self._record("stt", started)
+        return web.json_response({"result": self.stt_text})
+
+    async def tts(self, request):
+        started = time.monotonic()
+        await request.read()
+        await asyncio.sleep(self.speech_latency.sample())
+        self._record("tts", started)
+        return web.Response(body=self.voice_bytes, content_type="audio/ogg")
+
+    async def telegram(self, request):
+        started = time.monotonic()
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        chat_id = params.get("chat_id")
+        try:
+            chat_id = int(chat_id) if chat_id is not None else None
+        except (TypeError, ValueError):
+            pass
+        self.telegram_calls.append((started, chat_id, method))
+
+        await asyncio.sleep(self.telegram_latency.sample())
+        if method == "getMe":
+            result = {"id": int(REPLAY_TOKEN.split(":")[0]), "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+        elif method in SEND_METHODS or method in EDIT_METHODS:
+            self.message_id += 1
+            result = {"message_id": params.get("message_id") or self.message_id, "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+        elif method == "getFile":
+            file_id = params.get("file_id", "replay")
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.voice_bytes),
+                      "file_path": f"voice/{file_id}.oga"}
+        else:
+            result = True
+        self._record(f"telegram.{method}", started)
+        return web.json_response({"ok": True, "result": result})
+
+    async def telegram_file(self, request):
+        started = time.monotonic()
+        await asyncio.sleep(self.telegram_latency.sample())
+        self._record("telegram.file", started)
+        return web.Response(body=self.voice_bytes, content_type="audio/ogg")
+
+    async def start(self, host, port):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/neuroapi/v1/chat/completions", self.neuroapi)
+        app.router.add_post("/yandexgpt/completion", self.yandexgpt)
+        app.router.add_post("/speechkit/stt", self.stt)
+        app.router.add_post("/speechkit/tts", self.tts)
+        app.router.add_post("/telegram/bot{token}/{method}", self.telegram)
+        app.router.add_get("/telegram/file/bot{token}/{path:.*}", self.telegram_file)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+class Replayer:
+    """Отправка updates в webhook с исходными интервалами и сбор задержек"""
+
+    def __init__(self, target, speed=1.0, concurrency=16, secret_token=None):
+        self.target = target
+        self.speed = speed
+        self.concurrency = concurrency
+        self.secret_token = secret_token
+        self.ack = []
+        self.lag = []
+        self.statuses = {}
+        # (время отправки, chat_id) по порядку отправки
+        self.injections = []
+        self.started = None
+        self.finished = None
+
+    async def _inject(self, session, semaphore, update):
+        headers = {"Content-Type": "application/json"}
+        if self.secret_token:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.secret_token
+        body = json.dumps(update, ensure_ascii=False).encode()
+        try:
+            sent = time.monotonic()
+            self.injections.append((sent, update_keys(update)[0]))
+            async with session.post(self.target, data=body, headers=headers) as response:
+                await response.read()
+                status = str(response.status)
+            self.ack.append((time.monotonic() - sent) * 1000)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = type(e).__name__
+        finally:
+            semaphore.release()
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def run(self, updates):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        first_ts = None
+        last_ts = None
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            self.started = time.monotonic()
+            for ts, update in updates:
+                if ts is None:
+                    ts = last_ts
+                if ts is not None:
+                    first_ts = ts if first_ts is None else first_ts
+                    last_ts = ts
+                due = self.started
+                if self.speed > 0 and ts is not None:
+                    due += (ts - first_ts) / self.speed
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await semaphore.acquire()
+                if self.speed > 0:
+                    self.lag.append(max(time.monotonic() - due, 0.0) * 1000)
+                tasks.append(asyncio.create_task(self._inject(session, semaphore, update)))
+            await asyncio.gather(*tasks)
+        self.finished = time.monotonic()
+
+    def stages(self, telegram_calls):
+        """Задержки от отправки update до вызовов Telegram API по его чату (мс)"""
+        by_chat = {}
+        for index, (sent, chat_id) in sorted(enumerate(self.injections), key=lambda item: item[1][0]):
+            if chat_id is not None:
+                by_chat.setdefault(chat_id, ([], []))
+                by_chat[chat_id][0].append(sent)
+                by_chat[chat_id][1].append(index)
+
+        first_action, first_message, reply = {}, {}, {}
+        for called, chat_id, method in sorted(telegram_calls, key=lambda call: call[0]):
+            if chat_id not in by_chat:
+                continue
+            times, indexes = by_chat[chat_id]
+            position = bisect.bisect_right(times, called) - 1
+            if position < 0:
+                continue
+            index, sent = indexes[position], times[position]
+            elapsed = (called - sent) * 1000
+            first_action.setdefault(index, elapsed)
+            if method in SEND_METHODS:
+                first_message.setdefault(index, elapsed)
+            if method in SEND_METHODS or method in EDIT_METHODS:
+                reply[index] = elapsed
+        return {
+            "ack": percentiles(self.ack),
+            "first_action": percentiles(list(first_action.values())),
+            "first_message": percentiles(list(first_message.values())),
+            "reply": percentiles(list(reply.values())),
+        }
+
+
+async def wait_quiet(stubs, quiet_sec, max_wait_sec):
+    """Ждет, пока бот перестанет вызывать Telegram API (досылка ответов после последнего update)"""
+    deadline = time.monotonic() + max_wait_sec
+    seen = -1
+    while time.monotonic() < deadline:
+        if len(stubs.telegram_calls) == seen:
+            return
+        seen = len(stubs.telegram_calls)
+        await asyncio.sleep(quiet_sec)
+
+
+async def wait_healthy(url, timeout_sec, process=None):
+    deadline = time.monotonic() + timeout_sec
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Бот завершился с кодом {process.returncode}")
+            try:
+                async with session.get(url) as response:
+                    # 503 - бот еще прогревается
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Бот не ответил на {url} за {timeout_sec} с")
+
+
+def spawn_bot(stub_env, port, state_dir):
+    """Запуск бота с адресами API на заглушках и временными файлами состояния"""
+    env = dict(os.environ)
+    for name in ("UPDATE_DEDUP_FILE", "YC_SA_KEY_FILE", "YC_SA_KEY_JSON", "YC_IAM_TOKEN_CACHE_FILE"):
+        env.pop(name, None)
+    env.update(stub_env)
+    env.update({
+        "TELEGRAM_TOKEN": REPLAY_TOKEN,
+        "NEUROAPI_API_KEY": "replay",
+        "YC_API_KEY": "replay",
+        "YC_FOLDER_ID": env.get("YC_FOLDER_ID", "replay"),
+        "WEBHOOK_HOST": "127.0.0.1",
+        "WEBHOOK_PORT": str(port),
+        "WEBHOOK_URL": f"http://127.0.0.1:{port}",
+        "CONTEXT_FILE": os.path.join(state_dir, "chat_contexts.json"),
+        "CONTEXT_DB_FILE": os.path.join(state_dir, "chat_contexts.db"),
+        # Повторные updates не должны попасть в рабочий журнал
+        "UPDATE_JOURNAL_ENABLED": "false",
+    })
+    log_file = open(os.path.join(state_dir, "bot.out"), 'wb')
+    return subprocess.Popen([sys.executable, BOT_SCRIPT], cwd=state_dir, env=env,
+                            stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def print_report(report):
+    print(f"\n📊 Updates: {report['updates']} за {report['duration_sec']} с "
+          f"({report['throughput_per_sec']} updates/с)")
+    print(f"📨 Ответы webhook: {report['statuses']}")
+    rows = [(f"stage.{name}", values) for name, values in report["stages"].items()]
+    rows.append(("schedule_lag", report["schedule_lag"]))
+    rows += [(f"upstream.{name}", values) for name, values in sorted(report["upstream"].items())]
+    print(f"\n{'этап':<32}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for name, values in rows:
+        if not values.get("count"):
+            print(f"{name:<32}{0:>8}")
+            continue
+        print(f"{name:<32}{values['count']:>8}{values['p50']:>10}{values['p90']:>10}{values['p99']:>10}{values['max']:>10}")
+
+
+async def run(args):
+    stubs = BackendStubs(args.llm_latency, args.speech_latency, args.telegram_latency,
+                         reply_chars=args.reply_chars, voice_file=args.voice_file)
+    await stubs.start(args.stub_host, args.stub_port)
+    stub_env = stubs.env(f"http://{args.stub_host}:{args.stub_port}")
+
+    process = None
+    state_dir = None
+    target = args.target
+    try:
+        if args.spawn_bot:
+            state_dir = tempfile.mkdtemp(prefix="replay-")
+            process = spawn_bot(stub_env, args.bot_port, state_dir)
+            target = f"http://127.0.0.1:{args.bot_port}{os.getenv('WEBHOOK_PATH', '/bot')}"
+            print(f"🚀 Бот запущен (PID {process.pid}), вывод: {state_dir}/bot.out")
+            await wait_healthy(f"http://127.0.0.1:{args.bot_port}/health", args.startup_timeout, process)
+        else:
+            print("🔧 Запустите бота с переменными окружения:")
+            for name, value in stub_env.items():
+                print(f"   {name}={value}")
+
+        updates = read_updates(args.input)
+        if args.limit:
+            updates = (record for _, record in zip(range(args.limit), updates))
+
+        replayer = Replayer(target, speed=args.speed, concurrency=args.concurrency,
+                            secret_token=os.getenv("WEBHOOK_SECRET_TOKEN"))
+        print(f"▶️ Повтор {args.input} -> {target} (скорость {args.speed or 'максимальная'}, "
+              f"параллельно {args.concurrency})")
+        await replayer.run(updates)
+        await wait_quiet(stubs, args.drain_sec, args.drain_max_sec)
+
+        duration = replayer.finished - replayer.started
+        report = {
+            "updates": len(replayer.injections),
+            "duration_sec": round(duration, 3),
+            "throughput_per_sec": round(len(replayer.injections) / duration, 2) if duration else 0.0,
+            "statuses": replayer.statuses,
+            "stages": replayer.stages(stubs.telegram_calls),
+            "schedule_lag": percentiles(replayer.lag),
+            "upstream": {name: percentiles(values) for name, values in stubs.upstream.items()},
+        }
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n💾 Отчет сохранен в {args.json}")
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        await stubs.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Повтор записанных updates в webhook бота с заглушками внешних API")
+    parser.add_argument("--input", default=os.getenv("UPDATE_JOURNAL_FILE", "/app/logs/updates.jsonl"),
+                        help="Журнал updates (с сегментами <файл>.N) или старый logs/updates.json")
+    parser.add_argument("--target", default="http://127.0.0.1:11844/bot", help="URL webhook бота")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Ускорение времени: 1 - как в записи, 10 - в 10 раз быстрее, 0 - без пауз")
+    parser.add_argument("--concurrency", type=int, default=16, help="Одновременных запросов к webhook")
+    parser.add_argument("--limit", type=int, default=0, help="Не больше N updates")
+    parser.add_argument("--llm-latency", type=Latency, default=Latency("lognormal:1500:0.5"),
+                        help="Задержка NeuroAPI/YandexGPT (fixed:MS, uniform:LO:HI, normal:MEAN:STD, lognormal:MEDIAN:SIGMA)")
+    parser.add_argument("--speech-latency", type=Latency, default=Latency("lognormal:400:0.4"),
+                        help="Задержка SpeechKit STT/TTS")
+    parser.add_argument("--telegram-latency", type=Latency, default=Latency("lognormal:60:0.3"),
+                        help="Задержка Telegram Bot API")
+    parser.add_argument("--reply-chars", type=int, default=400, help="Длина ответа заглушки LLM")
+    parser.add_argument("--voice-file", help="Аудио для скачивания голосовых и ответа TTS")
+    parser.add_argument("--stub-host", default="127.0.0.1")
+    parser.add_argument("--stub-port", type=int, default=18080)
+    parser.add_argument("--spawn-bot", action="store_true", help="Запустить бота с API на заглушках")
+    parser.add_argument("--bot-port", type=int, default=18443, help="Порт webhook для --spawn-bot")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--drain-sec", type=float, default=2.0,
+                        help="Сколько ждать тишины в Telegram API после последнего update")
+    parser.add_argument("--drain-max-sec", type=float, default=120.0)
+    parser.add_argument("--json", help="Сохранить отчет в JSON файл")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
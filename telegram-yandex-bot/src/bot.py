@@ -1,4 +1,5 @@
 import os
+import time
 import logging
 import json
 import asyncio
@@ -6,9 +7,19 @@ from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 from handlers.commands import start, help_command, ping_command, handle_text_message, handle_business_message
 from handlers.voice import handle_voice_message, handle_audio_message
+from services.neuroapi_client import neuroapi_client
+from services.update_queue import UpdateQueue
+from services.update_dedup import UpdateDeduplicator
+from services.update_journal import UpdateJournal
+from services.message_coalescer import message_coalescer
+from services.inflight_registry import inflight_registry
+from services.upstream_limiter import limiters
+from services.http_pool import http_pool
+from services.iam_token_manager import token_manager
+from services.warmup import warmup
 from config import config
 from dotenv import load_dotenv
-from utils.logger import logger, log_info, log_error, log_update_json
+from utils.logger import logger, log_info, log_error, log_stats, stop_logging
 from aiohttp import web
 
 # Load environment variables
@@ -17,23 +28,34 @@ load_dotenv()
 # Глобальная переменная для application
 application = None
 
-async def log_all_updates(update: Update, context):
-    """Middleware для логирования всех входящих updates в виде JSON"""
-    try:
-        # Конвертируем update в словарь
-        update_dict = update.to_dict()
-        
-        # Логируем полный JSON
-        log_update_json(update_dict)
-        
-    except Exception as e:
-        logger.error(f"Error logging update JSON: {e}")
+# Очередь updates для режима fast-ack (None, если режим выключен)
+update_queue = None
+
+# Фильтр повторных доставок update_id (None, если выключен)
+update_deduplicator = None
+
+# Журнал входящих updates (None, если выключен)
+update_journal = None
 
 async def webhook_handler(request):
     """Обработчик webhook запросов"""
+    update_id = None
     try:
         # Получаем данные из запроса
-        data = await request.json()
+        received_at = time.time()
+        body = await request.read()
+        data = json.loads(body)
+        
+        # Отбрасываем повторные доставки до разбора Update
+        update_id = data.get("update_id")
+        if update_deduplicator is not None and update_id is not None:
+            if update_deduplicator.check_and_add(update_id):
+                log_info(f"Duplicate update {update_id} dropped")
+                return web.Response(text="OK")
+        
+        # Журналируем исходные байты запроса, без повторной сериализации (включая business updates)
+        if update_journal is not None:
+            update_journal.append(body, received_at, data)
         
         # Создаем Update объект
         update = Update.de_json(data, None)
@@ -41,8 +63,26 @@ async def webhook_handler(request):
         # Проверяем, что application инициализирован
         if application is None:
             log_error("Application not initialized")
+            _forget_update(update_id)
             return web.Response(text="Application not initialized", status=500)
         
+        # Серию сообщений замечаем до очереди: обработчики одного чата идут по порядку
+        if message_coalescer.enabled:
+            message_coalescer.observe(update)
+        
+        # Fast-ack: ставим update в очередь и сразу отвечаем Telegram
+        if update_queue is not None:
+            if not await update_queue.submit(update):
+                # Очередь переполнена - Telegram доставит update повторно
+                _forget_update(update_id)
+                return web.Response(text="Busy", status=503)
+            # Только принятый update отменяет незаконченный ответ в этом чате
+            _observe_inflight(update)
+            return web.Response(text="OK")
+        
+        # Новое или исправленное сообщение отменяет незаконченный ответ в этом чате
+        _observe_inflight(update)
+        
         # Обрабатываем update через стандартную систему
         await application.process_update(update)
         
@@ -50,11 +90,26 @@ async def webhook_handler(request):
         
     except Exception as e:
         log_error(f"Error processing webhook: {e}")
+        _forget_update(update_id)
         return web.Response(text="Error", status=500)
 
 
+def _observe_inflight(update: Update) -> None:
+    """Let an accepted update supersede the chat's in-flight request"""
+    if inflight_registry.enabled:
+        inflight_registry.observe(update)
+
+
+def _forget_update(update_id) -> None:
+    """Позволяет повторной доставке update пройти фильтр дубликатов"""
+    if update_deduplicator is not None and update_id is not None:
+        update_deduplicator.forget(update_id)
+
+
 async def health_handler(request):
-    """Health check endpoint"""
+    """Health check endpoint (503 "warming" until the warm-up is done)"""
+    if warmup.warming:
+        return web.Response(text="warming", status=503)
     return web.Response(text="OK", status=200)
 
 async def status_handler(request):
@@ -64,10 +119,61 @@ async def status_handler(request):
         "webhook_url": f"{config.WEBHOOK_URL}{config.WEBHOOK_PATH}",
         "port": config.WEBHOOK_PORT,
         "voice_enabled": config.ENABLE_VOICE,
-        "context_enabled": config.ENABLE_CONTEXT
+        "context_enabled": config.ENABLE_CONTEXT,
+        "fast_ack": update_queue is not None
     }
+    if update_queue is not None:
+        status["update_queue"] = update_queue.stats()
+    if update_deduplicator is not None:
+        status["update_dedup"] = update_deduplicator.stats()
+    if update_journal is not None:
+        status["update_journal"] = update_journal.stats()
+    status["context_store"] = neuroapi_client.chat_contexts.stats()
+    status["context_summarizer"] = neuroapi_client.summarizer.stats()
+    status["llm_router"] = neuroapi_client.router.stats()
+    status["upstreams"] = {name: limiter.stats() for name, limiter in limiters.items()}
+    status["http_pool"] = http_pool.stats()
+    status["warmup"] = warmup.stats()
+    status["logging"] = log_stats()
+    if uses_iam_refresh():
+        status["iam"] = token_manager.stats()
+    if config.HEDGE_ENABLED:
+        status["hedging"] = neuroapi_client.hedger.stats()
+    if config.RESPONSE_CACHE_ENABLED:
+        status["response_cache"] = neuroapi_client.response_cache.stats()
+    if inflight_registry.enabled:
+        status["inflight"] = inflight_registry.stats()
+    if message_coalescer.enabled:
+        status["message_coalescer"] = message_coalescer.stats()
+    if config.NEAR_DUPLICATE_CACHE_ENABLED:
+        status["near_duplicate_cache"] = neuroapi_client.near_duplicates.stats()
     return web.json_response(status)
 
+def uses_iam_refresh() -> bool:
+    """IAM tokens are exchanged only when a service account key is the credential"""
+    return not (config.YC_IAM_TOKEN or config.YC_API_KEY) and bool(config.YC_SA_KEY_FILE or config.YC_SA_KEY_JSON)
+
+def warmup_steps():
+    """Warm-up steps for the configured upstreams and stores"""
+    async def contexts():
+        # Хранилище контекстов и оценщик токенов - с диска, вне event loop
+        await asyncio.to_thread(neuroapi_client.chat_contexts.stats)
+        await asyncio.to_thread(neuroapi_client.estimate_tokens, "warm-up")
+
+    # Соединение с Telegram уже открыто в application.initialize() (getMe)
+    steps = {
+        "neuroapi": lambda: http_pool.warm(neuroapi_client.endpoint),
+        "contexts": contexts,
+    }
+    if "yandex" in neuroapi_client.router.names or config.HEDGE_TARGET == "yandex":
+        steps["yandexgpt"] = lambda: http_pool.warm(config.YC_FOUNDATION_MODELS_ENDPOINT)
+    if config.ENABLE_VOICE:
+        steps["speechkit_stt"] = lambda: http_pool.warm(config.YC_STT_ENDPOINT)
+        steps["speechkit_tts"] = lambda: http_pool.warm(config.YC_TTS_ENDPOINT)
+    if uses_iam_refresh():
+        steps["iam"] = lambda: asyncio.to_thread(token_manager.get_token)
+    return steps
+
 async def setup_webhook():
     """Настройка webhook"""
     try:
@@ -126,13 +232,17 @@ def main() -> None:
     log_info(f"Voice mode: {'enabled' if config.ENABLE_VOICE else 'disabled'}")
     log_info(f"Context mode: {'enabled' if config.ENABLE_CONTEXT else 'disabled'}")
     log_info("Message logging is enabled - all incoming messages will be logged")
-    log_info("Full JSON update logging is enabled - all updates will be logged to updates.json")
+    if config.UPDATE_JOURNAL_ENABLED:
+        log_info(f"Update journal is enabled - raw updates will be written to {config.UPDATE_JOURNAL_FILE}")
     
     # Create application
-    application = Application.builder().token(config.TELEGRAM_TOKEN).build()
-    
-    # Add middleware for logging all updates as JSON
-    application.add_handler(MessageHandler(filters.ALL, log_all_updates), group=-1)
+    application = (
+        Application.builder()
+        .token(config.TELEGRAM_TOKEN)
+        .base_url(config.TELEGRAM_API_BASE_URL)
+        .base_file_url(config.TELEGRAM_API_FILE_URL)
+        .build()
+    )
     
     # Add command handlers
     application.add_handler(CommandHandler("start", start))
@@ -149,36 +259,85 @@ def main() -> None:
         application.add_handler(MessageHandler(filters.AUDIO, handle_audio_message))
         log_info("Voice message handlers registered")
     
-    # Запускаем сервер
-    asyncio.run(start_server())
+    # Запускаем сервер; после остановки дописываем очередь логов
+    try:
+        asyncio.run(start_server())
+    finally:
+        stop_logging()
 
 async def start_server():
     """Запуск webhook сервера"""
-    # Инициализируем application
+    global update_queue, update_deduplicator, update_journal
+    
+    # Инициализируем application и общий пул исходящих соединений
     await application.initialize()
+    await http_pool.start()
     
-    # Настраиваем webhook
-    await setup_webhook()
+    # Фильтр повторных доставок
+    if config.UPDATE_DEDUP_ENABLED:
+        update_deduplicator = UpdateDeduplicator(
+            capacity=config.UPDATE_DEDUP_CAPACITY,
+            ttl_sec=config.UPDATE_DEDUP_TTL_SEC,
+            persist_file=config.UPDATE_DEDUP_FILE
+        )
+    
+    # Журнал входящих updates
+    if config.UPDATE_JOURNAL_ENABLED:
+        update_journal = UpdateJournal(
+            config.UPDATE_JOURNAL_FILE,
+            segment_bytes=config.UPDATE_JOURNAL_SEGMENT_BYTES,
+            max_segments=config.UPDATE_JOURNAL_MAX_SEGMENTS,
+            flush_interval=config.UPDATE_JOURNAL_FLUSH_INTERVAL_SEC,
+            index=config.UPDATE_JOURNAL_INDEX_ENABLED,
+        )
+        update_journal.start()
+    
+    # Запускаем пул воркеров для режима fast-ack
+    if config.WEBHOOK_FAST_ACK:
+        update_queue = UpdateQueue(
+            maxsize=config.UPDATE_QUEUE_SIZE,
+            workers=config.UPDATE_WORKERS,
+            put_timeout=config.UPDATE_QUEUE_PUT_TIMEOUT_SEC
+        )
+        update_queue.start(application.process_update)
     
     # Создаем aiohttp приложение
     app = await init_app()
     
-    # Запускаем сервер
+    # Запускаем сервер (пока идет прогрев, /health отвечает "warming")
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT)
     await site.start()
     
     log_info(f"Webhook server started on {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}")
+    
+    # Фоновое обновление IAM-токена до истечения
+    if uses_iam_refresh():
+        token_manager.start()
+    
+    # Прогреваем соединения и хранилища, и только потом регистрируем webhook
+    if config.WARMUP_ENABLED:
+        await warmup.run(warmup_steps(), config.WARMUP_TIMEOUT_SEC)
+    await setup_webhook()
     log_info(f"Webhook URL: {config.WEBHOOK_URL}{config.WEBHOOK_PATH}")
     
     # Ждем завершения
     try:
         await asyncio.Future()  # Бесконечное ожидание
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         log_info("Shutting down...")
         await application.bot.delete_webhook()
+        if update_queue is not None:
+            await update_queue.stop()
+        if update_deduplicator is not None:
+            update_deduplicator.close()
+        if update_journal is not None:
+            update_journal.close()
         await application.shutdown()
+        await neuroapi_client.close()
+        await token_manager.stop()
+        await http_pool.close()
         await runner.cleanup()
 
 if __name__ == '__main__':
@@ -1,14 +1,57 @@
 import os
-from typing import Optional
+from typing import List, Optional
 
 class Config:
     # Telegram Configuration
     TELEGRAM_TOKEN: Optional[str] = os.getenv("TELEGRAM_TOKEN")
+    # Сообщения владельца бота не обрабатываются
+    OWNER_USER_ID: Optional[int] = int(os.getenv("OWNER_USER_ID")) if os.getenv("OWNER_USER_ID") else None
     
     # NeuroAPI Configuration
     NEUROAPI_API_KEY: Optional[str] = os.getenv("NEUROAPI_API_KEY")
     NEUROAPI_TEMPERATURE: float = float(os.getenv("NEUROAPI_TEMPERATURE", "0.7"))
     NEUROAPI_MAX_TOKENS: int = int(os.getenv("NEUROAPI_MAX_TOKENS", "5000"))
+    NEUROAPI_TIMEOUT_SEC: float = float(os.getenv("NEUROAPI_TIMEOUT_SEC", "60"))
+    NEUROAPI_MAX_RETRIES: int = int(os.getenv("NEUROAPI_MAX_RETRIES", "2"))
+    
+    # Общий пул исходящих HTTP-соединений (на каждый хост); NEUROAPI_POOL_SIZE/KEEPALIVE_SEC - старые имена
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", os.getenv("NEUROAPI_POOL_SIZE", "20")))
+    HTTP_KEEPALIVE_SEC: float = float(os.getenv("HTTP_KEEPALIVE_SEC", os.getenv("NEUROAPI_KEEPALIVE_SEC", "30")))
+    HTTP_DNS_CACHE_TTL_SEC: int = int(os.getenv("HTTP_DNS_CACHE_TTL_SEC", "300"))
+    HTTP_CONNECT_TIMEOUT_SEC: float = float(os.getenv("HTTP_CONNECT_TIMEOUT_SEC", "10"))
+    # Прогрев соединений, IAM-токена и хранилищ до регистрации webhook
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_TIMEOUT_SEC: float = float(os.getenv("WARMUP_TIMEOUT_SEC", "20"))
+    
+    # LLM provider routing: providers in priority order (neuroapi, yandex) with circuit breakers
+    LLM_PROVIDERS: List[str] = [name.strip() for name in os.getenv("LLM_PROVIDERS", "neuroapi").split(",") if name.strip()]
+    # Время до первого токена (или ответа) у всех провайдеров, кроме последнего; начатый ответ не прерывается
+    PROVIDER_ATTEMPT_TIMEOUT_SEC: float = float(os.getenv("PROVIDER_ATTEMPT_TIMEOUT_SEC", "25"))
+    BREAKER_WINDOW: int = int(os.getenv("BREAKER_WINDOW", "20"))
+    BREAKER_MIN_CALLS: int = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+    BREAKER_FAILURE_RATE: float = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+    # Медленный вызов - по времени до первого токена; у последнего провайдера не учитывается
+    BREAKER_SLOW_CALL_SEC: float = float(os.getenv("BREAKER_SLOW_CALL_SEC", "20"))
+    BREAKER_SLOW_CALL_RATE: float = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+    BREAKER_OPEN_SEC: float = float(os.getenv("BREAKER_OPEN_SEC", "30"))
+    # Ограничения на стороне клиента для каждого внешнего API (0 - без ограничения)
+    NEUROAPI_RATE_LIMIT_PER_SEC: float = float(os.getenv("NEUROAPI_RATE_LIMIT_PER_SEC", "0"))
+    NEUROAPI_RATE_LIMIT_BURST: int = int(os.getenv("NEUROAPI_RATE_LIMIT_BURST", "10"))
+    NEUROAPI_MAX_IN_FLIGHT: int = int(os.getenv("NEUROAPI_MAX_IN_FLIGHT", "20"))
+    YC_GPT_RATE_LIMIT_PER_SEC: float = float(os.getenv("YC_GPT_RATE_LIMIT_PER_SEC", "0"))
+    YC_GPT_RATE_LIMIT_BURST: int = int(os.getenv("YC_GPT_RATE_LIMIT_BURST", "10"))
+    YC_GPT_MAX_IN_FLIGHT: int = int(os.getenv("YC_GPT_MAX_IN_FLIGHT", "10"))
+    SPEECHKIT_RATE_LIMIT_PER_SEC: float = float(os.getenv("SPEECHKIT_RATE_LIMIT_PER_SEC", "0"))
+    SPEECHKIT_RATE_LIMIT_BURST: int = int(os.getenv("SPEECHKIT_RATE_LIMIT_BURST", "10"))
+    SPEECHKIT_MAX_IN_FLIGHT: int = int(os.getenv("SPEECHKIT_MAX_IN_FLIGHT", "10"))
+    SPEECHKIT_MAX_RETRIES: int = int(os.getenv("SPEECHKIT_MAX_RETRIES", "2"))
+    # Hedged requests: второй запрос, если первый байт не пришел за p90 задержки
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+    HEDGE_QUANTILE: float = float(os.getenv("HEDGE_QUANTILE", "0.9"))
+    HEDGE_MIN_DELAY_SEC: float = float(os.getenv("HEDGE_MIN_DELAY_SEC", "2"))
+    HEDGE_MAX_DELAY_SEC: float = float(os.getenv("HEDGE_MAX_DELAY_SEC", "30"))
+    HEDGE_BUDGET_RATIO: float = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))
+    HEDGE_TARGET: str = os.getenv("HEDGE_TARGET", "neuroapi")
     
     # Yandex Cloud Configuration (legacy, kept for compatibility)
     YC_FOLDER_ID: Optional[str] = os.getenv("YC_FOLDER_ID")
@@ -17,6 +60,9 @@ class Config:
     # Service Account key for automatic IAM token retrieval
     YC_SA_KEY_FILE: Optional[str] = os.getenv("YC_SA_KEY_FILE")
     YC_SA_KEY_JSON: Optional[str] = os.getenv("YC_SA_KEY_JSON")
+    # Фоновое обновление IAM-токена за столько секунд до истечения; файл - общий кэш токена для процессов
+    YC_IAM_REFRESH_MARGIN_SEC: float = float(os.getenv("YC_IAM_REFRESH_MARGIN_SEC", "3600"))
+    YC_IAM_TOKEN_CACHE_FILE: Optional[str] = os.getenv("YC_IAM_TOKEN_CACHE_FILE")
     
     # Model Configuration (legacy)
     YC_MODEL_URI: Optional[str] = os.getenv("YC_MODEL_URI")
@@ -25,7 +71,60 @@ class Config:
     
     # Bot Configuration
     ENABLE_CONTEXT: bool = os.getenv("ENABLE_CONTEXT", "true").lower() == "true"
+    # Снимок контекстов + журнал изменений (<CONTEXT_FILE>.journal)
+    CONTEXT_FILE: str = os.getenv("CONTEXT_FILE", "/app/logs/chat_contexts.json")
+    CONTEXT_FSYNC_INTERVAL_SEC: float = float(os.getenv("CONTEXT_FSYNC_INTERVAL_SEC", "1.0"))
+    CONTEXT_COMPACT_EVERY: int = int(os.getenv("CONTEXT_COMPACT_EVERY", "1000"))
+    # Хранилище контекстов: sqlite (в памяти только кэш горячих чатов), journal (JSON-снимок + журнал)
+    # или memory; journal и memory держат в памяти все контексты
+    CONTEXT_STORE: str = os.getenv("CONTEXT_STORE", "sqlite")
+    CONTEXT_DB_FILE: str = os.getenv("CONTEXT_DB_FILE", "/app/logs/chat_contexts.db")
+    CONTEXT_DB_BATCH_INTERVAL_SEC: float = float(os.getenv("CONTEXT_DB_BATCH_INTERVAL_SEC", "0.2"))
+    CONTEXT_DB_BATCH_SIZE: int = int(os.getenv("CONTEXT_DB_BATCH_SIZE", "200"))
+    # Кэш горячих контекстов (для sqlite) и завершение сессии по неактивности (0 - без лимита)
+    CONTEXT_CACHE_MAX_CHATS: int = int(os.getenv("CONTEXT_CACHE_MAX_CHATS", "1000"))
+    CONTEXT_CACHE_MAX_BYTES: int = int(os.getenv("CONTEXT_CACHE_MAX_BYTES", "0"))
+    CONTEXT_IDLE_TTL_SEC: float = float(os.getenv("CONTEXT_IDLE_TTL_SEC", "0"))
+    # Бюджет входных токенов на запрос (системный промпт + история + сообщение);
+    # по умолчанию в него помещается хотя бы один ответ длиной NEUROAPI_MAX_TOKENS
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", str(NEUROAPI_MAX_TOKENS + 3000)))
+    CONTEXT_TOKEN_BUDGET_BUSINESS: int = int(os.getenv("CONTEXT_TOKEN_BUDGET_BUSINESS", str(NEUROAPI_MAX_TOKENS + 2000)))
+    # Оценка числа токенов: heuristic (быстрая) или tiktoken (если установлен)
+    TOKEN_ESTIMATOR: str = os.getenv("TOKEN_ESTIMATOR", "heuristic")
+    # Сводка вытесненных из контекста реплик (дешевая модель, в фоне); выключена по умолчанию -
+    # это дополнительные платные запросы к SUMMARY_MODEL
+    ENABLE_CONTEXT_SUMMARY: bool = os.getenv("ENABLE_CONTEXT_SUMMARY", "false").lower() == "true"
+    SUMMARY_MODEL: str = os.getenv("SUMMARY_MODEL", "gpt-5-mini")
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS", "400"))
+    # Потоковый ответ: первое сообщение с первыми токенами, затем правки не чаще интервала
+    ENABLE_STREAMING: bool = os.getenv("ENABLE_STREAMING", "false").lower() == "true"
+    STREAM_EDIT_INTERVAL_SEC: float = float(os.getenv("STREAM_EDIT_INTERVAL_SEC", "1.5"))
+    # Кэш ответов на одинаковые первые сообщения (без истории), по business-подключению
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    RESPONSE_CACHE_TTL_SEC: float = float(os.getenv("RESPONSE_CACHE_TTL_SEC", "3600"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    # Почти одинаковые первые вопросы (MinHash по символьным шинглам + LSH)
+    NEAR_DUPLICATE_CACHE_ENABLED: bool = os.getenv("NEAR_DUPLICATE_CACHE_ENABLED", "false").lower() == "true"
+    NEAR_DUPLICATE_THRESHOLD: float = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+    NEAR_DUPLICATE_TTL_SEC: float = float(os.getenv("NEAR_DUPLICATE_TTL_SEC", "3600"))
+    NEAR_DUPLICATE_MAX_ENTRIES: int = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "1000"))
+    NEAR_DUPLICATE_FP_SAMPLE_RATE: float = float(os.getenv("NEAR_DUPLICATE_FP_SAMPLE_RATE", "0.1"))
+    # Склейка серии коротких сообщений одного чата в один запрос (0 - выключено)
+    MESSAGE_COALESCE_WINDOW_MS: int = int(os.getenv("MESSAGE_COALESCE_WINDOW_MS", "0"))
+    MESSAGE_COALESCE_MAX_WAIT_MS: int = int(os.getenv("MESSAGE_COALESCE_MAX_WAIT_MS", "3000"))
+    # Отмена незаконченного ответа при новом/исправленном сообщении: off, replace, merge
+    INFLIGHT_POLICY_REGULAR: str = os.getenv("INFLIGHT_POLICY_REGULAR", "off")
+    INFLIGHT_POLICY_BUSINESS: str = os.getenv("INFLIGHT_POLICY_BUSINESS", "off")
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # Очередь логов: запись в файлы идет в отдельном потоке; при переполнении drop - отбросить, block - ждать
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_QUEUE_POLICY: str = os.getenv("LOG_QUEUE_POLICY", "drop")
+    LOG_QUEUE_BLOCK_TIMEOUT_SEC: float = float(os.getenv("LOG_QUEUE_BLOCK_TIMEOUT_SEC", "1"))
+    # Ротация файлов логов по размеру и по времени (0 - выключено), сжатие и число хранимых сегментов
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+    LOG_ROTATE_INTERVAL_SEC: float = float(os.getenv("LOG_ROTATE_INTERVAL_SEC", "86400"))
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "14"))
+    LOG_COMPRESS: bool = os.getenv("LOG_COMPRESS", "true").lower() == "true"
     
     # Webhook Configuration
     WEBHOOK_URL: Optional[str] = os.getenv("WEBHOOK_URL", "https://talkbot.skhlebnikov.ru")
@@ -36,6 +135,23 @@ class Config:
     SSL_CERT_PATH: Optional[str] = None
     SSL_KEY_PATH: Optional[str] = None
     WEBHOOK_SECRET_TOKEN: Optional[str] = os.getenv("WEBHOOK_SECRET_TOKEN")
+    # Fast-ack: webhook кладет update в очередь и сразу отвечает 200
+    WEBHOOK_FAST_ACK: bool = os.getenv("WEBHOOK_FAST_ACK", "false").lower() == "true"
+    UPDATE_QUEUE_SIZE: int = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+    UPDATE_WORKERS: int = int(os.getenv("UPDATE_WORKERS", "8"))
+    UPDATE_QUEUE_PUT_TIMEOUT_SEC: float = float(os.getenv("UPDATE_QUEUE_PUT_TIMEOUT_SEC", "1.0"))
+    # Отсев повторных доставок update_id
+    UPDATE_DEDUP_ENABLED: bool = os.getenv("UPDATE_DEDUP_ENABLED", "true").lower() == "true"
+    UPDATE_DEDUP_CAPACITY: int = int(os.getenv("UPDATE_DEDUP_CAPACITY", "10000"))
+    UPDATE_DEDUP_TTL_SEC: float = float(os.getenv("UPDATE_DEDUP_TTL_SEC", "86400"))
+    UPDATE_DEDUP_FILE: Optional[str] = os.getenv("UPDATE_DEDUP_FILE")
+    # Журнал входящих updates: исходное тело запроса, по строке JSONL, запись пачками в фоне
+    UPDATE_JOURNAL_ENABLED: bool = os.getenv("UPDATE_JOURNAL_ENABLED", "true").lower() == "true"
+    UPDATE_JOURNAL_FILE: str = os.getenv("UPDATE_JOURNAL_FILE", "/app/logs/updates.jsonl")
+    UPDATE_JOURNAL_SEGMENT_BYTES: int = int(os.getenv("UPDATE_JOURNAL_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+    UPDATE_JOURNAL_MAX_SEGMENTS: int = int(os.getenv("UPDATE_JOURNAL_MAX_SEGMENTS", "50"))
+    UPDATE_JOURNAL_FLUSH_INTERVAL_SEC: float = float(os.getenv("UPDATE_JOURNAL_FLUSH_INTERVAL_SEC", "0.5"))
+    UPDATE_JOURNAL_INDEX_ENABLED: bool = os.getenv("UPDATE_JOURNAL_INDEX_ENABLED", "true").lower() == "true"
     
     # Voice Configuration
     ENABLE_VOICE: bool = os.getenv("ENABLE_VOICE", "false").lower() == "true"
@@ -45,10 +161,13 @@ class Config:
     AUDIO_MAX_DURATION_SEC: int = int(os.getenv("AUDIO_MAX_DURATION_SEC", "60"))
     ENABLE_TTS_REPLY: bool = os.getenv("ENABLE_TTS_REPLY", "false").lower() == "true"
     
-    # API Endpoints
-    YC_FOUNDATION_MODELS_ENDPOINT = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
-    YC_STT_ENDPOINT = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
-    YC_TTS_ENDPOINT = "https://tts.api.cloud.yandex.net/speech/v1/tts:synthesize"
-    YC_IAM_ENDPOINT = "https://iam.api.cloud.yandex.net/iam/v1/tokens"
+    # API Endpoints (переопределяются для локальных заглушек, см. replay_updates.py)
+    YC_FOUNDATION_MODELS_ENDPOINT: str = os.getenv("YC_FOUNDATION_MODELS_ENDPOINT", "https://llm.api.cloud.yandex.net/foundationModels/v1/completion")
+    YC_STT_ENDPOINT: str = os.getenv("YC_STT_ENDPOINT", "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize")
+    YC_TTS_ENDPOINT: str = os.getenv("YC_TTS_ENDPOINT", "https://tts.api.cloud.yandex.net/speech/v1/tts:synthesize")
+    YC_IAM_ENDPOINT: str = os.getenv("YC_IAM_ENDPOINT", "https://iam.api.cloud.yandex.net/iam/v1/tokens")
+    NEUROAPI_ENDPOINT: str = os.getenv("NEUROAPI_ENDPOINT", "https://neuroapi.host/v1/chat/completions")
+    TELEGRAM_API_BASE_URL: str = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot")
+    TELEGRAM_API_FILE_URL: str = os.getenv("TELEGRAM_API_FILE_URL", "https://api.telegram.org/file/bot")
 
 config = Config()
\ No newline at end of file
@@ -4,7 +4,11 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode, ChatAction
 from utils.markdown import transform_to_markdown_v2
-from services.neuroapi_client import get_gpt_response
+from services.neuroapi_client import get_gpt_response_async, stream_gpt_response_async
+from handlers.streaming import StreamingReply
+from services.message_coalescer import message_coalescer
+from services.inflight_registry import inflight_registry
+from utils.context_keys import make_context_key
 from config import config
 from telegram.error import BadRequest
 from utils.logger import log_message, log_response
@@ -207,13 +211,41 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             logger.info(f"Ignoring message from owner (user_id: {user_id})")
             return
         
+        # Сообщение уже вошло в объединенный ход, на который ответ дан
+        if message_coalescer.enabled and message_coalescer.consumed(chat_id, message_id):
+            logger.info(f"Message {message_id} of chat {chat_id} was answered as part of a merged turn")
+            return
+        
         # Отправляем статус "печатает"
         logger.info(f"Processing text message from chat {chat_id}: {user_message[:50]}...")
         await _send_typing_status(update, context)
         
-        # Get response from NeuroAPI GPT-5
-        gpt_response = get_gpt_response(user_message, chat_id)
-        await _reply_md_v2_safe(update, context, gpt_response)
+        # Ждем окончания серии коротких сообщений и отвечаем на них одним ходом
+        if message_coalescer.enabled:
+            user_message = await message_coalescer.collect(chat_id, message_id, user_message)
+            if user_message is None:
+                return
+        
+        # Get response from NeuroAPI GPT-5 (newer input of the chat may supersede it)
+        if config.ENABLE_STREAMING:
+            # Показываем ответ по мере генерации, правя одно сообщение
+            reply = StreamingReply(context.bot, chat_id, min_interval=config.STREAM_EDIT_INTERVAL_SEC)
+            gpt_response = await inflight_registry.run(
+                chat_id, message_id, user_message,
+                lambda text: stream_gpt_response_async(text, reply.update, chat_id),
+            )
+            if gpt_response is None:
+                await reply.discard()
+                return
+            await reply.finish(gpt_response)
+        else:
+            gpt_response = await inflight_registry.run(
+                chat_id, message_id, user_message,
+                lambda text: get_gpt_response_async(text, chat_id),
+            )
+            if gpt_response is None:
+                return
+            await _reply_md_v2_safe(update, context, gpt_response)
         log_response(chat_id, "TEXT", True)
     except Exception as e:
         logger.error(f"Error handling text message for chat {chat_id}: {str(e)}")
@@ -265,15 +297,41 @@ async def handle_business_message(update: Update, context: ContextTypes.DEFAULT_
             logger.info(f"Ignoring business message from owner (user_id: {user_id})")
             return
         
+        context_key = make_context_key(chat_id, True, business_connection_id)
+        if message_coalescer.enabled and message_coalescer.consumed(context_key, message_id):
+            logger.info(f"Business message {message_id} of chat {chat_id} was answered as part of a merged turn")
+            return
+        
         # Отправляем статус "печатает"
         logger.info(f"Processing business message from chat {chat_id}: {user_message[:50]}...")
         await _send_business_typing_status(update, context)
         
-        # Get response from NeuroAPI GPT-5 with business context and connection ID
-        gpt_response = get_gpt_response(user_message, chat_id, is_business_message=True, business_connection_id=business_connection_id)
+        if message_coalescer.enabled:
+            user_message = await message_coalescer.collect(context_key, message_id, user_message)
+            if user_message is None:
+                return
         
-        # Отправляем ответ в бизнес-чат с поддержкой MarkdownV2
-        await _reply_business_md_v2_safe(update, context, gpt_response)
+        # Get response from NeuroAPI GPT-5 with business context and connection ID
+        if config.ENABLE_STREAMING:
+            reply = StreamingReply(context.bot, chat_id, business_connection_id, min_interval=config.STREAM_EDIT_INTERVAL_SEC)
+            gpt_response = await inflight_registry.run(
+                context_key, message_id, user_message,
+                lambda text: stream_gpt_response_async(text, reply.update, chat_id, is_business_message=True, business_connection_id=business_connection_id),
+            )
+            if gpt_response is None:
+                await reply.discard()
+                return
+            await reply.finish(gpt_response)
+        else:
+            gpt_response = await inflight_registry.run(
+                context_key, message_id, user_message,
+                lambda text: get_gpt_response_async(text, chat_id, is_business_message=True, business_connection_id=business_connection_id),
+            )
+            if gpt_response is None:
+                return
+            
+            # Отправляем ответ в бизнес-чат с поддержкой MarkdownV2
+            await _reply_business_md_v2_safe(update, context, gpt_response)
         
         log_response(chat_id, "BUSINESS_MESSAGE", True)
     except Exception as e:
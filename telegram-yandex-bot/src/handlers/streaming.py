@@ -0,0 +1,143 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from utils.markdown import transform_to_markdown_v2
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина текста одного сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Сколько раз повторять финальную правку после RetryAfter
+FINAL_EDIT_ATTEMPTS = 3
+
+
+class StreamingReply:
+    """Progressively rendered bot reply: one message, edited as the answer grows.
+
+    The first non-empty chunk is sent as a new plain-text message; later
+    chunks edit it at most once per min_interval seconds (Telegram throttles
+    frequent edits of the same message). finish() waits out the edit
+    cadence (and any RetryAfter), applies the MarkdownV2 rendering and falls
+    back to plain text if Telegram rejects it.
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, business_connection_id: Optional[str] = None,
+                 min_interval: float = 1.5):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.business_connection_id = business_connection_id
+        self.min_interval = min_interval
+        self.message_id: Optional[int] = None
+        self.edits = 0
+        self._shown = ""
+        self._next_edit_at = 0.0
+
+    async def update(self, text: str) -> None:
+        """Show the partial answer if the edit cadence allows it"""
+        preview = text[:TELEGRAM_MESSAGE_LIMIT]
+        if not preview.strip() or preview == self._shown:
+            return
+        now = time.monotonic()
+        if self.message_id is not None and now < self._next_edit_at:
+            return
+        try:
+            if self.message_id is None:
+                message = await self.bot.send_message(
+                    chat_id=self.chat_id,
+                    text=preview,
+                    disable_web_page_preview=True,
+                    business_connection_id=self.business_connection_id,
+                )
+                self.message_id = message.message_id
+            else:
+                await self._edit(preview)
+            self._shown = preview
+            self._next_edit_at = now + self.min_interval
+        except RetryAfter as e:
+            # Telegram просит подождать - пропускаем промежуточные правки
+            self._next_edit_at = now + float(e.retry_after)
+            logger.warning(f"Streaming edits for chat {self.chat_id} throttled for {e.retry_after}s")
+        except BadRequest as e:
+            logger.warning(f"Streaming update for chat {self.chat_id} failed: {e}")
+
+    async def finish(self, text: str) -> None:
+        """Render the final answer with MarkdownV2 (plain text fallback)"""
+        if self.message_id is None:
+            await self._send_final(text)
+            return
+        try:
+            try:
+                await self._edit_final(transform_to_markdown_v2(text), parse_mode=ParseMode.MARKDOWN_V2)
+            except BadRequest as e:
+                logger.warning(f"MarkdownV2 failed for streamed reply, fallback to plain: {e}")
+                if text[:TELEGRAM_MESSAGE_LIMIT] != self._shown:
+                    await self._edit_final(text[:TELEGRAM_MESSAGE_LIMIT])
+        except TelegramError as e:
+            # Ответ уже частично показан - не превращаем сбой правки в ошибку обработки
+            logger.error(f"Final edit of streamed reply in chat {self.chat_id} failed: {e}")
+            return
+        self._shown = text
+
+    async def discard(self) -> None:
+        """Remove the partial answer of a request that was superseded"""
+        if self.message_id is None:
+            return
+        if self.business_connection_id:
+            # Удалять сообщения бизнес-чата этой версией Bot API нельзя - оставляем как есть
+            return
+        try:
+            await self.bot.delete_message(chat_id=self.chat_id, message_id=self.message_id)
+        except BadRequest as e:
+            logger.warning(f"Failed to delete superseded streamed reply in chat {self.chat_id}: {e}")
+        self.message_id = None
+        self._shown = ""
+
+    async def _send_final(self, text: str) -> None:
+        try:
+            await self.bot.send_message(
+                chat_id=self.chat_id,
+                text=transform_to_markdown_v2(text),
+                parse_mode=ParseMode.MARKDOWN_V2,
+                disable_web_page_preview=True,
+                business_connection_id=self.business_connection_id,
+            )
+        except BadRequest as e:
+            logger.warning(f"MarkdownV2 failed, fallback to plain: {e}")
+            await self.bot.send_message(
+                chat_id=self.chat_id,
+                text=text,
+                disable_web_page_preview=True,
+                business_connection_id=self.business_connection_id,
+            )
+
+    async def _edit_final(self, text: str, parse_mode: Optional[str] = None) -> None:
+        """Edit respecting the cadence and Telegram's RetryAfter"""
+        for attempt in range(FINAL_EDIT_ATTEMPTS):
+            delay = self._next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self._edit(text, parse_mode=parse_mode)
+                return
+            except RetryAfter as e:
+                self._next_edit_at = time.monotonic() + float(e.retry_after)
+                logger.warning(f"Final edit for chat {self.chat_id} throttled for {e.retry_after}s")
+                if attempt == FINAL_EDIT_ATTEMPTS - 1:
+                    raise
+
+    async def _edit(self, text: str, parse_mode: Optional[str] = None) -> None:
+        await self.bot.edit_message_text(
+            text=text,
+            chat_id=self.chat_id,
+            message_id=self.message_id,
+            parse_mode=parse_mode,
+            disable_web_page_preview=True,
+            business_connection_id=self.business_connection_id,
+        )
+        self.edits += 1
@@ -4,7 +4,7 @@ from telegram import Update
 from io import BytesIO
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
-from services.neuroapi_client import get_gpt_response
+from services.neuroapi_client import get_gpt_response_async
 from handlers.commands import _reply_md_v2_safe
 from services.speech_client import speech_client
 from config import config
@@ -58,7 +58,7 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
         await _reply_md_v2_safe(update, "🎤 Обрабатываю голосовое сообщение...")
         log_response(chat_id, "TEXT", True)
 
-        recognized_text = speech_client.speech_to_text(audio_data)
+        recognized_text = await speech_client.speech_to_text_async(audio_data)
         if not recognized_text:
             await _reply_md_v2_safe(update, "Не удалось распознать речь. Попробуйте еще раз или отправьте текстовое сообщение.")
             log_response(chat_id, "TEXT", True)
@@ -77,7 +77,7 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
             logger.warning(f"Failed to send typing status for voice: {e}")
 
         # Get GPT response
-        gpt_response = get_gpt_response(recognized_text, chat_id)
+        gpt_response = await get_gpt_response_async(recognized_text, chat_id)
 
         # Send text response
         await _reply_md_v2_safe(update, f"🤖 {gpt_response}")
@@ -85,7 +85,7 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
 
         # Optionally send voice response (TTS)
         if config.ENABLE_TTS_REPLY:
-            tts_audio = speech_client.text_to_speech(gpt_response)
+            tts_audio = await speech_client.text_to_speech_async(gpt_response)
             if tts_audio:
                 await update.message.reply_voice(voice=BytesIO(tts_audio))
                 log_response(chat_id, "VOICE", True)
@@ -0,0 +1,121 @@
+import time
+import logging
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker over a sliding window of recent calls.
+
+    Every call is recorded as (failed, slow). Once the window holds at least
+    min_calls outcomes and either the failure rate reaches failure_rate or
+    the share of calls slower than slow_call_sec reaches slow_call_rate, the
+    circuit opens: allow() refuses calls for open_sec (slow_call_sec <= 0
+    disables the slow-call check). After that it goes
+    half-open and lets half_open_probes calls through; a successful probe
+    closes the circuit with a clean window, a failed one opens it again.
+    A call that ends without an outcome (cancelled) must release() its probe.
+    """
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5, failure_rate: float = 0.5,
+                 slow_call_sec: float = 20.0, slow_call_rate: float = 0.8, open_sec: float = 30.0,
+                 half_open_probes: int = 1):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_sec = slow_call_sec
+        self.slow_call_rate = slow_call_rate
+        self.open_sec = open_sec
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """True if a call may be made now (counts half-open probes)"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_sec:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"Circuit {self.name} half-open, probing")
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+
+    def release(self) -> None:
+        """Return a half-open probe taken by allow() without recording an outcome"""
+        if self.state == HALF_OPEN:
+            self._probes = max(self._probes - 1, 0)
+
+    def record_success(self, latency: float) -> None:
+        self._record(False, latency)
+
+    def record_failure(self, latency: float) -> None:
+        self._record(True, latency)
+
+    def _record(self, failed: bool, latency: float) -> None:
+        self.calls += 1
+        if failed:
+            self.failures += 1
+        slow = self.slow_call_sec > 0 and latency >= self.slow_call_sec
+
+        if self.state == HALF_OPEN:
+            self._probes = max(self._probes - 1, 0)
+            if failed or slow:
+                self._open()
+            else:
+                self.state = CLOSED
+                self._window.clear()
+                logger.info(f"Circuit {self.name} closed after successful probe")
+            return
+
+        self._window.append((failed, slow))
+        if self.state == CLOSED and len(self._window) >= self.min_calls:
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.failure_rate or slow_rate >= self.slow_call_rate:
+                self._open()
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._window:
+            return 0.0, 0.0
+        failed = sum(1 for f, _ in self._window if f)
+        slow = sum(1 for _, s in self._window if s)
+        return failed / len(self._window), slow / len(self._window)
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        failure_rate, slow_rate = self._rates()
+        logger.warning(
+            f"Circuit {self.name} opened for {self.open_sec}s "
+            f"(failure rate {failure_rate:.0%}, slow rate {slow_rate:.0%})"
+        )
+
+    def stats(self) -> Dict[str, object]:
+        failure_rate, slow_rate = self._rates()
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "window_failure_rate": round(failure_rate, 4),
+            "window_slow_rate": round(slow_rate, 4),
+            "rejected": self.rejected,
+            "opened": self.opened,
+        }
@@ -0,0 +1,267 @@
+import os
+import glob
+import json
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Contexts = Dict[object, List[Dict[str, str]]]
+
+
+class ContextJournal:
+    """Append-only journal of chat context mutations with background snapshot compaction.
+
+    Every context update is one compact JSON line ``{"s": seq, "k": key,
+    "m": [turns], "n": max_len}`` appended to ``<snapshot>.journal`` (with
+    ``"r": 1`` the turns replace the history instead of extending it;
+    ``{"s": seq, "k": key, "sum": text}`` sets the rolling summary); a
+    background thread flushes and fsyncs the journal every fsync_interval
+    seconds, so the per-message cost no longer depends on the number of chats.
+
+    Every compact_every records the journal is sealed (renamed to
+    ``<journal>.<seq>``) and a snapshot ``{"seq": seq, "contexts": {...},
+    "summaries": {...}}`` is
+    written atomically in the background; the sealed segment is deleted once
+    the snapshot is in place. Recovery loads the snapshot and replays sealed
+    segments plus the live journal, skipping records already covered by the
+    snapshot and torn trailing lines.
+
+    Sealing runs in the writer's thread, so it only takes a shallow copy of
+    the state dict (about 2 ms per 100k contexts, against about 140 ms for a
+    copy of every history) and leaves serialization to the background thread. This relies on copy-on-write: the state provider
+    replaces a context's list of turns instead of mutating it in place.
+    """
+
+    def __init__(self, snapshot_file: str, state_provider: Callable[[], Contexts],
+                 fsync_interval: float = 1.0, compact_every: int = 1000,
+                 summaries_provider: Optional[Callable[[], Dict[object, str]]] = None):
+        self.snapshot_file = snapshot_file
+        self.journal_file = f"{snapshot_file}.journal"
+        self.state_provider = state_provider
+        self.summaries_provider = summaries_provider or dict
+        # Сводки, восстановленные последним recover()
+        self.summaries: Dict[object, str] = {}
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._seq = 0
+        self._since_snapshot = 0
+        self._dirty = False
+        self._pending_snapshot: Optional[Tuple[int, Contexts, Dict[object, str]]] = None
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_seq = 0
+
+    # ------------------------------------------------------------------ recovery
+
+    def recover(self) -> Contexts:
+        """Rebuild contexts from the latest snapshot plus the journal tail"""
+        contexts: Contexts = {}
+        summaries: Dict[object, str] = {}
+        snapshot_seq = 0
+
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and "contexts" in data and "seq" in data:
+                contexts = data["contexts"]
+                summaries = data.get("summaries", {})
+                snapshot_seq = int(data["seq"])
+            else:
+                # Старый формат: файл целиком - словарь контекстов
+                contexts = data
+
+        replayed = 0
+        max_seq = snapshot_seq
+        for path in self._segments() + [self.journal_file]:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = self._parse(line)
+                    if record is None or record["s"] <= snapshot_seq:
+                        continue
+                    max_seq = max(max_seq, record["s"])
+                    replayed += 1
+                    if "sum" in record:
+                        summaries[record["k"]] = record["sum"]
+                        continue
+                    base = [] if record.get("r") else contexts.get(record["k"], [])
+                    context = (base + record["m"])[-record["n"]:] if record["n"] else []
+                    if context:
+                        contexts[record["k"]] = context
+                    else:
+                        contexts.pop(record["k"], None)
+                        summaries.pop(record["k"], None)
+
+        self._seq = max_seq
+        self._snapshot_seq = snapshot_seq
+        self._since_snapshot = replayed
+        self.summaries = summaries
+        if replayed:
+            logger.info(f"Replayed {replayed} journal records on top of snapshot (seq {snapshot_seq})")
+        return contexts
+
+    def _segments(self) -> List[str]:
+        """Sealed journal segments ordered by sequence number"""
+        segments = []
+        for path in glob.glob(f"{glob.escape(self.journal_file)}.*"):
+            suffix = path.rsplit(".", 1)[-1]
+            if suffix.isdigit():
+                segments.append((int(suffix), path))
+        return [path for _, path in sorted(segments)]
+
+    @staticmethod
+    def _parse(line: str) -> Optional[dict]:
+        if not line.endswith("\n"):
+            # Оборванная запись после падения посреди write
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict) or not {"s", "k"} <= record.keys():
+            return None
+        if "sum" not in record and not {"m", "n"} <= record.keys():
+            return None
+        return record
+
+    # ------------------------------------------------------------------ writes
+
+    def append(self, key, messages: List[Dict[str, str]], max_len: int, replace: bool = False) -> None:
+        """Journal new turns for a context; O(1) regardless of total history size.
+
+        With replace=True the turns become the whole history (an empty list
+        deletes the context).
+        """
+        record = {"k": key, "m": messages, "n": max_len}
+        if replace:
+            record["r"] = 1
+        self._write(record)
+
+    def append_summary(self, key, summary: str) -> None:
+        """Journal the rolling summary of a context"""
+        self._write({"k": key, "sum": summary})
+
+    def _write(self, record: dict) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            if self._file is None and not self._open():
+                return
+            self._seq += 1
+            record = {"s": self._seq, **record}
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._dirty = True
+            self._since_snapshot += 1
+            compact = self._since_snapshot >= self.compact_every and self._pending_snapshot is None
+            if compact:
+                self._pending_snapshot = self._seal()
+        if compact:
+            self._wakeup.set()
+
+    def _open(self) -> bool:
+        try:
+            self._file = open(self.journal_file, 'a', encoding='utf-8')
+        except Exception as e:
+            logger.error(f"Cannot open context journal {self.journal_file}: {e}")
+            return False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="context-journal", daemon=True)
+            self._thread.start()
+        return True
+
+    def _seal(self) -> Tuple[int, Contexts, Dict[object, str]]:
+        """Capture state and retire the live journal into a sealed segment (called under lock)"""
+        # Копия состояния берется в потоке, который его меняет, поэтому
+        # она согласована с self._seq. Списки реплик заменяются, а не меняются
+        # на месте, так что хватает поверхностной копии словаря
+        state = dict(self.state_provider())
+        summaries = dict(self.summaries_provider())
+        if self._file is not None:
+            # fsync не нужен: сегмент покрывается снимком, который пишется с fsync,
+            # а до тех пор гарантии те же, что у живого журнала
+            self._file.flush()
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.journal_file):
+            os.replace(self.journal_file, f"{self.journal_file}.{self._seq}")
+        self._dirty = False
+        self._since_snapshot = 0
+        return self._seq, state, summaries
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.fsync_interval)
+            self._wakeup.clear()
+            self._sync()
+            with self._lock:
+                snapshot, self._pending_snapshot = self._pending_snapshot, None
+            if snapshot is not None:
+                self._write_snapshot(*snapshot)
+            if self._closed:
+                return
+
+    def _sync(self) -> None:
+        """Group commit: one flush + fsync for everything appended since the last one"""
+        with self._lock:
+            if self._file is None or not self._dirty:
+                return
+            try:
+                self._file.flush()
+                fd = os.dup(self._file.fileno())
+            except Exception as e:
+                logger.error(f"Error flushing context journal: {e}")
+                return
+            self._dirty = False
+        try:
+            os.fsync(fd)
+        except Exception as e:
+            logger.error(f"Error syncing context journal: {e}")
+        finally:
+            os.close(fd)
+
+    def _write_snapshot(self, seq: int, state: Contexts, summaries: Dict[object, str]) -> None:
+        with self._snapshot_lock:
+            if seq < self._snapshot_seq:
+                # Более свежий снимок уже записан
+                return
+            tmp_path = f"{self.snapshot_file}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"seq": seq, "contexts": state, "summaries": summaries}, f, ensure_ascii=False, separators=(",", ":"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_file)
+                self._snapshot_seq = seq
+                for path in self._segments():
+                    if int(path.rsplit(".", 1)[-1]) <= seq:
+                        os.remove(path)
+                logger.info(f"Saved context snapshot with {len(state)} contexts (seq {seq})")
+            except Exception as e:
+                logger.error(f"Error saving context snapshot: {e}")
+
+    def snapshot(self) -> None:
+        """Write a full snapshot synchronously and drop the journal it covers"""
+        with self._lock:
+            snapshot = self._seal()
+        self._write_snapshot(*snapshot)
+
+    def close(self) -> None:
+        """Flush outstanding records and stop the background thread"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self._sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,604 @@
+import os
+import sys
+import glob
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import config
+from services.context_journal import ContextJournal
+
+logger = logging.getLogger(__name__)
+
+# {"role", "content"} и, если уже посчитано, закэшированное число токенов "tokens"
+Turn = Dict[str, Any]
+
+
+class ContextStore(MutableMapping, ABC):
+    """Per-conversation turn history addressed by context key.
+
+    Keys are normalized to str, so a chat stored under the int chat_id is
+    found again after a restart (JSON and SQLite both hand keys back as
+    strings). Besides the mapping interface, stores offer ``recent`` to read
+    only the tail a prompt needs and ``append`` to add turns with trimming.
+    A store missing any abstract method fails when it is instantiated.
+    """
+
+    @staticmethod
+    def _norm(key) -> str:
+        return str(key)
+
+    @abstractmethod
+    def recent(self, key, limit: int) -> List[Turn]:
+        """Last `limit` turns of a context (empty list if unknown)"""
+
+    @abstractmethod
+    def append(self, key, turns: List[Turn], max_len: int) -> None:
+        """Add turns to a context keeping at most max_len of them"""
+
+    def touched_at(self, key) -> Optional[float]:
+        """Time of the last write to a context, None if unknown"""
+        return None
+
+    @abstractmethod
+    def summary(self, key) -> Optional[str]:
+        """Rolling summary of turns already trimmed from the context"""
+
+    @abstractmethod
+    def set_summary(self, key, summary: str) -> None:
+        """Replace the rolling summary (deleting the context deletes it too)"""
+
+    def flush(self) -> None:
+        """Make everything written so far durable"""
+
+    def close(self) -> None:
+        """Flush and release resources"""
+        self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        """Counters for the status endpoint"""
+        return {"contexts": len(self)}
+
+
+class MemoryContextStore(ContextStore):
+    """All contexts held in a dict (no persistence)"""
+
+    def __init__(self, initial: Optional[Dict] = None):
+        self._contexts: Dict[str, List[Turn]] = {}
+        self._summaries: Dict[str, str] = {}
+        self._touched: Dict[str, float] = {}
+        for key, turns in (initial or {}).items():
+            self._contexts[self._norm(key)] = list(turns)
+
+    def recent(self, key, limit: int) -> List[Turn]:
+        if limit <= 0:
+            return []
+        return self._contexts.get(self._norm(key), [])[-limit:]
+
+    def append(self, key, turns: List[Turn], max_len: int) -> None:
+        key = self._norm(key)
+        context = self._contexts.get(key, []) + list(turns)
+        self._contexts[key] = context[-max_len:]
+        self._touched[key] = time.time()
+
+    def touched_at(self, key) -> Optional[float]:
+        return self._touched.get(self._norm(key))
+
+    def summary(self, key) -> Optional[str]:
+        return self._summaries.get(self._norm(key))
+
+    def set_summary(self, key, summary: str) -> None:
+        self._summaries[self._norm(key)] = summary
+
+    def __getitem__(self, key) -> List[Turn]:
+        return self._contexts[self._norm(key)]
+
+    def __setitem__(self, key, turns: List[Turn]) -> None:
+        key = self._norm(key)
+        self._contexts[key] = list(turns)
+        self._touched[key] = time.time()
+
+    def __delitem__(self, key) -> None:
+        key = self._norm(key)
+        del self._contexts[key]
+        self._summaries.pop(key, None)
+        self._touched.pop(key, None)
+
+    def __contains__(self, key) -> bool:
+        return self._norm(key) in self._contexts
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._contexts))
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+
+class JournalContextStore(MemoryContextStore):
+    """In-memory contexts persisted as a JSON snapshot plus an append-only journal.
+
+    Lists of turns are replaced on every write, never mutated in place, so
+    the journal can snapshot the dict copy-on-write.
+    """
+
+    def __init__(self, snapshot_file: str, fsync_interval: float = 1.0, compact_every: int = 1000):
+        self._journal = ContextJournal(
+            snapshot_file,
+            lambda: self._contexts,
+            fsync_interval=fsync_interval,
+            compact_every=compact_every,
+            summaries_provider=lambda: self._summaries,
+        )
+        super().__init__(self._journal.recover())
+        self._summaries.update(self._journal.summaries)
+
+    def append(self, key, turns: List[Turn], max_len: int) -> None:
+        super().append(key, turns, max_len)
+        self._journal.append(self._norm(key), list(turns), max_len)
+
+    def __setitem__(self, key, turns: List[Turn]) -> None:
+        super().__setitem__(key, turns)
+        self._journal.append(self._norm(key), list(turns), len(turns), replace=True)
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self._journal.append(self._norm(key), [], 0, replace=True)
+
+    def set_summary(self, key, summary: str) -> None:
+        super().set_summary(key, summary)
+        self._journal.append_summary(self._norm(key), summary)
+
+    def flush(self) -> None:
+        self._journal.snapshot()
+
+    def close(self) -> None:
+        self._journal.close()
+
+
+class SQLiteContextStore(ContextStore):
+    """One row per turn in SQLite (WAL mode), written in batches by a dedicated thread.
+
+    Reads go straight to the database and only fetch the requested tail;
+    operations still waiting for the writer are overlaid on the result so a
+    reader always sees its own writes.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS turns ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " context_key TEXT NOT NULL,"
+        " role TEXT NOT NULL,"
+        " content TEXT NOT NULL,"
+        " tokens INTEGER,"
+        " created_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_turns_key_id ON turns (context_key, id)",
+        "CREATE TABLE IF NOT EXISTS summaries ("
+        " context_key TEXT PRIMARY KEY,"
+        " summary TEXT NOT NULL,"
+        " updated_at REAL NOT NULL)",
+    )
+
+    def __init__(self, db_file: str, batch_interval: float = 0.2, batch_size: int = 200):
+        self.db_file = db_file
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+
+        self._read_conn = self._connect()
+        for statement in self._SCHEMA:
+            self._read_conn.execute(statement)
+        columns = {row[1] for row in self._read_conn.execute("PRAGMA table_info(turns)")}
+        if "tokens" not in columns:
+            # База, созданная до появления кэша числа токенов
+            self._read_conn.execute("ALTER TABLE turns ADD COLUMN tokens INTEGER")
+
+        # Операции, еще не закоммиченные писателем: key -> [(op, turns, max_len)].
+        # Один лок на чтение БД, очередь и COMMIT, чтобы читатель не увидел
+        # операцию дважды или не потерял ее между коммитом и чтением
+        self._pending: Dict[str, List[Tuple[str, List[Turn], int]]] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[str, str, List[Turn], int]]]" = queue.Queue()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._writer = threading.Thread(target=self._run, name="context-sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    # ------------------------------------------------------------------ writes
+
+    def _submit(self, op: str, key, turns: List[Turn], max_len: int) -> None:
+        key = self._norm(key)
+        with self._lock:
+            self._pending.setdefault(key, []).append((op, turns, max_len))
+            self._idle.clear()
+        self._queue.put((op, key, turns, max_len))
+
+    def append(self, key, turns: List[Turn], max_len: int) -> None:
+        self._submit("append", key, list(turns), max_len)
+
+    def __setitem__(self, key, turns: List[Turn]) -> None:
+        self._submit("replace", key, list(turns), len(turns))
+
+    def __delitem__(self, key) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._submit("replace", key, [], 0)
+
+    def _run(self) -> None:
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                conn.close()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_batch(conn, batch)
+            if stop:
+                conn.close()
+                return
+
+    def _write_batch(self, conn: sqlite3.Connection, batch) -> None:
+        now = time.time()
+        conn.execute("BEGIN")
+        try:
+            for op, key, turns, max_len in batch:
+                if op == "summary":
+                    conn.execute(
+                        "INSERT OR REPLACE INTO summaries (context_key, summary, updated_at) VALUES (?, ?, ?)",
+                        (key, turns[0]["content"], now),
+                    )
+                    continue
+                if op == "replace":
+                    conn.execute("DELETE FROM turns WHERE context_key = ?", (key,))
+                    if not max_len:
+                        conn.execute("DELETE FROM summaries WHERE context_key = ?", (key,))
+                conn.executemany(
+                    "INSERT INTO turns (context_key, role, content, tokens, created_at) VALUES (?, ?, ?, ?, ?)",
+                    [(key, turn["role"], turn["content"], turn.get("tokens"), now) for turn in turns],
+                )
+                # Обрезаем историю до max_len последних реплик
+                conn.execute(
+                    "DELETE FROM turns WHERE context_key = ? AND id <= ("
+                    " SELECT id FROM turns WHERE context_key = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (key, key, max_len),
+                )
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} context operations to SQLite: {e}")
+            conn.execute("ROLLBACK")
+            with self._lock:
+                self._settle(batch)
+            return
+        with self._lock:
+            conn.execute("COMMIT")
+            self._settle(batch)
+
+    def _settle(self, batch) -> None:
+        """Drop committed operations from the pending overlay (called under lock)"""
+        for _, key, _, _ in batch:
+            ops = self._pending.get(key)
+            if ops:
+                ops.pop(0)
+                if not ops:
+                    del self._pending[key]
+        if not self._pending:
+            self._idle.set()
+
+    # ------------------------------------------------------------------ reads
+
+    def _read(self, key: str, limit: int) -> List[Turn]:
+        """Committed tail of a context with pending operations applied on top"""
+        with self._lock:
+            rows = self._read_conn.execute(
+                "SELECT role, content, tokens FROM turns WHERE context_key = ? ORDER BY id DESC LIMIT ?",
+                (key, limit),
+            ).fetchall()
+            ops = list(self._pending.get(key, ()))
+        turns = [self._turn(*row) for row in reversed(rows)]
+        for op, op_turns, max_len in ops:
+            if op == "summary":
+                continue
+            base = [] if op == "replace" else turns
+            turns = (base + op_turns)[-max_len:] if max_len else []
+        return turns
+
+    @staticmethod
+    def _turn(role: str, content: str, tokens: Optional[int]) -> Turn:
+        turn = {"role": role, "content": content}
+        if tokens is not None:
+            turn["tokens"] = tokens
+        return turn
+
+    def recent(self, key, limit: int) -> List[Turn]:
+        if limit <= 0:
+            return []
+        return self._read(self._norm(key), limit)[-limit:]
+
+    def __getitem__(self, key) -> List[Turn]:
+        # LIMIT -1 в SQLite - без ограничения
+        turns = self._read(self._norm(key), -1)
+        if not turns:
+            raise KeyError(key)
+        return turns
+
+    def __contains__(self, key) -> bool:
+        return bool(self.recent(key, 1))
+
+    def summary(self, key) -> Optional[str]:
+        key = self._norm(key)
+        with self._lock:
+            row = self._read_conn.execute(
+                "SELECT summary FROM summaries WHERE context_key = ?", (key,)
+            ).fetchone()
+            summary = row[0] if row else None
+            for op, op_turns, max_len in self._pending.get(key, ()):
+                if op == "summary":
+                    summary = op_turns[0]["content"]
+                elif op == "replace" and not max_len:
+                    summary = None
+        return summary
+
+    def set_summary(self, key, summary: str) -> None:
+        self._submit("summary", key, [{"role": "system", "content": summary}], 0)
+
+    def touched_at(self, key) -> Optional[float]:
+        key = self._norm(key)
+        with self._lock:
+            if any(op != "summary" for op, _, _ in self._pending.get(key, ())):
+                return time.time()
+            row = self._read_conn.execute(
+                "SELECT MAX(created_at) FROM turns WHERE context_key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _keys(self) -> List[str]:
+        with self._lock:
+            keys = [row[0] for row in self._read_conn.execute("SELECT DISTINCT context_key FROM turns")]
+            keys.extend(self._pending)
+        return [key for key in dict.fromkeys(keys) if key in self]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """Wait until the writer has committed everything queued so far"""
+        self._idle.wait(timeout)
+
+    def close(self) -> None:
+        self.flush()
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+        with self._lock:
+            self._read_conn.close()
+
+
+class CachedContextStore(ContextStore):
+    """Bounded in-memory LRU cache of hot contexts in front of a persistent store.
+
+    Writes go through to the backend; reads are served from the cache and
+    misses load the context from the backend. When the cache exceeds
+    max_chats or max_bytes the least recently used contexts are dropped from
+    memory (they stay in the backend). A context untouched for idle_ttl_sec
+    ends its session: the history is deleted from the cache and the backend.
+    Zero disables the respective limit.
+    """
+
+    def __init__(self, backend: ContextStore, max_chats: int = 0, max_bytes: int = 0, idle_ttl_sec: float = 0):
+        self.backend = backend
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.idle_ttl_sec = idle_ttl_sec
+        # key -> (turns, размер в байтах, время последней активности); порядок = LRU
+        self._cache: "OrderedDict[str, Tuple[List[Turn], int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _sizeof(turns: List[Turn]) -> int:
+        return sum(sys.getsizeof(turn) + sum(sys.getsizeof(v) for v in turn.values()) for turn in turns)
+
+    def _put(self, key: str, turns: List[Turn], active_at: float) -> None:
+        self._drop(key)
+        size = self._sizeof(turns)
+        self._cache[key] = (turns, size, active_at)
+        self._bytes += size
+        while self._cache and (
+            (self.max_chats and len(self._cache) > self.max_chats)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            old_key, _ = next(iter(self._cache.items()))
+            if old_key == key:
+                break
+            self._drop(old_key)
+            self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _is_idle(self, active_at: Optional[float], now: float) -> bool:
+        return bool(self.idle_ttl_sec) and active_at is not None and now - active_at > self.idle_ttl_sec
+
+    def _expire(self, key: str) -> None:
+        self._drop(key)
+        if key in self.backend:
+            del self.backend[key]
+        self.expirations += 1
+        logger.info(f"Context {key} expired after {self.idle_ttl_sec}s of inactivity")
+
+    def _sweep(self, now: float) -> None:
+        """Expire idle sessions from the cold end of the LRU"""
+        if not self.idle_ttl_sec:
+            return
+        while self._cache:
+            key, (_, _, active_at) = next(iter(self._cache.items()))
+            if not self._is_idle(active_at, now):
+                break
+            self._expire(key)
+
+    def _load(self, key: str, now: float) -> List[Turn]:
+        """Cached history of a context, loading it from the backend on a miss"""
+        self._sweep(now)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return entry[0]
+
+        self.misses += 1
+        active_at = self.backend.touched_at(key)
+        if self._is_idle(active_at, now):
+            self._expire(key)
+            return []
+        turns = self.backend.get(key, [])
+        if turns:
+            self._put(key, list(turns), active_at or now)
+        return turns
+
+    def recent(self, key, limit: int) -> List[Turn]:
+        if limit <= 0:
+            return []
+        with self._lock:
+            return self._load(self._norm(key), time.time())[-limit:]
+
+    def append(self, key, turns: List[Turn], max_len: int) -> None:
+        key = self._norm(key)
+        now = time.time()
+        with self._lock:
+            context = (self._load(key, now) + list(turns))[-max_len:]
+            self.backend.append(key, turns, max_len)
+            self._put(key, context, now)
+
+    def touched_at(self, key) -> Optional[float]:
+        key = self._norm(key)
+        with self._lock:
+            entry = self._cache.get(key)
+        return entry[2] if entry is not None else self.backend.touched_at(key)
+
+    def summary(self, key) -> Optional[str]:
+        return self.backend.summary(key)
+
+    def set_summary(self, key, summary: str) -> None:
+        self.backend.set_summary(key, summary)
+
+    def __getitem__(self, key) -> List[Turn]:
+        turns = self.recent(key, sys.maxsize)
+        if not turns:
+            raise KeyError(key)
+        return turns
+
+    def __setitem__(self, key, turns: List[Turn]) -> None:
+        key = self._norm(key)
+        with self._lock:
+            self.backend[key] = turns
+            self._put(key, list(turns), time.time())
+
+    def __delitem__(self, key) -> None:
+        key = self._norm(key)
+        with self._lock:
+            self._drop(key)
+            del self.backend[key]
+
+    def __contains__(self, key) -> bool:
+        return bool(self.recent(key, 1))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.backend)
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    def flush(self) -> None:
+        self.backend.flush()
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cached_chats": len(self._cache),
+                "cached_bytes": self._bytes,
+                "max_chats": self.max_chats,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def create_context_store() -> ContextStore:
+    """Build the context store selected by CONTEXT_STORE (journal, sqlite or memory)"""
+    backend = config.CONTEXT_STORE.lower()
+    if backend == "sqlite":
+        # В памяти держим только горячие чаты, остальные читаются из базы
+        return CachedContextStore(
+            _open_sqlite_store(),
+            max_chats=config.CONTEXT_CACHE_MAX_CHATS,
+            max_bytes=config.CONTEXT_CACHE_MAX_BYTES,
+            idle_ttl_sec=config.CONTEXT_IDLE_TTL_SEC,
+        )
+    store = MemoryContextStore() if backend == "memory" else JournalContextStore(
+        config.CONTEXT_FILE,
+        fsync_interval=config.CONTEXT_FSYNC_INTERVAL_SEC,
+        compact_every=config.CONTEXT_COMPACT_EVERY,
+    )
+    if config.CONTEXT_IDLE_TTL_SEC:
+        # Бэкенд и так целиком в памяти, кэш нужен только для завершения сессий
+        return CachedContextStore(store, idle_ttl_sec=config.CONTEXT_IDLE_TTL_SEC)
+    return store
+
+
+def _open_sqlite_store() -> SQLiteContextStore:
+    """Open the SQLite store, importing the JSON snapshot and its journal into a brand new database"""
+    is_new = not os.path.exists(config.CONTEXT_DB_FILE)
+    store = SQLiteContextStore(
+        config.CONTEXT_DB_FILE,
+        batch_interval=config.CONTEXT_DB_BATCH_INTERVAL_SEC,
+        batch_size=config.CONTEXT_DB_BATCH_SIZE,
+    )
+    journal_files = glob.glob(f"{glob.escape(config.CONTEXT_FILE)}.journal*")
+    if is_new and (os.path.exists(config.CONTEXT_FILE) or journal_files):
+        # Однократный перенос контекстов из JSON-снимка и его журнала
+        legacy = JournalContextStore(config.CONTEXT_FILE)
+        for key in legacy:
+            store[key] = legacy[key]
+        store.flush()
+        logger.info(f"Migrated {len(legacy)} contexts from {config.CONTEXT_FILE} to SQLite")
+        legacy.close()
+    return store
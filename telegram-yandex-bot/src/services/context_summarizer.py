@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Turn = Dict[str, Any]
+SummaryFolder = Callable[[str, List[Turn]], Awaitable[None]]
+
+
+class ContextSummarizer:
+    """Background stage that folds turns trimmed from chat contexts into rolling summaries.
+
+    schedule() only records the evicted turns and returns; a single asyncio
+    task calls fold(key, turns) off the request path. Turns evicted from the
+    same context while a fold is queued are merged into one call, and at most
+    max_pending_turns per context are kept (oldest dropped) if the model
+    cannot keep up.
+    """
+
+    def __init__(self, fold: SummaryFolder, max_pending_turns: int = 200):
+        self.fold = fold
+        self.max_pending_turns = max_pending_turns
+        self._pending: Dict[str, List[Turn]] = {}
+        self._order: Deque[str] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def schedule(self, key, turns: List[Turn]) -> bool:
+        """Queue evicted turns for folding; False outside an event loop (sync API path)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+        key = str(key)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = []
+            self._order.append(key)
+        pending.extend(turns)
+        overflow = len(pending) - self.max_pending_turns
+        if overflow > 0:
+            del pending[:overflow]
+            self.dropped += overflow
+        self.scheduled += 1
+
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._idle = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            if not self._order:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            key = self._order.popleft()
+            turns = self._pending.pop(key)
+            try:
+                await self.fold(key, turns)
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error summarizing {len(turns)} turns of context {key}: {e}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Finish queued folds (up to timeout) and stop the background task"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        if task.get_loop() is not asyncio.get_running_loop():
+            # Задача осталась от уже закрытого event loop
+            task.cancel()
+            return
+        if not task.done():
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Context summarizer stopped with {len(self._order)} contexts pending")
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending_contexts": len(self._order),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped_turns": self.dropped,
+        }
@@ -0,0 +1,146 @@
+import ssl
+import asyncio
+import logging
+from types import SimpleNamespace
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class HttpPool:
+    """Outbound HTTP connection pools shared by all upstream clients.
+
+    Async callers get one aiohttp session per upstream host (session(url)),
+    each with its own keep-alive connection pool, a DNS cache and the
+    process-wide SSL context, so the CA bundle is loaded once and TLS
+    handshakes happen only for new connections. Sync callers share one
+    requests.Session (sync_session) with per-host urllib3 pools.
+
+    The pools are owned by the application: start() at startup, close()
+    at shutdown. stats() reports per-host utilization (connections in use
+    and idle, new vs reused connections, requests that waited for a free
+    connection) for sizing limit_per_host.
+    """
+
+    def __init__(self, limit_per_host: int = 20, keepalive_sec: float = 30.0, dns_ttl_sec: int = 300,
+                 connect_timeout: float = 10.0):
+        self.limit_per_host = limit_per_host
+        self.keepalive_sec = keepalive_sec
+        self.dns_ttl_sec = dns_ttl_sec
+        self.connect_timeout = connect_timeout
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.sync_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=limit_per_host)
+        self.sync_session.mount("https://", adapter)
+        self.sync_session.mount("http://", adapter)
+
+    @property
+    def ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    @staticmethod
+    def _host(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _trace_config(self, host: str) -> aiohttp.TraceConfig:
+        counters = self._counters.setdefault(host, {
+            "requests": 0, "connections_created": 0, "connections_reused": 0, "queued": 0, "dns_misses": 0,
+        })
+
+        def count(name: str):
+            async def handler(session: aiohttp.ClientSession, context: SimpleNamespace, params) -> None:
+                counters[name] += 1
+            return handler
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(count("requests"))
+        trace.on_connection_create_end.append(count("connections_created"))
+        trace.on_connection_reuseconn.append(count("connections_reused"))
+        trace.on_connection_queued_start.append(count("queued"))
+        trace.on_dns_cache_miss.append(count("dns_misses"))
+        return trace
+
+    def session(self, url: str) -> aiohttp.ClientSession:
+        """Keep-alive session for the host of url (call from the running event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Сессии aiohttp привязаны к своему event loop
+            self._sessions = {}
+            self._loop = loop
+        host = self._host(url)
+        session = self._sessions.get(host)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl_sec,
+                keepalive_timeout=self.keepalive_sec,
+                ssl=self.ssl_context,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout),
+                trace_configs=[self._trace_config(host)],
+            )
+            self._sessions[host] = session
+            logger.info(f"Opened HTTP pool for {host} (limit {self.limit_per_host})")
+        return session
+
+    async def warm(self, url: str) -> None:
+        """Open a pooled connection to the host of url (DNS, TCP, TLS) ahead of real traffic"""
+        async with self.session(url).head(url, allow_redirects=False) as response:
+            # Код ответа не важен: соединение возвращается в пул keep-alive
+            await response.read()
+
+    async def start(self) -> None:
+        """Prepare the shared SSL context before the first request"""
+        # Загрузка CA-сертификатов блокирует - делаем это один раз и вне event loop
+        await asyncio.to_thread(lambda: self.ssl_context)
+
+    async def close(self) -> None:
+        """Close all pooled connections"""
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            if not session.closed:
+                await session.close()
+        self.sync_session.close()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        for host, counters in self._counters.items():
+            session = self._sessions.get(host)
+            connector = session.connector if session is not None and not session.closed else None
+            in_use = len(getattr(connector, "_acquired", ())) if connector else 0
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values()) if connector else 0
+            opened = counters["connections_created"] + counters["connections_reused"]
+            stats[host] = {
+                **counters,
+                "limit": self.limit_per_host,
+                "in_use": in_use,
+                "idle": idle,
+                "utilization": round(in_use / self.limit_per_host, 4) if self.limit_per_host else 0.0,
+                "reuse_rate": round(counters["connections_reused"] / opened, 4) if opened else 0.0,
+            }
+        return stats
+
+
+# Global pool instance
+http_pool = HttpPool(
+    limit_per_host=config.HTTP_POOL_SIZE,
+    keepalive_sec=config.HTTP_KEEPALIVE_SEC,
+    dns_ttl_sec=config.HTTP_DNS_CACHE_TTL_SEC,
+    connect_timeout=config.HTTP_CONNECT_TIMEOUT_SEC,
+)
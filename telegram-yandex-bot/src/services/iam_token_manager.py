@@ -1,24 +1,56 @@
+import os
 import json
 import time
+import asyncio
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Iterator, Optional
 
 import requests
 import pytz
 
 from config import config
+from .http_pool import http_pool
+
+try:
+    import fcntl
+except ImportError:  # Windows: без межпроцессной блокировки файла кэша
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# Обновление в пути запроса - только если фоновое не успело
+REQUEST_REFRESH_MARGIN = timedelta(minutes=5)
+
 
 class IamTokenManager:
-    """Fetches and caches Yandex Cloud IAM tokens using a Service Account key (JWT exchange)."""
+    """Fetches and caches Yandex Cloud IAM tokens using a Service Account key (JWT exchange).
+
+    Refreshes are single-flight: concurrent callers wait for one exchange
+    instead of starting their own. With start() a background task renews
+    the token refresh_margin before expiry, so the request path normally
+    never pays for JWT signing and the HTTP round trip. The parsed private
+    key and the signing algorithm that worked are kept between refreshes.
+    With cache_file set, the token is shared through an atomically written
+    file (guarded by flock), so restarts and sibling worker processes reuse
+    it instead of each doing an exchange.
+    """
 
-    def __init__(self):
+    def __init__(self, cache_file: Optional[str] = None, refresh_margin_sec: float = 3600.0):
         self._iam_token: Optional[str] = None
         self._expires_at: Optional[datetime] = None
         self._sa_key: Optional[dict] = None
+        self._signing_key = None
+        self._algorithm: Optional[str] = None
+        self._lock = threading.Lock()
+        self._refresher: Optional[asyncio.Task] = None
+        self.cache_file = cache_file
+        self.refresh_margin = timedelta(seconds=refresh_margin_sec)
+        self.exchanges = 0
+        self.cache_hits = 0
+        self.refresh_failures = 0
 
     def _load_sa_key(self) -> dict:
         if self._sa_key:
@@ -42,6 +74,19 @@ class IamTokenManager:
 
         return self._sa_key
 
+    def _get_signing_key(self, key: dict):
+        """Private key parsed once; the PEM string if it cannot be parsed here"""
+        if self._signing_key is None:
+            pem = key["private_key"]
+            # Ключ Yandex Cloud начинается со служебной строки перед PEM-блоком
+            pem = pem[pem.find("-----BEGIN"):] if "-----BEGIN" in pem else pem
+            try:
+                from cryptography.hazmat.primitives.serialization import load_pem_private_key
+                self._signing_key = load_pem_private_key(pem.encode("utf-8"), password=None)
+            except Exception:
+                self._signing_key = pem
+        return self._signing_key
+
     def _build_jwt(self) -> str:
         # Lazy import to avoid hard dependency at module import time
         try:
@@ -67,13 +112,19 @@ class IamTokenManager:
             "typ": "JWT",
         }
 
-        private_key = key["private_key"]
+        private_key = self._get_signing_key(key)
 
-        # Yandex recommends PS256; fall back to RS256 if PS256 is not supported
-        try:
-            token = jwt.encode(payload, private_key, algorithm="PS256", headers=headers)
-        except Exception:
-            token = jwt.encode(payload, private_key, algorithm="RS256", headers=headers)
+        # Yandex recommends PS256; fall back to RS256 if PS256 is not supported.
+        # The algorithm that worked is remembered for the next refreshes.
+        if self._algorithm:
+            token = jwt.encode(payload, private_key, algorithm=self._algorithm, headers=headers)
+        else:
+            try:
+                token = jwt.encode(payload, private_key, algorithm="PS256", headers=headers)
+                self._algorithm = "PS256"
+            except Exception:
+                token = jwt.encode(payload, private_key, algorithm="RS256", headers=headers)
+                self._algorithm = "RS256"
 
         # PyJWT may return bytes in older versions; ensure str
         if isinstance(token, bytes):
@@ -83,7 +134,7 @@ class IamTokenManager:
     def _request_iam_token(self) -> None:
         assertion = self._build_jwt()
         try:
-            response = requests.post(
+            response = http_pool.sync_session.post(
                 config.YC_IAM_ENDPOINT,
                 json={"jwt": assertion},
                 timeout=15,
@@ -103,16 +154,136 @@ class IamTokenManager:
 
         self._iam_token = iam_token
         self._expires_at = expires_at
+        self.exchanges += 1
         logger.info("Obtained new IAM token (expires at %s)", self._expires_at.isoformat())
+        self._store_cached_token()
+
+    def _key_id(self) -> Optional[str]:
+        try:
+            return self._load_sa_key()["id"]
+        except Exception:
+            return None
+
+    @contextmanager
+    def _cache_lock(self) -> Iterator[None]:
+        """Exclusive lock on the token cache across worker processes"""
+        if not self.cache_file or fcntl is None:
+            yield
+            return
+        with open(f"{self.cache_file}.lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load_cached_token(self) -> bool:
+        """Adopt the token from the cache file if it is newer than ours"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return False
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("key_id") != self._key_id():
+                return False
+            expires_at = datetime.fromisoformat(data["expiresAt"]).astimezone(pytz.UTC)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable IAM token cache {self.cache_file}: {e}")
+            return False
+        if self._expires_at is not None and expires_at <= self._expires_at:
+            return False
+        self._iam_token = data["iamToken"]
+        self._expires_at = expires_at
+        self.cache_hits += 1
+        logger.info("Loaded IAM token from cache (expires at %s)", expires_at.isoformat())
+        return True
+
+    def _store_cached_token(self) -> None:
+        """Write the current token to the cache file atomically (owner-only permissions)"""
+        if not self.cache_file:
+            return
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "key_id": self._key_id(),
+                    "iamToken": self._iam_token,
+                    "expiresAt": self._expires_at.isoformat(),
+                }, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.cache_file)
+        except Exception as e:
+            logger.error(f"Error writing IAM token cache {self.cache_file}: {e}")
+
+    def _needs_refresh(self, margin: timedelta) -> bool:
+        now = datetime.now(pytz.UTC)
+        return not self._iam_token or not self._expires_at or (self._expires_at - now) < margin
+
+    def refresh(self, margin: timedelta = REQUEST_REFRESH_MARGIN) -> None:
+        """Single-flight refresh of a token expiring within margin (file cache first, then exchange)"""
+        with self._lock:
+            # Пока ждали блокировку, токен мог обновить другой поток
+            if not self._needs_refresh(margin):
+                return
+            with self._cache_lock():
+                if self._load_cached_token() and not self._needs_refresh(margin):
+                    return
+                self._request_iam_token()
 
     def get_token(self) -> str:
         """Return a valid IAM token, refreshing it if needed."""
         # Refresh if token missing or expiring within 5 minutes
-        now = datetime.now(pytz.UTC)
-        if not self._iam_token or not self._expires_at or (self._expires_at - now) < timedelta(minutes=5):
-            self._request_iam_token()
+        if self._needs_refresh(REQUEST_REFRESH_MARGIN):
+            self.refresh(REQUEST_REFRESH_MARGIN)
         return self._iam_token
 
+    async def _refresh_loop(self) -> None:
+        retry_delay = 5.0
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh, self.refresh_margin)
+                retry_delay = 5.0
+                # Следующее обновление - за refresh_margin до истечения
+                due = self._expires_at - self.refresh_margin - datetime.now(pytz.UTC)
+                await asyncio.sleep(max(due.total_seconds(), 1.0))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refresh_failures += 1
+                logger.error(f"Background IAM token refresh failed, retrying in {retry_delay:.0f}s: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 300.0)
+
+    def start(self) -> None:
+        """Start the background refresher (in the running event loop)"""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    def stats(self) -> Dict[str, object]:
+        expires_in = (self._expires_at - datetime.now(pytz.UTC)).total_seconds() if self._expires_at else None
+        return {
+            "expires_in_sec": round(expires_in) if expires_in is not None else None,
+            "background_refresh": self._refresher is not None and not self._refresher.done(),
+            "exchanges": self.exchanges,
+            "cache_hits": self.cache_hits,
+            "refresh_failures": self.refresh_failures,
+            "algorithm": self._algorithm,
+        }
+
 
 # Global singleton
-token_manager = IamTokenManager()
+token_manager = IamTokenManager(
+    cache_file=config.YC_IAM_TOKEN_CACHE_FILE,
+    refresh_margin_sec=config.YC_IAM_REFRESH_MARGIN_SEC,
+)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from telegram import Update
+
+from config import config
+from utils.context_keys import is_owner_message, update_context_key
+
+logger = logging.getLogger(__name__)
+
+RequestFactory = Callable[[str], Awaitable[str]]
+
+# Политики чата: off - не отменять; replace - новое сообщение отменяет
+# незаконченный ответ; merge - отменяет и задает оба вопроса новым запросом
+POLICIES = ("off", "replace", "merge")
+
+# Сколько правок еще не начатых сообщений помним
+_MAX_PENDING_EDITS = 1000
+
+
+class _Inflight:
+    __slots__ = ("message_id", "text", "task", "replacement")
+
+    def __init__(self, message_id: int, text: str, task: asyncio.Task):
+        self.message_id = message_id
+        self.text = text
+        self.task = task
+        self.replacement: Optional[str] = None
+
+
+class InflightRegistry:
+    """Tracks the outstanding LLM request of every chat so newer input can supersede it.
+
+    Handlers run the provider call through run(); the webhook feeds every
+    incoming update to observe() before the per-chat queue, so a follow-up
+    or an edit is seen while the old request is still generating. The
+    request runs in a child task: cancelling it aborts the HTTP connection
+    without touching the worker that runs the handler.
+
+    - edit of the in-flight message: the request is reissued with the new
+      text (any policy except off);
+    - new message in the chat: with replace the old request is dropped and
+      the newer handler answers; with merge its text is carried over and
+      asked together with the newer message.
+    """
+
+    def __init__(self, regular_policy: str = "off", business_policy: str = "off"):
+        for policy in (regular_policy, business_policy):
+            if policy not in POLICIES:
+                raise ValueError(f"Unknown in-flight policy '{policy}', expected one of {POLICIES}")
+        self.regular_policy = regular_policy
+        self.business_policy = business_policy
+        self._inflight: Dict[Hashable, _Inflight] = {}
+        self._carry: Dict[Hashable, str] = {}
+        self._edits: "OrderedDict[Tuple[Hashable, int], str]" = OrderedDict()
+        self.superseded = 0
+        self.merged = 0
+        self.reissued = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.regular_policy != "off" or self.business_policy != "off"
+
+    def policy_for(self, is_business_message: bool) -> str:
+        return self.business_policy if is_business_message else self.regular_policy
+
+    def observe(self, update: Update) -> None:
+        """Ingress hook: let a new or edited text message supersede the chat's request"""
+        is_business = bool(update.business_message or update.edited_business_message)
+        if self.policy_for(is_business) == "off":
+            return
+        edited = update.edited_message or update.edited_business_message
+        message = edited or update.message or update.business_message
+        if message is None or not message.text or message.text.startswith("/"):
+            return
+        # Владелец, отвечающий в своем бизнес-чате, не отменяет ответ клиенту
+        if is_owner_message(message):
+            return
+        key = update_context_key(update)
+        if key is None:
+            return
+        if edited is not None:
+            self.edit(key, message.message_id, message.text)
+        else:
+            self.supersede(key, message.message_id, is_business)
+
+    def edit(self, key: Hashable, message_id: int, text: str) -> None:
+        """Restart the in-flight request with edited text, or remember the edit for later"""
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.message_id == message_id:
+            if not inflight.task.done():
+                logger.info(f"Message {message_id} of {key} edited while generating, reissuing request")
+                inflight.replacement = text
+                inflight.task.cancel()
+            return
+        # Сообщение еще ждет в очереди: обработчик возьмет последнюю правку
+        self._edits[(key, message_id)] = text
+        while len(self._edits) > _MAX_PENDING_EDITS:
+            self._edits.popitem(last=False)
+
+    def supersede(self, key: Hashable, message_id: int, is_business_message: bool) -> None:
+        """Cancel the chat's in-flight request because a newer message arrived"""
+        inflight = self._inflight.get(key)
+        if inflight is None or inflight.message_id == message_id or inflight.task.done():
+            return
+        logger.info(f"Message {message_id} supersedes in-flight request of {key}")
+        if self.policy_for(is_business_message) == "merge":
+            self._carry[key] = inflight.text
+        inflight.task.cancel()
+
+    async def run(self, key: Hashable, message_id: int, text: str, request: RequestFactory) -> Optional[str]:
+        """Answer text via request(text); None if a newer message took over"""
+        text = self._edits.pop((key, message_id), text)
+        carried = self._carry.pop(key, None)
+        if carried is not None:
+            text = f"{carried}\n{text}"
+            self.merged += 1
+
+        while True:
+            task = asyncio.ensure_future(request(text))
+            inflight = self._inflight[key] = _Inflight(message_id, text, task)
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                # Отменили сам обработчик (остановка) - отменяем и запрос
+                task.cancel()
+                raise
+            finally:
+                if self._inflight.get(key) is inflight:
+                    del self._inflight[key]
+
+            if not task.cancelled():
+                return task.result()
+            if inflight.replacement is None:
+                self.superseded += 1
+                return None
+            self.reissued += 1
+            text = inflight.replacement
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "regular_policy": self.regular_policy,
+            "business_policy": self.business_policy,
+            "inflight": len(self._inflight),
+            "superseded": self.superseded,
+            "merged": self.merged,
+            "reissued": self.reissued,
+        }
+
+
+# Global registry instance
+inflight_registry = InflightRegistry(config.INFLIGHT_POLICY_REGULAR, config.INFLIGHT_POLICY_BUSINESS)
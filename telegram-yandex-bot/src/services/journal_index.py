@@ -0,0 +1,263 @@
+import os
+import json
+import bisect
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+
+# Виды update, в которых есть сообщение с содержимым
+MESSAGE_KINDS = ("message", "edited_message", "channel_post", "edited_channel_post",
+                 "business_message", "edited_business_message")
+# Типы содержимого сообщения (первый найденный)
+CONTENT_TYPES = ("text", "voice", "audio", "video_note", "video", "photo", "document", "sticker",
+                 "animation", "location", "contact", "poll")
+
+
+def update_keys(update: Dict[str, Any]) -> Tuple[Optional[int], Optional[int], List[str]]:
+    """chat_id, user_id and types (update kind plus content type) of a raw update dict"""
+    for kind, payload in update.items():
+        if kind == "update_id" or not isinstance(payload, dict):
+            continue
+        types = [kind]
+        message = payload
+        if kind == "callback_query":
+            message = payload.get("message") or {}
+        elif kind in MESSAGE_KINDS:
+            for content_type in CONTENT_TYPES:
+                if content_type in payload:
+                    types.append(content_type)
+                    break
+        chat = message.get("chat") or {}
+        user = payload.get("from") or payload.get("user") or {}
+        return chat.get("id"), user.get("id"), types
+    return None, None, []
+
+
+class SegmentIndex:
+    """Sidecar index of one journal segment: sparse time index plus postings.
+
+    time holds ``[ts, offset]`` for every time_step-th line, so a time range
+    maps to a byte range without reading the segment; chat, user and type
+    map a key to the sorted byte offsets of its lines. Stored next to the
+    segment as ``<segment>.idx``: a one-line header (line count, time
+    bounds) followed by one line with the index itself, so segments
+    outside a time range are skipped after reading only the header.
+    """
+
+    def __init__(self, time_step: int = 64):
+        self.time_step = time_step
+        self.lines = 0
+        self.t_min: Optional[float] = None
+        self.t_max: Optional[float] = None
+        self.time: List[List[float]] = []
+        self.chat: Dict[str, List[int]] = {}
+        self.user: Dict[str, List[int]] = {}
+        self.type: Dict[str, List[int]] = {}
+
+    def add(self, offset: int, ts: float, update: Dict[str, Any]) -> None:
+        if self.lines % self.time_step == 0:
+            self.time.append([ts, offset])
+        self.lines += 1
+        self.t_min = ts if self.t_min is None else min(self.t_min, ts)
+        self.t_max = ts if self.t_max is None else max(self.t_max, ts)
+        chat_id, user_id, types = update_keys(update)
+        if chat_id is not None:
+            self.chat.setdefault(str(chat_id), []).append(offset)
+        if user_id is not None:
+            self.user.setdefault(str(user_id), []).append(offset)
+        for update_type in types:
+            self.type.setdefault(update_type, []).append(offset)
+
+    def byte_range(self, since: Optional[float], until: Optional[float]) -> Tuple[int, Optional[int]]:
+        """Byte range [start, end) that holds every line received in [since, until]"""
+        times = [entry[0] for entry in self.time]
+        start = 0
+        if since is not None:
+            # Время получения почти монотонно: начинаем с предыдущей метки
+            position = bisect.bisect_left(times, since) - 1
+            start = int(self.time[position][1]) if position >= 0 else 0
+        end = None
+        if until is not None:
+            position = bisect.bisect_right(times, until) + 1
+            end = int(self.time[position][1]) if position < len(self.time) else None
+        return start, end
+
+    def offsets(self, chat: Optional[int] = None, user: Optional[int] = None, update_type: Optional[str] = None,
+                since: Optional[float] = None, until: Optional[float] = None) -> Optional[List[int]]:
+        """Candidate offsets for the filters (None means no key filter: read the byte range)"""
+        postings = []
+        for values, key in ((self.chat, chat), (self.user, user), (self.type, update_type)):
+            if key is not None:
+                postings.append(values.get(str(key), []))
+        if not postings:
+            return None
+        postings.sort(key=len)
+        start, end = self.byte_range(since, until)
+        first = postings[0]
+        candidates = first[bisect.bisect_left(first, start):
+                           bisect.bisect_left(first, end) if end is not None else len(first)]
+        for other in postings[1:]:
+            members = set(other)
+            candidates = [offset for offset in candidates if offset in members]
+        return candidates
+
+    def header(self) -> Dict[str, Any]:
+        return {"v": INDEX_VERSION, "lines": self.lines, "t_min": self.t_min, "t_max": self.t_max}
+
+    def write(self, path: str) -> None:
+        """Write the index atomically"""
+        body = {"step": self.time_step, "time": self.time, "chat": self.chat, "user": self.user, "type": self.type}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.header(), separators=(",", ":")) + "\n")
+            f.write(json.dumps(body, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read_header(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        return header if header.get("v") == INDEX_VERSION else None
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SegmentIndex"]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                body = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        if header.get("v") != INDEX_VERSION:
+            return None
+        index = cls(body["step"])
+        index.lines = header["lines"]
+        index.t_min, index.t_max = header["t_min"], header["t_max"]
+        index.time, index.chat, index.user, index.type = body["time"], body["chat"], body["user"], body["type"]
+        return index
+
+    @classmethod
+    def scan(cls, segment_path: str, time_step: int = 64) -> "SegmentIndex":
+        """Build the index by reading a segment (torn or unparsable lines are skipped)"""
+        index = cls(time_step)
+        offset = 0
+        with open(segment_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    index.add(offset, record["ts"], record["update"])
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    pass
+                offset += len(line)
+        return index
+
+
+def index_path(segment_path: str) -> str:
+    return f"{segment_path}{INDEX_SUFFIX}"
+
+
+def build_index(segment_path: str, time_step: int = 64) -> SegmentIndex:
+    """(Re)build and write the sidecar index of a sealed segment"""
+    index = SegmentIndex.scan(segment_path, time_step)
+    index.write(index_path(segment_path))
+    return index
+
+
+def _matches(record: Dict[str, Any], chat: Optional[int], user: Optional[int], update_type: Optional[str],
+             since: Optional[float], until: Optional[float]) -> bool:
+    ts = record.get("ts")
+    if since is not None and (ts is None or ts < since):
+        return False
+    if until is not None and (ts is None or ts > until):
+        return False
+    if chat is None and user is None and update_type is None:
+        return True
+    chat_id, user_id, types = update_keys(record.get("update") or {})
+    if chat is not None and chat_id != chat:
+        return False
+    if user is not None and user_id != user:
+        return False
+    return update_type is None or update_type in types
+
+
+def _parse(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def query_segment(segment_path: str, chat: Optional[int] = None, user: Optional[int] = None,
+                  update_type: Optional[str] = None, since: Optional[float] = None,
+                  until: Optional[float] = None) -> Iterator[Tuple[bytes, Dict[str, Any]]]:
+    """Matching (raw line, record) pairs of one segment, via its index when there is one"""
+    header = SegmentIndex.read_header(index_path(segment_path))
+    if header is not None:
+        if not header["lines"]:
+            return
+        if since is not None and header["t_max"] < since:
+            return
+        if until is not None and header["t_min"] > until:
+            return
+    index = SegmentIndex.load(index_path(segment_path)) if header is not None else None
+
+    with open(segment_path, 'rb') as f:
+        if index is None:
+            # Без индекса (живой файл, старый сегмент) - последовательное чтение
+            lines = iter(f)
+        else:
+            offsets = index.offsets(chat, user, update_type, since, until)
+            if offsets is None:
+                start, end = index.byte_range(since, until)
+                f.seek(start)
+                lines = iter(f.readline, b"")
+                if end is not None:
+                    lines = _until_offset(f, lines, end)
+            else:
+                lines = _at_offsets(f, offsets)
+        for line in lines:
+            record = _parse(line)
+            if record is not None and _matches(record, chat, user, update_type, since, until):
+                yield line, record
+
+
+def _at_offsets(f, offsets: List[int]) -> Iterator[bytes]:
+    for offset in offsets:
+        f.seek(offset)
+        yield f.readline()
+
+
+def _until_offset(f, lines: Iterator[bytes], end: int) -> Iterator[bytes]:
+    for line in lines:
+        yield line
+        if f.tell() >= end:
+            return
+
+
+def journal_files(journal_file: str) -> List[str]:
+    """Sealed segments in order, then the live file"""
+    segments = []
+    directory = os.path.dirname(journal_file) or "."
+    prefix = os.path.basename(journal_file) + "."
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and suffix.isdigit():
+                segments.append((int(suffix), os.path.join(directory, name)))
+    files = [path for _, path in sorted(segments)]
+    if os.path.exists(journal_file):
+        files.append(journal_file)
+    return files
+
+
+def query_journal(journal_file: str, **filters: Any) -> Iterator[Tuple[bytes, Dict[str, Any]]]:
+    """Matching (raw line, record) pairs across all segments of a journal, oldest first"""
+    for path in journal_files(journal_file):
+        yield from query_segment(path, **filters)
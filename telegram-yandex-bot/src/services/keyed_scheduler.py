@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ItemProcessor = Callable[[Any], Awaitable[None]]
+
+
+class KeyedScheduler:
+    """Runs items with the same key strictly in order and different keys in parallel.
+
+    Every key owns a FIFO of pending items. A key is placed on the ready queue
+    at most once, so only one worker at a time processes items of a given key,
+    while the worker pool spreads across keys round-robin. A key's FIFO is
+    dropped as soon as it drains, so idle chats cost nothing. The total number
+    of pending items is bounded by maxsize.
+    """
+
+    def __init__(self, maxsize: int, workers: int, put_timeout: float = 1.0):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self._pending: Dict[Hashable, Deque[Any]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._process: Optional[ItemProcessor] = None
+        self._queued = 0
+        self._unfinished = 0
+        self._active = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.peak_keys = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, process: ItemProcessor) -> None:
+        """Spawn the worker pool; must be called inside the running event loop"""
+        if self.running:
+            return
+        self._process = process
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.maxsize)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"keyed-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def submit(self, key: Hashable, item: Any) -> bool:
+        """Queue an item behind earlier items of the same key.
+
+        Returns False if no capacity freed up within put_timeout.
+        """
+        if self._slots is None:
+            raise RuntimeError("Scheduler is not started")
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+
+        self._queued += 1
+        self._unfinished += 1
+        self._idle.clear()
+
+        items = self._pending.get(key)
+        if items is None:
+            # Ключ неактивен - создаем очередь и ставим ключ в ready
+            items = self._pending[key] = deque()
+            self._ready.put_nowait(key)
+            self.peak_keys = max(self.peak_keys, len(self._pending))
+        items.append(item)
+        return True
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            key = await self._ready.get()
+            items = self._pending[key]
+            item = items.popleft()
+            self._queued -= 1
+            self._slots.release()
+            self._active += 1
+            try:
+                await self._process(item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Worker {index} failed to process item for key {key}: {e}")
+            finally:
+                self._active -= 1
+                if items:
+                    # Следующий элемент ключа встает в конец ready (round-robin)
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                self._unfinished -= 1
+                if self._unfinished == 0:
+                    self._idle.set()
+
+    async def join(self) -> None:
+        """Wait until every submitted item has been processed"""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Wait for pending items (up to drain_timeout) and cancel the workers"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Scheduler drain timed out, {self._queued} items dropped")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self._queued,
+            "queue_capacity": self.maxsize,
+            "workers": len(self._tasks),
+            "busy_workers": self._active,
+            "active_keys": len(self._pending),
+            "peak_keys": self.peak_keys,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
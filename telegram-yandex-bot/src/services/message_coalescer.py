@@ -0,0 +1,132 @@
+import time
+import asyncio
+import logging
+from typing import Dict, Hashable, Optional, Tuple
+
+from telegram import Update
+
+from config import config
+from utils.context_keys import is_owner_message, update_context_key
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд забываем брошенные пачки и отметки о слитых сообщениях
+_STALE_SEC = 60.0
+
+
+class _Burst:
+    __slots__ = ("texts", "started_at", "last_at", "has_leader")
+
+    def __init__(self, now: float):
+        self.texts: Dict[int, str] = {}
+        self.started_at = now
+        self.last_at = now
+        self.has_leader = False
+
+
+class MessageCoalescer:
+    """Per-chat debounce window that merges bursts of text messages into one LLM turn.
+
+    Messages are observed as early as possible (at webhook ingress, before
+    the per-chat queue) and again in the handler. The first handler of a
+    burst becomes its leader: it waits until the chat has been quiet for
+    window_sec (but no longer than max_wait_sec from the first message),
+    then answers all collected texts at once. Handlers of the other messages
+    of the burst find them already consumed and return without a request.
+    """
+
+    def __init__(self, window_sec: float, max_wait_sec: float):
+        self.window_sec = window_sec
+        self.max_wait_sec = max(max_wait_sec, window_sec)
+        self._bursts: Dict[Hashable, _Burst] = {}
+        # (ключ, message_id) -> время слияния для сообщений, ответ на которые уже дан
+        self._consumed: Dict[Tuple[Hashable, int], float] = {}
+        self.turns = 0
+        self.merged_messages = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_sec > 0
+
+    def _prune(self, now: float) -> None:
+        for item, merged_at in list(self._consumed.items()):
+            if now - merged_at > _STALE_SEC:
+                del self._consumed[item]
+        for key, burst in list(self._bursts.items()):
+            if not burst.has_leader and now - burst.last_at > _STALE_SEC:
+                # Обработчик так и не пришел (например, update отклонен очередью)
+                del self._bursts[key]
+
+    def add(self, key: Hashable, message_id: int, text: str) -> None:
+        """Register a text message in the chat's current burst (idempotent)"""
+        now = time.monotonic()
+        if (key, message_id) in self._consumed:
+            return
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = self._bursts[key] = _Burst(now)
+        if message_id not in burst.texts:
+            burst.texts[message_id] = text
+            burst.last_at = now
+
+    def observe(self, update: Update) -> None:
+        """Ingress hook: register a text message of a regular or business chat"""
+        message = update.message or update.business_message
+        if message is None or not message.text or message.text.startswith("/"):
+            return
+        # Реплики владельца в бизнес-чате не часть вопроса клиента
+        if is_owner_message(message):
+            return
+        key = update_context_key(update)
+        if key is not None:
+            self.add(key, message.message_id, message.text)
+
+    def consumed(self, key: Hashable, message_id: int) -> bool:
+        """True if the message was already answered as part of an earlier merged turn"""
+        return self._consumed.pop((key, message_id), None) is not None
+
+    async def collect(self, key: Hashable, message_id: int, text: str) -> Optional[str]:
+        """Merged text of the burst for its leader, None for messages joining a leader"""
+        now = time.monotonic()
+        self._prune(now)
+        if self.consumed(key, message_id):
+            return None
+        self.add(key, message_id, text)
+        burst = self._bursts[key]
+        if burst.has_leader:
+            return None
+        burst.has_leader = True
+
+        while True:
+            deadline = min(burst.last_at + self.window_sec, burst.started_at + self.max_wait_sec)
+            delay = deadline - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+
+        del self._bursts[key]
+        merged_at = time.monotonic()
+        for other_id in burst.texts:
+            if other_id != message_id:
+                self._consumed[(key, other_id)] = merged_at
+        self.turns += 1
+        self.merged_messages += len(burst.texts) - 1
+        if len(burst.texts) > 1:
+            logger.info(f"Coalesced {len(burst.texts)} messages of {key} into one turn")
+        return "\n".join(burst.texts[mid] for mid in sorted(burst.texts))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "window_ms": int(self.window_sec * 1000),
+            "max_wait_ms": int(self.max_wait_sec * 1000),
+            "pending_bursts": len(self._bursts),
+            "turns": self.turns,
+            "merged_messages": self.merged_messages,
+        }
+
+
+# Global coalescer instance (disabled while MESSAGE_COALESCE_WINDOW_MS is 0)
+message_coalescer = MessageCoalescer(
+    config.MESSAGE_COALESCE_WINDOW_MS / 1000,
+    config.MESSAGE_COALESCE_MAX_WAIT_MS / 1000,
+)
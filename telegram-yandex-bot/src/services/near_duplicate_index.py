@@ -0,0 +1,181 @@
+import time
+import zlib
+import random
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from services.response_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Простое число Мерсенна 2^61 - 1 для универсального хеширования
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class _Entry:
+    __slots__ = ("scope", "shingles", "signature", "answer", "stored_at")
+
+    def __init__(self, scope: str, shingles: FrozenSet[int], signature: Tuple[int, ...], answer: str, stored_at: float):
+        self.scope = scope
+        self.shingles = shingles
+        self.signature = signature
+        self.answer = answer
+        self.stored_at = stored_at
+
+
+class NearDuplicateIndex:
+    """Local near-duplicate index of recent (question, answer) pairs.
+
+    Questions are normalized, split into character shingles and summarized by
+    a MinHash signature; LSH banding (bands x rows = num_perm) narrows lookups
+    to candidates sharing at least one band. A candidate is a match when the
+    estimated Jaccard similarity reaches threshold. A fraction of matches
+    (fp_sample_rate) is re-checked against the exact Jaccard similarity of the
+    shingle sets: that measures the false-positive rate and rejects the
+    sampled false positives.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 16, shingle_size: int = 3,
+                 max_entries: int = 1000, ttl_sec: float = 3600, fp_sample_rate: float = 0.1, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.fp_sample_rate = fp_sample_rate
+
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+        self._sampler = random.Random(seed)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple, Set[int]] = {}
+        self._next_id = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.sampled = 0
+        self.false_positives = 0
+        self.evictions = 0
+        self._latencies_ms: Deque[float] = deque(maxlen=1000)
+
+    # ------------------------------------------------------------------ minhash
+
+    def _shingles(self, text: str) -> FrozenSet[int]:
+        text = normalize_text(text)
+        if len(text) < self.shingle_size:
+            text = text.ljust(self.shingle_size)
+        return frozenset(
+            zlib.crc32(text[i:i + self.shingle_size].encode("utf-8"))
+            for i in range(len(text) - self.shingle_size + 1)
+        )
+
+    def _signature(self, shingles: FrozenSet[int]) -> Tuple[int, ...]:
+        return tuple(
+            min((a * shingle + b) % _MERSENNE_PRIME for shingle in shingles)
+            for a, b in self._perms
+        )
+
+    def _band_keys(self, scope: str, signature: Tuple[int, ...]) -> List[Tuple]:
+        return [
+            (scope, band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+        if not a and not b:
+            return 1.0
+        return len(a & b) / len(a | b)
+
+    # ------------------------------------------------------------------ index
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for key in self._band_keys(entry.scope, entry.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def add(self, question: str, scope: str, answer: str) -> None:
+        """Index an answered question within a scope (prompt variant / connection)"""
+        shingles = self._shingles(question)
+        signature = self._signature(shingles)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = _Entry(scope, shingles, signature, answer, time.time())
+        for key in self._band_keys(scope, signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def lookup(self, question: str, scope: str) -> Optional[str]:
+        """Answer of the most similar indexed question above threshold, if any"""
+        started = time.perf_counter()
+        self.lookups += 1
+        try:
+            shingles = self._shingles(question)
+            signature = self._signature(shingles)
+            candidates: Set[int] = set()
+            for key in self._band_keys(scope, signature):
+                candidates |= self._buckets.get(key, set())
+
+            now = time.time()
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry.stored_at > self.ttl_sec:
+                    self._remove(entry_id)
+                    continue
+                score = sum(x == y for x, y in zip(signature, entry.signature)) / self.num_perm
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                return None
+
+            entry = self._entries[best_id]
+            if self._sampler.random() < self.fp_sample_rate:
+                self.sampled += 1
+                exact = self.jaccard(shingles, entry.shingles)
+                if exact < self.threshold:
+                    self.false_positives += 1
+                    logger.info(f"Near-duplicate false positive: estimated {best_score:.2f}, exact {exact:.2f}")
+                    return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return entry.answer
+        finally:
+            self._latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    def stats(self) -> Dict[str, float]:
+        latencies = sorted(self._latencies_ms)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "size": len(self._entries),
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "sampled": self.sampled,
+            "false_positives": self.false_positives,
+            "false_positive_rate": round(self.false_positives / self.sampled, 4) if self.sampled else 0.0,
+            "evictions": self.evictions,
+            "lookup_ms_p50": percentile(0.5),
+            "lookup_ms_p95": percentile(0.95),
+        }
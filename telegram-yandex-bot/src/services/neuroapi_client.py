@@ -1,53 +1,138 @@
 import requests
-import logging
+import aiohttp
+import asyncio
 import json
+import logging
 import os
-from typing import List, Dict, Optional
+import time
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
 from config import config
+from utils.context_keys import make_context_key
+from services.context_store import ContextStore, MemoryContextStore, create_context_store
+from services.context_summarizer import ContextSummarizer
+from services.response_cache import ResponseCache, fingerprint
+from services.near_duplicate_index import NearDuplicateIndex
+from services.circuit_breaker import CircuitBreaker
+from services.provider_router import Provider, ProviderRouter, ProviderUnavailableError
+from services.request_hedger import RequestHedger
+from services.upstream_limiter import limiters, parse_retry_after
+from services.http_pool import http_pool
+from services.yandex_client import yandex_client
+from utils.tokens import fit_to_budget, get_token_estimator, message_tokens
 
 logger = logging.getLogger(__name__)
 
+# Статусы, при которых имеет смысл повторить запрос
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Сколько последних сообщений храним в контексте чата
+CONTEXT_MAX_MESSAGES = 20
+
+
+# Колбэк стриминга: получает весь накопленный на данный момент текст ответа
+TextCallback = Callable[[str], Awaitable[None]]
+
+
+class NeuroAPIError(Exception):
+    """Raised when NeuroAPI answers with a non-retryable error status"""
+
+    def __init__(self, status: int, body: str = ""):
+        super().__init__(f"NeuroAPI Error {status}: {body}")
+        self.status = status
+        self.body = body
+
+
+class IncompleteResponseError(Exception):
+    """Raised when a streamed answer broke off after part of it was delivered"""
+
+    def __init__(self, text: str):
+        super().__init__(f"Stream broke after {len(text)} chars")
+        self.text = text
+
+
 class NeuroAPIClient:
     def __init__(self):
         self.api_key = config.NEUROAPI_API_KEY
-        self.endpoint = "https://neuroapi.host/v1/chat/completions"
+        self.endpoint = config.NEUROAPI_ENDPOINT
         self.model = "gpt-5"
+        self.timeout = config.NEUROAPI_TIMEOUT_SEC
+        self.max_retries = config.NEUROAPI_MAX_RETRIES
         
-        # HTTP session with retries
-        self.session = requests.Session()
-        try:
-            from requests.adapters import HTTPAdapter
-            from urllib3.util import Retry
-            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
-            self.session.mount("https://", HTTPAdapter(max_retries=retries))
-        except Exception:
-            # Fallback: no retries if urllib3 not available
-            pass
-
-        # Chat context storage (in-memory + file persistence)
-        self.chat_contexts: Dict[str, List[Dict[str, str]]] = {}
-        self.context_file = "/app/logs/chat_contexts.json"
+        # Connections come from the shared pool; retries and rate limits are handled by the upstream limiter
+        self.limiter = limiters["neuroapi"]
+
+        # Chat context storage (backend selected by CONTEXT_STORE)
+        self.chat_contexts: ContextStore = MemoryContextStore()
+        self.context_file = config.CONTEXT_FILE
+        self.estimate_tokens = get_token_estimator(config.TOKEN_ESTIMATOR)
         self._load_contexts()
+        # Сжатие вытесненных реплик в сводку - в фоне, вне пути запроса
+        self.summarizer = ContextSummarizer(self._fold_summary)
+        # Кэш ответов на одинаковые первые сообщения (включается RESPONSE_CACHE_ENABLED)
+        self.response_cache = ResponseCache(config.RESPONSE_CACHE_MAX_ENTRIES, config.RESPONSE_CACHE_TTL_SEC)
+        # Поиск почти одинаковых первых вопросов (включается NEAR_DUPLICATE_CACHE_ENABLED)
+        self.near_duplicates = NearDuplicateIndex(
+            threshold=config.NEAR_DUPLICATE_THRESHOLD,
+            max_entries=config.NEAR_DUPLICATE_MAX_ENTRIES,
+            ttl_sec=config.NEAR_DUPLICATE_TTL_SEC,
+            fp_sample_rate=config.NEAR_DUPLICATE_FP_SAMPLE_RATE,
+        )
+        # Маршрутизация по провайдерам LLM_PROVIDERS с автоматами защиты
+        self.router = self._build_router()
+        # Дублирующий запрос, если первый байт запаздывает (HEDGE_ENABLED)
+        self.hedger = RequestHedger(
+            quantile=config.HEDGE_QUANTILE,
+            min_delay=config.HEDGE_MIN_DELAY_SEC,
+            max_delay=config.HEDGE_MAX_DELAY_SEC,
+            budget_ratio=config.HEDGE_BUDGET_RATIO,
+        )
+    
+    def _build_router(self) -> ProviderRouter:
+        """Providers from LLM_PROVIDERS in priority order, each with its own circuit breaker"""
+        providers = []
+        # Провайдер без ключей заведомо отвечает ошибкой и только портит статистику автомата
+        configured = {"neuroapi": bool(self.api_key), "yandex": yandex_client.configured}
+        names = []
+        for name in config.LLM_PROVIDERS:
+            if name not in configured:
+                logger.warning(f"Unknown LLM provider '{name}' ignored")
+            elif not configured[name]:
+                logger.warning(f"LLM provider '{name}' has no credentials configured, skipped")
+            else:
+                names.append(name)
+        for name in names:
+            breaker = CircuitBreaker(
+                name,
+                window=config.BREAKER_WINDOW,
+                min_calls=config.BREAKER_MIN_CALLS,
+                failure_rate=config.BREAKER_FAILURE_RATE,
+                # Последнему провайдеру переключаться некуда: медленный ответ лучше ошибки
+                slow_call_sec=config.BREAKER_SLOW_CALL_SEC if name != names[-1] else 0,
+                slow_call_rate=config.BREAKER_SLOW_CALL_RATE,
+                open_sec=config.BREAKER_OPEN_SEC,
+            )
+            providers.append(Provider(name, breaker))
+        if not providers:
+            logger.warning("No valid LLM providers configured, using neuroapi")
+            providers.append(Provider("neuroapi", CircuitBreaker("neuroapi", slow_call_sec=0)))
+        return ProviderRouter(providers, config.PROVIDER_ATTEMPT_TIMEOUT_SEC)
     
     def _load_contexts(self):
-        """Load contexts from file"""
+        """Open the configured context store (journal, sqlite or memory)"""
         try:
-            if os.path.exists(self.context_file):
-                with open(self.context_file, 'r', encoding='utf-8') as f:
-                    self.chat_contexts = json.load(f)
-                logger.info(f"Loaded {len(self.chat_contexts)} contexts from file")
+            self.chat_contexts = create_context_store()
+            if self.chat_contexts:
+                logger.info(f"Loaded {len(self.chat_contexts)} contexts from {config.CONTEXT_STORE} store")
             else:
-                logger.info("No context file found, starting with empty contexts")
+                logger.info("No stored contexts found, starting with empty contexts")
         except Exception as e:
             logger.error(f"Error loading contexts: {e}")
-            self.chat_contexts = {}
+            self.chat_contexts = MemoryContextStore()
     
     def _save_contexts(self):
-        """Save contexts to file"""
+        """Make all contexts durable (stores persist per message, this is for shutdown/maintenance)"""
         try:
-            with open(self.context_file, 'w', encoding='utf-8') as f:
-                json.dump(self.chat_contexts, f, ensure_ascii=False, indent=2)
-            logger.info(f"Saved {len(self.chat_contexts)} contexts to file")
+            self.chat_contexts.flush()
         except Exception as e:
             logger.error(f"Error saving contexts: {e}")
         
@@ -66,19 +151,20 @@ class NeuroAPIClient:
         """Prepare messages for the API request with context"""
         
         # Создаем уникальный ключ для контекста
-        context_key = f"business_{business_connection_id}_{chat_id}" if is_business_message else chat_id
+        context_key = make_context_key(chat_id, is_business_message, business_connection_id)
+        
+        history = self.chat_contexts.recent(context_key, CONTEXT_MAX_MESSAGES) if config.ENABLE_CONTEXT else []
         
         # Отладочные логи
         logger.info(f"Context key: {context_key}")
-        logger.info(f"Context exists: {context_key in self.chat_contexts}")
-        if context_key in self.chat_contexts:
-            logger.info(f"Context length: {len(self.chat_contexts[context_key])}")
-            logger.info(f"Context content: {self.chat_contexts[context_key]}")
+        logger.info(f"Context exists: {bool(history)}")
+        if history:
+            logger.info(f"Context length: {len(history)}")
         
         # Выбираем системный промпт в зависимости от типа сообщения
         if is_business_message:
             # Для business сообщений используем более краткий системный промпт после первого сообщения
-            if config.ENABLE_CONTEXT and context_key in self.chat_contexts and len(self.chat_contexts[context_key]) > 0:
+            if history:
                 system_content = (
                     "Ты — ИИ-ассистент Сергея Хлебникова. Продолжай общение в том же стиле. "
                     "Сергей прочитает все сообщения и ответит как только сможет. "
@@ -100,18 +186,30 @@ class NeuroAPIClient:
         else:
             system_content = "Ты — полезный Telegram-бот. Отвечай дружелюбно и информативно на русском языке."
         
-        messages = [
-            {"role": "system", "content": system_content}
-        ]
+        system_message = {"role": "system", "content": system_content}
+        user_turn = {"role": "user", "content": user_message}
+        messages = [system_message]
+        budget = config.CONTEXT_TOKEN_BUDGET_BUSINESS if is_business_message else config.CONTEXT_TOKEN_BUDGET
+        budget -= message_tokens(system_message, self.estimate_tokens) + message_tokens(user_turn, self.estimate_tokens)
         
-        if config.ENABLE_CONTEXT and context_key in self.chat_contexts:
-            # Add recent context (last 6 messages to stay within limits)
-            context = self.chat_contexts[context_key][-6:]
-            messages.extend(context)
-            logger.info(f"Added {len(context)} context messages")
+        summary = self.chat_contexts.summary(context_key) if config.ENABLE_CONTEXT else None
+        if summary:
+            # Сводка более ранней части разговора - одним системным сообщением
+            summary_message = {"role": "system", "content": f"Краткое содержание предыдущей части разговора:\n{summary}"}
+            messages.append(summary_message)
+            budget -= message_tokens(summary_message, self.estimate_tokens)
+            logger.info(f"Added conversation summary ({len(summary)} chars)")
+        
+        if history:
+            # Заполняем бюджет входных токенов от новых реплик к старым
+            context = fit_to_budget(history, max(budget, 0), self.estimate_tokens)
+            # Кэш числа токенов в API не отправляем
+            messages.extend({"role": turn["role"], "content": turn["content"]} for turn in context)
+            logger.info(f"Added {len(context)} of {len(history)} context messages within {max(budget, 0)} token budget")
             
-        messages.append({"role": "user", "content": user_message})
-        logger.info(f"Total messages: {len(messages)}")
+        messages.append(user_turn)
+        prompt_tokens = sum(message_tokens(message, self.estimate_tokens) for message in messages)
+        logger.info(f"Total messages: {len(messages)}, ~{prompt_tokens} prompt tokens")
         return messages
     
     def _update_context(self, chat_id: int, user_message: str, assistant_response: str, is_business_message: bool = False, business_connection_id: str = None):
@@ -121,67 +219,149 @@ class NeuroAPIClient:
             return
         
         # Создаем уникальный ключ для контекста
-        context_key = f"business_{business_connection_id}_{chat_id}" if is_business_message else chat_id
+        context_key = make_context_key(chat_id, is_business_message, business_connection_id)
         
         logger.info(f"Updating context for key: {context_key}")
         logger.info(f"User message: {user_message[:50]}...")
         logger.info(f"Assistant response: {assistant_response[:50]}...")
             
-        if context_key not in self.chat_contexts:
-            self.chat_contexts[context_key] = []
-            logger.info(f"Created new context for key: {context_key}")
-            
-        context = self.chat_contexts[context_key]
-        context.extend([
-            {"role": "user", "content": user_message},
-            {"role": "assistant", "content": assistant_response}
-        ])
-        
-        logger.info(f"Context updated. New length: {len(context)}")
-        
-        # Keep only last 20 messages (10 pairs) to manage memory
-        if len(context) > 20:
-            self.chat_contexts[context_key] = context[-20:]
-            logger.info(f"Context trimmed to 20 messages")
-        
-        # Save contexts to file
-        self._save_contexts()
+        # Число токенов считаем один раз и храним вместе с репликой
+        turns = [
+            {"role": "user", "content": user_message, "tokens": self.estimate_tokens(user_message)},
+            {"role": "assistant", "content": assistant_response, "tokens": self.estimate_tokens(assistant_response)}
+        ]
+        evicted = []
+        if config.ENABLE_CONTEXT_SUMMARY:
+            history = self.chat_contexts.recent(context_key, CONTEXT_MAX_MESSAGES)
+            evicted = (history + turns)[:-CONTEXT_MAX_MESSAGES]
+        # Хранилище дописывает только новые реплики и держит последние 20 (10 пар)
+        self.chat_contexts.append(context_key, turns, CONTEXT_MAX_MESSAGES)
+        logger.info(f"Context updated for key: {context_key}")
+        if evicted:
+            # Вытесненные реплики не теряются, а сворачиваются в сводку
+            self.summarizer.schedule(context_key, evicted)
+
+    async def _fold_summary(self, context_key: str, turns: List[Dict]) -> None:
+        """Fold evicted turns into the context's rolling summary"""
+        summary = await self._summarize(context_key, self.chat_contexts.summary(context_key), turns)
+        if summary:
+            self.chat_contexts.set_summary(context_key, summary.strip())
+            logger.info(f"Summary of context {context_key} updated with {len(turns)} turns")
+
+    async def _summarize(self, context_key: str, previous: Optional[str], turns: List[Dict]) -> Optional[str]:
+        """Ask the cheap model to merge the previous summary with older turns"""
+        dialog = "\n".join(
+            f"{'Пользователь' if turn['role'] == 'user' else 'Ассистент'}: {turn['content']}" for turn in turns
+        )
+        prompt = (
+            f"Текущее краткое содержание:\n{previous or '(пока нет)'}\n\n"
+            f"Новые реплики:\n{dialog}\n\n"
+            "Обнови краткое содержание с учетом новых реплик."
+        )
+        payload = {
+            "model": config.SUMMARY_MODEL,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": (
+                        "Ты сжимаешь историю переписки в краткое содержание на русском языке. "
+                        "Сохраняй факты о собеседнике, его просьбы, договоренности и открытые вопросы. "
+                        "Пиши сжато, без вступлений."
+                    )
+                },
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.2,
+            "max_tokens": config.SUMMARY_MAX_TOKENS,
+            "stream": False
+        }
+        return await self._request_completion_async(self._get_headers(), payload, None, label=f"summary of {context_key}")
     
+    def _truncate_message(self, user_message: str, chat_id: int) -> str:
+        """Limit message length to what we send to the model"""
+        if len(user_message) > 4000:
+            logger.warning(f"Message truncated to 4000 characters for chat {chat_id}")
+            return user_message[:4000]
+        return user_message
+
+    def _build_payload(self, messages: List[Dict[str, str]], stream: bool = False) -> Dict:
+        """Build chat completion request body"""
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": config.NEUROAPI_TEMPERATURE,
+            "max_tokens": config.NEUROAPI_MAX_TOKENS,
+            "stream": stream
+        }
+
+    def _error_fallback(self, is_business_message: bool) -> str:
+        """Reply used when NeuroAPI answered with an error status"""
+        if is_business_message:
+            return "Привет! Я ИИ-ассистент Сергея. Произошла техническая ошибка, но Сергей прочитает ваше сообщение и ответит как только сможет."
+        return f"Извините, произошла ошибка при обращении к GPT-5. Попробуйте позже."
+
+    def _timeout_fallback(self, is_business_message: bool) -> str:
+        """Reply used when the request deadline expired"""
+        if is_business_message:
+            return "Привет! Я ИИ-ассистент Сергея. Произошла задержка, но Сергей прочитает ваше сообщение и ответит как только сможет."
+        return "Превышено время ожидания ответа. Попробуйте еще раз."
+
+    def _unexpected_fallback(self, is_business_message: bool) -> str:
+        """Reply used for any other failure"""
+        if is_business_message:
+            return "Привет! Я ИИ-ассистент Сергея. Произошла техническая ошибка, но Сергей прочитает ваше сообщение и ответит как только сможет."
+        return "Произошла техническая ошибка. Попробуйте позже."
+
+    def _finalize_response(self, assistant_message: Optional[str], user_message: str, chat_id: int, is_business_message: bool, business_connection_id: Optional[str]) -> str:
+        """Replace empty answers with a fallback and record the turn in the context"""
+        message_type = "business" if is_business_message else "regular"
+
+        # Проверяем, что ответ не пустой (после всех попыток)
+        if not assistant_message or not assistant_message.strip():
+            logger.warning(f"Empty response from NeuroAPI for chat {chat_id} after {self.max_retries + 1} attempts")
+            if is_business_message:
+                # Проверяем, есть ли контекст для этого чата
+                context_key = make_context_key(chat_id, True, business_connection_id)
+                if self.chat_contexts.recent(context_key, 1):
+                    # Если контекст есть, используем более естественный ответ
+                    assistant_message = "Сергей прочитает ваше сообщение и ответит как только сможет. Извините за задержку."
+                else:
+                    # Если контекста нет, представляемся
+                    assistant_message = "Привет! Я ИИ-ассистент Сергея. Он прочитает ваше сообщение и ответит как только сможет. Чем могу помочь?"
+            else:
+                assistant_message = "Извините, я не смог сгенерировать ответ. Попробуйте еще раз."
+
+        # Update context (для всех случаев - успешных и fallback)
+        self._update_context(chat_id, user_message, assistant_message, is_business_message, business_connection_id)
+
+        logger.info(f"Successfully got response from NeuroAPI GPT-5 for chat {chat_id} ({message_type}): {assistant_message[:100]}...")
+        return assistant_message
+
     def get_response(self, user_message: str, chat_id: int, is_business_message: bool = False, business_connection_id: str = None) -> str:
-        """Get response from NeuroAPI GPT-5"""
+        """Get response from NeuroAPI GPT-5 (blocking, kept for backward compatibility)"""
         if not user_message.strip():
             return "Ошибка: пустой ввод"
             
-        # Limit message length
-        if len(user_message) > 4000:
-            user_message = user_message[:4000]
-            logger.warning(f"Message truncated to 4000 characters for chat {chat_id}")
+        user_message = self._truncate_message(user_message, chat_id)
         
         try:
             headers = self._get_headers()
             messages = self._prepare_messages(user_message, chat_id, is_business_message, business_connection_id)
-            
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": config.NEUROAPI_TEMPERATURE,
-                "max_tokens": config.NEUROAPI_MAX_TOKENS,
-                "stream": False
-            }
+            payload = self._build_payload(messages)
             
             message_type = "business" if is_business_message else "regular"
             logger.info(f"Sending request to NeuroAPI GPT-5 for chat {chat_id} ({message_type} message)")
             
             # Retry логика для пустых ответов
-            max_retries = 2
             assistant_message = None
+            deadline = time.monotonic() + self.timeout
             
-            for attempt in range(max_retries + 1):
-                response = requests.post(
+            for attempt in range(self.max_retries + 1):
+                response = http_pool.sync_session.post(
                     self.endpoint, 
                     headers=headers, 
                     json=payload,
-                    timeout=60  # Увеличиваем таймаут до 60 секунд
+                    timeout=self.timeout
                 )
                 
                 if response.status_code == 200:
@@ -194,51 +374,331 @@ class NeuroAPIClient:
                         break
                     else:
                         logger.warning(f"Empty response from NeuroAPI for chat {chat_id}, attempt {attempt + 1}")
-                        if attempt < max_retries:
+                        if attempt < self.max_retries:
+                            delay = self.limiter.backoff(attempt, deadline)
+                            if delay is None:
+                                break
                             logger.info(f"Retrying request for chat {chat_id}, attempt {attempt + 2}")
+                            time.sleep(delay)
                             continue
                 else:
                     logger.error(f"NeuroAPI Error {response.status_code}: {response.text}")
                     # Если это не 200 статус, используем fallback
-                    if is_business_message:
-                        assistant_message = "Привет! Я ИИ-ассистент Сергея. Произошла техническая ошибка, но Сергей прочитает ваше сообщение и ответит как только сможет."
-                    else:
-                        assistant_message = f"Извините, произошла ошибка при обращении к GPT-5. Попробуйте позже."
+                    assistant_message = self._error_fallback(is_business_message)
                     break
                 
-            # Проверяем, что ответ не пустой (после всех попыток)
-            if not assistant_message or not assistant_message.strip():
-                logger.warning(f"Empty response from NeuroAPI for chat {chat_id} after {max_retries + 1} attempts")
-                if is_business_message:
-                    # Проверяем, есть ли контекст для этого чата
-                    context_key = f"business_{business_connection_id}_{chat_id}"
-                    if context_key in self.chat_contexts and len(self.chat_contexts[context_key]) > 0:
-                        # Если контекст есть, используем более естественный ответ
-                        assistant_message = "Сергей прочитает ваше сообщение и ответит как только сможет. Извините за задержку."
-                    else:
-                        # Если контекста нет, представляемся
-                        assistant_message = "Привет! Я ИИ-ассистент Сергея. Он прочитает ваше сообщение и ответит как только сможет. Чем могу помочь?"
-                else:
-                    assistant_message = "Извините, я не смог сгенерировать ответ. Попробуйте еще раз."
-            
-            # Update context (для всех случаев - успешных и fallback)
-            self._update_context(chat_id, user_message, assistant_message, is_business_message, business_connection_id)
-            
-            logger.info(f"Successfully got response from NeuroAPI GPT-5 for chat {chat_id} ({message_type}): {assistant_message[:100]}...")
-            return assistant_message
+            return self._finalize_response(assistant_message, user_message, chat_id, is_business_message, business_connection_id)
                 
         except requests.exceptions.Timeout:
             logger.error(f"Timeout error for chat {chat_id}")
-            if is_business_message:
-                return "Привет! Я ИИ-ассистент Сергея. Произошла задержка, но Сергей прочитает ваше сообщение и ответит как только сможет."
-            else:
-                return "Превышено время ожидания ответа. Попробуйте еще раз."
+            return self._timeout_fallback(is_business_message)
         except Exception as e:
             logger.error(f"Unexpected error for chat {chat_id}: {str(e)}")
-            if is_business_message:
-                return "Привет! Я ИИ-ассистент Сергея. Произошла техническая ошибка, но Сергей прочитает ваше сообщение и ответит как только сможет."
-            else:
-                return "Произошла техническая ошибка. Попробуйте позже."
+            return self._unexpected_fallback(is_business_message)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled keep-alive session for the NeuroAPI host"""
+        return http_pool.session(self.endpoint)
+
+    async def close(self) -> None:
+        """Stop the summarizer and close the context store (connections belong to http_pool)"""
+        await self.summarizer.stop()
+        self.chat_contexts.close()
+
+    def _note_throttling(self, response, attempt: int) -> Optional[float]:
+        """Pause the upstream on 429/503 responses; returns Retry-After seconds if given"""
+        if response.status not in (429, 503):
+            return None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            self.limiter.pause(retry_after)
+        elif response.status == 429:
+            self.limiter.pause(self.limiter.base_backoff * (2 ** attempt))
+        return retry_after
+
+    async def _request_completion_async(self, headers: Dict[str, str], payload: Dict, chat_id: Optional[int], on_first_byte: Optional[Callable[[], None]] = None, label: Optional[str] = None) -> Optional[str]:
+        """POST the payload until a non-empty answer arrives or the deadline expires.
+
+        Empty answers, 429/5xx statuses and connection errors are retried with
+        jittered exponential backoff (at least Retry-After); every attempt
+        waits for an upstream limiter slot and only gets the time left until
+        the overall deadline. Raises NeuroAPIError for non-retryable statuses and
+        asyncio.TimeoutError once the deadline is spent. label names the
+        request in logs instead of the chat (e.g. background summaries).
+        """
+        log_key = label or f"chat {chat_id}"
+        session = await self._get_session()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        assistant_message = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+
+            retry_after = None
+            try:
+                async with self.limiter.slot(deadline), session.post(
+                    self.endpoint,
+                    headers=headers,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=remaining),
+                ) as response:
+                    if response.status == 200:
+                        result = await response.json(content_type=None)
+                        logger.debug(f"NeuroAPI response for {log_key}: {result}")
+                        assistant_message = result["choices"][0]["message"]["content"]
+                        if assistant_message and assistant_message.strip():
+                            if on_first_byte is not None:
+                                on_first_byte()
+                            return assistant_message
+                        logger.warning(f"Empty response from NeuroAPI for {log_key}, attempt {attempt + 1}")
+                    else:
+                        body = await response.text()
+                        logger.error(f"NeuroAPI Error {response.status}: {body}")
+                        retry_after = self._note_throttling(response, attempt)
+                        if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                            raise NeuroAPIError(response.status, body)
+            except aiohttp.ClientConnectionError as e:
+                logger.warning(f"NeuroAPI connection error for {log_key}, attempt {attempt + 1}: {e}")
+                if attempt >= self.max_retries:
+                    raise
+
+            if attempt < self.max_retries:
+                delay = self.limiter.backoff(attempt, deadline, retry_after)
+                if delay is None:
+                    raise asyncio.TimeoutError()
+                logger.info(f"Retrying request for {log_key}, attempt {attempt + 2}")
+                await asyncio.sleep(delay)
+
+        return assistant_message
+
+    def _is_first_contact(self, chat_id: int, is_business_message: bool, business_connection_id: Optional[str]) -> bool:
+        """Whether the conversation has no stored turns and no summary yet"""
+        if not config.ENABLE_CONTEXT:
+            return True
+        # Длина промпта не годится: fit_to_budget может выбросить всю историю
+        context_key = make_context_key(chat_id, is_business_message, business_connection_id)
+        return not self.chat_contexts.recent(context_key, 1) and not self.chat_contexts.summary(context_key)
+
+    def _response_cache_key(self, user_message: str, messages: List[Dict[str, str]], first_contact: bool, is_business_message: bool, business_connection_id: Optional[str]) -> Optional[str]:
+        """Cache key for a context-free request, None when the cache does not apply"""
+        if not config.RESPONSE_CACHE_ENABLED or not first_contact:
+            # Только первые сообщения: системный промпт + вопрос, без истории
+            return None
+        scope = f"business:{business_connection_id}" if is_business_message else "regular"
+        prompt_variant = fingerprint(self.model, messages[0]["content"])
+        context_fingerprint = fingerprint(*(message["content"] for message in messages[1:-1]))
+        return ResponseCache.make_key(user_message, prompt_variant, context_fingerprint, scope)
+
+    def _near_duplicate_scope(self, messages: List[Dict[str, str]], first_contact: bool, is_business_message: bool, business_connection_id: Optional[str]) -> Optional[str]:
+        """Near-duplicate index scope for a context-free request, None when the index does not apply"""
+        if not config.NEAR_DUPLICATE_CACHE_ENABLED or not first_contact:
+            return None
+        scope = f"business:{business_connection_id}" if is_business_message else "regular"
+        return fingerprint(self.model, messages[0]["content"], scope)
+
+    @staticmethod
+    async def _read_sse_stream(response: aiohttp.ClientResponse, on_text: TextCallback) -> Tuple[str, bool]:
+        """Accumulate content deltas from an SSE chat completion stream; (text, ended with [DONE])"""
+        text = ""
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return text, True
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                logger.warning(f"Skipping malformed SSE chunk: {data[:100]}")
+                continue
+            choices = chunk.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                text += delta
+                await on_text(text)
+        return text, False
+
+    async def _stream_completion_async(self, headers: Dict[str, str], payload: Dict, chat_id: int, on_text: TextCallback, on_first_byte: Optional[Callable[[], None]] = None) -> Optional[str]:
+        """Streaming variant of _request_completion_async.
+
+        Retries follow the same deadline rules, but only until the first
+        token has been delivered to on_text; a stream that broke midway (or
+        ended without [DONE]) raises IncompleteResponseError with the text
+        received so far.
+        """
+        session = await self._get_session()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        assistant_message = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+
+            received = ""
+
+            async def track(text: str) -> None:
+                nonlocal received
+                if not received and on_first_byte is not None:
+                    on_first_byte()
+                received = text
+                await on_text(text)
+
+            retry_after = None
+            try:
+                async with self.limiter.slot(deadline), session.post(
+                    self.endpoint,
+                    headers=headers,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=remaining),
+                ) as response:
+                    if response.status == 200:
+                        assistant_message, done = await self._read_sse_stream(response, track)
+                        if assistant_message.strip():
+                            if not done:
+                                logger.warning(f"NeuroAPI stream for chat {chat_id} ended without [DONE] after {len(assistant_message)} chars")
+                                raise IncompleteResponseError(assistant_message)
+                            return assistant_message
+                        logger.warning(f"Empty streamed response from NeuroAPI for chat {chat_id}, attempt {attempt + 1}")
+                    else:
+                        body = await response.text()
+                        logger.error(f"NeuroAPI Error {response.status}: {body}")
+                        retry_after = self._note_throttling(response, attempt)
+                        if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                            raise NeuroAPIError(response.status, body)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                if received:
+                    # Часть ответа пользователь уже видит - повтор начал бы текст заново
+                    logger.warning(f"NeuroAPI stream for chat {chat_id} broke after {len(received)} chars: {e!r}")
+                    raise IncompleteResponseError(received) from e
+                if isinstance(e, asyncio.TimeoutError):
+                    raise
+                logger.warning(f"NeuroAPI connection error for chat {chat_id}, attempt {attempt + 1}: {e}")
+                if attempt >= self.max_retries:
+                    raise
+
+            if attempt < self.max_retries:
+                delay = self.limiter.backoff(attempt, deadline, retry_after)
+                if delay is None:
+                    raise asyncio.TimeoutError()
+                logger.info(f"Retrying request for chat {chat_id}, attempt {attempt + 2}")
+                await asyncio.sleep(delay)
+
+        return assistant_message
+
+    async def _complete_yandex(self, messages: List[Dict[str, str]], timeout: float, on_text: Optional[TextCallback], on_first_byte: Optional[Callable[[], None]] = None) -> Optional[str]:
+        """Failover completion through YandexGPT (whole answer at once, also when streaming)"""
+        answer = await yandex_client.complete_async(messages, timeout)
+        if on_first_byte is not None and answer:
+            on_first_byte()
+        if on_text is not None and answer:
+            await on_text(answer)
+        return answer
+
+    async def _complete_neuroapi(self, headers: Dict[str, str], payload: Dict, chat_id: int, on_text: Optional[TextCallback], on_first_byte: Optional[Callable[[], None]] = None) -> Optional[str]:
+        if on_text is not None:
+            return await self._stream_completion_async(headers, payload, chat_id, on_text, on_first_byte)
+        return await self._request_completion_async(headers, payload, chat_id, on_first_byte)
+
+    async def _complete_hedged(self, headers: Dict[str, str], payload: Dict, messages: List[Dict[str, str]], chat_id: int, on_text: Optional[TextCallback], budget: float, on_first_byte: Callable[[], None]) -> Optional[str]:
+        """NeuroAPI request raced against a hedge (same request or HEDGE_TARGET backend)"""
+        async def attempt(index: int, mark_first_byte: Callable[[], bool]) -> Optional[str]:
+            def first_byte() -> None:
+                # Для маршрутизатора первым байтом считается первый байт выигравшей попытки
+                if mark_first_byte():
+                    on_first_byte()
+
+            gated = None
+            if on_text is not None:
+                async def gated(text: str) -> None:
+                    # Текст показывает только попытка, первой получившая токены
+                    if mark_first_byte():
+                        await on_text(text)
+            if index == 1 and config.HEDGE_TARGET == "yandex":
+                return await self._complete_yandex(messages, budget, gated, first_byte)
+            return await self._complete_neuroapi(headers, payload, f"{chat_id}" if index == 0 else f"{chat_id}/hedge", gated, first_byte)
+
+        return await self.hedger.run(attempt)
+
+    async def _complete(self, headers: Dict[str, str], payload: Dict, messages: List[Dict[str, str]], chat_id: int, on_text: Optional[TextCallback]) -> Optional[str]:
+        """Run the completion through the provider router"""
+        if config.HEDGE_ENABLED:
+            neuroapi = lambda budget, first_byte: self._complete_hedged(headers, payload, messages, chat_id, on_text, budget, first_byte)
+        else:
+            neuroapi = lambda budget, first_byte: self._complete_neuroapi(headers, payload, chat_id, on_text, first_byte)
+        calls = {
+            "neuroapi": neuroapi,
+            "yandex": lambda budget, first_byte: self._complete_yandex(messages, budget, on_text, first_byte),
+        }
+        assistant_message, provider = await self.router.complete(calls, self.timeout)
+        if provider != self.router.names[0]:
+            logger.info(f"Chat {chat_id} answered by failover provider {provider}")
+        return assistant_message
+
+    async def get_response_async(self, user_message: str, chat_id: int, is_business_message: bool = False, business_connection_id: str = None, on_text: Optional[TextCallback] = None) -> str:
+        """Get response from NeuroAPI GPT-5 without blocking the event loop.
+
+        With on_text the answer is streamed: the callback receives the text
+        accumulated so far as chunks arrive. The return value is the final
+        answer in both modes (including fallbacks).
+        """
+        if not user_message.strip():
+            return "Ошибка: пустой ввод"
+
+        user_message = self._truncate_message(user_message, chat_id)
+
+        try:
+            headers = self._get_headers()
+            messages = self._prepare_messages(user_message, chat_id, is_business_message, business_connection_id)
+            payload = self._build_payload(messages, stream=on_text is not None)
+
+            message_type = "business" if is_business_message else "regular"
+
+            first_contact = self._is_first_contact(chat_id, is_business_message, business_connection_id)
+            cache_key = self._response_cache_key(user_message, messages, first_contact, is_business_message, business_connection_id)
+            near_scope = self._near_duplicate_scope(messages, first_contact, is_business_message, business_connection_id)
+            cached = None
+            if cache_key is not None:
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Response cache hit for chat {chat_id} ({message_type} message)")
+            if cached is None and near_scope is not None:
+                cached = self.near_duplicates.lookup(user_message, near_scope)
+                if cached is not None:
+                    logger.info(f"Near-duplicate cache hit for chat {chat_id} ({message_type} message)")
+            if cached is not None:
+                if on_text is not None:
+                    await on_text(cached)
+                return self._finalize_response(cached, user_message, chat_id, is_business_message, business_connection_id)
+
+            logger.info(f"Sending request to NeuroAPI GPT-5 for chat {chat_id} ({message_type} message, stream={on_text is not None})")
+
+            try:
+                assistant_message = await self._complete(headers, payload, messages, chat_id, on_text)
+                if assistant_message and assistant_message.strip():
+                    if cache_key is not None:
+                        self.response_cache.put(cache_key, assistant_message)
+                    if near_scope is not None:
+                        self.near_duplicates.add(user_message, near_scope, assistant_message)
+            except IncompleteResponseError as e:
+                # Пользователь уже видит начало ответа - оставляем его, но не кэшируем
+                assistant_message = e.text
+            except (NeuroAPIError, ProviderUnavailableError):
+                assistant_message = self._error_fallback(is_business_message)
+
+            return self._finalize_response(assistant_message, user_message, chat_id, is_business_message, business_connection_id)
+
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout error for chat {chat_id}")
+            return self._timeout_fallback(is_business_message)
+        except Exception as e:
+            logger.error(f"Unexpected error for chat {chat_id}: {str(e)}")
+            return self._unexpected_fallback(is_business_message)
 
 # Global client instance
 neuroapi_client = NeuroAPIClient()
@@ -246,3 +706,12 @@ neuroapi_client = NeuroAPIClient()
 def get_gpt_response(user_message: str, chat_id: int = 0, is_business_message: bool = False, business_connection_id: str = None) -> str:
     """Backward compatibility function"""
     return neuroapi_client.get_response(user_message, chat_id, is_business_message, business_connection_id)
+
+async def get_gpt_response_async(user_message: str, chat_id: int = 0, is_business_message: bool = False, business_connection_id: str = None) -> str:
+    """Async counterpart of get_gpt_response for use inside handlers"""
+    return await neuroapi_client.get_response_async(user_message, chat_id, is_business_message, business_connection_id)
+
+async def stream_gpt_response_async(user_message: str, on_text: TextCallback, chat_id: int = 0, is_business_message: bool = False, business_connection_id: str = None) -> str:
+    """Streaming get_gpt_response_async: on_text gets the partial answer as it is generated"""
+    return await neuroapi_client.get_response_async(user_message, chat_id, is_business_message, business_connection_id, on_text=on_text)
+
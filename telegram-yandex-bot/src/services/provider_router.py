@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# (timeout, first_byte) -> ответ провайдера; first_byte() вызывается, когда провайдер
+# начал отвечать (первый токен потока или ответ целиком); схема сообщений переводится внутри вызова
+ProviderCall = Callable[[float, Callable[[], None]], Awaitable[Optional[str]]]
+
+
+# 4xx, которые говорят о провайдере (ключ, модель, перегрузка), а не о самом запросе
+PROVIDER_SIDE_STATUSES = frozenset({401, 403, 404, 408, 429})
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when every configured provider is short-circuited"""
+
+
+def is_request_error(error: BaseException) -> bool:
+    """Whether a provider rejected the request itself (4xx such as 400 or 413).
+
+    Clients expose the HTTP status as error.status. Such errors say nothing
+    about provider health, and a fallback provider would reject the same
+    request.
+    """
+    status = getattr(error, "status", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in PROVIDER_SIDE_STATUSES
+
+
+class Provider:
+    """LLM backend known to the router, guarded by its own circuit breaker"""
+
+    def __init__(self, name: str, breaker: CircuitBreaker):
+        self.name = name
+        self.breaker = breaker
+
+
+class FirstByte:
+    """First byte signal of one provider attempt"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self.event = asyncio.Event()
+        self.at: Optional[float] = None
+
+    def __call__(self) -> None:
+        if self.at is None:
+            self.at = self._loop.time()
+            self.event.set()
+
+
+class ProviderRouter:
+    """Routes a completion to the first healthy provider, failing over in priority order.
+
+    Providers whose circuit is open are skipped without waiting. Every
+    provider except the last one must start answering (first streamed
+    token, or the whole answer) within attempt_timeout seconds, so a
+    degraded primary cannot consume the whole deadline; once it has started,
+    the answer gets the rest of the overall budget and is never replaced by
+    a fallback (the user may already be reading it). Breakers see the time
+    to first byte, so long streamed answers do not count as slow calls.
+    A request the provider rejects as such (see is_request_error) is not a
+    breaker failure and is not retried on another provider.
+    """
+
+    def __init__(self, providers: List[Provider], attempt_timeout: float):
+        self.providers = providers
+        self.attempt_timeout = attempt_timeout
+        self.failovers = 0
+        self.served: Dict[str, int] = {provider.name: 0 for provider in providers}
+
+    @property
+    def names(self) -> List[str]:
+        return [provider.name for provider in self.providers]
+
+    async def complete(self, calls: Dict[str, ProviderCall], timeout: float) -> Tuple[Optional[str], str]:
+        """Run the request on the first provider that is allowed and succeeds.
+
+        calls maps provider names to request coroutines taking the time
+        budget of the attempt. Returns (answer, provider name). Re-raises the
+        last provider error if all attempts failed, ProviderUnavailableError
+        if no provider was allowed to run.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        candidates = [provider for provider in self.providers if provider.name in calls]
+        last_error: Optional[BaseException] = None
+
+        for index, provider in enumerate(candidates):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if not provider.breaker.allow():
+                logger.info(f"Skipping provider {provider.name}: circuit {provider.breaker.state}")
+                continue
+            is_last = index == len(candidates) - 1
+
+            started = loop.time()
+            first_byte = FirstByte(loop)
+            task = asyncio.ensure_future(calls[provider.name](remaining, first_byte))
+            try:
+                answer = await self._run_attempt(task, first_byte, None if is_last else min(self.attempt_timeout, remaining), deadline)
+            except asyncio.CancelledError:
+                # Отмена (вытеснение, проигравший hedge) ничего не говорит о провайдере,
+                # но проба полуоткрытого автомата должна вернуться
+                provider.breaker.release()
+                raise
+            except Exception as e:
+                latency = (first_byte.at or loop.time()) - started
+                last_error = e
+                if is_request_error(e):
+                    # Провайдер здоров, а резервный отклонит тот же запрос
+                    provider.breaker.record_success(latency)
+                    logger.warning(f"Provider {provider.name} rejected the request ({e!r}), not failing over")
+                    break
+                provider.breaker.record_failure(latency)
+                if first_byte.at is not None:
+                    # Провайдер уже начал отвечать - резервный ответ заменил бы показанный текст
+                    logger.warning(f"Provider {provider.name} failed after it started answering ({e!r})")
+                    break
+                if not is_last:
+                    self.failovers += 1
+                    logger.warning(f"Provider {provider.name} failed ({e!r}), failing over")
+                continue
+
+            provider.breaker.record_success((first_byte.at or loop.time()) - started)
+            self.served[provider.name] += 1
+            return answer, provider.name
+
+        if last_error is not None:
+            raise last_error
+        if loop.time() >= deadline:
+            raise asyncio.TimeoutError()
+        raise ProviderUnavailableError(f"No LLM provider available ({', '.join(self.names)})")
+
+    @staticmethod
+    async def _run_attempt(task: asyncio.Future, first_byte: FirstByte, attempt_timeout: Optional[float], deadline: float) -> Optional[str]:
+        """Wait for the attempt: attempt_timeout until its first byte, then up to the overall deadline"""
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.ensure_future(first_byte.event.wait())
+        try:
+            if attempt_timeout is not None:
+                await asyncio.wait({task, waiter}, timeout=attempt_timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not task.done() and first_byte.at is None:
+                    raise asyncio.TimeoutError()
+            await asyncio.wait({task}, timeout=max(deadline - loop.time(), 0))
+            if not task.done():
+                raise asyncio.TimeoutError()
+            return task.result()
+        finally:
+            waiter.cancel()
+            task.cancel()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "providers": self.names,
+            "failovers": self.failovers,
+            "served": dict(self.served),
+            "circuits": {provider.name: provider.breaker.stats() for provider in self.providers},
+        }
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# attempt(index, mark_first_byte): mark_first_byte() фиксирует первый байт попытки
+# и возвращает True, если эта попытка выиграла гонку
+Attempt = Callable[[int, Callable[[], bool]], Awaitable[T]]
+
+
+class RequestHedger:
+    """Hedged requests: a second attempt if the first byte is late, first one wins.
+
+    The hedge delay adapts to the observed time-to-first-byte: it is the
+    configured quantile (p90 by default) of the last window samples, clamped
+    to [min_delay, max_delay]; max_delay is used until min_samples are
+    collected. An attempt's first byte is the first streamed chunk, or the
+    whole answer for non-streaming requests. The attempt that reaches its
+    first byte first wins and the other one is cancelled (which aborts its
+    HTTP request). A cancelled primary attempt contributes its elapsed time
+    as a lower bound (censored sample), so the slow requests that got hedged
+    are not left out of the window. At most budget_ratio of all requests
+    are hedged.
+    """
+
+    def __init__(self, quantile: float = 0.9, min_delay: float = 2.0, max_delay: float = 30.0,
+                 budget_ratio: float = 0.1, window: int = 200, min_samples: int = 20):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped_budget = 0
+
+    def delay(self) -> float:
+        """Current hedge delay in seconds"""
+        if len(self._samples) < self.min_samples:
+            return self.max_delay
+        ordered = sorted(self._samples)
+        value = ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+        return min(max(value, self.min_delay), self.max_delay)
+
+    def record_first_byte(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def _within_budget(self) -> bool:
+        return self.hedged + 1 <= self.budget_ratio * self.requests
+
+    async def run(self, attempt: Attempt) -> T:
+        """Run attempt(0, ...) and, if its first byte is late, race attempt(1, ...)"""
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        first_byte = asyncio.Event()
+        winner: Optional[int] = None
+        started: Dict[int, float] = {}
+
+        def marker(index: int) -> Callable[[], bool]:
+            def mark() -> bool:
+                nonlocal winner
+                if winner is None:
+                    winner = index
+                    self.record_first_byte(loop.time() - started[index])
+                    first_byte.set()
+                return winner == index
+            return mark
+
+        async def wrapped(index: int) -> T:
+            started[index] = loop.time()
+            mark = marker(index)
+            result = await attempt(index, mark)
+            # Ответ без потока: первым байтом считается весь ответ
+            mark()
+            return result
+
+        tasks: Dict[int, asyncio.Task] = {0: asyncio.ensure_future(wrapped(0))}
+        waiter = asyncio.ensure_future(first_byte.wait())
+        try:
+            await asyncio.wait({tasks[0], waiter}, timeout=self.delay(), return_when=asyncio.FIRST_COMPLETED)
+            if not first_byte.is_set() and not tasks[0].done():
+                if self._within_budget():
+                    self.hedged += 1
+                    logger.info(f"No first byte after {self.delay():.1f}s, sending hedged request")
+                    tasks[1] = asyncio.ensure_future(wrapped(1))
+                else:
+                    self.skipped_budget += 1
+
+            while winner is None:
+                pending = [task for task in tasks.values() if not task.done()]
+                if not pending:
+                    break
+                await asyncio.wait(pending + [waiter], return_when=asyncio.FIRST_COMPLETED)
+
+            if winner is None:
+                # Все попытки упали - отдаем ошибку основной
+                return tasks[0].result()
+            if winner == 1:
+                self.hedge_wins += 1
+            for index, task in tasks.items():
+                if index != winner:
+                    if index == 0 and not task.done():
+                        # Первый байт основной попытки пришел бы не раньше этого
+                        self.record_first_byte(loop.time() - started[0])
+                    task.cancel()
+            return await tasks[winner]
+        finally:
+            waiter.cancel()
+            for task in tasks.values():
+                task.cancel()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "win_rate": round(self.hedge_wins / self.hedged, 4) if self.hedged else 0.0,
+            "skipped_budget": self.skipped_budget,
+            "delay_sec": round(self.delay(), 3),
+            "budget_ratio": self.budget_ratio,
+        }
@@ -0,0 +1,88 @@
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a user message"""
+    text = text.casefold().replace("ё", "е")
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def fingerprint(*parts: str) -> str:
+    """Stable short digest of arbitrary strings"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """TTL + LRU cache of model answers keyed by exact (normalized) requests.
+
+    The key combines the normalized user text, the system prompt variant,
+    a fingerprint of the context sent along and a scope (e.g. the business
+    connection), so an answer is only reused for an identical prompt in the
+    same business account.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_sec: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        # key -> (ответ, время записи); порядок = LRU
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @staticmethod
+    def make_key(user_message: str, prompt_variant: str, context_fingerprint: str, scope: str) -> str:
+        return fingerprint(normalize_text(user_message), prompt_variant, context_fingerprint, scope)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        answer, stored_at = entry
+        if time.time() - stored_at > self.ttl_sec:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return answer
+
+    def put(self, key: str, answer: str) -> None:
+        self._entries[key] = (answer, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
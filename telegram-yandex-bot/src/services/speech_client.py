@@ -1,8 +1,14 @@
+import time
+import json
+import asyncio
+import aiohttp
 import requests
 import logging
-from typing import Optional
+from typing import Dict, Optional
 from config import config
 from .iam_token_manager import token_manager
+from .upstream_limiter import limiters, parse_retry_after
+from .http_pool import http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -13,15 +19,9 @@ class SpeechClient:
         self.folder_id = config.YC_FOLDER_ID
         self.stt_endpoint = config.YC_STT_ENDPOINT
         self.tts_endpoint = config.YC_TTS_ENDPOINT
-        # HTTP session with retries
-        self.session = requests.Session()
-        try:
-            from requests.adapters import HTTPAdapter
-            from urllib3.util import Retry
-            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
-            self.session.mount("https://", HTTPAdapter(max_retries=retries))
-        except Exception:
-            pass
+        # Connections come from the shared pool, rate limits per upstream
+        self.limiter = limiters["speechkit"]
+        self.timeout = 30
         
     def _get_auth_header(self) -> str:
         """Get authentication header value"""
@@ -32,6 +32,111 @@ class SpeechClient:
         else:
             raise ValueError("Either YC_API_KEY or YC_IAM_TOKEN must be provided")
     
+    def _request_auth_header(self) -> str:
+        """Authorization header: static creds first, auto IAM only if SA key configured"""
+        if self.iam_token:
+            return f"Bearer {self.iam_token}"
+        if self.api_key:
+            return f"Api-Key {self.api_key}"
+        if config.YC_SA_KEY_FILE or config.YC_SA_KEY_JSON:
+            return f"Bearer {token_manager.get_token()}"
+        return self._get_auth_header()
+
+    @staticmethod
+    def _tts_language(voice: str, language: Optional[str]) -> str:
+        if language:
+            return language
+        # Determine language from voice if not specified
+        return "ru-RU" if voice in ["alena", "jane", "omazh", "zahar", "ermil"] else "en-US"
+
+    async def _post_async(self, url: str, headers: Dict[str, str], kind: str, **request) -> Optional[bytes]:
+        """POST through the speechkit limiter with retries on 429/5xx; body bytes or None"""
+        session = http_pool.session(url)
+        deadline = time.monotonic() + self.timeout
+        for attempt in range(config.SPEECHKIT_MAX_RETRIES + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            retry_after = None
+            try:
+                async with self.limiter.slot(deadline), session.post(
+                    url, headers=headers, timeout=aiohttp.ClientTimeout(total=remaining), **request
+                ) as response:
+                    if response.status == 200:
+                        return await response.read()
+                    body = await response.text()
+                    logger.error(f"{kind} API Error {response.status}: {body}")
+                    if response.status not in (429, 500, 502, 503, 504):
+                        return None
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if retry_after is not None:
+                        self.limiter.pause(retry_after)
+            except aiohttp.ClientConnectionError as e:
+                logger.warning(f"{kind} connection error, attempt {attempt + 1}: {e}")
+            if attempt < config.SPEECHKIT_MAX_RETRIES:
+                delay = self.limiter.backoff(attempt, deadline, retry_after)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+        return None
+
+    async def speech_to_text_async(self, audio_data: bytes, language: str = None) -> Optional[str]:
+        """Non-blocking speech_to_text for use inside handlers"""
+        if not config.ENABLE_VOICE:
+            return None
+        try:
+            # IAM-токен может обновляться по сети - не блокируем event loop
+            headers = {"Authorization": await asyncio.to_thread(self._request_auth_header)}
+            params = {
+                "folderId": self.folder_id,
+                "lang": language or config.STT_LANGUAGE,
+                "topic": "general",
+                "profanityFilter": "false"
+            }
+            logger.info(f"Sending STT request, audio size: {len(audio_data)} bytes")
+            body = await self._post_async(self.stt_endpoint, headers, "STT", params=params, data=audio_data)
+            if body is None:
+                return None
+            recognized_text = json.loads(body).get("result", "")
+            logger.info(f"STT successful, recognized: '{recognized_text[:50]}...'")
+            return recognized_text
+        except asyncio.TimeoutError:
+            logger.error("STT timeout error")
+            return None
+        except Exception as e:
+            logger.error(f"STT unexpected error: {str(e)}")
+            return None
+
+    async def text_to_speech_async(self, text: str, voice: str = None, language: str = None) -> Optional[bytes]:
+        """Non-blocking text_to_speech for use inside handlers"""
+        if not config.ENABLE_VOICE:
+            return None
+        try:
+            voice = voice or config.TTS_VOICE
+            headers = {
+                "Authorization": await asyncio.to_thread(self._request_auth_header),
+                "Content-Type": "application/x-www-form-urlencoded",
+            }
+            data = {
+                "text": text,
+                "lang": self._tts_language(voice, language),
+                "voice": voice,
+                "format": config.TTS_FORMAT,
+                "speed": "1.0",
+                "folderId": self.folder_id
+            }
+            logger.info(f"Sending TTS request, text length: {len(text)}")
+            audio = await self._post_async(self.tts_endpoint, headers, "TTS", data=data)
+            if audio is not None:
+                logger.info(f"TTS successful, audio size: {len(audio)} bytes")
+            return audio
+        except asyncio.TimeoutError:
+            logger.error("TTS timeout error")
+            return None
+        except Exception as e:
+            logger.error(f"TTS unexpected error: {str(e)}")
+            return None
+
     def speech_to_text(self, audio_data: bytes, language: str = None) -> Optional[str]:
         """Convert speech to text using Yandex SpeechKit STT"""
         if not config.ENABLE_VOICE:
@@ -39,18 +144,7 @@ class SpeechClient:
             
         try:
             language = language or config.STT_LANGUAGE
-            
-            # Prefer static creds; auto IAM only if SA key configured
-            if self.iam_token:
-                auth_header = f"Bearer {self.iam_token}"
-            elif self.api_key:
-                auth_header = f"Api-Key {self.api_key}"
-            elif config.YC_SA_KEY_FILE or config.YC_SA_KEY_JSON:
-                iam = token_manager.get_token()
-                auth_header = f"Bearer {iam}"
-            else:
-                auth_header = self._get_auth_header()
-            headers = {"Authorization": auth_header}
+            headers = {"Authorization": self._request_auth_header()}
             
             params = {
                 "folderId": self.folder_id,
@@ -61,7 +155,7 @@ class SpeechClient:
             
             logger.info(f"Sending STT request, audio size: {len(audio_data)} bytes")
             
-            response = requests.post(
+            response = http_pool.sync_session.post(
                 self.stt_endpoint,
                 headers=headers,
                 params=params,
@@ -92,24 +186,8 @@ class SpeechClient:
             
         try:
             voice = voice or config.TTS_VOICE
-            # Determine language from voice if not specified
-            if not language:
-                if voice in ["alena", "jane", "omazh", "zahar", "ermil"]:
-                    language = "ru-RU"
-                else:
-                    language = "en-US"
-            
-            # Prefer static creds; auto IAM only if SA key configured
-            if self.iam_token:
-                auth_header = f"Bearer {self.iam_token}"
-            elif self.api_key:
-                auth_header = f"Api-Key {self.api_key}"
-            elif config.YC_SA_KEY_FILE or config.YC_SA_KEY_JSON:
-                iam = token_manager.get_token()
-                auth_header = f"Bearer {iam}"
-            else:
-                auth_header = self._get_auth_header()
-            headers = {"Authorization": auth_header, "Content-Type": "application/x-www-form-urlencoded"}
+            language = self._tts_language(voice, language)
+            headers = {"Authorization": self._request_auth_header(), "Content-Type": "application/x-www-form-urlencoded"}
             
             data = {
                 "text": text,
@@ -122,7 +200,7 @@ class SpeechClient:
             
             logger.info(f"Sending TTS request, text length: {len(text)}")
             
-            response = requests.post(
+            response = http_pool.sync_session.post(
                 self.tts_endpoint,
                 headers=headers,
                 data=data,
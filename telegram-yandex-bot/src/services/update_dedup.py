@@ -0,0 +1,201 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Вторая колонка строки файла для забытых id
+FORGET_MARK = "forget"
+
+
+class UpdateDeduplicator:
+    """Bounded, time-windowed set of recently seen Telegram update_ids.
+
+    A ring buffer keeps insertion order for eviction (by capacity and by age),
+    a dict of id -> time seen answers membership in O(1). forget() only drops
+    the dict entry; its ring buffer entry is skipped when it reaches the head.
+    With persist_file set, every new id (and a tombstone for every forgotten
+    one) is appended to a small text file that is replayed on startup, so
+    redeliveries after a restart are dropped as well. Lines are only queued
+    on the caller's path; a background thread writes them in batches every
+    flush_interval seconds, like UpdateJournal, so an id seen less than that
+    before a crash may be processed once more after the restart.
+    """
+
+    def __init__(self, capacity: int, ttl_sec: float, persist_file: Optional[str] = None,
+                 flush_interval: float = 0.5):
+        self.capacity = capacity
+        self.ttl_sec = ttl_sec
+        self.persist_file = persist_file
+        self.flush_interval = flush_interval
+        self._order: Deque[Tuple[int, float]] = deque()
+        self._seen: Dict[int, float] = {}
+        self._file = None
+        self._appended = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending: List[str] = []
+        # Снимок окна для перезаписи файла (компактирование в потоке записи)
+        self._rewrite: Optional[List[str]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+
+        if self.persist_file:
+            self._load()
+            self._open_for_append()
+            if self._file is not None:
+                self._thread = threading.Thread(target=self._run, name="update-dedup", daemon=True)
+                self._thread.start()
+
+    def _load(self) -> None:
+        """Replay persisted ids that are still inside the time window"""
+        if not os.path.exists(self.persist_file):
+            return
+        cutoff = time.time() - self.ttl_sec
+        try:
+            with open(self.persist_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if not line.endswith("\n") or len(parts) != 2:
+                        # Оборванная последняя строка после падения
+                        continue
+                    try:
+                        update_id = int(parts[0])
+                        if parts[1] == FORGET_MARK:
+                            self._seen.pop(update_id, None)
+                            continue
+                        seen_at = float(parts[1])
+                    except ValueError:
+                        continue
+                    if seen_at >= cutoff and update_id not in self._seen:
+                        self._remember(update_id, seen_at)
+            logger.info(f"Loaded {len(self._seen)} seen update ids from {self.persist_file}")
+        except Exception as e:
+            logger.error(f"Error loading seen update ids: {e}")
+        # Переписываем файл без устаревших записей
+        self._compact()
+
+    def _open_for_append(self) -> None:
+        try:
+            self._file = open(self.persist_file, 'a', encoding='utf-8')
+        except Exception as e:
+            logger.error(f"Cannot open {self.persist_file} for append, persistence disabled: {e}")
+            self._file = None
+
+    def _window_lines(self) -> List[str]:
+        """Persist file lines for the ids currently in the window"""
+        return [f"{update_id} {seen_at:.3f}\n" for update_id, seen_at in self._order
+                if self._seen.get(update_id) == seen_at]
+
+    def _compact(self, lines: Optional[List[str]] = None) -> None:
+        """Rewrite the persist file with the current window only"""
+        tmp_path = f"{self.persist_file}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write("".join(self._window_lines() if lines is None else lines))
+            os.replace(tmp_path, self.persist_file)
+        except Exception as e:
+            logger.error(f"Error compacting seen update ids: {e}")
+
+    def _remember(self, update_id: int, seen_at: float) -> None:
+        self._order.append((update_id, seen_at))
+        self._seen[update_id] = seen_at
+        while len(self._order) > self.capacity:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        old_id, seen_at = self._order.popleft()
+        # Запись забытого (или заново добавленного) id уже не действует
+        if self._seen.get(old_id) == seen_at:
+            del self._seen[old_id]
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.ttl_sec
+        while self._order and self._order[0][1] < cutoff:
+            self._evict_oldest()
+
+    def _persist(self, line: str) -> None:
+        """Queue a line for the writer thread (no file I/O on the caller's path)"""
+        if self._thread is None:
+            return
+        self._appended += 1
+        with self._lock:
+            if self._appended > self.capacity:
+                # Снимок окна уже содержит все ранее поставленные строки
+                self._rewrite = self._window_lines()
+                self._pending = []
+                self._appended = 0
+                self._wakeup.set()
+            else:
+                self._pending.append(line)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_batch()
+            if self._closed:
+                return
+
+    def _write_batch(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+            rewrite, self._rewrite = self._rewrite, None
+        if self._file is None or (not batch and rewrite is None):
+            return
+        try:
+            if rewrite is not None:
+                self._file.close()
+                self._compact(rewrite + batch)
+                self._open_for_append()
+            else:
+                self._file.write("".join(batch))
+                self._file.flush()
+        except Exception as e:
+            logger.error(f"Error persisting seen update ids: {e}")
+
+    def check_and_add(self, update_id: int) -> bool:
+        """Return True if update_id was already seen; otherwise remember it"""
+        now = time.time()
+        self._expire(now)
+        if update_id in self._seen:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        self._remember(update_id, now)
+        self._persist(f"{update_id} {now:.3f}\n")
+        return False
+
+    def forget(self, update_id: int) -> None:
+        """Drop an id so that Telegram's redelivery is processed again (e.g. after a failure)"""
+        if self._seen.pop(update_id, None) is None:
+            return
+        # Надгробие: после перезапуска id тоже не считается увиденным
+        self._persist(f"{update_id} {FORGET_MARK}\n")
+
+    def close(self) -> None:
+        """Write out everything queued and close the file"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._seen),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,171 @@
+import os
+import glob
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.journal_index import SegmentIndex, index_path
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateJournal:
+    """Append-only JSONL journal of incoming updates, written from the raw webhook body.
+
+    Every update is one line ``{"ts": <receive unix time>, "update": <raw
+    body>}``: the request bytes are spliced in as they came from Telegram,
+    without parsing or re-serializing them. append() only queues the line;
+    a background thread writes everything queued as one batch every
+    flush_interval seconds (or as soon as batch_size lines are waiting).
+    Under overload lines beyond max_pending are dropped and counted rather
+    than blocking the event loop.
+
+    When the live file grows past segment_bytes it is sealed (renamed to
+    ``<journal>.<N>``) and a new one is started; with max_segments only the
+    newest sealed segments are kept.
+
+    With index enabled the writer thread also maintains a SegmentIndex
+    (sparse time index, chat/user/type postings with byte offsets) for the
+    live file from the update dicts passed to append(), and writes it as
+    ``<segment>.idx`` when the segment is sealed; after a restart the index
+    of the existing live file is rebuilt by scanning it once.
+    """
+
+    def __init__(self, journal_file: str, segment_bytes: int = 64 * 1024 * 1024, max_segments: int = 0,
+                 flush_interval: float = 0.5, batch_size: int = 256, max_pending: int = 10000,
+                 index: bool = True):
+        self.journal_file = journal_file
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.index = index
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending: List[Tuple[bytes, float, Optional[Dict[str, Any]]]] = []
+        self._segment_index: Optional[SegmentIndex] = None
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.sealed = 0
+
+    def segments(self) -> List[str]:
+        """Sealed segments ordered by number"""
+        segments = []
+        for path in glob.glob(f"{glob.escape(self.journal_file)}.*"):
+            suffix = path.rsplit(".", 1)[-1]
+            if suffix.isdigit():
+                segments.append((int(suffix), path))
+        return [path for _, path in sorted(segments)]
+
+    def start(self) -> None:
+        directory = os.path.dirname(self.journal_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.journal_file, 'ab')
+        if self.index:
+            # Индекс уже записанной части живого файла (после перезапуска)
+            self._segment_index = SegmentIndex.scan(self.journal_file) if self._file.tell() else SegmentIndex()
+        self._thread = threading.Thread(target=self._run, name="update-journal", daemon=True)
+        self._thread.start()
+
+    def append(self, body: bytes, received_at: Optional[float] = None,
+               update: Optional[Dict[str, Any]] = None) -> bool:
+        """Queue one raw update body (update is its parsed form, for the index); False if it was dropped"""
+        if received_at is None:
+            received_at = time.time()
+        if b"\n" in body or b"\r" in body:
+            # Переводы строк вне строк JSON - пробельные символы; внутри строк они экранированы
+            body = body.replace(b"\r", b" ").replace(b"\n", b" ")
+        line = b'{"ts":%.3f,"update":%s}\n' % (received_at, body.strip())
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((line, received_at, update))
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_batch()
+            if self._closed:
+                return
+
+    def _write_batch(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch or self._file is None:
+            return
+        try:
+            if self._segment_index is not None:
+                offset = self._file.tell()
+                for line, received_at, update in batch:
+                    if update is not None:
+                        self._segment_index.add(offset, received_at, update)
+                    offset += len(line)
+            self._file.write(b"".join(line for line, _, _ in batch))
+            self._file.flush()
+            self.written += len(batch)
+            self.batches += 1
+            if self.segment_bytes > 0 and self._file.tell() >= self.segment_bytes:
+                self._seal()
+        except Exception as e:
+            logger.error(f"Error writing update journal: {e}")
+
+    def _seal(self) -> None:
+        """Rename the live file to the next segment number and start a new one"""
+        self._file.close()
+        segments = self.segments()
+        number = int(segments[-1].rsplit(".", 1)[-1]) + 1 if segments else 1
+        sealed_path = f"{self.journal_file}.{number}"
+        os.replace(self.journal_file, sealed_path)
+        self.sealed += 1
+        self._file = open(self.journal_file, 'ab')
+        if self._segment_index is not None:
+            self._segment_index.write(index_path(sealed_path))
+            self._segment_index = SegmentIndex()
+        if self.max_segments > 0:
+            for path in self.segments()[:-self.max_segments]:
+                os.remove(path)
+                if os.path.exists(index_path(path)):
+                    os.remove(index_path(path))
+        self.on_sealed(sealed_path)
+
+    def on_sealed(self, path: str) -> None:
+        """Hook called in the writer thread after a segment is sealed"""
+
+    def close(self) -> None:
+        """Write out everything queued and close the file"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self._write_batch()
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "written": self.written,
+            "pending": pending,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "segments": len(self.segments()),
+        }
@@ -0,0 +1,77 @@
+import logging
+from typing import Awaitable, Callable, Dict, Hashable
+
+from telegram import Update
+
+from services.keyed_scheduler import KeyedScheduler
+from utils.context_keys import update_context_key
+
+logger = logging.getLogger(__name__)
+
+UpdateProcessor = Callable[[Update], Awaitable[None]]
+
+
+class UpdateQueue:
+    """Bounded in-memory queue of Telegram updates drained by a pool of async workers.
+
+    The webhook handler only enqueues and acknowledges; workers run the
+    (slow) LLM/STT/TTS pipeline in the background. Updates of one
+    conversation (same context key) are processed strictly in arrival order,
+    different conversations run concurrently.
+    """
+
+    def __init__(self, maxsize: int, workers: int, put_timeout: float = 1.0):
+        self.maxsize = maxsize
+        self.workers = workers
+        self._scheduler = KeyedScheduler(maxsize, workers, put_timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._scheduler.running
+
+    @property
+    def processed(self) -> int:
+        return self._scheduler.processed
+
+    @property
+    def failed(self) -> int:
+        return self._scheduler.failed
+
+    @property
+    def rejected(self) -> int:
+        return self._scheduler.rejected
+
+    def start(self, process: UpdateProcessor) -> None:
+        """Spawn the worker pool; must be called inside the running event loop"""
+        if self.running:
+            return
+        self._scheduler.start(process)
+        logger.info(f"Update queue started: {self.workers} workers, capacity {self.maxsize}")
+
+    @staticmethod
+    def _key_for(update: Update) -> Hashable:
+        key = update_context_key(update)
+        if key is None:
+            # Updates без чата ни с чем не упорядочиваем
+            return ("update", update.update_id)
+        return key
+
+    async def submit(self, update: Update) -> bool:
+        """Enqueue an update; returns False if the queue stayed full for put_timeout"""
+        if not self.running:
+            raise RuntimeError("Update queue is not started")
+        if not await self._scheduler.submit(self._key_for(update), update):
+            logger.warning(f"Update queue is full ({self.maxsize}), rejecting update {update.update_id}")
+            return False
+        return True
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Wait for queued updates (up to drain_timeout) and cancel the workers"""
+        if not self.running:
+            return
+        await self._scheduler.stop(drain_timeout)
+        logger.info("Update queue stopped")
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and worker pool counters for the status endpoint"""
+        return self._scheduler.stats()
@@ -0,0 +1,189 @@
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamLimiter:
+    """Client-side limits for one upstream API: token bucket + max in-flight requests.
+
+    slot(deadline) waits for a token (rate_per_sec, up to burst banked) and
+    a free in-flight slot, and fails with asyncio.TimeoutError instead of
+    waiting past the request's deadline. A 429/503 with Retry-After pauses
+    the whole upstream via pause(). backoff() gives the jittered exponential
+    delay before a retry, never shorter than Retry-After and never past the
+    deadline. Deadlines are time.monotonic() values (the asyncio loop clock).
+    """
+
+    def __init__(self, name: str, rate_per_sec: float = 0.0, burst: int = 1, max_in_flight: int = 0,
+                 base_backoff: float = 0.5, max_backoff: float = 10.0):
+        self.name = name
+        self.rate_per_sec = rate_per_sec
+        self.burst = max(burst, 1)
+        self.max_in_flight = max_in_flight
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._released: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self.waiting = 0
+        self.requests = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.retries = 0
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Примитивы asyncio привязаны к своему event loop
+            self._loop = loop
+            self._released = asyncio.Condition()
+        return self._released
+
+    def _take_token(self, now: float) -> float:
+        """Take a token if available; otherwise seconds until one is"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rate_per_sec <= 0:
+            return 0.0
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_sec)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate_per_sec
+
+    @asynccontextmanager
+    async def slot(self, deadline: float) -> AsyncIterator[None]:
+        """Hold a rate token and an in-flight slot for one HTTP attempt"""
+        released = self._condition()
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                wait = self._take_token(now)
+                if wait <= 0:
+                    break
+                if now + wait >= deadline:
+                    self.rejected += 1
+                    raise asyncio.TimeoutError()
+                await asyncio.sleep(wait)
+
+            if self.max_in_flight > 0:
+                async with released:
+                    while self._in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise asyncio.TimeoutError()
+                        await asyncio.wait_for(released.wait(), remaining)
+                    self._in_flight += 1
+            else:
+                self._in_flight += 1
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name}: no upstream slot before the deadline")
+            raise
+        finally:
+            self.waiting -= 1
+
+        self._waits.append(time.monotonic() - started)
+        self.requests += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if self.max_in_flight > 0:
+                async with released:
+                    released.notify()
+
+    def pause(self, seconds: float) -> None:
+        """Stop issuing requests to the upstream for seconds (Retry-After)"""
+        self.throttled += 1
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            logger.warning(f"{self.name}: upstream asked to retry after {seconds:.1f}s")
+
+    def backoff(self, attempt: int, deadline: float, retry_after: Optional[float] = None) -> Optional[float]:
+        """Jittered exponential delay before retry attempt+1, None if it would pass the deadline"""
+        ceiling = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        delay = random.uniform(ceiling / 2, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if time.monotonic() + delay >= deadline:
+            return None
+        self.retries += 1
+        return delay
+
+    def stats(self) -> Dict[str, float]:
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1)
+
+        return {
+            "rate_per_sec": self.rate_per_sec,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "queue_wait_ms_p50": percentile(0.5),
+            "queue_wait_ms_p95": percentile(0.95),
+            "queue_wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
+
+
+# Один лимитер на каждый внешний API
+limiters: Dict[str, UpstreamLimiter] = {
+    "neuroapi": UpstreamLimiter(
+        "neuroapi",
+        rate_per_sec=config.NEUROAPI_RATE_LIMIT_PER_SEC,
+        burst=config.NEUROAPI_RATE_LIMIT_BURST,
+        max_in_flight=config.NEUROAPI_MAX_IN_FLIGHT,
+    ),
+    "yandexgpt": UpstreamLimiter(
+        "yandexgpt",
+        rate_per_sec=config.YC_GPT_RATE_LIMIT_PER_SEC,
+        burst=config.YC_GPT_RATE_LIMIT_BURST,
+        max_in_flight=config.YC_GPT_MAX_IN_FLIGHT,
+    ),
+    "speechkit": UpstreamLimiter(
+        "speechkit",
+        rate_per_sec=config.SPEECHKIT_RATE_LIMIT_PER_SEC,
+        burst=config.SPEECHKIT_RATE_LIMIT_BURST,
+        max_in_flight=config.SPEECHKIT_MAX_IN_FLIGHT,
+    ),
+}
@@ -0,0 +1,69 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+IDLE = "idle"
+WARMING = "warming"
+READY = "ready"
+
+WarmupStep = Callable[[], Awaitable[object]]
+
+
+class WarmUp:
+    """Startup warm-up: runs named steps concurrently before the bot takes traffic.
+
+    Each step gets the same timeout; a failed or slow step is logged and
+    recorded but does not stop the startup (the request path still works,
+    just without the head start). state is "warming" while run() is in
+    progress and "ready" afterwards, which /health reports.
+    """
+
+    def __init__(self):
+        self.state = IDLE
+        self.steps: Dict[str, Dict[str, object]] = {}
+        self.duration_ms: Optional[float] = None
+
+    @property
+    def warming(self) -> bool:
+        return self.state == WARMING
+
+    async def _run_step(self, name: str, step: WarmupStep, timeout: float) -> None:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(step(), timeout)
+            result = {"ok": True}
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up step {name} timed out after {timeout}s")
+            result = {"ok": False, "error": "timeout"}
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+            result = {"ok": False, "error": str(e)[:200]}
+        result["ms"] = round((time.monotonic() - started) * 1000, 1)
+        self.steps[name] = result
+
+    async def run(self, steps: Dict[str, WarmupStep], timeout: float) -> None:
+        """Run all steps concurrently, then switch to ready"""
+        self.state = WARMING
+        self.steps = {}
+        started = time.monotonic()
+        try:
+            await asyncio.gather(*(self._run_step(name, step, timeout) for name, step in steps.items()))
+        finally:
+            self.duration_ms = round((time.monotonic() - started) * 1000, 1)
+            self.state = READY
+        failed = [name for name, result in self.steps.items() if not result["ok"]]
+        logger.info(f"Warm-up finished in {self.duration_ms} ms" + (f", failed: {', '.join(failed)}" if failed else ""))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "duration_ms": self.duration_ms,
+            "steps": dict(self.steps),
+        }
+
+
+# Global warm-up state
+warmup = WarmUp()
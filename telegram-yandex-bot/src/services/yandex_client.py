@@ -1,11 +1,26 @@
+import time
+import asyncio
+import aiohttp
 import requests
 import logging
 from typing import List, Dict, Optional
 from config import config
 from .iam_token_manager import token_manager
+from .context_store import ContextStore, MemoryContextStore
+from .upstream_limiter import limiters, parse_retry_after
+from .http_pool import http_pool
 
 logger = logging.getLogger(__name__)
 
+class YandexGPTError(Exception):
+    """Raised by complete_async when Foundation Models answers with an error status"""
+
+    def __init__(self, status: int, body: str = ""):
+        super().__init__(f"Yandex GPT error {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
 class YandexClient:
     def __init__(self):
         self.api_key = config.YC_API_KEY
@@ -14,19 +29,10 @@ class YandexClient:
         self.model_uri = config.YC_MODEL_URI or f"gpt://{self.folder_id}/yandexgpt/latest"
         self.endpoint = config.YC_FOUNDATION_MODELS_ENDPOINT
         
-        # HTTP session with retries
-        self.session = requests.Session()
-        try:
-            from requests.adapters import HTTPAdapter
-            from urllib3.util import Retry
-            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
-            self.session.mount("https://", HTTPAdapter(max_retries=retries))
-        except Exception:
-            # Fallback: no retries if urllib3 not available
-            pass
+        self.limiter = limiters["yandexgpt"]
 
         # Chat context storage (in-memory for MVP)
-        self.chat_contexts: Dict[int, List[Dict[str, str]]] = {}
+        self.chat_contexts: ContextStore = MemoryContextStore()
         
     def _get_headers(self) -> Dict[str, str]:
         """Get authentication headers for API requests"""
@@ -56,10 +62,9 @@ class YandexClient:
             {"role": "system", "text": "Ты — полезный Telegram-бот. Отвечай дружелюбно и информативно."}
         ]
         
-        if config.ENABLE_CONTEXT and chat_id in self.chat_contexts:
+        if config.ENABLE_CONTEXT:
             # Add recent context (last 10 messages to stay within limits)
-            context = self.chat_contexts[chat_id][-10:]
-            messages.extend(context)
+            messages.extend(self.chat_contexts.recent(chat_id, 10))
             
         messages.append({"role": "user", "text": user_message})
         return messages
@@ -69,18 +74,11 @@ class YandexClient:
         if not config.ENABLE_CONTEXT:
             return
             
-        if chat_id not in self.chat_contexts:
-            self.chat_contexts[chat_id] = []
-            
-        context = self.chat_contexts[chat_id]
-        context.extend([
+        # Keep only last 20 messages (10 pairs) to manage memory
+        self.chat_contexts.append(chat_id, [
             {"role": "user", "text": user_message},
             {"role": "assistant", "text": assistant_response}
-        ])
-        
-        # Keep only last 20 messages (10 pairs) to manage memory
-        if len(context) > 20:
-            self.chat_contexts[chat_id] = context[-20:]
+        ], 20)
     
     def get_response(self, user_message: str, chat_id: int) -> str:
         """Get response from Yandex GPT using Foundation Models API"""
@@ -107,7 +105,7 @@ class YandexClient:
             }
             
             logger.info(f"Sending request to Yandex GPT for chat {chat_id}")
-            response = requests.post(
+            response = http_pool.sync_session.post(
                 self.endpoint, 
                 headers=headers, 
                 json=payload,
@@ -135,6 +133,50 @@ class YandexClient:
             logger.error(f"Unexpected error for chat {chat_id}: {str(e)}")
             return "Произошла техническая ошибка. Попробуйте позже."
 
+    @property
+    def configured(self) -> bool:
+        """True if the folder and some credentials are set"""
+        return bool(self.folder_id and (self.iam_token or self.api_key or config.YC_SA_KEY_FILE or config.YC_SA_KEY_JSON))
+
+    @staticmethod
+    def to_yandex_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Translate OpenAI-style chat messages (content) to Foundation Models ones (text)"""
+        return [{"role": message["role"], "text": message["content"]} for message in messages]
+
+    async def complete_async(self, messages: List[Dict[str, str]], timeout: float) -> Optional[str]:
+        """Single async completion for OpenAI-style messages (no context bookkeeping).
+
+        Used as a failover backend: raises on HTTP errors instead of
+        returning an apology, so the caller can account for the failure.
+        """
+        # IAM-токен может обновляться по сети - не блокируем event loop
+        headers = await asyncio.to_thread(self._get_headers)
+        payload = {
+            "modelUri": self.model_uri,
+            "completionOptions": {
+                "stream": False,
+                "temperature": config.YC_TEMPERATURE,
+                "maxTokens": config.YC_MAX_TOKENS
+            },
+            "messages": self.to_yandex_messages(messages)
+        }
+        deadline = time.monotonic() + timeout
+        async with self.limiter.slot(deadline), http_pool.session(self.endpoint).post(
+            self.endpoint,
+            headers=headers,
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=max(deadline - time.monotonic(), 0.001)),
+        ) as response:
+            if response.status != 200:
+                body = await response.text()
+                if response.status in (429, 503):
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if retry_after is not None:
+                        self.limiter.pause(retry_after)
+                raise YandexGPTError(response.status, body)
+            result = await response.json(content_type=None)
+        return result["result"]["alternatives"][0]["message"]["text"]
+
 # Global client instance
 yandex_client = YandexClient()
 
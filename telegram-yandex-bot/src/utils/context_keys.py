@@ -0,0 +1,30 @@
+from typing import Optional, Union
+
+from telegram import Message, Update
+
+from config import config
+
+ContextKey = Union[int, str]
+
+
+def make_context_key(chat_id: int, is_business_message: bool = False, business_connection_id: Optional[str] = None) -> ContextKey:
+    """Context key used for chat history: chat_id or business_{connection}_{chat}"""
+    if is_business_message:
+        return f"business_{business_connection_id}_{chat_id}"
+    return chat_id
+
+
+def update_context_key(update: Update) -> Optional[ContextKey]:
+    """Context key of the conversation an update belongs to (None if it has no chat)"""
+    business_message = update.business_message or update.edited_business_message
+    if business_message is not None:
+        return make_context_key(business_message.chat.id, True, business_message.business_connection_id)
+    if update.effective_chat is not None:
+        return make_context_key(update.effective_chat.id)
+    return None
+
+
+def is_owner_message(message: Message) -> bool:
+    """True for messages written by the bot owner (OWNER_USER_ID), e.g. in their business chats"""
+    owner_id = getattr(config, "OWNER_USER_ID", None)
+    return bool(owner_id and message.from_user and message.from_user.id == owner_id)
@@ -1,36 +1,238 @@
 import logging
+import logging.handlers
 import os
-import json
+import gzip
+import time
+import queue
+import shutil
+import atexit
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+from config import config
+
 # Создаем директорию для логов если её нет
 log_dir = "logs"
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(log_dir, "error.log"), mode='a', encoding='utf-8'),
-        logging.FileHandler(os.path.join(log_dir, "combined.log"), mode='a', encoding='utf-8'),
-        logging.FileHandler(os.path.join(log_dir, "messages.log"), mode='a', encoding='utf-8'),
-        logging.FileHandler(os.path.join(log_dir, "updates.json"), mode='a', encoding='utf-8'),
-        logging.StreamHandler()  # Вывод в консоль
-    ]
-)
-
-# Настройка консольного вывода для лучшей читаемости
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler over a bounded queue with a drop or block policy under overload.
+
+    The hot path only enqueues the record; formatting and file I/O happen in
+    the listener thread. With policy "drop" a record that does not fit is
+    discarded at once; with "block" the caller waits up to block_timeout for
+    room and the record is dropped only after that. Dropped records are
+    counted and reported by a warning once the queue accepts records again.
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "drop", block_timeout: float = 1.0):
+        super().__init__(log_queue)
+        self.block = policy == "block"
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь внутри процесса: запись не нужно сериализовать и форматировать заранее
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.block:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            return
+        if self._unreported:
+            dropped, self._unreported = self._unreported, 0
+            notice = logging.LogRecord(
+                "utils.logger", logging.WARNING, __file__, 0,
+                f"Log queue overflow: dropped {dropped} records", None, None,
+            )
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                self._unreported += dropped
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room instead of failing on a full queue"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class ExcludeLoggers(logging.Filter):
+    """Drops records of the given loggers (and their children)"""
+
+    def __init__(self, *names: str):
+        super().__init__()
+        self.names = names
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not any(record.name == name or record.name.startswith(f"{name}.") for name in self.names)
+
+
+class OnlyLoggers(ExcludeLoggers):
+    """Passes only records of the given loggers (and their children)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not super().filter(record)
+
+
+class SizeTimeRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """File handler rotating at max_bytes or every interval_sec, whichever comes first.
+
+    A rotated segment is renamed to <file>.<YYYYmmdd-HHMMSS>[.N] and
+    gzip-compressed (in the listener thread, off the event loop); only the
+    newest backup_count segments are kept. 0 disables the size or time
+    trigger, backup_count 0 keeps every segment.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, interval_sec: float = 0, backup_count: int = 0,
+                 compress: bool = True):
+        super().__init__(filename, 'a', encoding='utf-8', delay=True)
+        self.max_bytes = max_bytes
+        self.interval_sec = interval_sec
+        self.backup_count = backup_count
+        self.compress = compress
+        # Интервал отсчитывается от создания текущего файла, а не от запуска процесса
+        started = os.path.getmtime(filename) if os.path.exists(filename) else time.time()
+        self._rollover_at = started + interval_sec if interval_sec > 0 else float("inf")
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.stream is None:
+            self.stream = self._open()
+        size = self.stream.tell()
+        if size == 0:
+            # Пустой файл не ротируем; интервал начинается с первой записи
+            if time.time() >= self._rollover_at:
+                self._rollover_at = time.time() + self.interval_sec
+            return False
+        if time.time() >= self._rollover_at:
+            return True
+        if self.max_bytes > 0:
+            message = f"{self.format(record)}{self.terminator}"
+            return size + len(message.encode('utf-8')) > self.max_bytes
+        return False
+
+    def segments(self) -> list:
+        """Rotated segments of this file, oldest first"""
+        directory, base = os.path.split(self.baseFilename)
+        paths = [os.path.join(directory, name) for name in os.listdir(directory or ".") if name.startswith(f"{base}.")]
+        # Несколько ротаций за секунду различаются суффиксом .N - порядок по времени записи
+        return sorted(paths, key=lambda path: (os.stat(path).st_mtime_ns, path))
+
+    def doRollover(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        target = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}"
+        suffix = ".gz" if self.compress else ""
+        counter = 1
+        candidate = target
+        while os.path.exists(candidate + suffix):
+            candidate = f"{target}.{counter}"
+            counter += 1
+        if self.compress:
+            with open(self.baseFilename, 'rb') as source, gzip.open(candidate + suffix, 'wb') as compressed:
+                shutil.copyfileobj(source, compressed)
+            os.remove(self.baseFilename)
+        else:
+            os.replace(self.baseFilename, candidate)
+        if self.backup_count > 0:
+            for path in self.segments()[:-self.backup_count]:
+                os.remove(path)
+        if self.interval_sec > 0:
+            self._rollover_at = time.time() + self.interval_sec
+        self.stream = self._open()
+
+
+def rotating_handler(name: str) -> SizeTimeRotatingFileHandler:
+    return SizeTimeRotatingFileHandler(
+        os.path.join(log_dir, name),
+        max_bytes=config.LOG_MAX_BYTES,
+        interval_sec=config.LOG_ROTATE_INTERVAL_SEC,
+        backup_count=config.LOG_BACKUP_COUNT,
+        compress=config.LOG_COMPRESS,
+    )
+
+
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# Каждый файл получает только свои записи:
+# error.log - ошибки, combined.log - все, кроме журнала сообщений, messages.log - логгер "messages".
+# Входящие updates пишет services.update_journal в logs/updates.jsonl
+error_handler = rotating_handler("error.log")
+error_handler.setLevel(logging.ERROR)
+error_handler.addFilter(ExcludeLoggers("console"))
+
+combined_handler = rotating_handler("combined.log")
+combined_handler.addFilter(ExcludeLoggers("console", "messages"))
+
+messages_handler = rotating_handler("messages.log")
+messages_handler.addFilter(OnlyLoggers("messages"))
+
+file_handlers = [error_handler, combined_handler, messages_handler]
+for handler in file_handlers:
+    handler.setFormatter(formatter)
+
+# Единственный консольный вывод
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
 console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 console_handler.setFormatter(console_formatter)
+console_handler.addFilter(ExcludeLoggers("messages"))
+
+# Все записи идут через ограниченную очередь; форматирование и запись - в отдельном потоке
+log_queue: queue.Queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+queue_handler = BoundedQueueHandler(log_queue, config.LOG_QUEUE_POLICY, config.LOG_QUEUE_BLOCK_TIMEOUT_SEC)
+log_listener = DrainingQueueListener(log_queue, *file_handlers, console_handler, respect_handler_level=True)
+log_listener.start()
 
-# Добавляем консольный обработчик к корневому логгеру
 root_logger = logging.getLogger()
-root_logger.addHandler(console_handler)
+root_logger.setLevel(logging.INFO)
+root_logger.addHandler(queue_handler)
+
+# Краткие строки для консоли (вместо print)
+console_logger = logging.getLogger("console")
+
+
+def stop_logging() -> None:
+    """Write out everything still queued and switch to direct writes (idempotent).
+
+    Records logged after this (late shutdown messages) go straight to the
+    handlers; logging.shutdown() at exit closes the files.
+    """
+    if log_listener._thread is None:
+        return
+    log_listener.stop()
+    root_logger.removeHandler(queue_handler)
+    for handler in log_listener.handlers:
+        try:
+            handler.flush()
+        except (OSError, ValueError):
+            # Поток консоли уже закрыт при завершении процесса
+            pass
+        root_logger.addHandler(handler)
+
+
+atexit.register(stop_logging)
+
+
+def log_stats() -> Dict[str, Any]:
+    return {
+        "queued": log_queue.qsize(),
+        "capacity": log_queue.maxsize,
+        "policy": "block" if queue_handler.block else "drop",
+        "dropped": queue_handler.dropped,
+    }
+
 
 logger = logging.getLogger(__name__)
 
@@ -57,7 +259,7 @@ def log_message(chat_id: int, user_id: int, username: Optional[str], message_typ
     logger.info(log_entry)
     
     # Выводим краткую информацию в консоль
-    print(f"🔄 {console_entry}")
+    console_logger.info(f"🔄 {console_entry}")
     
     # Создаем отдельный логгер для сообщений
     message_logger = logging.getLogger("messages")
@@ -81,71 +283,4 @@ def log_response(chat_id: int, response_type: str, success: bool, error_msg: Opt
     logger.info(log_entry)
     
     # Выводим краткую информацию в консоль
-    print(f"🤖 {console_entry}")
-
-def log_update_json(update_data: Dict[str, Any]):
-    """Логирует полный JSON входящего update"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Создаем структуру для логирования
-    log_entry = {
-        "timestamp": timestamp,
-        "update": update_data
-    }
-    
-    # Конвертируем в JSON с красивым форматированием
-    json_str = json.dumps(log_entry, ensure_ascii=False, indent=2)
-    
-    # Логируем в отдельный файл для JSON updates
-    update_logger = logging.getLogger("updates")
-    update_logger.info(f"\n{'='*80}\n{json_str}\n{'='*80}")
-    
-    # Логируем краткую информацию в консоль
-    update_id = update_data.get("update_id", "unknown")
-    
-    # Определяем тип update для консоли
-    update_type = "UNKNOWN"
-    if "message" in update_data:
-        if "text" in update_data["message"]:
-            update_type = "TEXT"
-        elif "voice" in update_data["message"]:
-            update_type = "VOICE"
-        elif "photo" in update_data["message"]:
-            update_type = "PHOTO"
-        else:
-            update_type = "MESSAGE"
-    elif "callback_query" in update_data:
-        update_type = "CALLBACK"
-    elif "edited_message" in update_data:
-        update_type = "EDITED"
-    
-    # Получаем информацию о пользователе
-    user_info = "Unknown"
-    if "message" in update_data:
-        from_user = update_data["message"].get("from", {})
-        username = from_user.get("username")
-        first_name = from_user.get("first_name", "")
-        if username:
-            user_info = f"@{username}"
-        elif first_name:
-            user_info = first_name
-    elif "callback_query" in update_data:
-        from_user = update_data["callback_query"].get("from", {})
-        username = from_user.get("username")
-        first_name = from_user.get("first_name", "")
-        if username:
-            user_info = f"@{username}"
-        elif first_name:
-            user_info = first_name
-    
-    # Выводим краткую информацию в консоль
-    console_message = f"📨 UPDATE_ID:{update_id} TYPE:{update_type} USER:{user_info}"
-    
-    # Добавляем содержимое для текстовых сообщений
-    if update_type == "TEXT" and "message" in update_data:
-        text_content = update_data["message"].get("text", "")[:50]
-        if len(text_content) > 50:
-            text_content += "..."
-        console_message += f" CONTENT:{text_content}"
-    
-    logger.info(console_message)
\ No newline at end of file
+    console_logger.info(f"🤖 {console_entry}")
@@ -0,0 +1,112 @@
+import math
+import logging
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TokenEstimator = Callable[[str], int]
+
+# Служебные токены на каждое сообщение чата (роль, разделители)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Реплику короче этого после сокращения не оставляем
+MIN_TRUNCATED_TOKENS = 16
+
+
+def heuristic_tokens(text: str) -> int:
+    """Fast token estimate: about 4 UTF-8 bytes per token.
+
+    Matches BPE tokenizers well enough for budgeting: English averages ~4
+    characters per token, Cyrillic (2 bytes per character) ~2 characters.
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+def _tiktoken_estimator() -> TokenEstimator:
+    import tiktoken
+
+    encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text)) if text else 0
+
+
+_ESTIMATORS: Dict[str, Callable[[], TokenEstimator]] = {
+    "heuristic": lambda: heuristic_tokens,
+    "tiktoken": _tiktoken_estimator,
+}
+
+
+def get_token_estimator(name: str = "heuristic") -> TokenEstimator:
+    """Estimator by name; falls back to the heuristic if it cannot be loaded"""
+    factory = _ESTIMATORS.get(name)
+    if factory is None:
+        logger.warning(f"Unknown token estimator '{name}', using heuristic")
+        return heuristic_tokens
+    try:
+        return factory()
+    except Exception as e:
+        logger.warning(f"Token estimator '{name}' is unavailable ({e}), using heuristic")
+        return heuristic_tokens
+
+
+def message_tokens(message: Dict, estimate: TokenEstimator = heuristic_tokens) -> int:
+    """Tokens of one chat message, using the count cached in the turn when present"""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = estimate(message.get("content", ""))
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_turn(turn: Dict, max_tokens: int, estimate: TokenEstimator = heuristic_tokens) -> Optional[Dict]:
+    """Copy of turn with content cut to about max_tokens (None if too little room is left)"""
+    if max_tokens < MIN_TRUNCATED_TOKENS:
+        return None
+    content = turn.get("content", "")
+    tokens = max(estimate(content), 1)
+    cut = len(content) * max_tokens // tokens
+    while True:
+        text = content[:cut].rstrip() + " …"
+        text_tokens = estimate(text)
+        if text_tokens <= max_tokens or cut == 0:
+            return {**turn, "content": text, "tokens": text_tokens}
+        cut = cut * 9 // 10
+
+
+def fit_to_budget(turns: List[Dict], budget: int, estimate: TokenEstimator = heuristic_tokens, keep_last: int = 2) -> List[Dict]:
+    """Newest-first selection of turns that fit into budget tokens (chronological order).
+
+    The last keep_last turns (the latest exchange) are always kept: when
+    they do not fit, the longest of them are truncated to share the budget.
+    Older turns are added newest first until one does not fit.
+    """
+    latest = turns[-keep_last:] if keep_last > 0 else []
+    older = turns[:len(turns) - len(latest)]
+    costs = [message_tokens(turn, estimate) for turn in latest]
+
+    if sum(costs) > budget:
+        # Делим бюджет поровну, короткие реплики отдают излишек длинным
+        allowance = {}
+        remaining = max(budget, 0)
+        order = sorted(range(len(latest)), key=lambda i: costs[i])
+        for position, i in enumerate(order):
+            allowance[i] = min(costs[i], remaining // (len(order) - position))
+            remaining -= allowance[i]
+        kept = []
+        for i, turn in enumerate(latest):
+            if allowance[i] < costs[i]:
+                turn = truncate_turn(turn, allowance[i] - MESSAGE_OVERHEAD_TOKENS, estimate)
+            if turn is not None:
+                kept.append(turn)
+        return kept
+
+    budget -= sum(costs)
+    selected = []
+    for turn in reversed(older):
+        cost = message_tokens(turn, estimate)
+        if cost > budget:
+            break
+        budget -= cost
+        selected.append(turn)
+    selected.reverse()
+    return selected + latest
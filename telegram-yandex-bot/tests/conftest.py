@@ -51,7 +51,8 @@ def test_config():
         'YC_FOUNDATION_MODELS_ENDPOINT': 'https://test.endpoint/completion',
         'YC_STT_ENDPOINT': 'https://test.endpoint/stt',
         'YC_TTS_ENDPOINT': 'https://test.endpoint/tts',
-        'YC_IAM_ENDPOINT': 'https://test.endpoint/iam'
+        'YC_IAM_ENDPOINT': 'https://test.endpoint/iam',
+        'NEUROAPI_ENDPOINT': 'https://test.endpoint/chat/completions'
     }
 
 
@@ -300,6 +301,12 @@ def setup_test_environment():
             del os.environ[var]
 
 
+@pytest.fixture(autouse=True)
+def isolated_context_db(tmp_path, monkeypatch):
+    """Отдельный файл SQLite-хранилища контекстов на каждый тест"""
+    monkeypatch.setattr('services.context_store.config.CONTEXT_DB_FILE', str(tmp_path / "chat_contexts.db"))
+
+
 @pytest.fixture
 def skip_webhook_tests():
     """Фикстура для пропуска тестов webhook локально"""
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 import sys
 import os
 
@@ -30,7 +30,7 @@ class TestBot(unittest.TestCase):
         except Exception as e:
             self.fail(f"Bot initialization failed with exception: {e}")
 
-    @patch('handlers.commands.get_gpt_response')
+    @patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock)
     def test_command_handlers_import(self, mock_gpt):
         """Test that command handlers can be imported"""
         mock_gpt.return_value = "Test response"
@@ -4,6 +4,7 @@
 import pytest
 import sys
 import os
+import json
 from unittest.mock import patch, Mock, AsyncMock, MagicMock
 from datetime import datetime
 
@@ -11,9 +12,11 @@ from datetime import datetime
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
 
 from bot import (
-    log_all_updates, webhook_handler, health_handler, status_handler,
+    webhook_handler, health_handler, status_handler,
     setup_webhook, init_app, main, start_server
 )
+from services.update_dedup import UpdateDeduplicator
+from services.update_journal import UpdateJournal
 
 
 @pytest.mark.handlers
@@ -40,45 +43,12 @@ class TestBotEnhanced:
             }
         }
 
-    @pytest.mark.asyncio
-    async def test_log_all_updates_success(self, mock_update_data):
-        """Тест успешного логирования всех updates"""
-        # Создаем мок Update объекта
-        mock_update = Mock()
-        mock_update.to_dict.return_value = mock_update_data
-        
-        with patch('bot.log_update_json') as mock_log_update_json, \
-             patch('bot.logger') as mock_logger:
-            
-            await log_all_updates(mock_update, None)
-            
-            # Проверяем что update был конвертирован в словарь
-            mock_update.to_dict.assert_called_once()
-            
-            # Проверяем что JSON был залогирован
-            mock_log_update_json.assert_called_once_with(mock_update_data)
-
-    @pytest.mark.asyncio
-    async def test_log_all_updates_error(self, mock_update_data):
-        """Тест обработки ошибки при логировании updates"""
-        # Создаем мок Update объекта с ошибкой
-        mock_update = Mock()
-        mock_update.to_dict.side_effect = Exception("Conversion error")
-        
-        with patch('bot.logger') as mock_logger:
-            await log_all_updates(mock_update, None)
-            
-            # Проверяем что ошибка была залогирована
-            mock_logger.error.assert_called_once()
-            error_call = mock_logger.error.call_args[0][0]
-            assert "Error logging update JSON" in error_call
-
     @pytest.mark.asyncio
     async def test_webhook_handler_success(self, mock_update_data):
         """Тест успешной обработки webhook"""
         # Создаем мок запроса
         mock_request = Mock()
-        mock_request.json = AsyncMock(return_value=mock_update_data)
+        mock_request.read = AsyncMock(return_value=json.dumps(mock_update_data).encode())
         
         # Создаем мок application
         mock_application = Mock()
@@ -101,12 +71,153 @@ class TestBotEnhanced:
             assert response.status == 200
             assert response.text == "OK"
 
+    @pytest.mark.asyncio
+    async def test_webhook_handler_fast_ack(self, mock_update_data):
+        """Тест fast-ack: update ставится в очередь без обработки"""
+        mock_request = Mock()
+        mock_request.read = AsyncMock(return_value=json.dumps(mock_update_data).encode())
+        
+        mock_application = Mock()
+        mock_application.process_update = AsyncMock()
+        
+        mock_queue = Mock()
+        mock_queue.submit = AsyncMock(return_value=True)
+        
+        with patch('bot.application', mock_application), \
+             patch('bot.update_queue', mock_queue), \
+             patch('bot.Update') as mock_update_class:
+            
+            mock_update_instance = Mock()
+            mock_update_class.de_json.return_value = mock_update_instance
+            
+            response = await webhook_handler(mock_request)
+            
+            mock_queue.submit.assert_awaited_once_with(mock_update_instance)
+            mock_application.process_update.assert_not_called()
+            assert response.status == 200
+            assert response.text == "OK"
+
+    @pytest.mark.asyncio
+    async def test_webhook_handler_fast_ack_queue_full(self, mock_update_data):
+        """Тест fast-ack: переполненная очередь отвечает 503"""
+        mock_request = Mock()
+        mock_request.read = AsyncMock(return_value=json.dumps(mock_update_data).encode())
+        
+        mock_queue = Mock()
+        mock_queue.submit = AsyncMock(return_value=False)
+        
+        with patch('bot.application', Mock()), \
+             patch('bot.update_queue', mock_queue), \
+             patch('bot.Update'):
+            
+            response = await webhook_handler(mock_request)
+            
+            assert response.status == 503
+
+    @pytest.mark.asyncio
+    async def test_webhook_handler_rejected_update_does_not_supersede(self, mock_update_data):
+        """Тест: отклоненный очередью update не отменяет незаконченный ответ, принятый - отменяет"""
+        mock_request = Mock()
+        mock_request.read = AsyncMock(return_value=json.dumps(mock_update_data).encode())
+        
+        mock_queue = Mock()
+        mock_queue.submit = AsyncMock(return_value=False)
+        registry = Mock(enabled=True)
+        
+        with patch('bot.application', Mock()), \
+             patch('bot.update_queue', mock_queue), \
+             patch('bot.inflight_registry', registry), \
+             patch('bot.Update'):
+            
+            assert (await webhook_handler(mock_request)).status == 503
+            registry.observe.assert_not_called()
+            
+            mock_queue.submit.return_value = True
+            assert (await webhook_handler(mock_request)).status == 200
+            registry.observe.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_webhook_handler_drops_duplicate(self, mock_update_data):
+        """Тест: повторная доставка update не обрабатывается"""
+        mock_request = Mock()
+        mock_request.read = AsyncMock(return_value=json.dumps(mock_update_data).encode())
+        
+        mock_application = Mock()
+        mock_application.process_update = AsyncMock()
+        
+        dedup = UpdateDeduplicator(capacity=100, ttl_sec=60)
+        
+        with patch('bot.application', mock_application), \
+             patch('bot.update_deduplicator', dedup), \
+             patch('bot.update_queue', None), \
+             patch('bot.Update'):
+            
+            first = await webhook_handler(mock_request)
+            second = await webhook_handler(mock_request)
+            
+            assert first.status == 200
+            assert second.status == 200
+            mock_application.process_update.assert_called_once()
+            assert dedup.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_webhook_handler_failure_allows_redelivery(self, mock_update_data):
+        """Тест: после ошибки обработки повторная доставка не отсеивается"""
+        mock_request = Mock()
+        mock_request.read = AsyncMock(return_value=json.dumps(mock_update_data).encode())
+        
+        mock_application = Mock()
+        mock_application.process_update = AsyncMock(side_effect=[Exception("boom"), None])
+        
+        dedup = UpdateDeduplicator(capacity=100, ttl_sec=60)
+        
+        with patch('bot.application', mock_application), \
+             patch('bot.update_deduplicator', dedup), \
+             patch('bot.update_queue', None), \
+             patch('bot.Update'), \
+             patch('bot.log_error'):
+            
+            first = await webhook_handler(mock_request)
+            second = await webhook_handler(mock_request)
+            
+            assert first.status == 500
+            assert second.status == 200
+            assert mock_application.process_update.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_webhook_handler_journals_raw_body(self, tmp_path):
+        """Тест: в журнал попадает исходное тело запроса, в том числе business update"""
+        body = b'{"update_id":7,"business_message":{"message_id":1,"text":"\\u041f\\u0440\\u0438\\u0432\\u0435\\u0442","business_connection_id":"conn"}}'
+        mock_request = Mock()
+        mock_request.read = AsyncMock(return_value=body)
+        
+        mock_application = Mock()
+        mock_application.process_update = AsyncMock()
+        journal = UpdateJournal(str(tmp_path / "updates.jsonl"))
+        journal.start()
+        
+        with patch('bot.application', mock_application), \
+             patch('bot.update_journal', journal), \
+             patch('bot.update_deduplicator', None), \
+             patch('bot.update_queue', None), \
+             patch('bot.Update'):
+            response = await webhook_handler(mock_request)
+        journal.close()
+        
+        assert response.status == 200
+        with open(tmp_path / "updates.jsonl", 'rb') as f:
+            line = f.read()
+        assert line.endswith(body + b'}\n')
+        record = json.loads(line)
+        assert record["update"]["business_message"]["text"] == "Привет"
+        assert record["ts"] > 0
+
     @pytest.mark.asyncio
     async def test_webhook_handler_no_application(self, mock_update_data):
         """Тест обработки webhook без инициализированного application"""
         # Создаем мок запроса
         mock_request = Mock()
-        mock_request.json = AsyncMock(return_value=mock_update_data)
+        mock_request.read = AsyncMock(return_value=json.dumps(mock_update_data).encode())
         
         with patch('bot.application', None), \
              patch('bot.log_error') as mock_log_error:
@@ -125,7 +236,7 @@ class TestBotEnhanced:
         """Тест обработки ошибки в webhook"""
         # Создаем мок запроса с ошибкой
         mock_request = Mock()
-        mock_request.json = AsyncMock(side_effect=Exception("JSON error"))
+        mock_request.read = AsyncMock(side_effect=Exception("JSON error"))
         
         with patch('bot.log_error') as mock_log_error:
             response = await webhook_handler(mock_request)
@@ -150,6 +261,15 @@ class TestBotEnhanced:
         assert response.status == 200
         assert response.text == "OK"
 
+    @pytest.mark.asyncio
+    async def test_health_handler_warming(self):
+        """Тест: пока идет прогрев, health check отвечает warming"""
+        with patch('bot.warmup.state', 'warming'):
+            response = await health_handler(Mock())
+        
+        assert response.status == 503
+        assert response.text == "warming"
+
     @pytest.mark.asyncio
     async def test_status_handler(self, mock_config):
         """Тест status handler"""
@@ -297,6 +417,7 @@ class TestBotEnhanced:
         
         with patch('bot.application', mock_application), \
              patch('bot.setup_webhook') as mock_setup_webhook, \
+             patch('bot.warmup.run', new_callable=AsyncMock) as mock_warmup, \
              patch('bot.init_app') as mock_init_app, \
              patch('bot.web.AppRunner') as mock_app_runner_class, \
              patch('bot.web.TCPSite') as mock_tcp_site_class, \
@@ -328,6 +449,7 @@ class TestBotEnhanced:
                 # Проверяем что сервер был запущен
                 mock_application.initialize.assert_called_once()
                 mock_setup_webhook.assert_called_once()
+                mock_warmup.assert_awaited_once()
                 mock_app_runner.setup.assert_called_once()
                 mock_tcp_site.start.assert_called_once()
                 
@@ -364,10 +486,11 @@ class TestBotEnhanced:
             assert mock_logger is not None
             
             # Проверяем что функции логирования доступны
-            from bot import log_info, log_error, log_update_json
+            import bot
+            from bot import log_info, log_error
             assert callable(log_info)
             assert callable(log_error)
-            assert callable(log_update_json)
+            assert hasattr(bot, "update_journal")
 
     def test_application_global_variable(self):
         """Тест глобальной переменной application"""
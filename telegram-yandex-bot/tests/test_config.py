@@ -161,6 +161,8 @@ class TestConfig:
         assert test_config.YC_STT_ENDPOINT == "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
         assert test_config.YC_TTS_ENDPOINT == "https://tts.api.cloud.yandex.net/speech/v1/tts:synthesize"
         assert test_config.YC_IAM_ENDPOINT == "https://iam.api.cloud.yandex.net/iam/v1/tokens"
+        assert test_config.NEUROAPI_ENDPOINT == "https://neuroapi.host/v1/chat/completions"
+        assert test_config.TELEGRAM_API_BASE_URL == "https://api.telegram.org/bot"
 
     def test_config_instance(self):
         """Тест глобального экземпляра конфигурации"""
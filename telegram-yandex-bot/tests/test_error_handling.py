@@ -30,7 +30,7 @@ class TestErrorHandling:
         """Тест обработки ошибки API NeuroAPI"""
         from services.neuroapi_client import NeuroAPIClient
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             # Мокаем ошибку API
             mock_response = Mock()
             mock_response.status_code = 429  # Too Many Requests
@@ -47,7 +47,7 @@ class TestErrorHandling:
         """Тест обработки сетевой ошибки NeuroAPI"""
         from services.neuroapi_client import NeuroAPIClient
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             # Мокаем сетевую ошибку
             mock_post.side_effect = requests.exceptions.ConnectionError("Connection failed")
             
@@ -61,7 +61,7 @@ class TestErrorHandling:
         """Тест обработки таймаута NeuroAPI"""
         from services.neuroapi_client import NeuroAPIClient
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             # Мокаем таймаут
             mock_post.side_effect = requests.exceptions.Timeout("Request timeout")
             
@@ -75,7 +75,7 @@ class TestErrorHandling:
         """Тест обработки невалидного ответа NeuroAPI"""
         from services.neuroapi_client import NeuroAPIClient
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             # Мокаем невалидный ответ
             mock_response = Mock()
             mock_response.status_code = 200
@@ -92,7 +92,7 @@ class TestErrorHandling:
         """Тест обработки ошибки API Speech клиента"""
         from services.speech_client import SpeechClient
         
-        with patch('services.speech_client.requests.post') as mock_post:
+        with patch('services.speech_client.http_pool.sync_session.post') as mock_post:
             # Мокаем ошибку API
             mock_response = Mock()
             mock_response.status_code = 400
@@ -109,7 +109,7 @@ class TestErrorHandling:
         """Тест обработки сетевой ошибки Speech клиента"""
         from services.speech_client import SpeechClient
         
-        with patch('services.speech_client.requests.post') as mock_post:
+        with patch('services.speech_client.http_pool.sync_session.post') as mock_post:
             # Мокаем сетевую ошибку
             mock_post.side_effect = requests.exceptions.ConnectionError("Connection failed")
             
@@ -123,7 +123,7 @@ class TestErrorHandling:
         """Тест обработки ошибки IAM Token Manager"""
         from services.iam_token_manager import IamTokenManager
         
-        with patch('services.iam_token_manager.requests.post') as mock_post:
+        with patch('services.iam_token_manager.http_pool.sync_session.post') as mock_post:
             # Мокаем ошибку API
             mock_response = Mock()
             mock_response.status_code = 401
@@ -154,7 +154,7 @@ class TestErrorHandling:
         """Тест обработки ошибки Telegram в обработчике команд"""
         from handlers.commands import handle_text_message
         
-        with patch('handlers.commands.get_gpt_response', return_value="Ответ") as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ") as mock_gpt, \
              patch('handlers.commands._send_typing_status', new_callable=AsyncMock), \
              patch('handlers.commands._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
              patch('handlers.commands.log_message'), \
@@ -179,7 +179,7 @@ class TestErrorHandling:
         """Тест обработки сетевой ошибки в обработчике команд"""
         from handlers.commands import handle_text_message
         
-        with patch('handlers.commands.get_gpt_response', side_effect=Exception("Network error")) as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, side_effect=Exception("Network error")) as mock_gpt, \
              patch('handlers.commands._send_typing_status', new_callable=AsyncMock), \
              patch('handlers.commands.log_message'), \
              patch('handlers.commands.log_response') as mock_log_response:
@@ -232,7 +232,7 @@ class TestErrorHandling:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value=None) as mock_stt, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value=None) as mock_stt, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message'), \
                  patch('handlers.voice.log_response') as mock_log_response:
@@ -263,9 +263,9 @@ class TestErrorHandling:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value="Распознанный текст") as mock_stt, \
-                 patch('handlers.voice.get_gpt_response', return_value="Ответ от GPT") as mock_gpt, \
-                 patch('handlers.voice.speech_client.text_to_speech', return_value=None) as mock_tts, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value="Распознанный текст") as mock_stt, \
+                 patch('handlers.voice.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ от GPT") as mock_gpt, \
+                 patch('handlers.voice.speech_client.text_to_speech_async', new_callable=AsyncMock, return_value=None) as mock_tts, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message'), \
                  patch('handlers.voice.log_response') as mock_log_response, \
@@ -350,7 +350,7 @@ class TestErrorHandling:
         
         # Создаем мок запроса с ошибкой
         mock_request = Mock()
-        mock_request.json = AsyncMock(side_effect=Exception("JSON error"))
+        mock_request.read = AsyncMock(side_effect=Exception("JSON error"))
         
         with patch('bot.log_error') as mock_log_error:
             import asyncio
@@ -369,7 +369,7 @@ class TestErrorHandling:
         
         # Создаем мок запроса
         mock_request = Mock()
-        mock_request.json = AsyncMock(return_value={"update_id": 1})
+        mock_request.read = AsyncMock(return_value=b'{"update_id": 1}')
         
         with patch('bot.application', None), \
              patch('bot.log_error') as mock_log_error:
@@ -388,7 +388,7 @@ class TestErrorHandling:
         """Тест логики повторных попыток NeuroAPI"""
         from services.neuroapi_client import NeuroAPIClient
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             # Первый ответ пустой, второй успешный
             empty_response = Mock()
             empty_response.status_code = 200
@@ -423,7 +423,7 @@ class TestErrorHandling:
         """Тест fallback ответов при ошибках"""
         from services.neuroapi_client import NeuroAPIClient
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             # Мокаем ошибку API
             mock_response = Mock()
             mock_response.status_code = 500
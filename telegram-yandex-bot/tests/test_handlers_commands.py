@@ -10,6 +10,7 @@ from unittest.mock import patch, Mock, AsyncMock
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
 
 from handlers.commands import start, help_command, ping_command, handle_text_message, handle_business_message
+from services.message_coalescer import MessageCoalescer
 
 
 @pytest.mark.handlers
@@ -162,7 +163,7 @@ class TestCommandHandlers:
     @pytest.mark.asyncio
     async def test_handle_text_message_success(self, mock_update, mock_context, mock_config):
         """Тест успешной обработки текстового сообщения"""
-        with patch('handlers.commands.get_gpt_response', return_value="Тестовый ответ") as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, return_value="Тестовый ответ") as mock_gpt, \
              patch('handlers.commands._send_typing_status', new_callable=AsyncMock) as mock_typing, \
              patch('handlers.commands._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
              patch('handlers.commands.log_message') as mock_log_message, \
@@ -183,6 +184,75 @@ class TestCommandHandlers:
             mock_log_message.assert_called_once()
             mock_log_response.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_handle_text_message_streaming(self, mock_update, mock_context):
+        """Тест: в режиме стриминга ответ показывается по мере генерации"""
+        mock_context.bot.send_message = AsyncMock(return_value=Mock(message_id=10))
+        mock_context.bot.edit_message_text = AsyncMock()
+
+        async def fake_stream(user_message, on_text, chat_id):
+            await on_text("Тест")
+            return "Тестовый ответ"
+
+        with patch('handlers.commands.stream_gpt_response_async', side_effect=fake_stream) as mock_stream, \
+             patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock) as mock_gpt, \
+             patch('handlers.commands._send_typing_status', new_callable=AsyncMock), \
+             patch('handlers.commands.log_message'), \
+             patch('handlers.commands.log_response'), \
+             patch('handlers.commands.config') as mock_config:
+            mock_config.OWNER_USER_ID = None
+            mock_config.ENABLE_STREAMING = True
+            mock_config.STREAM_EDIT_INTERVAL_SEC = 1.0
+
+            await handle_text_message(mock_update, mock_context)
+
+        mock_stream.assert_called_once()
+        mock_gpt.assert_not_called()
+        assert mock_context.bot.send_message.call_args[1]["text"] == "Тест"
+        assert mock_context.bot.edit_message_text.call_args[1]["text"] == "Тестовый ответ"
+
+    @pytest.mark.asyncio
+    async def test_handle_text_message_coalesced(self, mock_update, mock_context):
+        """Тест: серия сообщений чата отвечается одним запросом к GPT"""
+        coalescer = MessageCoalescer(0.01, 1)
+        # Второе сообщение уже замечено на входе webhook
+        coalescer.add(67890, 2, "И еще вопрос")
+
+        with patch('handlers.commands.message_coalescer', coalescer), \
+             patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ") as mock_gpt, \
+             patch('handlers.commands._send_typing_status', new_callable=AsyncMock) as mock_typing, \
+             patch('handlers.commands._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
+             patch('handlers.commands.log_message'), \
+             patch('handlers.commands.log_response'), \
+             patch('handlers.commands.config') as mock_config:
+            mock_config.OWNER_USER_ID = None
+            mock_config.ENABLE_STREAMING = False
+            await handle_text_message(mock_update, mock_context)
+
+            mock_update.message.message_id = 2
+            mock_update.message.text = "И еще вопрос"
+            await handle_text_message(mock_update, mock_context)
+
+        mock_gpt.assert_called_once_with("Тестовое сообщение\nИ еще вопрос", 67890)
+        mock_typing.assert_called_once()
+        mock_reply.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_handle_text_message_superseded(self, mock_update, mock_context):
+        """Тест: ответ на сообщение, вытесненное более новым, не отправляется"""
+        with patch('handlers.commands.inflight_registry.run', new_callable=AsyncMock, return_value=None), \
+             patch('handlers.commands._send_typing_status', new_callable=AsyncMock), \
+             patch('handlers.commands._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
+             patch('handlers.commands.log_message'), \
+             patch('handlers.commands.log_response') as mock_log_response, \
+             patch('handlers.commands.config') as mock_config:
+            mock_config.OWNER_USER_ID = None
+            mock_config.ENABLE_STREAMING = False
+            await handle_text_message(mock_update, mock_context)
+
+        mock_reply.assert_not_called()
+        mock_log_response.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_handle_text_message_business_message(self, mock_business_update, mock_context):
         """Тест обработки текстового сообщения как бизнес-сообщения"""
@@ -195,7 +265,7 @@ class TestCommandHandlers:
     @pytest.mark.asyncio
     async def test_handle_text_message_error(self, mock_update, mock_context):
         """Тест обработки ошибки при обработке текстового сообщения"""
-        with patch('handlers.commands.get_gpt_response', side_effect=Exception("GPT Error")) as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, side_effect=Exception("GPT Error")) as mock_gpt, \
              patch('handlers.commands._send_typing_status', new_callable=AsyncMock), \
              patch('handlers.commands.log_message'), \
              patch('handlers.commands.log_response') as mock_log_response:
@@ -214,7 +284,7 @@ class TestCommandHandlers:
     @pytest.mark.asyncio
     async def test_handle_business_message_success(self, mock_business_update, mock_context, mock_config):
         """Тест успешной обработки бизнес-сообщения"""
-        with patch('handlers.commands.get_gpt_response', return_value="Бизнес ответ") as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, return_value="Бизнес ответ") as mock_gpt, \
              patch('handlers.commands._send_business_typing_status', new_callable=AsyncMock) as mock_typing, \
              patch('handlers.commands._reply_business_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
              patch('handlers.commands.log_message') as mock_log_message, \
@@ -257,7 +327,7 @@ class TestCommandHandlers:
     @pytest.mark.asyncio
     async def test_handle_business_message_error(self, mock_business_update, mock_context):
         """Тест обработки ошибки при обработке бизнес-сообщения"""
-        with patch('handlers.commands.get_gpt_response', side_effect=Exception("Business Error")) as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, side_effect=Exception("Business Error")) as mock_gpt, \
              patch('handlers.commands._send_business_typing_status', new_callable=AsyncMock), \
              patch('handlers.commands.log_message'), \
              patch('handlers.commands.log_response') as mock_log_response, \
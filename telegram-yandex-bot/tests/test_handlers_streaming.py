@@ -0,0 +1,164 @@
+"""
+Тесты для потоковой отправки ответа в Telegram.
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch, Mock, AsyncMock
+from telegram.error import BadRequest, RetryAfter, TimedOut
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from handlers.streaming import StreamingReply
+
+
+@pytest.mark.handlers
+class TestStreamingReply:
+    """Тесты для StreamingReply"""
+
+    @pytest.fixture
+    def bot(self):
+        bot = Mock()
+        bot.send_message = AsyncMock(return_value=Mock(message_id=777))
+        bot.edit_message_text = AsyncMock()
+        return bot
+
+    @pytest.fixture
+    def sleep(self):
+        """Финальная правка ждет паузу между правками - в тестах без реального ожидания"""
+        with patch('handlers.streaming.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            yield mock_sleep
+
+    @pytest.mark.asyncio
+    async def test_first_chunk_sends_message(self, bot):
+        """Тест: первые токены отправляются новым сообщением"""
+        reply = StreamingReply(bot, 12345, min_interval=1.0)
+
+        await reply.update("   ")
+        bot.send_message.assert_not_called()
+
+        await reply.update("Прив")
+        bot.send_message.assert_awaited_once()
+        assert bot.send_message.call_args[1]["text"] == "Прив"
+        assert reply.message_id == 777
+
+    @pytest.mark.asyncio
+    async def test_edits_are_throttled(self, bot):
+        """Тест: правки не чаще min_interval"""
+        reply = StreamingReply(bot, 12345, min_interval=1.0)
+
+        with patch('handlers.streaming.time.monotonic', return_value=100.0):
+            await reply.update("a")
+            await reply.update("ab")
+        with patch('handlers.streaming.time.monotonic', return_value=100.5):
+            await reply.update("abc")
+        bot.edit_message_text.assert_not_called()
+
+        with patch('handlers.streaming.time.monotonic', return_value=101.1):
+            await reply.update("abcd")
+        bot.edit_message_text.assert_awaited_once()
+        assert bot.edit_message_text.call_args[1]["text"] == "abcd"
+
+    @pytest.mark.asyncio
+    async def test_retry_after_postpones_edits(self, bot):
+        """Тест: RetryAfter от Telegram откладывает следующие правки"""
+        reply = StreamingReply(bot, 12345, min_interval=1.0)
+        bot.edit_message_text.side_effect = RetryAfter(5)
+
+        with patch('handlers.streaming.time.monotonic', return_value=100.0):
+            await reply.update("a")
+        with patch('handlers.streaming.time.monotonic', return_value=102.0):
+            await reply.update("ab")
+        with patch('handlers.streaming.time.monotonic', return_value=104.0):
+            await reply.update("abc")
+
+        assert bot.edit_message_text.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_finish_applies_markdown(self, bot, sleep):
+        """Тест: финальная правка с MarkdownV2"""
+        reply = StreamingReply(bot, 12345)
+        await reply.update("**Итог**")
+
+        await reply.finish("**Итог**")
+
+        kwargs = bot.edit_message_text.call_args[1]
+        assert kwargs["text"] == "*Итог*"
+        assert kwargs["parse_mode"] == "MarkdownV2"
+
+    @pytest.mark.asyncio
+    async def test_finish_falls_back_to_plain_text(self, bot, sleep):
+        """Тест: при ошибке MarkdownV2 финальный текст отправляется без разметки"""
+        reply = StreamingReply(bot, 12345)
+        await reply.update("Часть")
+        bot.edit_message_text.side_effect = [BadRequest("can't parse entities"), None]
+
+        await reply.finish("Часть и конец")
+
+        assert bot.edit_message_text.await_count == 2
+        assert bot.edit_message_text.call_args[1]["text"] == "Часть и конец"
+        assert bot.edit_message_text.call_args[1]["parse_mode"] is None
+
+    @pytest.mark.asyncio
+    async def test_finish_waits_for_edit_interval(self, bot, sleep):
+        """Тест: финальная правка не отправляется раньше min_interval после предыдущей"""
+        reply = StreamingReply(bot, 12345, min_interval=1.0)
+        with patch('handlers.streaming.time.monotonic', return_value=100.0):
+            await reply.update("Часть")
+
+        with patch('handlers.streaming.time.monotonic', return_value=100.4):
+            await reply.finish("Часть и конец")
+
+        assert sleep.await_args[0][0] == pytest.approx(0.6)
+        assert bot.edit_message_text.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_finish_retries_after_retry_after(self, bot, sleep):
+        """Тест: RetryAfter на финальной правке - ждем и повторяем, а не падаем"""
+        reply = StreamingReply(bot, 12345, min_interval=1.0)
+        await reply.update("Часть")
+        bot.edit_message_text.side_effect = [RetryAfter(3), None]
+
+        await reply.finish("**Часть и конец**")
+
+        assert bot.edit_message_text.await_count == 2
+        assert bot.edit_message_text.call_args[1]["text"] == "*Часть и конец*"
+        assert any(call[0][0] == pytest.approx(3, abs=0.1) for call in sleep.await_args_list)
+
+    @pytest.mark.asyncio
+    async def test_finish_swallows_telegram_errors(self, bot, sleep):
+        """Тест: сетевой сбой финальной правки не выходит наружу"""
+        reply = StreamingReply(bot, 12345)
+        await reply.update("Часть")
+        bot.edit_message_text.side_effect = TimedOut()
+
+        await reply.finish("Часть и конец")
+
+        assert bot.edit_message_text.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_finish_without_stream_sends_message(self, bot):
+        """Тест: если токенов не было (fallback), ответ отправляется одним сообщением"""
+        reply = StreamingReply(bot, 12345, business_connection_id="conn")
+
+        await reply.finish("Ответ")
+
+        bot.send_message.assert_awaited_once()
+        assert bot.send_message.call_args[1]["business_connection_id"] == "conn"
+        bot.edit_message_text.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_discard_deletes_partial_reply(self, bot):
+        """Тест: частичный ответ отмененного запроса удаляется"""
+        bot.delete_message = AsyncMock()
+        reply = StreamingReply(bot, 12345, min_interval=1.0)
+
+        await reply.discard()
+        bot.delete_message.assert_not_called()
+
+        await reply.update("Начало")
+        await reply.discard()
+
+        bot.delete_message.assert_awaited_once_with(chat_id=12345, message_id=777)
+        assert reply.message_id is None
@@ -125,8 +125,8 @@ class TestVoiceHandlers:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value="Распознанный текст") as mock_stt, \
-                 patch('handlers.voice.get_gpt_response', return_value="Ответ от GPT") as mock_gpt, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value="Распознанный текст") as mock_stt, \
+                 patch('handlers.voice.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ от GPT") as mock_gpt, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message') as mock_log_message, \
                  patch('handlers.voice.log_response') as mock_log_response:
@@ -161,7 +161,7 @@ class TestVoiceHandlers:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value=None) as mock_stt, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value=None) as mock_stt, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message'), \
                  patch('handlers.voice.log_response') as mock_log_response:
@@ -194,9 +194,9 @@ class TestVoiceHandlers:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value="Распознанный текст") as mock_stt, \
-                 patch('handlers.voice.get_gpt_response', return_value="Ответ от GPT") as mock_gpt, \
-                 patch('handlers.voice.speech_client.text_to_speech', return_value=tts_audio) as mock_tts, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value="Распознанный текст") as mock_stt, \
+                 patch('handlers.voice.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ от GPT") as mock_gpt, \
+                 patch('handlers.voice.speech_client.text_to_speech_async', new_callable=AsyncMock, return_value=tts_audio) as mock_tts, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message'), \
                  patch('handlers.voice.log_response') as mock_log_response, \
@@ -229,9 +229,9 @@ class TestVoiceHandlers:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value="Распознанный текст") as mock_stt, \
-                 patch('handlers.voice.get_gpt_response', return_value="Ответ от GPT") as mock_gpt, \
-                 patch('handlers.voice.speech_client.text_to_speech', return_value=None) as mock_tts, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value="Распознанный текст") as mock_stt, \
+                 patch('handlers.voice.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ от GPT") as mock_gpt, \
+                 patch('handlers.voice.speech_client.text_to_speech_async', new_callable=AsyncMock, return_value=None) as mock_tts, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message'), \
                  patch('handlers.voice.log_response') as mock_log_response, \
@@ -284,8 +284,8 @@ class TestVoiceHandlers:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value="Распознанный текст") as mock_stt, \
-                 patch('handlers.voice.get_gpt_response', return_value="Ответ от GPT") as mock_gpt, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value="Распознанный текст") as mock_stt, \
+                 patch('handlers.voice.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ от GPT") as mock_gpt, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message'), \
                  patch('handlers.voice.log_response') as mock_log_response:
@@ -333,8 +333,8 @@ class TestVoiceHandlers:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value="Распознанный текст") as mock_stt, \
-                 patch('handlers.voice.get_gpt_response', return_value="Ответ от GPT") as mock_gpt, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value="Распознанный текст") as mock_stt, \
+                 patch('handlers.voice.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ от GPT") as mock_gpt, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message') as mock_log_message, \
                  patch('handlers.voice.log_response') as mock_log_response:
@@ -43,7 +43,7 @@ class TestIntegration:
         
         with patch('services.neuroapi_client.os.path.exists', return_value=True), \
              patch('builtins.open', mock_open(read_data=json.dumps(sample_context_data, ensure_ascii=False))), \
-             patch('services.neuroapi_client.requests.post') as mock_post:
+             patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             
             # Мокаем успешный ответ от NeuroAPI
             mock_response = Mock()
@@ -83,7 +83,7 @@ class TestIntegration:
                 mock_token_manager.get_token.return_value = 'test_iam_token'
                 
                 # Мокаем успешный ответ от Speech API
-                with patch('services.speech_client.requests.post') as mock_post:
+                with patch('services.speech_client.http_pool.sync_session.post') as mock_post:
                     mock_response = Mock()
                     mock_response.status_code = 200
                     mock_response.json.return_value = {"result": "Распознанный текст"}
@@ -104,7 +104,7 @@ class TestIntegration:
 
     def test_business_message_flow(self, mock_business_update, mock_context, mock_config):
         """Тест полного потока обработки бизнес-сообщения"""
-        with patch('handlers.commands.get_gpt_response', return_value="Бизнес ответ") as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, return_value="Бизнес ответ") as mock_gpt, \
              patch('handlers.commands._send_business_typing_status', new_callable=AsyncMock) as mock_typing, \
              patch('handlers.commands._reply_business_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
              patch('handlers.commands.log_message') as mock_log_message, \
@@ -138,8 +138,8 @@ class TestIntegration:
             mock_bytesio_instance.getvalue.return_value = audio_data
             mock_bytesio.return_value = mock_bytesio_instance
             
-            with patch('handlers.voice.speech_client.speech_to_text', return_value="Распознанный текст") as mock_stt, \
-                 patch('handlers.voice.get_gpt_response', return_value="Ответ от GPT") as mock_gpt, \
+            with patch('handlers.voice.speech_client.speech_to_text_async', new_callable=AsyncMock, return_value="Распознанный текст") as mock_stt, \
+                 patch('handlers.voice.get_gpt_response_async', new_callable=AsyncMock, return_value="Ответ от GPT") as mock_gpt, \
                  patch('handlers.voice._reply_md_v2_safe', new_callable=AsyncMock) as mock_reply, \
                  patch('handlers.voice.log_message') as mock_log_message, \
                  patch('handlers.voice.log_response') as mock_log_response:
@@ -160,7 +160,7 @@ class TestIntegration:
         context_file = os.path.join(temp_log_dir, "test_contexts.json")
         
         with patch('services.neuroapi_client.os.path.exists', return_value=False), \
-             patch('services.neuroapi_client.requests.post') as mock_post:
+             patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             
             # Мокаем ответы от NeuroAPI
             mock_response = Mock()
@@ -191,7 +191,7 @@ class TestIntegration:
     def test_business_context_isolation(self, temp_log_dir):
         """Тест изоляции контекста между обычными и бизнес-сообщениями"""
         with patch('services.neuroapi_client.os.path.exists', return_value=False), \
-             patch('services.neuroapi_client.requests.post') as mock_post:
+             patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             
             # Мокаем ответы от NeuroAPI
             mock_response = Mock()
@@ -227,7 +227,7 @@ class TestIntegration:
 
     def test_error_handling_integration(self, mock_update, mock_context):
         """Тест интеграции обработки ошибок"""
-        with patch('handlers.commands.get_gpt_response', side_effect=Exception("API Error")) as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, side_effect=Exception("API Error")) as mock_gpt, \
              patch('handlers.commands._send_typing_status', new_callable=AsyncMock), \
              patch('handlers.commands.log_message'), \
              patch('handlers.commands.log_response') as mock_log_response:
@@ -266,7 +266,7 @@ class TestIntegration:
 
     def test_logging_integration(self, mock_update, mock_context):
         """Тест интеграции логирования"""
-        with patch('handlers.commands.get_gpt_response', return_value="Тестовый ответ") as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, return_value="Тестовый ответ") as mock_gpt, \
              patch('handlers.commands._send_typing_status', new_callable=AsyncMock), \
              patch('handlers.commands._reply_md_v2_safe', new_callable=AsyncMock), \
              patch('handlers.commands.log_message') as mock_log_message, \
@@ -293,7 +293,7 @@ class TestIntegration:
         
         # Создаем мок запроса
         mock_request = Mock()
-        mock_request.json = AsyncMock(return_value={
+        mock_request.read = AsyncMock(return_value=json.dumps({
             "update_id": 1,
             "message": {
                 "message_id": 1,
@@ -308,7 +308,7 @@ class TestIntegration:
                     "type": "private"
                 }
             }
-        })
+        }).encode())
         
         with patch('bot.application') as mock_app:
             mock_app.process_update = AsyncMock()
@@ -29,7 +29,7 @@ class TestPerformance:
         """Тест времени ответа NeuroAPI"""
         from services.neuroapi_client import NeuroAPIClient
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             # Мокаем быстрый ответ
             mock_response = Mock()
             mock_response.status_code = 200
@@ -59,7 +59,7 @@ class TestPerformance:
         """Тест времени ответа Speech клиента"""
         from services.speech_client import SpeechClient
         
-        with patch('services.speech_client.requests.post') as mock_post:
+        with patch('services.speech_client.http_pool.sync_session.post') as mock_post:
             # Мокаем быстрый ответ
             mock_response = Mock()
             mock_response.status_code = 200
@@ -150,7 +150,7 @@ class TestPerformance:
         """Тест производительности обработчиков"""
         from handlers.commands import handle_text_message
         
-        with patch('handlers.commands.get_gpt_response', return_value="Быстрый ответ") as mock_gpt, \
+        with patch('handlers.commands.get_gpt_response_async', new_callable=AsyncMock, return_value="Быстрый ответ") as mock_gpt, \
              patch('handlers.commands._send_typing_status', new_callable=AsyncMock), \
              patch('handlers.commands._reply_md_v2_safe', new_callable=AsyncMock), \
              patch('handlers.commands.log_message'), \
@@ -214,7 +214,7 @@ class TestPerformance:
         import threading
         import queue
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             # Мокаем ответы
             mock_response = Mock()
             mock_response.status_code = 200
@@ -261,7 +261,7 @@ class TestPerformance:
         """Тест производительности обработки больших сообщений"""
         from services.neuroapi_client import NeuroAPIClient
         
-        with patch('services.neuroapi_client.requests.post') as mock_post:
+        with patch('services.neuroapi_client.http_pool.sync_session.post') as mock_post:
             mock_response = Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = {
@@ -0,0 +1,69 @@
+"""
+Тесты для инструмента повтора updates (replay_updates.py).
+"""
+import pytest
+import sys
+import os
+import json
+
+# Добавляем src и корень проекта в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from replay_updates import Latency, Replayer, percentiles, read_updates
+
+
+@pytest.mark.utils
+class TestReplayUpdates:
+    """Тесты чтения записей, задержек и расчета этапов"""
+
+    def test_read_legacy_updates_json(self, tmp_path):
+        """Тест: блоки log_update_json между разделителями, строки лога пропускаются"""
+        path = tmp_path / "updates.json"
+        blocks = []
+        for update_id in (1, 2):
+            entry = json.dumps({"timestamp": "2025-09-14 04:38:10", "update": {"update_id": update_id}}, indent=2)
+            blocks.append(f"2025-09-14 04:38:10,995 - updates - INFO - \n{'=' * 80}\n{entry}\n{'=' * 80}\n")
+        path.write_text("2025-09-14 04:38:10,993 - utils.logger - INFO - старт {x}\n" + "".join(blocks), encoding='utf-8')
+
+        records = list(read_updates(str(path)))
+
+        assert [update["update_id"] for _, update in records] == [1, 2]
+        assert records[0][0] == records[1][0] is not None
+
+    def test_read_journal_with_segments(self, tmp_path):
+        """Тест: журнал читается с запечатанными сегментами по порядку"""
+        journal = tmp_path / "updates.jsonl"
+        (tmp_path / "updates.jsonl.1").write_text('{"ts":1.5,"update":{"update_id":1}}\n')
+        journal.write_text('{"ts":2.5,"update":{"update_id":2}}\n{"ts":3.0,"upd')
+
+        assert list(read_updates(str(journal))) == [(1.5, {"update_id": 1}), (2.5, {"update_id": 2})]
+
+    def test_latency_specs(self):
+        """Тест: распределения задержки и неверный формат"""
+        assert Latency("fixed:250").sample() == 0.25
+        assert 0.1 <= Latency("uniform:100:200").sample() <= 0.2
+        assert Latency("lognormal:500:0").sample() == 0.5
+        with pytest.raises(Exception):
+            Latency("pareto:1")
+
+    def test_percentiles(self):
+        """Тест: перцентили по рангу"""
+        result = percentiles([float(i) for i in range(1, 101)])
+
+        assert result == {"count": 100, "p50": 50.0, "p90": 90.0, "p99": 99.0, "max": 100.0}
+        assert percentiles([]) == {"count": 0}
+
+    def test_stages_attributed_to_latest_update_of_chat(self):
+        """Тест: вызовы Telegram API относятся к последнему update того же чата"""
+        replayer = Replayer("http://bot")
+        replayer.injections = [(10.0, 1), (10.5, 2), (11.0, 1)]
+        calls = [(10.1, 1, "sendChatAction"), (10.9, 1, "sendMessage"), (11.2, 1, "sendMessage"),
+                 (11.6, 1, "editMessageText"), (10.7, 2, "sendMessage"), (9.0, 1, "sendMessage")]
+
+        stages = replayer.stages(calls)
+
+        # Вызов до первой отправки не учитывается; ответы: 900, 200 и 600 мс
+        assert stages["first_action"]["count"] == 3
+        assert stages["first_message"] == {"count": 3, "p50": 200.0, "p90": 900.0, "p99": 900.0, "max": 900.0}
+        assert stages["reply"] == {"count": 3, "p50": 600.0, "p90": 900.0, "p99": 900.0, "max": 900.0}
@@ -0,0 +1,175 @@
+"""
+Тесты для журнала изменений контекста.
+"""
+import pytest
+import sys
+import os
+import json
+import glob
+from unittest.mock import patch
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.context_journal import ContextJournal
+
+
+def turns(text):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": f"re: {text}"}]
+
+
+@pytest.mark.services
+class TestContextJournal:
+    """Тесты для ContextJournal"""
+
+    @pytest.fixture
+    def snapshot_file(self, tmp_path):
+        return str(tmp_path / "chat_contexts.json")
+
+    def test_recover_empty(self, snapshot_file):
+        """Тест восстановления без файлов"""
+        journal = ContextJournal(snapshot_file, dict)
+        assert journal.recover() == {}
+
+    def test_recover_legacy_snapshot(self, snapshot_file):
+        """Тест чтения файла контекстов в старом формате"""
+        legacy = {"12345": turns("Привет")}
+        with open(snapshot_file, 'w', encoding='utf-8') as f:
+            json.dump(legacy, f, ensure_ascii=False, indent=2)
+
+        journal = ContextJournal(snapshot_file, dict)
+        assert journal.recover() == legacy
+
+    def test_append_and_replay(self, snapshot_file):
+        """Тест: записи журнала восстанавливаются после перезапуска"""
+        state = {}
+        journal = ContextJournal(snapshot_file, lambda: state)
+        for i in range(3):
+            journal.append("chat", turns(f"m{i}"), max_len=4)
+        journal.close()
+
+        recovered = ContextJournal(snapshot_file, dict).recover()
+        assert recovered == {"chat": turns("m1") + turns("m2")}
+
+    def test_replace_records_overwrite_and_delete(self, snapshot_file):
+        """Тест: записи с replace заменяют историю, пустая - удаляет контекст"""
+        journal = ContextJournal(snapshot_file, dict)
+        journal.append("a", turns("old"), max_len=20)
+        journal.append("a", turns("new"), max_len=2, replace=True)
+        journal.append("b", turns("x"), max_len=20)
+        journal.append("b", [], max_len=0, replace=True)
+        journal.close()
+
+        recovered = ContextJournal(snapshot_file, dict).recover()
+        assert recovered == {"a": turns("new")}
+
+    def test_summary_records_and_snapshot(self, snapshot_file):
+        """Тест: сводки восстанавливаются из журнала и из снимка"""
+        state = {"a": turns("x")}
+        summaries = {}
+        journal = ContextJournal(snapshot_file, lambda: state, summaries_provider=lambda: summaries)
+        journal.append("a", turns("x"), max_len=20)
+        journal.append_summary("a", "сводка 1")
+        journal.close()
+
+        restored = ContextJournal(snapshot_file, dict)
+        restored.recover()
+        assert restored.summaries == {"a": "сводка 1"}
+
+        summaries["a"] = "сводка 2"
+        journal = ContextJournal(snapshot_file, lambda: state, summaries_provider=lambda: summaries)
+        journal.recover()
+        journal.snapshot()
+        journal.close()
+
+        with open(snapshot_file, 'r', encoding='utf-8') as f:
+            assert json.load(f)["summaries"] == {"a": "сводка 2"}
+
+    def test_append_is_constant_size(self, snapshot_file):
+        """Тест: каждая запись - одна строка только с новыми репликами"""
+        journal = ContextJournal(snapshot_file, dict)
+        journal.append("a", turns("x"), max_len=20)
+        journal.append("b", turns("y"), max_len=20)
+        journal.close()
+
+        with open(journal.journal_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        assert len(lines) == 2
+        assert json.loads(lines[1])["m"] == turns("y")
+
+    def test_torn_last_line_is_skipped(self, snapshot_file):
+        """Тест: оборванная запись после падения игнорируется"""
+        journal = ContextJournal(snapshot_file, dict)
+        journal.append("chat", turns("ok"), max_len=20)
+        journal.close()
+        with open(journal.journal_file, 'a', encoding='utf-8') as f:
+            f.write('{"s": 2, "k": "chat", "m": [{"role": "us')
+
+        recovered = ContextJournal(snapshot_file, dict).recover()
+        assert recovered == {"chat": turns("ok")}
+
+    def test_compaction_writes_snapshot_and_drops_journal(self, snapshot_file):
+        """Тест: после compact_every записей пишется снимок"""
+        state = {}
+        journal = ContextJournal(snapshot_file, lambda: state, fsync_interval=0.01, compact_every=3)
+        for i in range(4):
+            # Как в хранилище: список реплик заменяется, а не меняется на месте
+            state["chat"] = state.get("chat", []) + turns(f"m{i}")
+            journal.append("chat", turns(f"m{i}"), max_len=20)
+        journal.close()
+
+        with open(snapshot_file, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        assert snapshot["seq"] == 3
+        assert snapshot["contexts"]["chat"] == turns("m0") + turns("m1") + turns("m2")
+        assert glob.glob(f"{journal.journal_file}.*") == []
+
+        recovered = ContextJournal(snapshot_file, dict).recover()
+        assert recovered["chat"] == state["chat"]
+
+    def test_seal_does_not_copy_histories(self, snapshot_file):
+        """Тест: при запечатывании копируется только словарь, без списков реплик и без fsync"""
+        state = {"chat": turns("m0")}
+        journal = ContextJournal(snapshot_file, lambda: state, fsync_interval=60)
+        journal.append("chat", turns("m0"), max_len=20)
+
+        with patch('services.context_journal.os.fsync') as mock_fsync, journal._lock:
+            seq, snapshot, _ = journal._seal()
+        mock_fsync.assert_not_called()
+        assert seq == 1
+        assert snapshot is not state
+        assert snapshot["chat"] is state["chat"]
+
+        state["chat"] = state["chat"] + turns("m1")
+        assert snapshot["chat"] == turns("m0")
+        journal.close()
+
+    def test_replay_skips_records_covered_by_snapshot(self, snapshot_file):
+        """Тест: сегмент, уже попавший в снимок, не применяется повторно"""
+        with open(snapshot_file, 'w', encoding='utf-8') as f:
+            json.dump({"seq": 1, "contexts": {"chat": turns("m0")}}, f)
+        with open(f"{snapshot_file}.journal.1", 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"s": 1, "k": "chat", "m": turns("m0"), "n": 20}) + "\n")
+        with open(f"{snapshot_file}.journal", 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"s": 2, "k": "chat", "m": turns("m1"), "n": 20}) + "\n")
+
+        recovered = ContextJournal(snapshot_file, dict).recover()
+        assert recovered == {"chat": turns("m0") + turns("m1")}
+
+    def test_manual_snapshot(self, snapshot_file):
+        """Тест синхронного снимка"""
+        state = {"chat": turns("m0")}
+        journal = ContextJournal(snapshot_file, lambda: state)
+        journal.append("chat", turns("m0"), max_len=20)
+        journal.snapshot()
+        journal.close()
+
+        assert not os.path.exists(journal.journal_file)
+        recovered = ContextJournal(snapshot_file, dict).recover()
+        assert recovered == state
+
+    def test_unwritable_path_does_not_raise(self):
+        """Тест: ошибка открытия журнала не ломает обработку сообщений"""
+        journal = ContextJournal("/invalid/path/contexts.json", dict)
+        journal.append("chat", turns("m0"), max_len=20)
+        journal.close()
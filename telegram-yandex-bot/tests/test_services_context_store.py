@@ -0,0 +1,343 @@
+"""
+Тесты для хранилищ контекста чатов.
+"""
+import pytest
+import sys
+import os
+import sqlite3
+from unittest.mock import patch
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.context_store import (
+    CachedContextStore,
+    ContextStore,
+    MemoryContextStore,
+    JournalContextStore,
+    SQLiteContextStore,
+    create_context_store,
+)
+
+
+def turns(text):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": f"re: {text}"}]
+
+
+@pytest.mark.services
+class TestMemoryContextStore:
+    """Тесты для MemoryContextStore"""
+
+    def test_incomplete_store_fails_on_construction(self):
+        """Тест: хранилище без recent/append/summary не создается"""
+        class PartialStore(ContextStore):
+            def __getitem__(self, key): return []
+            def __setitem__(self, key, value): pass
+            def __delitem__(self, key): pass
+            def __iter__(self): return iter(())
+            def __len__(self): return 0
+
+        with pytest.raises(TypeError, match="abstract"):
+            PartialStore()
+
+    def test_int_and_str_keys_are_the_same_context(self):
+        """Тест: ключ 12345 и "12345" указывают на один контекст"""
+        store = MemoryContextStore({"12345": turns("Привет")})
+
+        assert 12345 in store
+        assert store[12345] == turns("Привет")
+        assert store.recent(12345, 1) == turns("Привет")[-1:]
+
+    def test_append_trims_to_max_len(self):
+        """Тест: append оставляет не больше max_len реплик"""
+        store = MemoryContextStore()
+        for i in range(5):
+            store.append(1, turns(f"m{i}"), max_len=4)
+
+        assert store[1] == turns("m3") + turns("m4")
+
+    def test_recent_unknown_key(self):
+        """Тест: recent для неизвестного ключа возвращает пустой список"""
+        assert MemoryContextStore().recent(1, 6) == []
+
+
+@pytest.mark.services
+class TestJournalContextStore:
+    """Тесты для JournalContextStore"""
+
+    @pytest.fixture
+    def snapshot_file(self, tmp_path):
+        return str(tmp_path / "chat_contexts.json")
+
+    def test_int_key_survives_restart(self, snapshot_file):
+        """Тест: контекст, записанный по int chat_id, находится после перезапуска"""
+        store = JournalContextStore(snapshot_file)
+        store.append(12345, turns("Привет"), max_len=20)
+        store.close()
+
+        restored = JournalContextStore(snapshot_file)
+        assert restored.recent(12345, 6) == turns("Привет")
+        restored.close()
+
+    def test_summary_survives_restart(self, snapshot_file):
+        """Тест: сводка контекста переживает перезапуск"""
+        store = JournalContextStore(snapshot_file)
+        store.append(1, turns("a"), max_len=20)
+        store.set_summary(1, "сводка")
+        store.close()
+
+        restored = JournalContextStore(snapshot_file)
+        assert restored.summary("1") == "сводка"
+        restored.close()
+
+    def test_set_and_delete_are_persisted(self, snapshot_file):
+        """Тест: присваивание и удаление контекста переживают перезапуск"""
+        store = JournalContextStore(snapshot_file)
+        store.append("a", turns("old"), max_len=20)
+        store["a"] = turns("new")
+        store["b"] = turns("x")
+        del store["b"]
+        store.close()
+
+        restored = JournalContextStore(snapshot_file)
+        assert dict(restored) == {"a": turns("new")}
+        restored.close()
+
+
+@pytest.mark.services
+class TestSQLiteContextStore:
+    """Тесты для SQLiteContextStore"""
+
+    @pytest.fixture
+    def db_file(self, tmp_path):
+        return str(tmp_path / "chat_contexts.db")
+
+    def test_wal_mode_and_schema(self, db_file):
+        """Тест: база в режиме WAL, по строке на реплику"""
+        store = SQLiteContextStore(db_file)
+        store.append(1, turns("Привет"), max_len=20)
+        store.close()
+
+        conn = sqlite3.connect(db_file)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        rows = conn.execute("SELECT context_key, role, content FROM turns ORDER BY id").fetchall()
+        conn.close()
+        assert rows == [("1", "user", "Привет"), ("1", "assistant", "re: Привет")]
+
+    def test_reads_see_pending_writes(self, db_file):
+        """Тест: чтение сразу видит еще не закоммиченные записи"""
+        store = SQLiteContextStore(db_file, batch_interval=5)
+        store.append(1, turns("a"), max_len=20)
+        store.append(1, turns("b"), max_len=3)
+
+        assert store.recent(1, 10) == (turns("a") + turns("b"))[-3:]
+        assert 1 in store
+        store.close()
+
+    def test_trimming_and_recent(self, db_file):
+        """Тест: в базе остается max_len последних реплик, recent читает хвост"""
+        store = SQLiteContextStore(db_file)
+        for i in range(15):
+            store.append(12345, turns(f"m{i}"), max_len=20)
+        store.flush()
+
+        assert len(store[12345]) == 20
+        assert store.recent(12345, 2) == turns("m14")
+        store.close()
+
+    def test_persists_across_restart(self, db_file):
+        """Тест: контексты переживают перезапуск, ключи int и str совпадают"""
+        store = SQLiteContextStore(db_file)
+        store.append(12345, turns("Привет"), max_len=20)
+        store["business_conn_1"] = turns("Здравствуйте")
+        store["gone"] = turns("x")
+        del store["gone"]
+        store.close()
+
+        restored = SQLiteContextStore(db_file)
+        assert restored.recent("12345", 6) == turns("Привет")
+        assert sorted(restored) == ["12345", "business_conn_1"]
+        assert len(restored) == 2
+        restored.close()
+
+    def test_cached_token_counts_roundtrip(self, db_file):
+        """Тест: число токенов реплики хранится в колонке tokens"""
+        store = SQLiteContextStore(db_file)
+        store.append(1, [{"role": "user", "content": "Привет", "tokens": 3}], max_len=20)
+        store.close()
+
+        restored = SQLiteContextStore(db_file)
+        assert restored.recent(1, 1) == [{"role": "user", "content": "Привет", "tokens": 3}]
+        restored.close()
+
+    def test_summary_persisted_and_deleted_with_context(self, db_file):
+        """Тест: сводка хранится в таблице summaries и удаляется вместе с контекстом"""
+        store = SQLiteContextStore(db_file, batch_interval=5)
+        store.append(1, turns("a"), max_len=20)
+        store.set_summary(1, "сводка")
+        assert store.summary(1) == "сводка"
+        store.close()
+
+        restored = SQLiteContextStore(db_file)
+        assert restored.summary("1") == "сводка"
+        del restored[1]
+        assert restored.summary(1) is None
+        restored.close()
+
+    def test_delete_unknown_key(self, db_file):
+        """Тест: удаление несуществующего ключа вызывает KeyError"""
+        store = SQLiteContextStore(db_file)
+        with pytest.raises(KeyError):
+            del store["missing"]
+        store.close()
+
+
+@pytest.mark.services
+class TestCachedContextStore:
+    """Тесты для CachedContextStore"""
+
+    def test_hits_and_misses(self):
+        """Тест: первый доступ - промах с загрузкой из бэкенда, дальше попадания"""
+        backend = MemoryContextStore({"1": turns("Привет")})
+        store = CachedContextStore(backend, max_chats=10)
+
+        assert store.recent(1, 6) == turns("Привет")
+        assert store.recent(1, 6) == turns("Привет")
+
+        stats = store.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+        assert stats["cached_chats"] == 1
+
+    def test_lru_eviction_keeps_data_in_backend(self):
+        """Тест: вытесненный чат остается в бэкенде и загружается снова"""
+        backend = MemoryContextStore()
+        store = CachedContextStore(backend, max_chats=2)
+        for chat_id in (1, 2, 3):
+            store.append(chat_id, turns(f"m{chat_id}"), max_len=20)
+
+        assert store.stats()["cached_chats"] == 2
+        assert store.evictions == 1
+        assert store.recent(1, 6) == turns("m1")
+        assert store.evictions == 2
+
+    def test_recently_used_chat_is_not_evicted(self):
+        """Тест: вытесняется наименее недавно использованный чат"""
+        store = CachedContextStore(MemoryContextStore(), max_chats=2)
+        store.append(1, turns("a"), max_len=20)
+        store.append(2, turns("b"), max_len=20)
+        store.recent(1, 6)
+        store.append(3, turns("c"), max_len=20)
+
+        misses = store.misses
+        store.recent(1, 6)
+        assert store.misses == misses
+
+    def test_byte_limit(self):
+        """Тест: лимит по байтам ограничивает размер кэша"""
+        store = CachedContextStore(MemoryContextStore(), max_bytes=2000)
+        for chat_id in range(20):
+            store.append(chat_id, turns("x" * 200), max_len=20)
+
+        assert 0 < store.stats()["cached_bytes"] <= 2000
+        assert store.evictions > 0
+        assert len(store) == 20
+
+    def test_idle_session_expires(self):
+        """Тест: после TTL неактивности история чата удаляется"""
+        backend = MemoryContextStore()
+        store = CachedContextStore(backend, idle_ttl_sec=60)
+
+        with patch('services.context_store.time.time', return_value=1000.0):
+            store.append(1, turns("Привет"), max_len=20)
+        with patch('services.context_store.time.time', return_value=1030.0):
+            assert store.recent(1, 6) == turns("Привет")
+        with patch('services.context_store.time.time', return_value=1100.0):
+            assert store.recent(1, 6) == []
+
+        assert 1 not in backend
+        assert store.expirations == 1
+
+    def test_idle_session_expires_after_eviction(self):
+        """Тест: TTL работает и для чата, который уже вытеснен из кэша"""
+        backend = MemoryContextStore()
+        store = CachedContextStore(backend, max_chats=1, idle_ttl_sec=60)
+
+        with patch('services.context_store.time.time', return_value=1000.0):
+            store.append(1, turns("a"), max_len=20)
+            store.append(2, turns("b"), max_len=20)
+        with patch('services.context_store.time.time', return_value=1100.0):
+            assert store.recent(1, 6) == []
+
+        assert 1 not in backend
+
+
+@pytest.mark.services
+class TestCreateContextStore:
+    """Тесты для фабрики хранилищ"""
+
+    def test_sqlite_imports_json_snapshot_once(self, tmp_path):
+        """Тест: новая SQLite база заполняется из JSON-снимка"""
+        snapshot_file = str(tmp_path / "chat_contexts.json")
+        legacy = JournalContextStore(snapshot_file)
+        legacy[12345] = turns("Привет")
+        legacy.flush()
+        legacy.close()
+
+        with patch('services.context_store.config') as mock_config:
+            mock_config.CONTEXT_STORE = "sqlite"
+            mock_config.CONTEXT_FILE = snapshot_file
+            mock_config.CONTEXT_DB_FILE = str(tmp_path / "chat_contexts.db")
+            mock_config.CONTEXT_DB_BATCH_INTERVAL_SEC = 0.01
+            mock_config.CONTEXT_DB_BATCH_SIZE = 10
+            mock_config.CONTEXT_CACHE_MAX_CHATS = 10
+            mock_config.CONTEXT_CACHE_MAX_BYTES = 0
+            mock_config.CONTEXT_IDLE_TTL_SEC = 0
+
+            store = create_context_store()
+
+        assert isinstance(store, CachedContextStore)
+        assert isinstance(store.backend, SQLiteContextStore)
+        assert store[12345] == turns("Привет")
+        store.close()
+
+    def test_sqlite_imports_journal_without_snapshot(self, tmp_path):
+        """Тест: контексты, которые есть только в журнале (снимок еще не записан), тоже переносятся"""
+        snapshot_file = str(tmp_path / "chat_contexts.json")
+        legacy = JournalContextStore(snapshot_file)
+        legacy.append(12345, turns("Привет"), 20)
+        legacy.close()
+        assert not os.path.exists(snapshot_file)
+
+        with patch('services.context_store.config') as mock_config:
+            mock_config.CONTEXT_STORE = "sqlite"
+            mock_config.CONTEXT_FILE = snapshot_file
+            mock_config.CONTEXT_DB_FILE = str(tmp_path / "chat_contexts.db")
+            mock_config.CONTEXT_DB_BATCH_INTERVAL_SEC = 0.01
+            mock_config.CONTEXT_DB_BATCH_SIZE = 10
+            mock_config.CONTEXT_CACHE_MAX_CHATS = 10
+            mock_config.CONTEXT_CACHE_MAX_BYTES = 0
+            mock_config.CONTEXT_IDLE_TTL_SEC = 0
+
+            store = create_context_store()
+
+        assert store.max_chats == 10
+        assert store[12345] == turns("Привет")
+        store.close()
+
+    def test_memory_backend(self):
+        """Тест: CONTEXT_STORE=memory дает хранилище в памяти"""
+        with patch('services.context_store.config') as mock_config:
+            mock_config.CONTEXT_STORE = "memory"
+            mock_config.CONTEXT_IDLE_TTL_SEC = 0
+            assert isinstance(create_context_store(), MemoryContextStore)
+
+    def test_idle_ttl_wraps_memory_backend(self):
+        """Тест: с CONTEXT_IDLE_TTL_SEC хранилище в памяти оборачивается кэшем"""
+        with patch('services.context_store.config') as mock_config:
+            mock_config.CONTEXT_STORE = "memory"
+            mock_config.CONTEXT_IDLE_TTL_SEC = 60
+            store = create_context_store()
+
+        assert isinstance(store, CachedContextStore)
+        assert store.idle_ttl_sec == 60
@@ -0,0 +1,87 @@
+"""
+Тесты для фонового сжатия контекста в сводку.
+"""
+import pytest
+import sys
+import os
+import asyncio
+from unittest.mock import AsyncMock
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.context_summarizer import ContextSummarizer
+
+
+def turns(text):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": f"re: {text}"}]
+
+
+@pytest.mark.services
+class TestContextSummarizer:
+    """Тесты для ContextSummarizer"""
+
+    @pytest.mark.asyncio
+    async def test_fold_runs_in_background(self):
+        """Тест: schedule не ждет модель, сжатие выполняется в фоне"""
+        release = asyncio.Event()
+        folded = []
+
+        async def fold(key, evicted):
+            await release.wait()
+            folded.append((key, evicted))
+
+        summarizer = ContextSummarizer(fold)
+        assert summarizer.schedule(12345, turns("a")) is True
+        assert folded == []
+
+        release.set()
+        await summarizer.stop()
+
+        assert folded == [("12345", turns("a"))]
+        assert summarizer.stats()["completed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_pending_turns_of_one_context_are_merged(self):
+        """Тест: реплики одного чата, накопленные в очереди, сжимаются одним вызовом"""
+        fold = AsyncMock()
+        summarizer = ContextSummarizer(fold)
+
+        summarizer.schedule("chat", turns("a"))
+        summarizer.schedule("chat", turns("b"))
+        await summarizer.stop()
+
+        fold.assert_awaited_once_with("chat", turns("a") + turns("b"))
+
+    @pytest.mark.asyncio
+    async def test_pending_turns_are_bounded(self):
+        """Тест: при отставании модели старые реплики отбрасываются"""
+        fold = AsyncMock()
+        summarizer = ContextSummarizer(fold, max_pending_turns=2)
+
+        summarizer.schedule("chat", turns("a"))
+        summarizer.schedule("chat", turns("b"))
+        await summarizer.stop()
+
+        fold.assert_awaited_once_with("chat", turns("b"))
+        assert summarizer.dropped == 2
+
+    @pytest.mark.asyncio
+    async def test_fold_error_does_not_stop_worker(self):
+        """Тест: ошибка модели не останавливает фоновую задачу"""
+        fold = AsyncMock(side_effect=[Exception("boom"), None])
+        summarizer = ContextSummarizer(fold)
+
+        summarizer.schedule("a", turns("x"))
+        summarizer.schedule("b", turns("y"))
+        await summarizer.stop()
+
+        assert summarizer.failed == 1
+        assert summarizer.completed == 1
+
+    def test_schedule_outside_event_loop(self):
+        """Тест: вне event loop (синхронный API) сжатие пропускается"""
+        summarizer = ContextSummarizer(AsyncMock())
+
+        assert summarizer.schedule("chat", turns("a")) is False
+        assert summarizer.stats()["pending_contexts"] == 0
@@ -0,0 +1,65 @@
+"""
+Тесты для общего пула исходящих HTTP-соединений.
+"""
+import pytest
+import sys
+import os
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.http_pool import HttpPool
+
+
+@pytest.mark.services
+class TestHttpPool:
+    """Тесты для HttpPool"""
+
+    @pytest.mark.asyncio
+    async def test_one_session_per_host(self):
+        """Тест: один пул на хост, разные хосты - разные пулы"""
+        pool = HttpPool(limit_per_host=5)
+        try:
+            first = pool.session("https://stt.api.cloud.yandex.net/speech/v1/stt:recognize")
+            again = pool.session("https://stt.api.cloud.yandex.net/speech/v1/tts:synthesize")
+            other = pool.session("https://neuroapi.host/v1/chat/completions")
+
+            assert first is again
+            assert first is not other
+            assert first.connector.limit == 5
+            assert first.connector._ssl is other.connector._ssl
+        finally:
+            await pool.close()
+
+        assert first.closed and other.closed
+
+    @pytest.mark.asyncio
+    async def test_keepalive_reuses_connections(self):
+        """Тест: повторные запросы идут по тем же соединениям и видны в статистике"""
+        async def ok(request):
+            return web.json_response({"ok": True})
+
+        app = web.Application()
+        app.router.add_get('/', ok)
+        server = TestServer(app)
+        await server.start_server()
+        pool = HttpPool(limit_per_host=2)
+        try:
+            url = str(server.make_url('/'))
+            for _ in range(3):
+                async with pool.session(url).get(url) as response:
+                    assert response.status == 200
+                    await response.read()
+
+            stats = pool.stats()[f"http://{server.host}:{server.port}"]
+            assert stats["requests"] == 3
+            assert stats["connections_created"] == 1
+            assert stats["connections_reused"] == 2
+            assert stats["in_use"] == 0
+            assert stats["idle"] == 1
+            assert stats["limit"] == 2
+        finally:
+            await pool.close()
+            await server.close()
@@ -6,9 +6,13 @@ import sys
 import os
 import json
 import time
+import asyncio
+import threading
 from unittest.mock import patch, Mock, mock_open
 from datetime import datetime, timedelta
 
+import pytz
+
 # Добавляем src в путь для импортов
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
 
@@ -152,7 +156,7 @@ class TestIamTokenManager:
             
             assert result == "test_jwt_token"
 
-    @patch('services.iam_token_manager.requests.post')
+    @patch('services.iam_token_manager.http_pool.sync_session.post')
     def test_request_iam_token_success(self, mock_post, manager, mock_iam_token_response):
         """Тест успешного запроса IAM токена"""
         mock_post.return_value = mock_iam_token_response
@@ -164,7 +168,7 @@ class TestIamTokenManager:
             assert manager._expires_at is not None
             mock_post.assert_called_once()
 
-    @patch('services.iam_token_manager.requests.post')
+    @patch('services.iam_token_manager.http_pool.sync_session.post')
     def test_request_iam_token_network_error(self, mock_post, manager):
         """Тест обработки сетевой ошибки при запросе токена"""
         mock_post.side_effect = Exception("Network error")
@@ -173,7 +177,7 @@ class TestIamTokenManager:
             with pytest.raises(RuntimeError, match="Failed to obtain IAM token"):
                 manager._request_iam_token()
 
-    @patch('services.iam_token_manager.requests.post')
+    @patch('services.iam_token_manager.http_pool.sync_session.post')
     def test_request_iam_token_invalid_response(self, mock_post, manager):
         """Тест обработки невалидного ответа"""
         mock_response = Mock()
@@ -185,7 +189,7 @@ class TestIamTokenManager:
             with pytest.raises(RuntimeError, match="Invalid IAM token response"):
                 manager._request_iam_token()
 
-    @patch('services.iam_token_manager.requests.post')
+    @patch('services.iam_token_manager.http_pool.sync_session.post')
     def test_request_iam_token_missing_fields(self, mock_post, manager):
         """Тест обработки ответа с отсутствующими полями"""
         mock_response = Mock()
@@ -281,7 +285,7 @@ class TestIamTokenManager:
         """Тест что token_manager является синглтоном"""
         assert isinstance(token_manager, IamTokenManager)
 
-    @patch('services.iam_token_manager.requests.post')
+    @patch('services.iam_token_manager.http_pool.sync_session.post')
     def test_request_iam_token_expires_at_parsing(self, mock_post, manager):
         """Тест парсинга времени истечения токена"""
         mock_response = Mock()
@@ -301,7 +305,7 @@ class TestIamTokenManager:
             assert manager._expires_at.month == 12
             assert manager._expires_at.day == 31
 
-    @patch('services.iam_token_manager.requests.post')
+    @patch('services.iam_token_manager.http_pool.sync_session.post')
     def test_request_iam_token_expires_at_invalid_format(self, mock_post, manager):
         """Тест обработки невалидного формата времени истечения"""
         mock_response = Mock()
@@ -341,3 +345,83 @@ class TestIamTokenManager:
             assert headers["kid"] == "test_key_id"
             assert headers["typ"] == "JWT"
 
+    def test_refresh_is_single_flight(self, manager):
+        """Тест: параллельные вызовы get_token выполняют один обмен токена"""
+        def slow_request():
+            time.sleep(0.05)
+            manager._iam_token = "new_token"
+            manager._expires_at = datetime.now(pytz.UTC) + timedelta(hours=12)
+
+        with patch.object(manager, '_request_iam_token', side_effect=slow_request) as mock_request:
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(manager.get_token())) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert results == ["new_token"] * 5
+        mock_request.assert_called_once()
+
+    def test_token_shared_through_file_cache(self, tmp_path, sample_sa_key):
+        """Тест: токен из файлового кэша используется другим процессом без обмена"""
+        cache_file = str(tmp_path / "iam_token.json")
+        expires_at = (datetime.now(pytz.UTC) + timedelta(hours=12)).isoformat().replace("+00:00", "Z")
+        response = Mock()
+        response.json.return_value = {"iamToken": "cached_token", "expiresAt": expires_at}
+
+        first = IamTokenManager(cache_file=cache_file)
+        first._sa_key = sample_sa_key
+        with patch('services.iam_token_manager.http_pool.sync_session.post', return_value=response), \
+             patch.object(first, '_build_jwt', return_value="test_jwt"):
+            assert first.get_token() == "cached_token"
+
+        assert os.stat(cache_file).st_mode & 0o777 == 0o600
+
+        second = IamTokenManager(cache_file=cache_file)
+        second._sa_key = sample_sa_key
+        with patch.object(second, '_request_iam_token') as mock_request:
+            assert second.get_token() == "cached_token"
+
+        mock_request.assert_not_called()
+        assert second.cache_hits == 1
+
+        # Токен другого ключа сервисного аккаунта не подходит
+        other = IamTokenManager(cache_file=cache_file)
+        other._sa_key = dict(sample_sa_key, id="other_key_id")
+        assert other._load_cached_token() is False
+
+    def test_signing_key_and_algorithm_cached(self, manager, sample_sa_key):
+        """Тест: ключ разбирается один раз, выбранный алгоритм запоминается"""
+        fake_jwt = Mock()
+        fake_jwt.encode.side_effect = [Exception("PS256 not supported"), "jwt_1", "jwt_2"]
+        manager._sa_key = dict(sample_sa_key, private_key="PLEASE DO NOT REMOVE THIS LINE!\n" + sample_sa_key["private_key"])
+
+        with patch.dict(sys.modules, {"jwt": fake_jwt}):
+            assert manager._build_jwt() == "jwt_1"
+            signing_key = manager._signing_key
+            assert manager._build_jwt() == "jwt_2"
+
+        assert manager._signing_key is signing_key
+        assert [call.kwargs["algorithm"] for call in fake_jwt.encode.call_args_list] == ["PS256", "RS256", "RS256"]
+        assert manager.stats()["algorithm"] == "RS256"
+
+    @pytest.mark.asyncio
+    async def test_background_refresh(self, manager):
+        """Тест: фоновая задача обновляет токен заранее и останавливается"""
+        def refresh(margin):
+            manager._iam_token = "background_token"
+            manager._expires_at = datetime.now(pytz.UTC) + timedelta(hours=12)
+
+        with patch.object(manager, 'refresh', side_effect=refresh) as mock_refresh:
+            manager.start()
+            for _ in range(50):
+                if mock_refresh.called:
+                    break
+                await asyncio.sleep(0.01)
+            assert manager.stats()["background_refresh"] is True
+            await manager.stop()
+
+        mock_refresh.assert_called_once_with(manager.refresh_margin)
+        assert manager.get_token() == "background_token"
+        assert manager.stats()["background_refresh"] is False
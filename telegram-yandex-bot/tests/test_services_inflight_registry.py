@@ -0,0 +1,165 @@
+"""
+Тесты для отмены устаревших запросов к модели.
+"""
+import pytest
+import sys
+import os
+import asyncio
+from unittest.mock import Mock
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.inflight_registry import InflightRegistry
+
+
+class SlowModel:
+    """Модель, которая отвечает только по команде и запоминает отмены"""
+
+    def __init__(self):
+        self.calls = []
+        self.cancelled = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, text: str) -> str:
+        self.calls.append(text)
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(text)
+            raise
+        return f"ответ: {text}"
+
+
+async def started(model: SlowModel, calls: int) -> None:
+    while len(model.calls) < calls:
+        await asyncio.sleep(0)
+
+
+@pytest.mark.services
+class TestInflightRegistry:
+    """Тесты для InflightRegistry"""
+
+    def test_unknown_policy(self):
+        """Тест: неизвестная политика отклоняется"""
+        with pytest.raises(ValueError):
+            InflightRegistry("cancel", "off")
+
+    @pytest.mark.asyncio
+    async def test_run_returns_answer(self):
+        """Тест: без вмешательства запрос просто выполняется"""
+        registry = InflightRegistry("replace", "off")
+        model = SlowModel()
+        model.release.set()
+
+        assert await registry.run(1, 10, "вопрос", model) == "ответ: вопрос"
+        assert registry.stats()["inflight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_edit_reissues_request(self):
+        """Тест: правка генерируемого сообщения перезапускает запрос с новым текстом"""
+        registry = InflightRegistry("replace", "off")
+        model = SlowModel()
+        run = asyncio.create_task(registry.run(1, 10, "вопрсо", model))
+        await started(model, 1)
+
+        registry.edit(1, 10, "вопрос")
+        await started(model, 2)
+        model.release.set()
+
+        assert await run == "ответ: вопрос"
+        assert model.cancelled == ["вопрсо"]
+        assert registry.reissued == 1
+
+    @pytest.mark.asyncio
+    async def test_edit_of_queued_message(self):
+        """Тест: правка еще не начатого сообщения подхватывается обработчиком"""
+        registry = InflightRegistry("replace", "off")
+        model = SlowModel()
+        model.release.set()
+
+        registry.edit(1, 10, "исправлено")
+
+        assert await registry.run(1, 10, "оригинал", model) == "ответ: исправлено"
+
+    @pytest.mark.asyncio
+    async def test_replace_policy_drops_old_request(self):
+        """Тест: replace - новое сообщение отменяет старый ответ"""
+        registry = InflightRegistry("replace", "off")
+        model = SlowModel()
+        run = asyncio.create_task(registry.run(1, 10, "первый", model))
+        await started(model, 1)
+
+        registry.supersede(1, 11, False)
+
+        assert await run is None
+        assert model.cancelled == ["первый"]
+        model.release.set()
+        assert await registry.run(1, 11, "второй", model) == "ответ: второй"
+
+    @pytest.mark.asyncio
+    async def test_merge_policy_carries_old_text(self):
+        """Тест: merge - отмененный вопрос задается вместе с новым"""
+        registry = InflightRegistry("off", "merge")
+        model = SlowModel()
+        run = asyncio.create_task(registry.run("b", 10, "первый", model))
+        await started(model, 1)
+
+        registry.supersede("b", 11, True)
+        assert await run is None
+
+        model.release.set()
+        assert await registry.run("b", 11, "второй", model) == "ответ: первый\nвторой"
+        assert registry.merged == 1
+
+    @pytest.mark.asyncio
+    async def test_handler_cancellation_cancels_request(self):
+        """Тест: отмена самого обработчика отменяет и запрос"""
+        registry = InflightRegistry("replace", "off")
+        model = SlowModel()
+        run = asyncio.create_task(registry.run(1, 10, "вопрос", model))
+        await started(model, 1)
+
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        await asyncio.sleep(0)
+
+        assert model.cancelled == ["вопрос"]
+
+    def test_observe_respects_policy(self):
+        """Тест: при политике off входящие обновления ничего не отменяют"""
+        registry = InflightRegistry("off", "replace")
+        task = Mock()
+        task.done.return_value = False
+        registry._inflight[5] = Mock(message_id=1, task=task)
+
+        message = Mock(text="новое", message_id=2)
+        update = Mock(message=message, business_message=None, edited_message=None,
+                      edited_business_message=None, effective_chat=Mock(id=5))
+        registry.observe(update)
+
+        task.cancel.assert_not_called()
+
+    def test_observe_skips_owner_messages(self, monkeypatch):
+        """Тест: сообщение владельца в бизнес-чате не отменяет ответ клиенту и ничего не переносит"""
+        monkeypatch.setattr('services.inflight_registry.config.OWNER_USER_ID', 7, raising=False)
+        registry = InflightRegistry("off", "merge")
+        task = Mock()
+        task.done.return_value = False
+        key = "business_conn_5"
+        registry._inflight[key] = Mock(message_id=1, task=task, text="вопрос клиента")
+
+        message = Mock(text="Отвечу сам", message_id=2, business_connection_id="conn", chat=Mock(id=5))
+        message.from_user.id = 7
+        update = Mock(message=None, business_message=message, edited_message=None,
+                      edited_business_message=None)
+        registry.observe(update)
+
+        task.cancel.assert_not_called()
+        assert key not in registry._carry
+
+        message.from_user.id = 1
+        registry.observe(update)
+        task.cancel.assert_called_once()
+        assert registry._carry[key] == "вопрос клиента"
@@ -0,0 +1,103 @@
+"""
+Тесты для индекса сегментов журнала updates.
+"""
+import pytest
+import sys
+import os
+import json
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.journal_index import SegmentIndex, build_index, index_path, query_journal, update_keys
+
+
+def make_update(update_id, chat_id, user_id, content="text"):
+    message = {"message_id": update_id, "chat": {"id": chat_id}, "from": {"id": user_id}}
+    message[content] = "hi" if content == "text" else {"file_id": "f"}
+    return {"update_id": update_id, "message": message}
+
+
+def write_segment(path, records):
+    with open(path, 'wb') as f:
+        for ts, update in records:
+            f.write(json.dumps({"ts": ts, "update": update}).encode() + b"\n")
+
+
+@pytest.mark.services
+class TestJournalIndex:
+    """Тесты для SegmentIndex и поиска по журналу"""
+
+    def test_update_keys(self):
+        """Тест: chat_id, user_id и типы update"""
+        assert update_keys(make_update(1, 10, 20, "voice")) == (10, 20, ["message", "voice"])
+        callback = {"update_id": 2, "callback_query": {"from": {"id": 5}, "message": {"chat": {"id": 7}}}}
+        assert update_keys(callback) == (7, 5, ["callback_query"])
+        assert update_keys({"update_id": 3}) == (None, None, [])
+
+    def test_postings_query_reads_only_matching_lines(self, tmp_path):
+        """Тест: поиск по чату и времени читает строки по смещениям из индекса"""
+        path = str(tmp_path / "updates.jsonl.1")
+        write_segment(path, [(1000.0 + i, make_update(i, 100 + i % 3, 7)) for i in range(300)])
+        index = build_index(path, time_step=16)
+
+        offsets = index.offsets(chat=101, since=1100.0, until=1150.0)
+        results = [record["update"]["update_id"] for _, record in
+                   query_journal(str(tmp_path / "updates.jsonl"), chat=101, since=1100.0, until=1150.0)]
+
+        assert results == [i for i in range(100, 151) if i % 3 == 1]
+        # Кандидаты ограничены диапазоном разреженного индекса времени
+        assert len(offsets) < len(index.chat["101"])
+
+    def test_type_and_user_intersection(self, tmp_path):
+        """Тест: пересечение постингов по пользователю и типу"""
+        journal = str(tmp_path / "updates.jsonl")
+        records = [(1.0, make_update(1, 1, 5, "voice")), (2.0, make_update(2, 1, 6, "voice")),
+                   (3.0, make_update(3, 2, 5, "text")), (4.0, make_update(4, 3, 5, "voice"))]
+        write_segment(f"{journal}.1", records)
+        build_index(f"{journal}.1")
+
+        results = [record["update"]["update_id"] for _, record in query_journal(journal, user=5, update_type="voice")]
+
+        assert results == [1, 4]
+
+    def test_segments_outside_range_skipped_by_header(self, tmp_path):
+        """Тест: сегмент вне интервала отбрасывается по заголовку индекса"""
+        journal = str(tmp_path / "updates.jsonl")
+        write_segment(f"{journal}.1", [(10.0, make_update(1, 1, 1))])
+        build_index(f"{journal}.1")
+        write_segment(f"{journal}.2", [(20.0, make_update(2, 1, 1))])
+        build_index(f"{journal}.2")
+        # Испорченный сегмент: если бы он читался, результат бы изменился
+        with open(f"{journal}.1", 'wb') as f:
+            f.write(json.dumps({"ts": 15.0, "update": make_update(99, 1, 1)}).encode() + b"\n")
+
+        results = [record["update"]["update_id"] for _, record in query_journal(journal, since=18.0)]
+
+        assert results == [2]
+
+    def test_live_file_and_unindexed_segments_scanned(self, tmp_path):
+        """Тест: живой файл и сегменты без индекса читаются целиком"""
+        journal = str(tmp_path / "updates.jsonl")
+        write_segment(f"{journal}.1", [(1.0, make_update(1, 1, 1))])
+        write_segment(journal, [(2.0, make_update(2, 1, 1)), (3.0, make_update(3, 2, 1))])
+        with open(journal, 'ab') as f:
+            f.write(b'{"ts":4.0,"upd')  # Оборванная последняя строка
+
+        results = [record["update"]["update_id"] for _, record in query_journal(journal, chat=1)]
+
+        assert results == [1, 2]
+        assert not os.path.exists(index_path(f"{journal}.1"))
+
+    def test_index_round_trip(self, tmp_path):
+        """Тест: индекс читается с диска в том же виде"""
+        path = str(tmp_path / "updates.jsonl.1")
+        write_segment(path, [(5.0, make_update(1, 1, 2, "photo"))])
+        build_index(path)
+
+        index = SegmentIndex.load(index_path(path))
+
+        assert index.lines == 1
+        assert (index.t_min, index.t_max) == (5.0, 5.0)
+        assert index.type == {"message": [0], "photo": [0]}
+        assert SegmentIndex.read_header(index_path(path))["lines"] == 1
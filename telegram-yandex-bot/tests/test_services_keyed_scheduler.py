@@ -0,0 +1,123 @@
+"""
+Тесты для планировщика с упорядочиванием по ключу.
+"""
+import pytest
+import sys
+import os
+import asyncio
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.keyed_scheduler import KeyedScheduler
+
+
+@pytest.mark.services
+class TestKeyedScheduler:
+    """Тесты для KeyedScheduler"""
+
+    @pytest.mark.asyncio
+    async def test_same_key_runs_in_order(self):
+        """Тест: элементы одного ключа выполняются последовательно по порядку"""
+        order = []
+
+        async def process(item):
+            await asyncio.sleep(0.005 * (5 - item))
+            order.append(item)
+
+        scheduler = KeyedScheduler(maxsize=10, workers=4)
+        scheduler.start(process)
+
+        for i in range(5):
+            await scheduler.submit("chat", i)
+        await scheduler.stop()
+
+        assert order == [0, 1, 2, 3, 4]
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_concurrently(self):
+        """Тест: разные ключи выполняются параллельно"""
+        started = []
+        release = asyncio.Event()
+
+        async def process(item):
+            started.append(item)
+            await release.wait()
+
+        scheduler = KeyedScheduler(maxsize=10, workers=3)
+        scheduler.start(process)
+
+        for key in ("a", "b", "c"):
+            await scheduler.submit(key, key)
+        await asyncio.sleep(0.01)
+
+        assert sorted(started) == ["a", "b", "c"]
+
+        release.set()
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_busy_key_does_not_block_other_keys(self):
+        """Тест: очередь одного чата не занимает всех воркеров"""
+        done = []
+        release = asyncio.Event()
+
+        async def process(item):
+            key, _ = item
+            if key == "slow":
+                await release.wait()
+            done.append(item)
+
+        scheduler = KeyedScheduler(maxsize=20, workers=2)
+        scheduler.start(process)
+
+        for i in range(5):
+            await scheduler.submit("slow", ("slow", i))
+        await scheduler.submit("fast", ("fast", 0))
+        await asyncio.sleep(0.01)
+
+        assert ("fast", 0) in done
+
+        release.set()
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_idle_keys_are_collected(self):
+        """Тест: очереди простаивающих ключей удаляются"""
+        async def process(item):
+            pass
+
+        scheduler = KeyedScheduler(maxsize=10, workers=2)
+        scheduler.start(process)
+
+        for key in range(5):
+            await scheduler.submit(key, key)
+        await scheduler.join()
+
+        stats = scheduler.stats()
+        assert stats["active_keys"] == 0
+        assert stats["peak_keys"] >= 1
+        assert stats["processed"] == 5
+
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_capacity_is_bounded(self):
+        """Тест: при исчерпании емкости элемент отклоняется"""
+        release = asyncio.Event()
+
+        async def process(item):
+            await release.wait()
+
+        scheduler = KeyedScheduler(maxsize=2, workers=1, put_timeout=0.05)
+        scheduler.start(process)
+
+        assert await scheduler.submit("a", 1) is True
+        await asyncio.sleep(0)
+        assert await scheduler.submit("a", 2) is True
+        assert await scheduler.submit("b", 3) is True
+        assert await scheduler.submit("c", 4) is False
+        assert scheduler.rejected == 1
+
+        release.set()
+        await scheduler.stop()
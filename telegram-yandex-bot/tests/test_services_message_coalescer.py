@@ -0,0 +1,108 @@
+"""
+Тесты для склейки серий сообщений одного чата.
+"""
+import pytest
+import sys
+import os
+import asyncio
+from unittest.mock import Mock
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.message_coalescer import MessageCoalescer
+
+
+@pytest.mark.services
+class TestMessageCoalescer:
+    """Тесты для MessageCoalescer"""
+
+    def test_disabled_with_zero_window(self):
+        """Тест: нулевое окно выключает склейку"""
+        assert not MessageCoalescer(0, 3).enabled
+        assert MessageCoalescer(0.5, 3).enabled
+
+    @pytest.mark.asyncio
+    async def test_single_message_passes_through(self):
+        """Тест: одиночное сообщение возвращается как есть после окна"""
+        coalescer = MessageCoalescer(0.01, 1)
+        assert await coalescer.collect(1, 10, "Привет") == "Привет"
+        assert coalescer.stats()["pending_bursts"] == 0
+
+    @pytest.mark.asyncio
+    async def test_observed_messages_merged_into_leader_turn(self):
+        """Тест: сообщения, замеченные на входе, отвечаются одним ходом лидера"""
+        coalescer = MessageCoalescer(0.05, 1)
+        coalescer.add(1, 10, "Привет")
+        coalescer.add(1, 11, "Хочу записаться")
+
+        async def late_message():
+            await asyncio.sleep(0.02)
+            coalescer.add(1, 12, "на завтра")
+
+        merged, _ = await asyncio.gather(coalescer.collect(1, 10, "Привет"), late_message())
+
+        assert merged == "Привет\nХочу записаться\nна завтра"
+        # Обработчики остальных сообщений серии ничего не отправляют
+        assert await coalescer.collect(1, 11, "Хочу записаться") is None
+        assert coalescer.consumed(1, 12)
+        assert coalescer.stats()["merged_messages"] == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_handlers_join_leader(self):
+        """Тест: без очереди обработчики идут параллельно - второй присоединяется к лидеру"""
+        coalescer = MessageCoalescer(0.05, 1)
+
+        async def second():
+            await asyncio.sleep(0.01)
+            return await coalescer.collect(1, 11, "второе")
+
+        first, joined = await asyncio.gather(coalescer.collect(1, 10, "первое"), second())
+
+        assert first == "первое\nвторое"
+        assert joined is None
+
+    @pytest.mark.asyncio
+    async def test_max_wait_bounds_burst(self):
+        """Тест: непрерывный поток сообщений не задерживает ответ дольше max_wait"""
+        coalescer = MessageCoalescer(0.05, 0.1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async def chatter():
+            for i in range(20):
+                await asyncio.sleep(0.02)
+                coalescer.add(1, 100 + i, f"m{i}")
+
+        chatter_task = asyncio.create_task(chatter())
+        merged = await coalescer.collect(1, 10, "первое")
+        chatter_task.cancel()
+
+        assert loop.time() - started < 0.3
+        assert merged.startswith("первое\nm0")
+
+    @pytest.mark.asyncio
+    async def test_chats_are_independent(self):
+        """Тест: разные чаты не склеиваются"""
+        coalescer = MessageCoalescer(0.01, 1)
+        coalescer.add(2, 10, "чужое")
+
+        assert await coalescer.collect(1, 10, "свое") == "свое"
+
+    def test_observe_skips_commands_and_owner(self, monkeypatch):
+        """Тест: команды и сообщения владельца не попадают в серию"""
+        monkeypatch.setattr('services.message_coalescer.config.OWNER_USER_ID', 7, raising=False)
+        coalescer = MessageCoalescer(0.5, 3)
+
+        def update(text, user_id):
+            message = Mock(text=text, message_id=1)
+            message.from_user.id = user_id
+            return Mock(message=message, business_message=None, edited_business_message=None,
+                        effective_chat=Mock(id=5))
+
+        coalescer.observe(update("/start", 1))
+        coalescer.observe(update("Я владелец", 7))
+        assert coalescer.stats()["pending_bursts"] == 0
+
+        coalescer.observe(update("Привет", 1))
+        assert coalescer.stats()["pending_bursts"] == 1
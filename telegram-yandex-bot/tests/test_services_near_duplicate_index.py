@@ -0,0 +1,101 @@
+"""
+Тесты для индекса почти одинаковых вопросов.
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.near_duplicate_index import NearDuplicateIndex
+
+
+@pytest.mark.services
+class TestNearDuplicateIndex:
+    """Тесты для NearDuplicateIndex"""
+
+    def test_near_duplicate_hit(self):
+        """Тест: вопрос с опечаткой и другой пунктуацией находит сохраненный ответ"""
+        index = NearDuplicateIndex(threshold=0.6)
+        index.add("Сколько стоит консультация по налогам?", "scope", "3000 рублей")
+
+        assert index.lookup("сколько стоит консультация по налогам", "scope") == "3000 рублей"
+        assert index.lookup("Сколько стоит консультацыя по налогам?!", "scope") == "3000 рублей"
+
+    def test_different_question_misses(self):
+        """Тест: непохожий вопрос не совпадает"""
+        index = NearDuplicateIndex()
+        index.add("Сколько стоит консультация по налогам?", "scope", "3000 рублей")
+
+        assert index.lookup("Где находится ваш офис?", "scope") is None
+
+    def test_scope_isolation(self):
+        """Тест: ответы не переходят между областями (подключениями)"""
+        index = NearDuplicateIndex()
+        index.add("Здравствуйте, вы работаете сегодня?", "business:a", "Да")
+
+        assert index.lookup("Здравствуйте, вы работаете сегодня?", "business:b") is None
+
+    def test_signature_estimates_jaccard(self):
+        """Тест: доля совпавших минхешей близка к точному коэффициенту Жаккара"""
+        index = NearDuplicateIndex(num_perm=128, bands=32)
+        a = index._shingles("подскажите пожалуйста часы работы офиса в субботу")
+        b = index._shingles("подскажите пожалуйста часы работы офиса в воскресенье")
+        sig_a, sig_b = index._signature(a), index._signature(b)
+        estimate = sum(x == y for x, y in zip(sig_a, sig_b)) / 128
+
+        assert abs(estimate - index.jaccard(a, b)) < 0.15
+
+    def test_false_positive_sampling(self):
+        """Тест: перепроверка точным Жаккаром считает и отклоняет ложные совпадения"""
+        index = NearDuplicateIndex(threshold=0.9, fp_sample_rate=1.0)
+        index.add("вопрос", "scope", "ответ")
+
+        with patch.object(NearDuplicateIndex, 'jaccard', return_value=0.5):
+            assert index.lookup("вопрос", "scope") is None
+        assert index.lookup("вопрос", "scope") == "ответ"
+
+        stats = index.stats()
+        assert stats["sampled"] == 2
+        assert stats["false_positives"] == 1
+        assert stats["false_positive_rate"] == 0.5
+
+    def test_ttl_expiry(self):
+        """Тест: устаревшая запись удаляется при поиске"""
+        index = NearDuplicateIndex(ttl_sec=60)
+        with patch('services.near_duplicate_index.time.time', return_value=1000.0):
+            index.add("вопрос про цены", "scope", "ответ")
+        with patch('services.near_duplicate_index.time.time', return_value=1061.0):
+            assert index.lookup("вопрос про цены", "scope") is None
+
+        assert index.stats()["size"] == 0
+
+    def test_eviction_cleans_buckets(self):
+        """Тест: вытесненная запись исчезает и из LSH-корзин"""
+        index = NearDuplicateIndex(max_entries=1)
+        index.add("первый вопрос", "scope", "1")
+        index.add("совсем другой текст", "scope", "2")
+
+        assert index.lookup("первый вопрос", "scope") is None
+        assert index.evictions == 1
+        assert all(0 not in bucket for bucket in index._buckets.values())
+
+    def test_stats(self):
+        """Тест метрик: доля попаданий и задержка поиска"""
+        index = NearDuplicateIndex()
+        index.add("вопрос", "scope", "ответ")
+        index.lookup("вопрос", "scope")
+        index.lookup("другое", "scope")
+
+        stats = index.stats()
+        assert stats["lookups"] == 2
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["lookup_ms_p95"] >= stats["lookup_ms_p50"] >= 0
+
+    def test_invalid_banding(self):
+        """Тест: число перестановок должно делиться на число полос"""
+        with pytest.raises(ValueError):
+            NearDuplicateIndex(num_perm=10, bands=3)
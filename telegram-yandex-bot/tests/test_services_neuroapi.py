@@ -6,13 +6,81 @@ import sys
 import os
 import json
 import tempfile
-from unittest.mock import patch, Mock, mock_open
+import asyncio
+import aiohttp
+from unittest.mock import patch, Mock, AsyncMock, PropertyMock
 from datetime import datetime
 
 # Добавляем src в путь для импортов
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
 
-from services.neuroapi_client import NeuroAPIClient, get_gpt_response
+from services.neuroapi_client import NeuroAPIClient, get_gpt_response, get_gpt_response_async
+from services.context_store import ContextStore, MemoryContextStore, JournalContextStore
+from services.circuit_breaker import CircuitBreaker
+from services.provider_router import Provider, ProviderRouter
+from services.yandex_client import yandex_client
+
+
+class FakeStreamContent:
+    """Тело ответа, отдающее строки SSE по одной"""
+
+    def __init__(self, lines):
+        self._lines = list(lines)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for line in self._lines:
+            if isinstance(line, Exception):
+                raise line
+            yield line
+
+
+def sse(*deltas):
+    """Строки SSE-потока chat completions с переданными кусками текста"""
+    lines = [b": keep-alive\n"]
+    for delta in deltas:
+        chunk = {"choices": [{"delta": {"content": delta}}]}
+        lines.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n".encode("utf-8"))
+        lines.append(b"\n")
+    lines.append(b"data: [DONE]\n")
+    return lines
+
+
+class FakeAiohttpResponse:
+    """Минимальная замена ответа aiohttp для async-тестов"""
+
+    def __init__(self, status=200, payload=None, text="", lines=(), headers=None):
+        self.status = status
+        self._payload = payload
+        self._text = text
+        self.headers = headers or {}
+        self.content = FakeStreamContent(lines)
+
+    async def json(self, content_type=None):
+        return self._payload
+
+    async def text(self):
+        return self._text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+def make_fake_session(*responses):
+    """Создает мок сессии, которая по очереди отдает переданные ответы"""
+    session = Mock()
+    session.closed = False
+    session.post = Mock(side_effect=list(responses))
+    return session
+
+
+def completion(content):
+    return {"choices": [{"message": {"content": content}}]}
 
 
 @pytest.mark.services
@@ -30,7 +98,7 @@ class TestNeuroAPIClient:
         assert client.api_key == 'test_neuroapi_key'
         assert client.endpoint == "https://neuroapi.host/v1/chat/completions"
         assert client.model == "gpt-5"
-        assert isinstance(client.chat_contexts, dict)
+        assert isinstance(client.chat_contexts, ContextStore)
         assert client.context_file == "/app/logs/chat_contexts.json"
 
     def test_get_headers_success(self, client):
@@ -75,7 +143,7 @@ class TestNeuroAPIClient:
     def test_prepare_messages_with_context(self, client, sample_context_data):
         """Тест подготовки сообщений с контекстом"""
         # Устанавливаем контекст
-        client.chat_contexts = sample_context_data
+        client.chat_contexts = MemoryContextStore(sample_context_data)
         
         messages = client._prepare_messages("Как дела?", 12345)
         
@@ -88,7 +156,7 @@ class TestNeuroAPIClient:
     def test_prepare_messages_business_with_context(self, client, sample_context_data):
         """Тест подготовки сообщений для бизнес-чата с контекстом"""
         # Устанавливаем контекст для бизнес-чата
-        client.chat_contexts = sample_context_data
+        client.chat_contexts = MemoryContextStore(sample_context_data)
         
         messages = client._prepare_messages("Вопрос", 67890, is_business_message=True, business_connection_id="test_connection")
         
@@ -139,10 +207,8 @@ class TestNeuroAPIClient:
         assert len(context) == 20
 
     def test_load_contexts_file_exists(self, temp_context_file, sample_context_data):
-        """Тест загрузки контекста из существующего файла"""
-        with patch('services.neuroapi_client.os.path.exists', return_value=True), \
-             patch('builtins.open', mock_open(read_data=json.dumps(sample_context_data, ensure_ascii=False))):
-            
+        """Тест загрузки контекста из существующего файла (переносится в новую базу)"""
+        with patch('services.context_store.config.CONTEXT_FILE', temp_context_file):
             client = NeuroAPIClient()
             assert client.chat_contexts == sample_context_data
 
@@ -161,9 +227,10 @@ class TestNeuroAPIClient:
             assert client.chat_contexts == {}
 
     def test_save_contexts(self, client, temp_log_dir):
-        """Тест сохранения контекста в файл"""
+        """Тест сохранения снимка контекста в файл"""
         client.context_file = os.path.join(temp_log_dir, "test_contexts.json")
-        client.chat_contexts = {"12345": [{"role": "user", "content": "test"}]}
+        client.chat_contexts = JournalContextStore(client.context_file)
+        client.chat_contexts[12345] = [{"role": "user", "content": "test"}]
         
         client._save_contexts()
         
@@ -173,17 +240,154 @@ class TestNeuroAPIClient:
         # Проверяем содержимое файла
         with open(client.context_file, 'r', encoding='utf-8') as f:
             saved_data = json.load(f)
-        assert saved_data == client.chat_contexts
+        assert saved_data["contexts"] == {"12345": [{"role": "user", "content": "test"}]}
+        client.chat_contexts.close()
 
     def test_save_contexts_error(self, client):
         """Тест обработки ошибки при сохранении контекста"""
         client.context_file = "/invalid/path/contexts.json"
-        client.chat_contexts = {"12345": [{"role": "user", "content": "test"}]}
+        client.chat_contexts = JournalContextStore(client.context_file)
+        client.chat_contexts[12345] = [{"role": "user", "content": "test"}]
         
         # Не должно вызывать исключение
         client._save_contexts()
 
-    @patch('services.neuroapi_client.requests.post')
+    def test_update_context_appends_to_store(self, client):
+        """Тест: обновление контекста передает в хранилище только новые реплики"""
+        client.chat_contexts = Mock()
+        client.chat_contexts.recent.return_value = []
+        
+        client._update_context(12345, "Привет", "Здравствуйте")
+        
+        client.chat_contexts.append.assert_called_once_with(
+            12345,
+            [
+                {"role": "user", "content": "Привет", "tokens": 3},
+                {"role": "assistant", "content": "Здравствуйте", "tokens": 6}
+            ],
+            20
+        )
+        client.chat_contexts.flush.assert_not_called()
+
+    def test_prepare_messages_reads_only_recent_turns(self, client):
+        """Тест: из хранилища читаются только последние реплики, кэш токенов не уходит в API"""
+        client.chat_contexts = Mock()
+        client.chat_contexts.recent.return_value = [{"role": "user", "content": "старое", "tokens": 3}]
+        client.chat_contexts.summary.return_value = None
+        
+        messages = client._prepare_messages("Новое", 12345)
+        
+        client.chat_contexts.recent.assert_called_once_with(12345, 20)
+        assert messages[1] == {"role": "user", "content": "старое"}
+
+    def test_prepare_messages_fills_token_budget_newest_first(self, client):
+        """Тест: история добавляется от новых реплик к старым, пока влезает в бюджет"""
+        history = [
+            {"role": "user", "content": "старое " * 500},
+            {"role": "assistant", "content": "ответ 1"},
+            {"role": "user", "content": "вопрос 2"},
+            {"role": "assistant", "content": "ответ 2"},
+        ]
+        client.chat_contexts = MemoryContextStore({"12345": history})
+        
+        with patch('services.neuroapi_client.config') as mock_config:
+            mock_config.ENABLE_CONTEXT = True
+            mock_config.CONTEXT_TOKEN_BUDGET = 200
+            messages = client._prepare_messages("Новое", 12345)
+        
+        assert [m["content"] for m in messages[1:-1]] == ["ответ 1", "вопрос 2", "ответ 2"]
+
+    def test_prepare_messages_keeps_context_after_long_reply(self, client):
+        """Тест: после ответа длиннее бюджета последний обмен остается в промпте"""
+        history = [
+            {"role": "user", "content": "Напиши длинный текст"},
+            {"role": "assistant", "content": "абзац " * 3000},
+        ]
+        client.chat_contexts = MemoryContextStore({"12345": history})
+
+        with patch('services.neuroapi_client.config') as mock_config:
+            mock_config.ENABLE_CONTEXT = True
+            mock_config.CONTEXT_TOKEN_BUDGET = 1000
+            messages = client._prepare_messages("Сократи", 12345)
+
+        assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+        assert messages[1]["content"] == "Напиши длинный текст"
+        assert messages[2]["content"].startswith("абзац")
+
+    def test_prepare_messages_business_budget(self, client):
+        """Тест: для business-чатов используется отдельный бюджет"""
+        history = [{"role": "user", "content": f"реплика {i}"} for i in range(10)]
+        client.chat_contexts = MemoryContextStore({"business_conn_1": history})
+        
+        with patch('services.neuroapi_client.config') as mock_config:
+            mock_config.ENABLE_CONTEXT = True
+            mock_config.CONTEXT_TOKEN_BUDGET = 10000
+            mock_config.CONTEXT_TOKEN_BUDGET_BUSINESS = 0
+            messages = client._prepare_messages("Вопрос", 1, is_business_message=True, business_connection_id="conn")
+        
+        assert len(messages) == 2
+        # История есть, поэтому выбран краткий системный промпт
+        assert "Продолжай общение" in messages[0]["content"]
+
+    def test_prepare_messages_prepends_summary(self, client):
+        """Тест: сводка ранней части разговора идет одним системным сообщением"""
+        client.chat_contexts = MemoryContextStore({"12345": [{"role": "user", "content": "недавнее"}]})
+        client.chat_contexts.set_summary(12345, "Клиент просил счет")
+        
+        messages = client._prepare_messages("Новое", 12345)
+        
+        assert [m["role"] for m in messages] == ["system", "system", "user", "user"]
+        assert "Клиент просил счет" in messages[1]["content"]
+
+    def test_update_context_schedules_evicted_turns(self, client):
+        """Тест: реплики, вытесненные из контекста, отдаются на сжатие в сводку"""
+        client.summarizer = Mock()
+        with patch('services.neuroapi_client.config.ENABLE_CONTEXT_SUMMARY', True):
+            for i in range(10):
+                client._update_context(12345, f"Сообщение {i}", f"Ответ {i}")
+            client.summarizer.schedule.assert_not_called()
+            
+            client._update_context(12345, "Сообщение 10", "Ответ 10")
+        
+        key, evicted = client.summarizer.schedule.call_args[0]
+        assert key == 12345
+        assert [turn["content"] for turn in evicted] == ["Сообщение 0", "Ответ 0"]
+
+    def test_update_context_summary_disabled(self, client):
+        """Тест: с выключенной сводкой вытесненные реплики не отправляются в модель"""
+        client.summarizer = Mock()
+        with patch('services.neuroapi_client.config.ENABLE_CONTEXT_SUMMARY', False):
+            for i in range(11):
+                client._update_context(12345, f"Сообщение {i}", f"Ответ {i}")
+        
+        client.summarizer.schedule.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_fold_summary_merges_previous_summary(self, client):
+        """Тест: новая сводка строится из прежней сводки и вытесненных реплик"""
+        client.chat_contexts = MemoryContextStore()
+        client.chat_contexts.set_summary(12345, "старая сводка")
+        session = make_fake_session(FakeAiohttpResponse(200, completion("новая сводка")))
+        
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)):
+            await client._fold_summary("12345", [{"role": "user", "content": "Привет"}])
+        
+        payload = session.post.call_args[1]["json"]
+        assert "старая сводка" in payload["messages"][1]["content"]
+        assert "Пользователь: Привет" in payload["messages"][1]["content"]
+        assert client.chat_contexts.summary(12345) == "новая сводка"
+
+    @pytest.mark.asyncio
+    async def test_summary_request_labelled_not_as_chat(self, client):
+        """Тест: запрос сводки передает ключ контекста меткой, а не вместо chat_id"""
+        with patch.object(client, '_request_completion_async', AsyncMock(return_value="сводка")) as mock_request:
+            await client._summarize("business_conn_5", None, [{"role": "user", "content": "Привет"}])
+
+        args, kwargs = mock_request.call_args
+        assert args[2] is None
+        assert kwargs["label"] == "summary of business_conn_5"
+
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_success(self, mock_post, client, mock_neuroapi_response):
         """Тест успешного получения ответа от NeuroAPI"""
         mock_post.return_value = mock_neuroapi_response
@@ -193,7 +397,7 @@ class TestNeuroAPIClient:
         assert response == "Тестовый ответ от GPT-5"
         mock_post.assert_called_once()
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_empty_input(self, mock_post, client):
         """Тест обработки пустого ввода"""
         response = client.get_response("", 12345)
@@ -201,7 +405,7 @@ class TestNeuroAPIClient:
         assert response == "Ошибка: пустой ввод"
         mock_post.assert_not_called()
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_long_message(self, mock_post, client, mock_neuroapi_response):
         """Тест обработки длинного сообщения"""
         mock_post.return_value = mock_neuroapi_response
@@ -214,7 +418,7 @@ class TestNeuroAPIClient:
         payload = call_args[1]['json']
         assert len(payload['messages'][-1]['content']) == 4000
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_api_error(self, mock_post, client):
         """Тест обработки ошибки API"""
         mock_response = Mock()
@@ -226,7 +430,7 @@ class TestNeuroAPIClient:
         
         assert "Извините, произошла ошибка" in response
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_business_api_error(self, mock_post, client):
         """Тест обработки ошибки API для бизнес-сообщений"""
         mock_response = Mock()
@@ -238,7 +442,7 @@ class TestNeuroAPIClient:
         
         assert "ИИ-ассистент Сергея" in response
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_empty_response(self, mock_post, client):
         """Тест обработки пустого ответа от API"""
         mock_response = Mock()
@@ -256,7 +460,7 @@ class TestNeuroAPIClient:
         
         assert "не смог сгенерировать ответ" in response
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_business_empty_response(self, mock_post, client):
         """Тест обработки пустого ответа для бизнес-сообщений"""
         mock_response = Mock()
@@ -274,7 +478,7 @@ class TestNeuroAPIClient:
         
         assert "ИИ-ассистент Сергея" in response
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_timeout(self, mock_post, client):
         """Тест обработки таймаута"""
         mock_post.side_effect = Exception("Timeout")
@@ -283,7 +487,7 @@ class TestNeuroAPIClient:
         
         assert "Превышено время ожидания" in response
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_business_timeout(self, mock_post, client):
         """Тест обработки таймаута для бизнес-сообщений"""
         mock_post.side_effect = Exception("Timeout")
@@ -292,7 +496,7 @@ class TestNeuroAPIClient:
         
         assert "ИИ-ассистент Сергея" in response
 
-    @patch('services.neuroapi_client.requests.post')
+    @patch('services.neuroapi_client.http_pool.sync_session.post')
     def test_get_response_retry_logic(self, mock_post, client):
         """Тест логики повторных попыток при пустом ответе"""
         # Первый ответ пустой, второй успешный
@@ -325,7 +529,7 @@ class TestNeuroAPIClient:
 
     def test_get_gpt_response_function(self, mock_neuroapi_response):
         """Тест функции get_gpt_response для обратной совместимости"""
-        with patch('services.neuroapi_client.requests.post', return_value=mock_neuroapi_response):
+        with patch('services.neuroapi_client.http_pool.sync_session.post', return_value=mock_neuroapi_response):
             response = get_gpt_response("Тест", 12345)
             assert response == "Тестовый ответ от GPT-5"
 
@@ -339,7 +543,7 @@ class TestNeuroAPIClient:
 
     def test_business_message_system_prompt_with_context(self, client, sample_context_data):
         """Тест системного промпта для бизнес-сообщения с контекстом"""
-        client.chat_contexts = sample_context_data
+        client.chat_contexts = MemoryContextStore(sample_context_data)
         
         messages = client._prepare_messages("Последующее сообщение", 67890, is_business_message=True, business_connection_id="test_connection")
         
@@ -347,3 +551,319 @@ class TestNeuroAPIClient:
         assert "ИИ-ассистент Сергея" in system_content
         assert "Продолжай общение" in system_content
 
+    @pytest.mark.asyncio
+    async def test_get_response_async_success(self, client):
+        """Тест успешного асинхронного получения ответа"""
+        session = make_fake_session(FakeAiohttpResponse(payload=completion("Асинхронный ответ")))
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)):
+            response = await client.get_response_async("Привет", 12345)
+
+        assert response == "Асинхронный ответ"
+        session.post.assert_called_once()
+        payload = session.post.call_args[1]['json']
+        assert payload['messages'][-1]['content'] == "Привет"
+        assert client.chat_contexts[12345][-1]['content'] == "Асинхронный ответ"
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_retries_empty_and_server_errors(self, client):
+        """Тест повторов при пустом ответе и 5xx в пределах дедлайна"""
+        session = make_fake_session(
+            FakeAiohttpResponse(payload=completion("")),
+            FakeAiohttpResponse(status=503, text="Unavailable"),
+            FakeAiohttpResponse(payload=completion("Успешный ответ")),
+        )
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            response = await client.get_response_async("Тест", 12345)
+
+        assert response == "Успешный ответ"
+        assert session.post.call_count == 3
+        assert mock_sleep.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_honors_retry_after(self, client):
+        """Тест: 429 с Retry-After приостанавливает апстрим и задерживает повтор не меньше указанного"""
+        session = make_fake_session(
+            FakeAiohttpResponse(status=429, text="Too Many Requests", headers={"Retry-After": "3"}),
+            FakeAiohttpResponse(payload=completion("Ответ")),
+        )
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            response = await client.get_response_async("Тест", 12345)
+
+        assert response == "Ответ"
+        assert any(call.args[0] >= 3 for call in mock_sleep.await_args_list)
+        assert client.limiter.throttled >= 1
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_client_error_no_retry(self, client):
+        """Тест: 4xx ошибка не повторяется и возвращает fallback"""
+        session = make_fake_session(FakeAiohttpResponse(status=400, text="Bad Request"))
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)):
+            response = await client.get_response_async("Тест", 12345, is_business_message=True, business_connection_id="test_connection")
+
+        assert "ИИ-ассистент Сергея" in response
+        session.post.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_deadline_exceeded(self, client):
+        """Тест: исчерпанный дедлайн дает ответ о таймауте"""
+        client.timeout = 0.05
+
+        session = Mock()
+        session.post = Mock(side_effect=asyncio.TimeoutError())
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)):
+            response = await client.get_response_async("Тест", 12345)
+
+        assert "Превышено время ожидания" in response
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_streaming(self, client):
+        """Тест: в режиме стриминга колбэк получает накопленный текст"""
+        session = make_fake_session(FakeAiohttpResponse(lines=sse("При", "вет", "!")))
+        seen = []
+
+        async def on_text(text):
+            seen.append(text)
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)):
+            response = await client.get_response_async("Привет", 12345, on_text=on_text)
+
+        assert response == "Привет!"
+        assert seen == ["При", "Привет", "Привет!"]
+        assert session.post.call_args[1]['json']['stream'] is True
+        assert client.chat_contexts[12345][-1]['content'] == "Привет!"
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_streaming_retries_before_first_token(self, client):
+        """Тест: до первого токена стриминг повторяет запрос как обычный режим"""
+        session = make_fake_session(
+            FakeAiohttpResponse(status=503, text="Unavailable"),
+            FakeAiohttpResponse(lines=sse("Ответ")),
+        )
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.asyncio.sleep', new_callable=AsyncMock):
+            response = await client.get_response_async("Тест", 12345, on_text=AsyncMock())
+
+        assert response == "Ответ"
+        assert session.post.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_streaming_keeps_partial_answer(self, client):
+        """Тест: оборванный после первых токенов поток не повторяется"""
+        lines = sse("Начало ответа")[:-1] + [aiohttp.ClientPayloadError("connection lost")]
+        session = make_fake_session(FakeAiohttpResponse(lines=lines))
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)):
+            response = await client.get_response_async("Тест", 12345, on_text=AsyncMock())
+
+        assert response == "Начало ответа"
+        session.post.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_partial_answer_not_cached(self, client):
+        """Тест: оборванный поток и поток без [DONE] не попадают в кэши ответов"""
+        client.chat_contexts = MemoryContextStore()
+        broken = sse("Начало ответа")[:-1] + [aiohttp.ClientPayloadError("connection lost")]
+        session = make_fake_session(
+            FakeAiohttpResponse(lines=broken),
+            FakeAiohttpResponse(lines=sse("Другое начало")[:-1]),
+        )
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.config.RESPONSE_CACHE_ENABLED', True), \
+             patch('services.neuroapi_client.config.NEAR_DUPLICATE_CACHE_ENABLED', True):
+            first = await client.get_response_async("Привет", 1, on_text=AsyncMock())
+            second = await client.get_response_async("Привет", 2, on_text=AsyncMock())
+
+        assert (first, second) == ("Начало ответа", "Другое начало")
+        assert client.response_cache.stats()["size"] == 0
+        assert client.near_duplicates.stats()["size"] == 0
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_response_cache(self, client):
+        """Тест: одинаковый первый вопрос в том же business-подключении отвечается из кэша"""
+        client.chat_contexts = MemoryContextStore()
+        session = make_fake_session(
+            FakeAiohttpResponse(payload=completion("Здравствуйте! Чем помочь?")),
+            FakeAiohttpResponse(payload=completion("Ответ для другого подключения")),
+        )
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.config.RESPONSE_CACHE_ENABLED', True):
+            first = await client.get_response_async("Здравствуйте!", 1, True, "conn")
+            second = await client.get_response_async("здравствуйте", 2, True, "conn")
+            other = await client.get_response_async("здравствуйте", 3, True, "other_conn")
+
+        assert first == second == "Здравствуйте! Чем помочь?"
+        assert other == "Ответ для другого подключения"
+        assert session.post.call_count == 2
+        assert client.response_cache.hits == 1
+        # Ответ из кэша тоже попадает в контекст чата
+        assert client.chat_contexts["business_conn_2"][-1]["content"] == "Здравствуйте! Чем помочь?"
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_response_cache_skips_context(self, client):
+        """Тест: при наличии истории кэш ответов не используется"""
+        client.chat_contexts = MemoryContextStore({"12345": [{"role": "user", "content": "раньше"}]})
+        session = make_fake_session(FakeAiohttpResponse(payload=completion("Ответ")))
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.config.RESPONSE_CACHE_ENABLED', True):
+            await client.get_response_async("Привет", 12345)
+
+        assert client.response_cache.stats()["size"] == 0
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_cache_skips_history_dropped_by_budget(self, client):
+        """Тест: история, не влезшая в бюджет токенов, все равно отключает кэши"""
+        client.chat_contexts = MemoryContextStore()
+        client.response_cache.put(
+            client._response_cache_key("Привет", [{"role": "system", "content": "Ты — полезный Telegram-бот. Отвечай дружелюбно и информативно на русском языке."}], True, False, None),
+            "Чужой ответ",
+        )
+        client._update_context(12345, "Вопрос", "очень длинный ответ " * 2000)
+        session = make_fake_session(FakeAiohttpResponse(payload=completion("Свой ответ")))
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.config.RESPONSE_CACHE_ENABLED', True), \
+             patch('services.neuroapi_client.config.NEAR_DUPLICATE_CACHE_ENABLED', True), \
+             patch('services.neuroapi_client.config.CONTEXT_TOKEN_BUDGET', 100):
+            response = await client.get_response_async("Привет", 12345)
+
+        assert response == "Свой ответ"
+        assert client.near_duplicates.stats()["size"] == 0
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_near_duplicate_cache(self, client):
+        """Тест: почти одинаковый первый вопрос отвечается из индекса без запроса к модели"""
+        client.chat_contexts = MemoryContextStore()
+        session = make_fake_session(FakeAiohttpResponse(payload=completion("Работаем с 9 до 18")))
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.config.NEAR_DUPLICATE_CACHE_ENABLED', True), \
+             patch.object(client.near_duplicates, 'threshold', 0.6):
+            first = await client.get_response_async("Подскажите часы работы офиса", 1, True, "conn")
+            second = await client.get_response_async("подскажите, пожалуйста, часы работы офиса", 2, True, "conn")
+
+        assert first == second == "Работаем с 9 до 18"
+        session.post.assert_called_once()
+        assert client.near_duplicates.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_failover_to_yandex(self, client):
+        """Тест: при отказе NeuroAPI ответ дает YandexGPT, сообщения переводятся в его схему"""
+        client.chat_contexts = MemoryContextStore()
+        client.router = ProviderRouter([
+            Provider("neuroapi", CircuitBreaker("neuroapi")),
+            Provider("yandex", CircuitBreaker("yandex")),
+        ], attempt_timeout=5)
+        session = make_fake_session(FakeAiohttpResponse(status=401, text="invalid key"))
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.yandex_client.complete_async', new_callable=AsyncMock, return_value="Ответ YandexGPT") as mock_yandex:
+            response = await client.get_response_async("Привет", 12345)
+
+        assert response == "Ответ YandexGPT"
+        sent = mock_yandex.call_args[0][0]
+        assert sent[-1] == {"role": "user", "content": "Привет"}
+        assert client.router.failovers == 1
+        # Ответ резервного провайдера записан в контекст как обычно
+        assert client.chat_contexts["12345"][-1]["content"] == "Ответ YandexGPT"
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_bad_request_not_failed_over(self, client):
+        """Тест: запрос, отклоненный как некорректный (400), не отправляется резервному провайдеру"""
+        client.chat_contexts = MemoryContextStore()
+        client.router = ProviderRouter([
+            Provider("neuroapi", CircuitBreaker("neuroapi")),
+            Provider("yandex", CircuitBreaker("yandex")),
+        ], attempt_timeout=5)
+        session = make_fake_session(FakeAiohttpResponse(status=400, text="bad request"))
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.yandex_client.complete_async', new_callable=AsyncMock) as mock_yandex:
+            await client.get_response_async("Привет", 12345)
+
+        mock_yandex.assert_not_called()
+        assert client.router.failovers == 0
+        assert client.router.stats()["circuits"]["neuroapi"]["failures"] == 0
+
+    def test_unconfigured_provider_skipped(self, client):
+        """Тест: провайдер без ключей не попадает в маршрутизатор"""
+        with patch('services.neuroapi_client.config.LLM_PROVIDERS', ["neuroapi", "yandex"]), \
+             patch.object(type(yandex_client), 'configured', new_callable=PropertyMock, return_value=False):
+            router = client._build_router()
+
+        assert router.names == ["neuroapi"]
+        assert router.providers[0].breaker.slow_call_sec == 0
+
+    def test_last_provider_ignores_slow_calls(self, client):
+        """Тест: медленные ответы учитываются только у провайдеров, за которыми есть резерв"""
+        with patch('services.neuroapi_client.config.LLM_PROVIDERS', ["neuroapi", "yandex"]), \
+             patch.object(type(yandex_client), 'configured', new_callable=PropertyMock, return_value=True), \
+             patch('services.neuroapi_client.config.BREAKER_SLOW_CALL_SEC', 20.0):
+            router = client._build_router()
+        with patch('services.neuroapi_client.config.LLM_PROVIDERS', ["neuroapi"]):
+            single = client._build_router()
+
+        assert [provider.breaker.slow_call_sec for provider in router.providers] == [20.0, 0]
+        assert single.providers[0].breaker.slow_call_sec == 0
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_hedged_stream(self, client):
+        """Тест: при хеджировании текст показывает только победившая попытка"""
+        client.chat_contexts = MemoryContextStore()
+        client.hedger.max_delay = 0
+        client.hedger.min_delay = 0
+        client.hedger.budget_ratio = 1.0
+        session = make_fake_session(
+            FakeAiohttpResponse(lines=sse("Пер", "вый")),
+            FakeAiohttpResponse(lines=sse("Вто", "рой")),
+        )
+        on_text = AsyncMock()
+
+        with patch.object(client, '_get_session', AsyncMock(return_value=session)), \
+             patch('services.neuroapi_client.config.HEDGE_ENABLED', True):
+            response = await client.get_response_async("Тест", 12345, on_text=on_text)
+
+        shown = [call.args[0] for call in on_text.call_args_list]
+        assert response in ("Первый", "Второй")
+        assert shown[-1] == response
+        assert all(response.startswith(text) for text in shown)
+
+    @pytest.mark.asyncio
+    async def test_get_response_async_empty_input(self, client):
+        """Тест пустого ввода в асинхронном режиме"""
+        with patch.object(client, '_get_session', AsyncMock()) as mock_session:
+            response = await client.get_response_async("   ", 12345)
+
+        assert response == "Ошибка: пустой ввод"
+        mock_session.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_get_gpt_response_async_function(self):
+        """Тест асинхронной обертки get_gpt_response_async"""
+        with patch('services.neuroapi_client.neuroapi_client.get_response_async', new_callable=AsyncMock, return_value="Ответ") as mock_get:
+            response = await get_gpt_response_async("Тест", 12345, is_business_message=True, business_connection_id="conn")
+
+        assert response == "Ответ"
+        mock_get.assert_awaited_once_with("Тест", 12345, True, "conn")
+
+    @pytest.mark.asyncio
+    async def test_get_session_uses_shared_pool(self, client):
+        """Тест: соединения берутся из общего пула, закрытие клиента пул не закрывает"""
+        session = Mock()
+        with patch('services.neuroapi_client.http_pool.session', return_value=session) as mock_pool, \
+             patch('services.neuroapi_client.http_pool.close', new_callable=AsyncMock) as mock_close:
+            assert await client._get_session() is session
+            await client.close()
+
+        mock_pool.assert_called_once_with(client.endpoint)
+        mock_close.assert_not_awaited()
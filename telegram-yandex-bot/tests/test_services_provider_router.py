@@ -0,0 +1,258 @@
+"""
+Тесты для автоматов защиты и переключения между провайдерами LLM.
+"""
+import pytest
+import sys
+import os
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from services.provider_router import Provider, ProviderRouter, ProviderUnavailableError
+from services.neuroapi_client import NeuroAPIError
+from services.yandex_client import YandexGPTError
+
+
+@pytest.mark.services
+class TestCircuitBreaker:
+    """Тесты для CircuitBreaker"""
+
+    def test_opens_on_failure_rate(self):
+        """Тест: автомат размыкается при доле ошибок выше порога"""
+        breaker = CircuitBreaker("p", window=10, min_calls=4, failure_rate=0.5)
+        breaker.record_success(0.1)
+        breaker.record_failure(0.1)
+        breaker.record_success(0.1)
+        assert breaker.state == CLOSED
+
+        breaker.record_failure(0.1)
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.rejected == 1
+
+    def test_opens_on_slow_calls(self):
+        """Тест: автомат размыкается, если слишком много медленных ответов"""
+        breaker = CircuitBreaker("p", min_calls=3, slow_call_sec=5, slow_call_rate=0.6)
+        breaker.record_success(6)
+        breaker.record_success(1)
+        breaker.record_success(7)
+
+        assert breaker.state == OPEN
+
+    def test_half_open_probe(self):
+        """Тест: после паузы пропускается одна проба, успех замыкает автомат"""
+        breaker = CircuitBreaker("p", min_calls=1, open_sec=30)
+        with patch('services.circuit_breaker.time.monotonic', return_value=100.0):
+            breaker.record_failure(0.1)
+        with patch('services.circuit_breaker.time.monotonic', return_value=131.0):
+            assert breaker.allow()
+            assert breaker.state == HALF_OPEN
+            assert not breaker.allow()
+            breaker.record_success(0.1)
+
+        assert breaker.state == CLOSED
+        assert breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        """Тест: неудачная проба снова размыкает автомат"""
+        breaker = CircuitBreaker("p", min_calls=1, open_sec=30)
+        with patch('services.circuit_breaker.time.monotonic', return_value=100.0):
+            breaker.record_failure(0.1)
+        with patch('services.circuit_breaker.time.monotonic', return_value=131.0):
+            assert breaker.allow()
+            breaker.record_failure(0.1)
+            assert breaker.state == OPEN
+            assert not breaker.allow()
+
+        assert breaker.opened == 2
+
+    def test_slow_check_disabled(self):
+        """Тест: при slow_call_sec=0 медленные ответы автомат не размыкают"""
+        breaker = CircuitBreaker("p", min_calls=1, slow_call_sec=0)
+        breaker.record_success(600)
+
+        assert breaker.state == CLOSED
+
+    def test_release_returns_probe(self):
+        """Тест: проба без результата возвращается, автомат не застревает в half-open"""
+        breaker = CircuitBreaker("p", min_calls=1, open_sec=30)
+        with patch('services.circuit_breaker.time.monotonic', return_value=100.0):
+            breaker.record_failure(0.1)
+        with patch('services.circuit_breaker.time.monotonic', return_value=131.0):
+            assert breaker.allow()
+            breaker.release()
+            assert breaker.state == HALF_OPEN
+            assert breaker.allow()
+
+
+@pytest.mark.services
+class TestProviderRouter:
+    """Тесты для ProviderRouter"""
+
+    @pytest.fixture
+    def router(self):
+        return ProviderRouter([
+            Provider("primary", CircuitBreaker("primary", min_calls=1)),
+            Provider("backup", CircuitBreaker("backup")),
+        ], attempt_timeout=0.05)
+
+    @pytest.mark.asyncio
+    async def test_primary_answers(self, router):
+        """Тест: здоровый основной провайдер отвечает сам"""
+        backup = AsyncMock(return_value="резерв")
+        answer = await router.complete({"primary": AsyncMock(return_value="ответ"), "backup": backup}, 1)
+
+        assert answer == ("ответ", "primary")
+        backup.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_failover_on_error(self, router):
+        """Тест: при ошибке основного запрос уходит резервному провайдеру"""
+        answer = await router.complete({
+            "primary": AsyncMock(side_effect=ConnectionError("down")),
+            "backup": AsyncMock(return_value="резерв"),
+        }, 1)
+
+        assert answer == ("резерв", "backup")
+        assert router.failovers == 1
+        assert router.stats()["circuits"]["primary"]["state"] == OPEN
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("error", [NeuroAPIError(400, "bad"), YandexGPTError(413, "too long")])
+    async def test_request_error_not_failed_over(self, router, error):
+        """Тест: ошибка самого запроса (4xx) у любого провайдера - не отказ и не повод переключаться"""
+        backup = AsyncMock(return_value="резерв")
+
+        with pytest.raises(type(error)):
+            await router.complete({"primary": AsyncMock(side_effect=error), "backup": backup}, 1)
+
+        backup.assert_not_called()
+        assert router.failovers == 0
+        circuit = router.stats()["circuits"]["primary"]
+        assert circuit["failures"] == 0
+        assert circuit["state"] == CLOSED
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("error", [NeuroAPIError(401, "key"), YandexGPTError(429, "quota"), YandexGPTError(500, "down")])
+    async def test_provider_side_error_fails_over(self, router, error):
+        """Тест: ключ, квота и 5xx - отказ провайдера у обоих клиентов, запрос уходит резервному"""
+        answer = await router.complete({
+            "primary": AsyncMock(side_effect=error),
+            "backup": AsyncMock(return_value="резерв"),
+        }, 1)
+
+        assert answer == ("резерв", "backup")
+        assert router.stats()["circuits"]["primary"]["failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_bounded_by_attempt_timeout(self, router):
+        """Тест: зависший основной провайдер ждем не дольше attempt_timeout"""
+        async def hang(budget, first_byte):
+            await asyncio.sleep(10)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        answer = await router.complete({"primary": hang, "backup": AsyncMock(return_value="резерв")}, 5)
+
+        assert answer == ("резерв", "backup")
+        assert loop.time() - started < 1
+
+    @pytest.mark.asyncio
+    async def test_started_answer_not_bounded_by_attempt_timeout(self, router):
+        """Тест: начавший отвечать провайдер дописывает ответ после attempt_timeout"""
+        backup = AsyncMock(return_value="резерв")
+
+        async def stream(budget, first_byte):
+            first_byte()
+            await asyncio.sleep(0.2)
+            return "длинный ответ"
+
+        answer = await router.complete({"primary": stream, "backup": backup}, 5)
+
+        assert answer == ("длинный ответ", "primary")
+        backup.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_no_failover_after_first_byte(self, router):
+        """Тест: после первого токена резервный ответ не заменяет показанный текст"""
+        backup = AsyncMock(return_value="резерв")
+
+        async def broken(budget, first_byte):
+            first_byte()
+            raise ConnectionError("stream broke")
+
+        with pytest.raises(ConnectionError):
+            await router.complete({"primary": broken, "backup": backup}, 1)
+        backup.assert_not_called()
+        assert router.failovers == 0
+
+    @pytest.mark.asyncio
+    async def test_breaker_sees_time_to_first_byte(self):
+        """Тест: медленным считается поздний первый токен, а не длинный ответ"""
+        breaker = CircuitBreaker("primary", min_calls=1, slow_call_sec=0.1, slow_call_rate=0.5)
+        router = ProviderRouter([Provider("primary", breaker), Provider("backup", CircuitBreaker("backup"))], attempt_timeout=1)
+
+        async def stream(budget, first_byte):
+            first_byte()
+            await asyncio.sleep(0.2)
+            return "ответ"
+
+        await router.complete({"primary": stream, "backup": AsyncMock()}, 5)
+
+        assert breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_provider(self, router):
+        """Тест: при разомкнутом автомате провайдер пропускается без ожидания"""
+        router.providers[0].breaker.record_failure(0.1)
+        primary = AsyncMock(return_value="ответ")
+
+        answer = await router.complete({"primary": primary, "backup": AsyncMock(return_value="резерв")}, 1)
+
+        assert answer == ("резерв", "backup")
+        primary.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_all_providers_fail(self, router):
+        """Тест: ошибка последнего провайдера пробрасывается вызывающему"""
+        with pytest.raises(ValueError):
+            await router.complete({
+                "primary": AsyncMock(side_effect=ConnectionError("down")),
+                "backup": AsyncMock(side_effect=ValueError("bad")),
+            }, 1)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_half_open_probe_released(self, router):
+        """Тест: отмененная проба не оставляет провайдера отключенным навсегда"""
+        breaker = router.providers[0].breaker
+        breaker.record_failure(0.1)
+        breaker._opened_at -= breaker.open_sec
+        started = asyncio.Event()
+
+        async def hang(*args):
+            started.set()
+            await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(router.complete({"primary": hang, "backup": AsyncMock(return_value="резерв")}, 5))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert breaker.state == HALF_OPEN
+        answer = await router.complete({"primary": AsyncMock(return_value="ответ"), "backup": AsyncMock()}, 1)
+        assert answer == ("ответ", "primary")
+        assert breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_no_provider_available(self, router):
+        """Тест: если все автоматы разомкнуты - ProviderUnavailableError"""
+        for provider in router.providers:
+            provider.breaker.state = OPEN
+            provider.breaker._opened_at = asyncio.get_running_loop().time() + 1000
+
+        with pytest.raises(ProviderUnavailableError):
+            await router.complete({"primary": AsyncMock(), "backup": AsyncMock()}, 1)
@@ -0,0 +1,151 @@
+"""
+Тесты для дублирующих (hedged) запросов.
+"""
+import pytest
+import sys
+import os
+import asyncio
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.request_hedger import RequestHedger
+
+
+def fast_hedger(**kwargs):
+    """Хеджер с маленькой задержкой и без ограничения бюджета"""
+    params = dict(min_delay=0.01, max_delay=0.02, budget_ratio=1.0, min_samples=1000)
+    params.update(kwargs)
+    return RequestHedger(**params)
+
+
+@pytest.mark.services
+class TestRequestHedger:
+    """Тесты для RequestHedger"""
+
+    def test_adaptive_delay(self):
+        """Тест: задержка - квантиль наблюдаемого времени до первого байта"""
+        hedger = RequestHedger(quantile=0.9, min_delay=0.5, max_delay=30, min_samples=10)
+        assert hedger.delay() == 30
+
+        for i in range(1, 11):
+            hedger.record_first_byte(float(i))
+
+        assert hedger.delay() == 10.0
+        hedger._samples.clear()
+        for _ in range(10):
+            hedger.record_first_byte(0.1)
+        assert hedger.delay() == 0.5
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_not_hedged(self):
+        """Тест: быстрый ответ не дублируется"""
+        hedger = fast_hedger(max_delay=1)
+        calls = []
+
+        async def attempt(index, mark):
+            calls.append(index)
+            return "ответ"
+
+        assert await hedger.run(attempt) == "ответ"
+        assert calls == [0]
+        assert hedger.stats()["hedged"] == 0
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_loses_to_hedge(self):
+        """Тест: медленная основная попытка отменяется, побеждает дубль"""
+        hedger = fast_hedger()
+        cancelled = []
+
+        async def attempt(index, mark):
+            if index == 0:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(index)
+                    raise
+            return f"ответ {index}"
+
+        assert await hedger.run(attempt) == "ответ 1"
+        await asyncio.sleep(0)
+        assert cancelled == [0]
+        stats = hedger.stats()
+        assert stats["hedged"] == 1
+        assert stats["hedge_wins"] == 1
+        assert stats["win_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_primary_recorded_as_lower_bound(self):
+        """Тест: время отмененной основной попытки попадает в окно как нижняя оценка"""
+        hedger = fast_hedger()
+
+        async def attempt(index, mark):
+            if index == 0:
+                await asyncio.sleep(10)
+            await asyncio.sleep(0.05)
+            return f"ответ {index}"
+
+        assert await hedger.run(attempt) == "ответ 1"
+        hedge_sample, primary_sample = hedger._samples
+        assert hedge_sample >= 0.05
+        assert primary_sample >= 0.06
+        assert primary_sample > hedge_sample
+
+    @pytest.mark.asyncio
+    async def test_first_streamed_token_wins(self):
+        """Тест: при стриминге побеждает попытка, первой выдавшая токены"""
+        hedger = fast_hedger()
+        shown = []
+
+        async def attempt(index, mark):
+            if index == 1:
+                await asyncio.sleep(10)
+            await asyncio.sleep(0.05)
+            if mark():
+                shown.append(index)
+            return f"ответ {index}"
+
+        assert await hedger.run(attempt) == "ответ 0"
+        assert shown == [0]
+        assert hedger.hedge_wins == 0
+
+    @pytest.mark.asyncio
+    async def test_budget_cap(self):
+        """Тест: доля дублированных запросов не превышает бюджет"""
+        hedger = fast_hedger(budget_ratio=0.0)
+        calls = []
+
+        async def attempt(index, mark):
+            calls.append(index)
+            await asyncio.sleep(0.05)
+            return "ответ"
+
+        assert await hedger.run(attempt) == "ответ"
+        assert calls == [0]
+        assert hedger.skipped_budget == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_primary_falls_back_to_hedge(self):
+        """Тест: если основная попытка упала, ждем дубль"""
+        hedger = fast_hedger()
+
+        async def attempt(index, mark):
+            if index == 0:
+                await asyncio.sleep(0.05)
+                raise ConnectionError("down")
+            await asyncio.sleep(0.1)
+            return "ответ дубля"
+
+        assert await hedger.run(attempt) == "ответ дубля"
+
+    @pytest.mark.asyncio
+    async def test_all_attempts_fail(self):
+        """Тест: если упали обе попытки, пробрасывается ошибка основной"""
+        hedger = fast_hedger()
+
+        async def attempt(index, mark):
+            await asyncio.sleep(0.05)
+            raise ConnectionError(f"down {index}")
+
+        with pytest.raises(ConnectionError, match="down 0"):
+            await hedger.run(attempt)
@@ -0,0 +1,67 @@
+"""
+Тесты для кэша ответов.
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.response_cache import ResponseCache, normalize_text
+
+
+@pytest.mark.services
+class TestResponseCache:
+    """Тесты для ResponseCache"""
+
+    def test_normalize_text(self):
+        """Тест нормализации: регистр, пунктуация, пробелы, ё"""
+        assert normalize_text("  Здравствуйте!!! ") == "здравствуйте"
+        assert normalize_text("Вы  работаете?") == normalize_text("вы работаете")
+        assert normalize_text("Ещё") == "еще"
+
+    def test_key_components(self):
+        """Тест: ключ зависит от промпта, контекста и области, но не от регистра"""
+        base = ResponseCache.make_key("Сколько стоит?", "prompt", "ctx", "business:conn")
+
+        assert ResponseCache.make_key("сколько  стоит", "prompt", "ctx", "business:conn") == base
+        assert ResponseCache.make_key("Сколько стоит?", "other", "ctx", "business:conn") != base
+        assert ResponseCache.make_key("Сколько стоит?", "prompt", "other", "business:conn") != base
+        assert ResponseCache.make_key("Сколько стоит?", "prompt", "ctx", "business:other") != base
+
+    def test_hit_and_miss_counters(self):
+        """Тест счетчиков попаданий и промахов"""
+        cache = ResponseCache()
+        assert cache.get("k") is None
+        cache.put("k", "ответ")
+        assert cache.get("k") == "ответ"
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_ttl_expiry(self):
+        """Тест: запись устаревает по TTL"""
+        cache = ResponseCache(ttl_sec=60)
+        with patch('services.response_cache.time.time', return_value=1000.0):
+            cache.put("k", "ответ")
+        with patch('services.response_cache.time.time', return_value=1061.0):
+            assert cache.get("k") is None
+
+        assert cache.expired == 1
+        assert cache.stats()["size"] == 0
+
+    def test_lru_eviction(self):
+        """Тест: при переполнении вытесняется давно не использованная запись"""
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")
+        cache.put("c", "3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.evictions == 1
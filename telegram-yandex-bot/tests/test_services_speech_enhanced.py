@@ -62,7 +62,7 @@ class TestSpeechClientEnhanced:
             with pytest.raises(ValueError, match="No API key or IAM token provided"):
                 client._get_headers()
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_speech_to_text_success(self, mock_post, client, mock_speech_response):
         """Тест успешного преобразования речи в текст"""
         mock_post.return_value = mock_speech_response
@@ -73,7 +73,7 @@ class TestSpeechClientEnhanced:
         assert result == "Распознанный текст"
         mock_post.assert_called_once()
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_speech_to_text_api_error(self, mock_post, client):
         """Тест обработки ошибки API при преобразовании речи"""
         mock_response = Mock()
@@ -86,7 +86,7 @@ class TestSpeechClientEnhanced:
         
         assert result is None
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_speech_to_text_network_error(self, mock_post, client):
         """Тест обработки сетевой ошибки при преобразовании речи"""
         mock_post.side_effect = Exception("Network error")
@@ -96,7 +96,7 @@ class TestSpeechClientEnhanced:
         
         assert result is None
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_speech_to_text_invalid_response(self, mock_post, client):
         """Тест обработки невалидного ответа при преобразовании речи"""
         mock_response = Mock()
@@ -109,7 +109,7 @@ class TestSpeechClientEnhanced:
         
         assert result is None
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_text_to_speech_success(self, mock_post, client, mock_speech_response):
         """Тест успешного преобразования текста в речь"""
         mock_post.return_value = mock_speech_response
@@ -120,7 +120,7 @@ class TestSpeechClientEnhanced:
         assert result == b"fake_audio_data"
         mock_post.assert_called_once()
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_text_to_speech_api_error(self, mock_post, client):
         """Тест обработки ошибки API при преобразовании текста"""
         mock_response = Mock()
@@ -133,7 +133,7 @@ class TestSpeechClientEnhanced:
         
         assert result is None
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_text_to_speech_network_error(self, mock_post, client):
         """Тест обработки сетевой ошибки при преобразовании текста"""
         mock_post.side_effect = Exception("Network error")
@@ -163,7 +163,7 @@ class TestSpeechClientEnhanced:
             
             assert result is None
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_speech_to_text_request_params(self, mock_post, client, mock_speech_response):
         """Тест параметров запроса для STT"""
         mock_post.return_value = mock_speech_response
@@ -185,7 +185,7 @@ class TestSpeechClientEnhanced:
         assert 'language' in data.fields
         assert 'format' in data.fields
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_text_to_speech_request_params(self, mock_post, client, mock_speech_response):
         """Тест параметров запроса для TTS"""
         mock_post.return_value = mock_speech_response
@@ -222,7 +222,7 @@ class TestSpeechClientEnhanced:
         result = client.text_to_speech(None)
         assert result is None
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_speech_to_text_different_language(self, mock_post, client, mock_speech_response):
         """Тест STT с другим языком"""
         mock_post.return_value = mock_speech_response
@@ -238,7 +238,7 @@ class TestSpeechClientEnhanced:
             data = call_args[1]['data']
             assert data.fields['language'] == 'en-US'
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_text_to_speech_different_voice(self, mock_post, client, mock_speech_response):
         """Тест TTS с другим голосом"""
         mock_post.return_value = mock_speech_response
@@ -254,7 +254,7 @@ class TestSpeechClientEnhanced:
             data = call_args[1]['data']
             assert data.fields['voice'] == 'john'
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_text_to_speech_different_format(self, mock_post, client, mock_speech_response):
         """Тест TTS с другим форматом"""
         mock_post.return_value = mock_speech_response
@@ -270,7 +270,7 @@ class TestSpeechClientEnhanced:
             data = call_args[1]['data']
             assert data.fields['format'] == 'mp3'
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_speech_to_text_large_audio(self, mock_post, client, mock_speech_response):
         """Тест STT с большим аудио файлом"""
         mock_post.return_value = mock_speech_response
@@ -281,7 +281,7 @@ class TestSpeechClientEnhanced:
         assert result == "Распознанный текст"
         mock_post.assert_called_once()
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     def test_text_to_speech_long_text(self, mock_post, client, mock_speech_response):
         """Тест TTS с длинным текстом"""
         mock_post.return_value = mock_speech_response
@@ -309,7 +309,7 @@ class TestSpeechClientEnhanced:
 
     def test_speech_to_text_unicode_text(self, client, mock_speech_response):
         """Тест STT с Unicode текстом в ответе"""
-        with patch('services.speech_client.requests.post') as mock_post:
+        with patch('services.speech_client.http_pool.sync_session.post') as mock_post:
             mock_response = Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = {
@@ -324,7 +324,7 @@ class TestSpeechClientEnhanced:
 
     def test_text_to_speech_unicode_text(self, client, mock_speech_response):
         """Тест TTS с Unicode текстом"""
-        with patch('services.speech_client.requests.post') as mock_post:
+        with patch('services.speech_client.http_pool.sync_session.post') as mock_post:
             mock_post.return_value = mock_speech_response
             
             unicode_text = "Привет, мир! 🌍"
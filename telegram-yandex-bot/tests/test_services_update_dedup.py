@@ -0,0 +1,150 @@
+"""
+Тесты для фильтра повторных доставок update_id.
+"""
+import pytest
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.update_dedup import UpdateDeduplicator
+
+
+@pytest.mark.services
+class TestUpdateDeduplicator:
+    """Тесты для UpdateDeduplicator"""
+
+    def test_duplicate_detected(self):
+        """Тест: повторный update_id распознается как дубликат"""
+        dedup = UpdateDeduplicator(capacity=100, ttl_sec=60)
+
+        assert dedup.check_and_add(1) is False
+        assert dedup.check_and_add(2) is False
+        assert dedup.check_and_add(1) is True
+
+        stats = dedup.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["size"] == 2
+
+    def test_capacity_evicts_oldest(self):
+        """Тест: при переполнении вытесняются самые старые id"""
+        dedup = UpdateDeduplicator(capacity=3, ttl_sec=60)
+
+        for update_id in range(5):
+            dedup.check_and_add(update_id)
+
+        assert dedup.stats()["size"] == 3
+        assert dedup.check_and_add(0) is False
+        assert dedup.check_and_add(4) is True
+
+    def test_ttl_expires_ids(self):
+        """Тест: id забываются по истечении окна"""
+        dedup = UpdateDeduplicator(capacity=100, ttl_sec=10)
+
+        with patch('services.update_dedup.time.time', return_value=1000.0):
+            dedup.check_and_add(1)
+        with patch('services.update_dedup.time.time', return_value=1005.0):
+            assert dedup.check_and_add(1) is True
+        with patch('services.update_dedup.time.time', return_value=1020.0):
+            assert dedup.check_and_add(1) is False
+
+    def test_forget(self):
+        """Тест: forget позволяет обработать повторную доставку"""
+        dedup = UpdateDeduplicator(capacity=100, ttl_sec=60)
+
+        dedup.check_and_add(7)
+        dedup.forget(7)
+
+        assert dedup.check_and_add(7) is False
+
+    def test_forget_keeps_eviction_order(self):
+        """Тест: забытый id не мешает вытеснению остальных по вместимости"""
+        dedup = UpdateDeduplicator(capacity=3, ttl_sec=60)
+        for update_id in (1, 2, 3):
+            dedup.check_and_add(update_id)
+
+        dedup.forget(2)
+        assert dedup.stats()["size"] == 2
+        dedup.check_and_add(2)
+        dedup.check_and_add(4)
+
+        assert dedup.check_and_add(1) is False
+        assert dedup.check_and_add(2) is True
+
+    def test_forget_persisted_across_restarts(self):
+        """Тест: забытый id после перезапуска снова обрабатывается"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "seen_updates.txt")
+
+            dedup = UpdateDeduplicator(capacity=100, ttl_sec=60, persist_file=path)
+            dedup.check_and_add(10)
+            dedup.check_and_add(11)
+            dedup.forget(10)
+            dedup.close()
+
+            restarted = UpdateDeduplicator(capacity=100, ttl_sec=60, persist_file=path)
+            assert restarted.check_and_add(10) is False
+            assert restarted.check_and_add(11) is True
+            restarted.close()
+
+    def test_persistence_across_restarts(self):
+        """Тест: увиденные id переживают перезапуск"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "seen_updates.txt")
+
+            dedup = UpdateDeduplicator(capacity=100, ttl_sec=60, persist_file=path)
+            dedup.check_and_add(10)
+            dedup.check_and_add(11)
+            dedup.close()
+
+            restarted = UpdateDeduplicator(capacity=100, ttl_sec=60, persist_file=path)
+            assert restarted.check_and_add(10) is True
+            assert restarted.check_and_add(12) is False
+            restarted.close()
+
+    def test_persistence_written_by_background_thread(self):
+        """Тест: check_and_add только ставит строку в очередь, файл пишет фоновый поток"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "seen_updates.txt")
+
+            dedup = UpdateDeduplicator(capacity=100, ttl_sec=60, persist_file=path, flush_interval=60)
+            with patch('builtins.open', side_effect=AssertionError("file I/O on the caller's path")):
+                dedup.check_and_add(10)
+                dedup.forget(10)
+                dedup.check_and_add(11)
+            assert os.path.getsize(path) == 0
+
+            dedup.close()
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = [line.split() for line in f]
+            assert [(int(parts[0]), parts[1] == "forget") for parts in lines] == [(10, False), (10, True), (11, False)]
+
+    def test_persistence_skips_truncated_line(self):
+        """Тест: оборванная строка в файле игнорируется"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "seen_updates.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("5 9999999999.0\n6 99")
+
+            dedup = UpdateDeduplicator(capacity=100, ttl_sec=10 ** 12, persist_file=path)
+            assert dedup.check_and_add(5) is True
+            assert dedup.stats()["size"] == 1
+            dedup.close()
+
+    def test_persist_file_is_compacted(self):
+        """Тест: файл компактируется и не растет бесконечно"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "seen_updates.txt")
+
+            dedup = UpdateDeduplicator(capacity=5, ttl_sec=60, persist_file=path)
+            for update_id in range(20):
+                dedup.check_and_add(update_id)
+            dedup.close()
+
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            assert len(lines) <= 10
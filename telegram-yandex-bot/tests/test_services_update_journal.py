@@ -0,0 +1,114 @@
+"""
+Тесты для журнала входящих updates.
+"""
+import pytest
+import sys
+import os
+import json
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.update_journal import UpdateJournal
+from services.journal_index import SegmentIndex, index_path, query_segment
+
+
+def read_lines(path):
+    with open(path, 'rb') as f:
+        return f.read().splitlines()
+
+
+@pytest.mark.services
+class TestUpdateJournal:
+    """Тесты для UpdateJournal"""
+
+    def test_raw_body_spliced_without_reserialization(self, tmp_path):
+        """Тест: тело запроса пишется как есть, одной строкой с временем получения"""
+        path = str(tmp_path / "updates.jsonl")
+        journal = UpdateJournal(path)
+        journal.start()
+        body = b'{"update_id": 1,\n "message": {"text": "a\\nb"}}'
+
+        assert journal.append(body, received_at=1700000000.25)
+        journal.close()
+
+        lines = read_lines(path)
+        assert len(lines) == 1
+        assert lines[0] == b'{"ts":1700000000.250,"update":{"update_id": 1,  "message": {"text": "a\\nb"}}}'
+        assert json.loads(lines[0])["update"]["message"]["text"] == "a\nb"
+
+    def test_batched_writes(self, tmp_path):
+        """Тест: накопленные записи пишутся одной пачкой"""
+        path = str(tmp_path / "updates.jsonl")
+        journal = UpdateJournal(path, flush_interval=60, batch_size=1000)
+        journal.start()
+
+        for i in range(10):
+            journal.append(json.dumps({"update_id": i}).encode(), received_at=1.0)
+        assert journal.stats()["pending"] == 10
+        journal.close()
+
+        assert [json.loads(line)["update"]["update_id"] for line in read_lines(path)] == list(range(10))
+        assert journal.stats()["batches"] == 1
+        assert journal.stats()["written"] == 10
+
+    def test_overload_drops_instead_of_blocking(self, tmp_path):
+        """Тест: при переполнении очереди записи отбрасываются и считаются"""
+        journal = UpdateJournal(str(tmp_path / "updates.jsonl"), flush_interval=60, batch_size=1000, max_pending=3)
+
+        results = [journal.append(b'{"update_id":%d}' % i) for i in range(5)]
+
+        assert results == [True, True, True, False, False]
+        assert journal.stats()["dropped"] == 2
+
+    def test_segments_sealed_and_pruned(self, tmp_path):
+        """Тест: файл делится на сегменты по размеру, хранятся последние max_segments"""
+        path = str(tmp_path / "updates.jsonl")
+        sealed = []
+        journal = UpdateJournal(path, segment_bytes=100, max_segments=2, flush_interval=60, batch_size=1)
+        journal.on_sealed = sealed.append
+        journal.start()
+
+        for i in range(4):
+            journal.append(b'{"update_id":%d,"message":{"text":"%s"}}' % (i, b"x" * 80), received_at=1.0)
+            journal._write_batch()
+        journal.close()
+
+        assert sealed == [f"{path}.{n}" for n in range(1, 5)]
+        assert journal.segments() == [f"{path}.3", f"{path}.4"]
+        assert json.loads(read_lines(f"{path}.4")[0])["update"]["update_id"] == 3
+
+    def test_sealed_segment_indexed(self, tmp_path):
+        """Тест: при запечатывании сегмента рядом пишется его индекс"""
+        path = str(tmp_path / "updates.jsonl")
+        journal = UpdateJournal(path, segment_bytes=150, flush_interval=60, batch_size=1)
+        journal.start()
+
+        for i in range(2):
+            update = {"update_id": i, "message": {"chat": {"id": 42}, "from": {"id": 7}, "voice": {}}}
+            journal.append(json.dumps(update).encode(), received_at=100.0 + i, update=update)
+        journal._write_batch()
+        journal.close()
+
+        index = SegmentIndex.load(index_path(f"{path}.1"))
+        assert index.lines == 2
+        assert index.chat == {"42": [0, index.type["voice"][1]]}
+        assert [json.loads(line)["update"]["update_id"] for line, _ in query_segment(f"{path}.1", chat=42)] == [0, 1]
+
+    def test_live_index_rebuilt_after_restart(self, tmp_path):
+        """Тест: после перезапуска индекс живого файла восстанавливается"""
+        path = str(tmp_path / "updates.jsonl")
+        first = UpdateJournal(path)
+        first.start()
+        update = {"update_id": 1, "message": {"chat": {"id": 1}, "text": "a"}}
+        first.append(json.dumps(update).encode(), received_at=1.0, update=update)
+        first.close()
+
+        second = UpdateJournal(path, segment_bytes=1, flush_interval=60, batch_size=1)
+        second.start()
+        update = {"update_id": 2, "message": {"chat": {"id": 1}, "text": "b"}}
+        second.append(json.dumps(update).encode(), received_at=2.0, update=update)
+        second._write_batch()
+        second.close()
+
+        assert SegmentIndex.load(index_path(f"{path}.1")).lines == 2
@@ -0,0 +1,144 @@
+"""
+Тесты для очереди updates (режим fast-ack).
+"""
+import pytest
+import sys
+import os
+import asyncio
+from unittest.mock import Mock, AsyncMock
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.update_queue import UpdateQueue
+
+
+def make_update(update_id, chat_id=None):
+    update = Mock()
+    update.update_id = update_id
+    update.business_message = None
+    update.edited_business_message = None
+    update.effective_chat = Mock(id=chat_id if chat_id is not None else 1000 + update_id)
+    return update
+
+
+@pytest.mark.services
+class TestUpdateQueue:
+    """Тесты для UpdateQueue"""
+
+    @pytest.mark.asyncio
+    async def test_workers_process_updates(self):
+        """Тест: воркеры обрабатывают все поставленные updates"""
+        processed = []
+
+        async def process(update):
+            processed.append(update.update_id)
+
+        queue = UpdateQueue(maxsize=10, workers=3)
+        queue.start(process)
+
+        for i in range(5):
+            assert await queue.submit(make_update(i)) is True
+
+        await queue.stop()
+
+        assert sorted(processed) == [0, 1, 2, 3, 4]
+        assert queue.processed == 5
+        assert queue.running is False
+
+    @pytest.mark.asyncio
+    async def test_submit_returns_without_waiting_for_processing(self):
+        """Тест: submit не ждет окончания обработки"""
+        release = asyncio.Event()
+
+        async def process(update):
+            await release.wait()
+
+        queue = UpdateQueue(maxsize=10, workers=1)
+        queue.start(process)
+
+        assert await asyncio.wait_for(queue.submit(make_update(1)), timeout=0.5) is True
+
+        release.set()
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_backpressure_rejects_when_full(self):
+        """Тест: при переполнении очереди update отклоняется"""
+        release = asyncio.Event()
+
+        async def process(update):
+            await release.wait()
+
+        queue = UpdateQueue(maxsize=1, workers=1, put_timeout=0.05)
+        queue.start(process)
+
+        assert await queue.submit(make_update(1)) is True
+        await asyncio.sleep(0)  # воркер забирает первый update
+        assert await queue.submit(make_update(2)) is True
+        assert await queue.submit(make_update(3)) is False
+        assert queue.rejected == 1
+
+        stats = queue.stats()
+        assert stats["queue_depth"] == 1
+        assert stats["busy_workers"] == 1
+
+        release.set()
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_worker_survives_processing_error(self):
+        """Тест: ошибка обработки не останавливает воркер"""
+        process = AsyncMock(side_effect=[Exception("boom"), None])
+
+        queue = UpdateQueue(maxsize=10, workers=1)
+        queue.start(process)
+
+        await queue.submit(make_update(1))
+        await queue.submit(make_update(2))
+        await queue.stop()
+
+        assert queue.failed == 1
+        assert queue.processed == 1
+
+    @pytest.mark.asyncio
+    async def test_same_chat_updates_are_serialized(self):
+        """Тест: updates одного чата обрабатываются по очереди и по порядку"""
+        order = []
+        running = 0
+        max_running = 0
+
+        async def process(update):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            order.append(update.update_id)
+            running -= 1
+
+        queue = UpdateQueue(maxsize=10, workers=4)
+        queue.start(process)
+
+        for i in range(4):
+            await queue.submit(make_update(i, chat_id=42))
+        await queue.stop()
+
+        assert order == [0, 1, 2, 3]
+        assert max_running == 1
+
+    @pytest.mark.asyncio
+    async def test_submit_before_start(self):
+        """Тест: submit до запуска очереди вызывает ошибку"""
+        queue = UpdateQueue(maxsize=10, workers=1)
+
+        with pytest.raises(RuntimeError):
+            await queue.submit(make_update(1))
+
+    def test_stats_before_start(self):
+        """Тест статистики до запуска"""
+        queue = UpdateQueue(maxsize=10, workers=4)
+
+        stats = queue.stats()
+        assert stats["queue_depth"] == 0
+        assert stats["queue_capacity"] == 10
+        assert stats["workers"] == 0
@@ -0,0 +1,99 @@
+"""
+Тесты для ограничителя запросов к внешним API.
+"""
+import pytest
+import sys
+import os
+import time
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.upstream_limiter import UpstreamLimiter, parse_retry_after
+
+
+@pytest.mark.services
+class TestUpstreamLimiter:
+    """Тесты для UpstreamLimiter"""
+
+    def test_parse_retry_after(self):
+        """Тест разбора Retry-After: секунды и HTTP-дата"""
+        assert parse_retry_after("5") == 5.0
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("завтра") is None
+        http_date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        assert 25 <= parse_retry_after(http_date) <= 31
+
+    @pytest.mark.asyncio
+    async def test_max_in_flight(self):
+        """Тест: одновременно выполняется не больше max_in_flight запросов"""
+        limiter = UpstreamLimiter("test", max_in_flight=2)
+        active = 0
+        peak = 0
+
+        async def request():
+            nonlocal active, peak
+            async with limiter.slot(time.monotonic() + 5):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(request() for _ in range(6)))
+
+        assert peak == 2
+        stats = limiter.stats()
+        assert stats["requests"] == 6
+        assert stats["in_flight"] == 0
+        assert stats["queue_wait_ms_max"] > 0
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_rate(self):
+        """Тест: после исчерпания запаса запросы идут с заданной частотой"""
+        limiter = UpstreamLimiter("test", rate_per_sec=50, burst=2)
+        started = time.monotonic()
+
+        for _ in range(4):
+            async with limiter.slot(time.monotonic() + 5):
+                pass
+
+        # 2 из запаса + 2 с интервалом 20 мс
+        assert time.monotonic() - started >= 0.035
+
+    @pytest.mark.asyncio
+    async def test_slot_respects_deadline(self):
+        """Тест: если слот не освободится до дедлайна - TimeoutError без ожидания"""
+        limiter = UpstreamLimiter("test", rate_per_sec=1, burst=1)
+        async with limiter.slot(time.monotonic() + 5):
+            pass
+
+        with pytest.raises(asyncio.TimeoutError):
+            async with limiter.slot(time.monotonic() + 0.1):
+                pass
+        assert limiter.rejected == 1
+
+    @pytest.mark.asyncio
+    async def test_pause_blocks_upstream(self):
+        """Тест: Retry-After приостанавливает все запросы к апстриму"""
+        limiter = UpstreamLimiter("test")
+        limiter.pause(10)
+
+        with pytest.raises(asyncio.TimeoutError):
+            async with limiter.slot(time.monotonic() + 1):
+                pass
+        assert limiter.throttled == 1
+
+    def test_backoff_bounded_by_deadline(self):
+        """Тест: задержка растет экспоненциально, с джиттером и не выходит за дедлайн"""
+        limiter = UpstreamLimiter("test", base_backoff=0.5, max_backoff=4)
+        now = time.monotonic()
+
+        assert 0.25 <= limiter.backoff(0, now + 100) <= 0.5
+        assert 2 <= limiter.backoff(3, now + 100) <= 4
+        assert 2 <= limiter.backoff(10, now + 100) <= 4
+        assert limiter.backoff(0, now + 100, retry_after=7) == 7
+        assert limiter.backoff(2, now + 0.1) is None
@@ -0,0 +1,69 @@
+"""
+Тесты для прогрева перед регистрацией webhook.
+"""
+import pytest
+import sys
+import os
+import asyncio
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from services.warmup import WarmUp
+
+
+@pytest.mark.services
+class TestWarmUp:
+    """Тесты для WarmUp"""
+
+    @pytest.mark.asyncio
+    async def test_state_transitions(self):
+        """Тест: состояние warming во время прогрева и ready после"""
+        warmup = WarmUp()
+        seen = []
+
+        async def step():
+            seen.append(warmup.state)
+
+        assert warmup.state == "idle"
+        await warmup.run({"step": step}, timeout=1)
+
+        assert seen == ["warming"]
+        assert warmup.state == "ready"
+        assert warmup.stats()["steps"]["step"]["ok"] is True
+
+    @pytest.mark.asyncio
+    async def test_steps_run_concurrently(self):
+        """Тест: шаги выполняются параллельно"""
+        warmup = WarmUp()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await warmup.run({"a": slow, "b": slow, "c": slow}, timeout=1)
+
+        assert loop.time() - started < 0.12
+
+    @pytest.mark.asyncio
+    async def test_failures_do_not_block_startup(self):
+        """Тест: ошибка или таймаут шага записываются, но прогрев завершается"""
+        warmup = WarmUp()
+
+        async def broken():
+            raise RuntimeError("DNS failure")
+
+        async def hangs():
+            await asyncio.sleep(10)
+
+        async def fine():
+            return None
+
+        await warmup.run({"broken": broken, "hangs": hangs, "fine": fine}, timeout=0.05)
+
+        steps = warmup.stats()["steps"]
+        assert warmup.state == "ready"
+        assert steps["broken"] == {"ok": False, "error": "DNS failure", "ms": steps["broken"]["ms"]}
+        assert steps["hangs"]["error"] == "timeout"
+        assert steps["fine"]["ok"] is True
@@ -10,6 +10,7 @@ from unittest.mock import patch, Mock
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
 
 from services.yandex_client import YandexClient
+from services.context_store import ContextStore, MemoryContextStore
 
 
 @pytest.mark.services
@@ -29,7 +30,7 @@ class TestYandexClientEnhanced:
         assert client.endpoint == 'https://test.endpoint/completion'
         assert client.temperature == 0.3
         assert client.max_tokens == 800
-        assert isinstance(client.chat_contexts, dict)
+        assert isinstance(client.chat_contexts, ContextStore)
 
     def test_get_headers_with_api_key(self, client):
         """Тест получения заголовков с API ключом"""
@@ -64,6 +65,15 @@ class TestYandexClientEnhanced:
             with pytest.raises(ValueError, match="No API key or IAM token provided"):
                 client._get_headers()
 
+    def test_to_yandex_messages(self):
+        """Тест перевода сообщений из схемы content в схему text"""
+        messages = [{"role": "system", "content": "Промпт"}, {"role": "user", "content": "Вопрос"}]
+
+        assert YandexClient.to_yandex_messages(messages) == [
+            {"role": "system", "text": "Промпт"},
+            {"role": "user", "text": "Вопрос"},
+        ]
+
     def test_prepare_messages_regular_chat(self, client):
         """Тест подготовки сообщений для обычного чата"""
         messages = client._prepare_messages("Привет", 12345)
@@ -76,7 +86,7 @@ class TestYandexClientEnhanced:
     def test_prepare_messages_with_context(self, client, sample_context_data):
         """Тест подготовки сообщений с контекстом"""
         # Устанавливаем контекст
-        client.chat_contexts = sample_context_data
+        client.chat_contexts = MemoryContextStore(sample_context_data)
         
         messages = client._prepare_messages("Как дела?", 12345)
         
@@ -92,7 +102,7 @@ class TestYandexClientEnhanced:
             mock_config.ENABLE_CONTEXT = False
             
             # Устанавливаем контекст
-            client.chat_contexts = sample_context_data
+            client.chat_contexts = MemoryContextStore(sample_context_data)
             
             messages = client._prepare_messages("Привет", 12345)
             
@@ -133,7 +143,7 @@ class TestYandexClientEnhanced:
         # Должно остаться только последние 20 сообщений
         assert len(context) == 20
 
-    @patch('services.yandex_client.requests.post')
+    @patch('services.yandex_client.http_pool.sync_session.post')
     def test_get_response_success(self, mock_post, client, mock_yandex_response):
         """Тест успешного получения ответа от Yandex GPT"""
         mock_post.return_value = mock_yandex_response
@@ -143,7 +153,7 @@ class TestYandexClientEnhanced:
         assert response == "Тестовый ответ от Yandex GPT"
         mock_post.assert_called_once()
 
-    @patch('services.yandex_client.requests.post')
+    @patch('services.yandex_client.http_pool.sync_session.post')
     def test_get_response_empty_input(self, mock_post, client):
         """Тест обработки пустого ввода"""
         response = client.get_response("", 12345)
@@ -151,7 +161,7 @@ class TestYandexClientEnhanced:
         assert response == "Ошибка: пустой ввод"
         mock_post.assert_not_called()
 
-    @patch('services.yandex_client.requests.post')
+    @patch('services.yandex_client.http_pool.sync_session.post')
     def test_get_response_api_error(self, mock_post, client):
         """Тест обработки ошибки API"""
         mock_response = Mock()
@@ -163,7 +173,7 @@ class TestYandexClientEnhanced:
         
         assert "Извините, произошла ошибка" in response
 
-    @patch('services.yandex_client.requests.post')
+    @patch('services.yandex_client.http_pool.sync_session.post')
     def test_get_response_network_error(self, mock_post, client):
         """Тест обработки сетевой ошибки"""
         mock_post.side_effect = Exception("Network error")
@@ -172,7 +182,7 @@ class TestYandexClientEnhanced:
         
         assert "Извините, произошла ошибка" in response
 
-    @patch('services.yandex_client.requests.post')
+    @patch('services.yandex_client.http_pool.sync_session.post')
     def test_get_response_invalid_response(self, mock_post, client):
         """Тест обработки невалидного ответа"""
         mock_response = Mock()
@@ -184,7 +194,7 @@ class TestYandexClientEnhanced:
         
         assert "Извините, произошла ошибка" in response
 
-    @patch('services.yandex_client.requests.post')
+    @patch('services.yandex_client.http_pool.sync_session.post')
     def test_get_response_request_params(self, mock_post, client, mock_yandex_response):
         """Тест параметров запроса"""
         mock_post.return_value = mock_yandex_response
@@ -271,11 +281,11 @@ class TestYandexClientEnhanced:
 
     def test_get_response_with_context(self, client, sample_context_data, mock_yandex_response):
         """Тест получения ответа с контекстом"""
-        with patch('services.yandex_client.requests.post') as mock_post:
+        with patch('services.yandex_client.http_pool.sync_session.post') as mock_post:
             mock_post.return_value = mock_yandex_response
             
             # Устанавливаем контекст
-            client.chat_contexts = sample_context_data
+            client.chat_contexts = MemoryContextStore(sample_context_data)
             
             response = client.get_response("Как дела?", 12345)
             
@@ -294,7 +304,7 @@ class TestYandexClientEnhanced:
 
     def test_get_response_context_update(self, client, mock_yandex_response):
         """Тест обновления контекста после получения ответа"""
-        with patch('services.yandex_client.requests.post') as mock_post:
+        with patch('services.yandex_client.http_pool.sync_session.post') as mock_post:
             mock_post.return_value = mock_yandex_response
             
             response = client.get_response("Привет", 12345)
@@ -323,7 +333,7 @@ class TestYandexClientEnhanced:
 
     def test_get_response_long_message(self, client, mock_yandex_response):
         """Тест обработки длинного сообщения"""
-        with patch('services.yandex_client.requests.post') as mock_post:
+        with patch('services.yandex_client.http_pool.sync_session.post') as mock_post:
             mock_post.return_value = mock_yandex_response
             
             long_message = "A" * 1000  # Длинное сообщение
@@ -334,7 +344,7 @@ class TestYandexClientEnhanced:
 
     def test_get_response_unicode_message(self, client, mock_yandex_response):
         """Тест обработки Unicode сообщения"""
-        with patch('services.yandex_client.requests.post') as mock_post:
+        with patch('services.yandex_client.http_pool.sync_session.post') as mock_post:
             mock_post.return_value = mock_yandex_response
             
             unicode_message = "Привет, мир! 🌍 Тест с эмодзи 😊"
@@ -24,7 +24,7 @@ class TestSpeechClient(unittest.TestCase):
         from services.speech_client import SpeechClient
         self.client = SpeechClient()
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     @patch('services.speech_client.config')
     def test_speech_to_text_success(self, mock_config, mock_post):
         """Test successful speech-to-text conversion"""
@@ -46,7 +46,7 @@ class TestSpeechClient(unittest.TestCase):
         result = self.client.speech_to_text(audio_data)
         self.assertEqual(result, "Привет, как дела?")
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     @patch('services.speech_client.config')
     def test_speech_to_text_error(self, mock_config, mock_post):
         """Test handling of STT API errors"""
@@ -64,7 +64,7 @@ class TestSpeechClient(unittest.TestCase):
         result = self.client.speech_to_text(audio_data)
         self.assertIsNone(result)
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     @patch('services.speech_client.config')
     def test_text_to_speech_success(self, mock_config, mock_post):
         """Test successful text-to-speech conversion"""
@@ -85,7 +85,7 @@ class TestSpeechClient(unittest.TestCase):
         result = self.client.text_to_speech(text)
         self.assertEqual(result, b"fake_audio_data")
 
-    @patch('services.speech_client.requests.post')
+    @patch('services.speech_client.http_pool.sync_session.post')
     @patch('services.speech_client.config')
     def test_text_to_speech_error(self, mock_config, mock_post):
         """Test handling of TTS API errors"""
@@ -0,0 +1,59 @@
+"""
+Тесты для построения ключей контекста.
+"""
+import pytest
+import sys
+import os
+from unittest.mock import Mock
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from utils.context_keys import make_context_key, update_context_key
+
+
+@pytest.mark.utils
+class TestContextKeys:
+    """Тесты для ключей контекста"""
+
+    def test_regular_chat_key(self):
+        """Тест ключа обычного чата"""
+        assert make_context_key(12345) == 12345
+
+    def test_business_chat_key(self):
+        """Тест ключа бизнес-чата"""
+        assert make_context_key(12345, True, "conn") == "business_conn_12345"
+
+    def test_update_key_regular_message(self):
+        """Тест ключа для update с обычным сообщением"""
+        update = Mock()
+        update.business_message = None
+        update.edited_business_message = None
+        update.effective_chat = Mock(id=67890)
+
+        assert update_context_key(update) == 67890
+
+    def test_update_key_business_message(self):
+        """Тест ключа для update с бизнес-сообщением"""
+        update = Mock()
+        update.business_message = Mock(business_connection_id="conn", chat=Mock(id=67890))
+        update.edited_business_message = None
+
+        assert update_context_key(update) == "business_conn_67890"
+
+    def test_update_key_edited_business_message(self):
+        """Тест ключа для отредактированного бизнес-сообщения"""
+        update = Mock()
+        update.business_message = None
+        update.edited_business_message = Mock(business_connection_id="conn", chat=Mock(id=1))
+
+        assert update_context_key(update) == "business_conn_1"
+
+    def test_update_key_without_chat(self):
+        """Тест ключа для update без чата"""
+        update = Mock()
+        update.business_message = None
+        update.edited_business_message = None
+        update.effective_chat = None
+
+        assert update_context_key(update) is None
@@ -13,7 +13,14 @@ from io import StringIO
 # Добавляем src в путь для импортов
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
 
-from utils.logger import log_info, log_error, log_message, log_response, log_update_json
+import time
+import queue
+import logging
+
+from utils.logger import (
+    log_info, log_error, log_message, log_response,
+    BoundedQueueHandler, DrainingQueueListener, ExcludeLoggers,
+)
 
 
 @pytest.mark.utils
@@ -35,7 +42,7 @@ class TestLoggerUtils:
     def test_log_message_basic(self):
         """Тест логирования сообщения с базовыми параметрами"""
         with patch('utils.logger.logger') as mock_logger, \
-             patch('utils.logger.print') as mock_print:
+             patch('utils.logger.console_logger') as mock_console:
             
             log_message(
                 chat_id=12345,
@@ -49,13 +56,13 @@ class TestLoggerUtils:
             # Проверяем что логгер был вызван
             assert mock_logger.info.called
             
-            # Проверяем что print был вызван для консольного вывода
-            assert mock_print.called
+            # Проверяем что была краткая строка для консоли
+            assert mock_console.info.called
 
     def test_log_message_without_username(self):
         """Тест логирования сообщения без имени пользователя"""
         with patch('utils.logger.logger') as mock_logger, \
-             patch('utils.logger.print') as mock_print:
+             patch('utils.logger.console_logger') as mock_console:
             
             log_message(
                 chat_id=12345,
@@ -67,12 +74,12 @@ class TestLoggerUtils:
             )
             
             assert mock_logger.info.called
-            assert mock_print.called
+            assert mock_console.info.called
 
     def test_log_message_long_content(self):
         """Тест логирования сообщения с длинным содержимым"""
         with patch('utils.logger.logger') as mock_logger, \
-             patch('utils.logger.print') as mock_print:
+             patch('utils.logger.console_logger') as mock_console:
             
             long_content = "A" * 300  # Длинное сообщение
             log_message(
@@ -91,7 +98,7 @@ class TestLoggerUtils:
     def test_log_message_console_output(self):
         """Тест консольного вывода сообщения"""
         with patch('utils.logger.logger'), \
-             patch('utils.logger.print') as mock_print:
+             patch('utils.logger.console_logger') as mock_console:
             
             log_message(
                 chat_id=12345,
@@ -102,24 +109,24 @@ class TestLoggerUtils:
                 message_id=1
             )
             
-            # Проверяем что был вызов print с эмодзи
-            print_calls = mock_print.call_args_list
-            assert any("💬" in str(call) for call in print_calls)
+            # Проверяем что была строка для консоли с эмодзи
+            console_calls = mock_console.info.call_args_list
+            assert any("💬" in str(call) for call in console_calls)
 
     def test_log_response_success(self):
         """Тест логирования успешного ответа"""
         with patch('utils.logger.logger') as mock_logger, \
-             patch('utils.logger.print') as mock_print:
+             patch('utils.logger.console_logger') as mock_console:
             
             log_response(chat_id=12345, response_type="TEXT", success=True)
             
             assert mock_logger.info.called
-            assert mock_print.called
+            assert mock_console.info.called
 
     def test_log_response_error(self):
         """Тест логирования ответа с ошибкой"""
         with patch('utils.logger.logger') as mock_logger, \
-             patch('utils.logger.print') as mock_print:
+             patch('utils.logger.console_logger') as mock_console:
             
             log_response(
                 chat_id=12345, 
@@ -129,239 +136,34 @@ class TestLoggerUtils:
             )
             
             assert mock_logger.info.called
-            assert mock_print.called
+            assert mock_console.info.called
 
     def test_log_response_console_output(self):
         """Тест консольного вывода ответа"""
         with patch('utils.logger.logger'), \
-             patch('utils.logger.print') as mock_print:
+             patch('utils.logger.console_logger') as mock_console:
             
             log_response(chat_id=12345, response_type="TEXT", success=True)
             
-            # Проверяем что был вызов print с эмодзи
-            print_calls = mock_print.call_args_list
-            assert any("🤖" in str(call) for call in print_calls)
+            # Проверяем что была строка для консоли с эмодзи
+            console_calls = mock_console.info.call_args_list
+            assert any("🤖" in str(call) for call in console_calls)
 
     def test_log_response_error_emoji(self):
         """Тест эмодзи для ошибки в ответе"""
         with patch('utils.logger.logger'), \
-             patch('utils.logger.print') as mock_print:
+             patch('utils.logger.console_logger') as mock_console:
             
             log_response(chat_id=12345, response_type="TEXT", success=False)
             
-            # Проверяем что был вызов print с эмодзи ошибки
-            print_calls = mock_print.call_args_list
-            assert any("❌" in str(call) for call in print_calls)
-
-    def test_log_update_json_basic(self):
-        """Тест логирования JSON update"""
-        with patch('utils.logger.logging.getLogger') as mock_get_logger:
-            mock_update_logger = mock_get_logger.return_value
-            
-            update_data = {
-                "update_id": 123,
-                "message": {
-                    "message_id": 1,
-                    "text": "Hello",
-                    "from": {
-                        "id": 12345,
-                        "username": "testuser",
-                        "first_name": "Test"
-                    }
-                }
-            }
-            
-            log_update_json(update_data)
-            
-            # Проверяем что был создан логгер для updates
-            mock_get_logger.assert_called_with("updates")
-            assert mock_update_logger.info.called
-
-    def test_log_update_json_text_message(self):
-        """Тест логирования текстового сообщения в JSON"""
-        with patch('utils.logger.logging.getLogger') as mock_get_logger, \
-             patch('utils.logger.logger') as mock_logger:
-            
-            mock_update_logger = mock_get_logger.return_value
-            
-            update_data = {
-                "update_id": 123,
-                "message": {
-                    "message_id": 1,
-                    "text": "Hello world",
-                    "from": {
-                        "id": 12345,
-                        "username": "testuser",
-                        "first_name": "Test"
-                    }
-                }
-            }
-            
-            log_update_json(update_data)
-            
-            # Проверяем что был вызов основного логгера
-            assert mock_logger.info.called
-            
-            # Проверяем что был вызов update логгера
-            assert mock_update_logger.info.called
-
-    def test_log_update_json_voice_message(self):
-        """Тест логирования голосового сообщения в JSON"""
-        with patch('utils.logger.logging.getLogger') as mock_get_logger, \
-             patch('utils.logger.logger') as mock_logger:
-            
-            mock_update_logger = mock_get_logger.return_value
-            
-            update_data = {
-                "update_id": 124,
-                "message": {
-                    "message_id": 2,
-                    "voice": {
-                        "file_id": "test_voice_id",
-                        "duration": 5
-                    },
-                    "from": {
-                        "id": 12345,
-                        "username": "testuser",
-                        "first_name": "Test"
-                    }
-                }
-            }
-            
-            log_update_json(update_data)
-            
-            assert mock_logger.info.called
-            assert mock_update_logger.info.called
-
-    def test_log_update_json_callback_query(self):
-        """Тест логирования callback query в JSON"""
-        with patch('utils.logger.logging.getLogger') as mock_get_logger, \
-             patch('utils.logger.logger') as mock_logger:
-            
-            mock_update_logger = mock_get_logger.return_value
-            
-            update_data = {
-                "update_id": 125,
-                "callback_query": {
-                    "id": "test_callback_id",
-                    "from": {
-                        "id": 12345,
-                        "username": "testuser",
-                        "first_name": "Test"
-                    },
-                    "data": "test_data"
-                }
-            }
-            
-            log_update_json(update_data)
-            
-            assert mock_logger.info.called
-            assert mock_update_logger.info.called
-
-    def test_log_update_json_edited_message(self):
-        """Тест логирования отредактированного сообщения в JSON"""
-        with patch('utils.logger.logging.getLogger') as mock_get_logger, \
-             patch('utils.logger.logger') as mock_logger:
-            
-            mock_update_logger = mock_get_logger.return_value
-            
-            update_data = {
-                "update_id": 126,
-                "edited_message": {
-                    "message_id": 3,
-                    "text": "Edited text",
-                    "from": {
-                        "id": 12345,
-                        "username": "testuser",
-                        "first_name": "Test"
-                    }
-                }
-            }
-            
-            log_update_json(update_data)
-            
-            assert mock_logger.info.called
-            assert mock_update_logger.info.called
-
-    def test_log_update_json_unknown_type(self):
-        """Тест логирования неизвестного типа update в JSON"""
-        with patch('utils.logger.logging.getLogger') as mock_get_logger, \
-             patch('utils.logger.logger') as mock_logger:
-            
-            mock_update_logger = mock_get_logger.return_value
-            
-            update_data = {
-                "update_id": 127,
-                "unknown_field": {
-                    "data": "test"
-                }
-            }
-            
-            log_update_json(update_data)
-            
-            assert mock_logger.info.called
-            assert mock_update_logger.info.called
-
-    def test_log_update_json_user_info_extraction(self):
-        """Тест извлечения информации о пользователе из JSON"""
-        with patch('utils.logger.logging.getLogger') as mock_get_logger, \
-             patch('utils.logger.logger') as mock_logger:
-            
-            mock_update_logger = mock_get_logger.return_value
-            
-            update_data = {
-                "update_id": 128,
-                "message": {
-                    "message_id": 4,
-                    "text": "Test message",
-                    "from": {
-                        "id": 12345,
-                        "first_name": "John",
-                        "last_name": "Doe"
-                        # Нет username
-                    }
-                }
-            }
-            
-            log_update_json(update_data)
-            
-            # Проверяем что информация о пользователе была извлечена
-            assert mock_logger.info.called
-            logged_message = mock_logger.info.call_args[0][0]
-            assert "John" in logged_message
-
-    def test_log_update_json_long_text_content(self):
-        """Тест логирования длинного текстового содержимого в JSON"""
-        with patch('utils.logger.logging.getLogger') as mock_get_logger, \
-             patch('utils.logger.logger') as mock_logger:
-            
-            mock_update_logger = mock_get_logger.return_value
-            
-            long_text = "A" * 100  # Длинный текст
-            update_data = {
-                "update_id": 129,
-                "message": {
-                    "message_id": 5,
-                    "text": long_text,
-                    "from": {
-                        "id": 12345,
-                        "username": "testuser",
-                        "first_name": "Test"
-                    }
-                }
-            }
-            
-            log_update_json(update_data)
-            
-            assert mock_logger.info.called
-            logged_message = mock_logger.info.call_args[0][0]
-            # Проверяем что длинный текст был обрезан
-            assert len(logged_message.split("CONTENT:")[1]) <= 50
+            # Проверяем что была строка для консоли с эмодзи ошибки
+            console_calls = mock_console.info.call_args_list
+            assert any("❌" in str(call) for call in console_calls)
 
     def test_log_message_timestamp_format(self):
         """Тест формата временной метки в логах"""
         with patch('utils.logger.logger') as mock_logger, \
-             patch('utils.logger.print'):
+             patch('utils.logger.console_logger'):
             
             log_message(
                 chat_id=12345,
@@ -379,7 +181,7 @@ class TestLoggerUtils:
     def test_log_response_timestamp_format(self):
         """Тест формата временной метки в логах ответов"""
         with patch('utils.logger.logger') as mock_logger, \
-             patch('utils.logger.print'):
+             patch('utils.logger.console_logger'):
             
             log_response(chat_id=12345, response_type="TEXT", success=True)
             
@@ -387,3 +189,146 @@ class TestLoggerUtils:
             # Проверяем что временная метка в правильном формате
             assert "[" in logged_message and "]" in logged_message
 
+
+@pytest.mark.utils
+class TestLogQueue:
+    """Тесты для очереди логов"""
+
+    @staticmethod
+    def make_record(message: str, name: str = "test") -> logging.LogRecord:
+        return logging.LogRecord(name, logging.INFO, __file__, 0, message, None, None)
+
+    def test_drop_policy(self):
+        """Тест: при переполнении запись отбрасывается сразу, потом приходит предупреждение"""
+        log_queue = queue.Queue(maxsize=2)
+        handler = BoundedQueueHandler(log_queue, policy="drop")
+
+        for i in range(4):
+            handler.emit(self.make_record(f"запись {i}"))
+
+        assert handler.dropped == 2
+        assert log_queue.qsize() == 2
+
+        log_queue.get_nowait()
+        log_queue.get_nowait()
+        handler.emit(self.make_record("после перегрузки"))
+
+        messages = [log_queue.get_nowait().getMessage() for _ in range(log_queue.qsize())]
+        assert messages == ["после перегрузки", "Log queue overflow: dropped 2 records"]
+
+    def test_block_policy_waits_then_drops(self):
+        """Тест: политика block ждет место в очереди не дольше таймаута"""
+        log_queue = queue.Queue(maxsize=1)
+        handler = BoundedQueueHandler(log_queue, policy="block", block_timeout=0.05)
+        handler.emit(self.make_record("первая"))
+
+        started = time.monotonic()
+        handler.emit(self.make_record("вторая"))
+
+        assert time.monotonic() - started >= 0.05
+        assert handler.dropped == 1
+
+    def test_record_not_formatted_in_caller(self):
+        """Тест: аргументы записи форматируются в потоке записи, а не в вызывающем коде"""
+        log_queue = queue.Queue()
+        handler = BoundedQueueHandler(log_queue)
+        record = logging.LogRecord("test", logging.INFO, __file__, 0, "ответ %s", ("готов",), None)
+
+        handler.emit(record)
+
+        queued = log_queue.get_nowait()
+        assert queued.args == ("готов",)
+        assert queued.getMessage() == "ответ готов"
+
+    def test_listener_drains_queue_on_stop(self):
+        """Тест: при остановке записываются все записи из очереди, даже из заполненной"""
+        log_queue = queue.Queue(maxsize=5)
+        stream = StringIO()
+        target = logging.StreamHandler(stream)
+        target.addFilter(ExcludeLoggers("console"))
+        listener = DrainingQueueListener(log_queue, target)
+        for i in range(5):
+            log_queue.put_nowait(self.make_record(f"запись {i}"))
+        # Очередь заполнена до запуска потока записи
+        log_queue_full = log_queue.full()
+
+        listener.start()
+        listener.stop()
+
+        assert log_queue_full
+        assert stream.getvalue().splitlines() == [f"запись {i}" for i in range(5)]
+
+    def test_console_records_stay_out_of_files(self):
+        """Тест: краткие строки для консоли не попадают в файловые логи"""
+        file_filter = ExcludeLoggers("console")
+
+        assert file_filter.filter(self.make_record("строка", name="console")) is False
+        assert file_filter.filter(self.make_record("строка", name="services.neuroapi_client")) is True
+
+
+@pytest.mark.utils
+class TestLogRouting:
+    """Тесты для маршрутизации и ротации файлов логов"""
+
+    @staticmethod
+    def make_record(name: str, level: int = logging.INFO, message: str = "запись") -> logging.LogRecord:
+        return logging.LogRecord(name, level, __file__, 0, message, None, None)
+
+    def test_each_file_gets_only_its_records(self):
+        """Тест: ошибки - в error.log, сообщения - только в messages.log, консольные строки - только в консоль"""
+        from utils.logger import error_handler, combined_handler, messages_handler, console_handler
+
+        def accepts(handler, record):
+            return record.levelno >= handler.level and bool(handler.filter(record))
+
+        error = self.make_record("services.neuroapi_client", logging.ERROR)
+        info = self.make_record("services.neuroapi_client")
+        message = self.make_record("messages")
+        console = self.make_record("console")
+
+        assert [accepts(error_handler, r) for r in (error, info, message, console)] == [True, False, False, False]
+        assert [accepts(combined_handler, r) for r in (error, info, message, console)] == [True, True, False, False]
+        assert [accepts(messages_handler, r) for r in (error, info, message, console)] == [False, False, True, False]
+        assert [accepts(console_handler, r) for r in (error, info, message, console)] == [True, True, False, True]
+
+    def test_size_rotation_with_gzip(self, tmp_path):
+        """Тест: файл ротируется по размеру, сегменты сжимаются, хранится backup_count последних"""
+        import gzip
+        from utils.logger import SizeTimeRotatingFileHandler
+
+        path = str(tmp_path / "combined.log")
+        handler = SizeTimeRotatingFileHandler(path, max_bytes=100, backup_count=2)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        try:
+            for i in range(12):
+                handler.emit(self.make_record("test", message=f"строка {i:02d} " + "x" * 20))
+        finally:
+            handler.close()
+
+        segments = handler.segments()
+        assert len(segments) == 2
+        assert all(segment.endswith(".gz") for segment in segments)
+        assert os.path.getsize(path) <= 100
+        with gzip.open(segments[-1], 'rt', encoding='utf-8') as f:
+            assert f.read().startswith("строка")
+
+    def test_time_rotation(self, tmp_path):
+        """Тест: по истечении интервала непустой файл ротируется"""
+        from utils.logger import SizeTimeRotatingFileHandler
+
+        path = str(tmp_path / "error.log")
+        handler = SizeTimeRotatingFileHandler(path, interval_sec=3600, compress=False)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        try:
+            handler.emit(self.make_record("test", message="старая"))
+            with patch('utils.logger.time.time', return_value=time.time() + 7200):
+                handler.emit(self.make_record("test", message="новая"))
+        finally:
+            handler.close()
+
+        segments = handler.segments()
+        assert len(segments) == 1
+        with open(segments[0], encoding='utf-8') as f:
+            assert f.read() == "старая\n"
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == "новая\n"
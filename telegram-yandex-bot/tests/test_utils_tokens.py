@@ -0,0 +1,80 @@
+"""
+Тесты для оценки числа токенов и бюджета промпта.
+"""
+import pytest
+import sys
+import os
+
+# Добавляем src в путь для импортов
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src'))
+
+from utils.tokens import (
+    MESSAGE_OVERHEAD_TOKENS,
+    fit_to_budget,
+    get_token_estimator,
+    heuristic_tokens,
+    message_tokens,
+)
+
+
+@pytest.mark.utils
+class TestTokens:
+    """Тесты для utils.tokens"""
+
+    def test_heuristic_tokens(self):
+        """Тест эвристики: ~4 байта UTF-8 на токен"""
+        assert heuristic_tokens("") == 0
+        assert heuristic_tokens("abcd") == 1
+        assert heuristic_tokens("abcde") == 2
+        # Кириллица - 2 байта на символ
+        assert heuristic_tokens("привет") == 3
+
+    def test_unknown_estimator_falls_back_to_heuristic(self):
+        """Тест: неизвестная оценка заменяется эвристикой"""
+        assert get_token_estimator("nope") is heuristic_tokens
+        assert get_token_estimator() is heuristic_tokens
+
+    def test_message_tokens_uses_cached_count(self):
+        """Тест: закэшированное в реплике число токенов не пересчитывается"""
+        estimate = lambda text: pytest.fail("не должно вызываться")
+        assert message_tokens({"role": "user", "content": "x", "tokens": 7}, estimate) == 7 + MESSAGE_OVERHEAD_TOKENS
+
+    def test_fit_to_budget_newest_first(self):
+        """Тест: берутся самые новые реплики, порядок сохраняется"""
+        turns = [{"role": "user", "content": str(i), "tokens": 10} for i in range(5)]
+        cost = 10 + MESSAGE_OVERHEAD_TOKENS
+
+        assert fit_to_budget(turns, cost * 2) == turns[-2:]
+        assert fit_to_budget(turns, cost * 2 + 1) == turns[-2:]
+        assert fit_to_budget(turns, 0) == []
+        assert fit_to_budget(turns, cost * 100) == turns
+
+    def test_fit_to_budget_stops_at_first_oversized_turn(self):
+        """Тест: история не прерывается - после длинной реплики более старые не берутся"""
+        turns = [
+            {"role": "user", "content": "a", "tokens": 1},
+            {"role": "assistant", "content": "b", "tokens": 1000},
+            {"role": "user", "content": "c", "tokens": 1},
+            {"role": "assistant", "content": "d", "tokens": 1},
+            {"role": "user", "content": "e", "tokens": 1},
+        ]
+
+        assert fit_to_budget(turns, 50) == turns[-3:]
+
+    def test_fit_to_budget_keeps_long_latest_exchange(self):
+        """Тест: длинный последний ответ сокращается, а не выбрасывает весь контекст"""
+        turns = [
+            {"role": "user", "content": "старый вопрос", "tokens": 5},
+            {"role": "user", "content": "вопрос", "tokens": 3},
+            {"role": "assistant", "content": "ответ " * 2000, "tokens": heuristic_tokens("ответ " * 2000)},
+        ]
+
+        selected = fit_to_budget(turns, 500)
+
+        assert [turn["role"] for turn in selected] == ["user", "assistant"]
+        assert selected[0] == turns[1]
+        assert selected[1]["content"].startswith("ответ ответ")
+        assert selected[1]["content"].endswith("…")
+        assert sum(message_tokens(turn) for turn in selected) <= 500
+        # Исходная реплика в истории не меняется
+        assert turns[2]["content"] == "ответ " * 2000
@@ -40,7 +40,7 @@ class TestYandexClient(unittest.TestCase):
             }
         }
         
-        with patch('services.yandex_client.requests.post', return_value=mock_response):
+        with patch('services.yandex_client.http_pool.sync_session.post', return_value=mock_response):
             response = self.client.get_response(user_input, chat_id=123)
             
         self.assertIsInstance(response, str)
@@ -61,7 +61,7 @@ class TestYandexClient(unittest.TestCase):
         mock_response.status_code = 400
         mock_response.text = "Bad Request"
         
-        with patch('services.yandex_client.requests.post', return_value=mock_response):
+        with patch('services.yandex_client.http_pool.sync_session.post', return_value=mock_response):
             response = self.client.get_response(user_input, chat_id=123)
             
         self.assertIn("Извините, произошла ошибка", response)